@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+章节素材内容寻址存储
+
+功能:
+    - 生成的图片等素材按内容SHA-256只写一次，存放在 data/.assets/objects/<前两位>/<哈希>
+    - 章节中的文件名（images/xxx.jpeg、Character_Images/xxx.png等）是指向对象的硬链接，
+      现有脚本和网页按原文件名读取不受影响；无法硬链接时（跨文件系统等）退回复制，并记录在清单中
+    - 重复的角色图片、重新生成后回填的图片、备份文件共用同一个对象，不再占用额外空间
+    - 引用计数垃圾回收：对象的硬链接数加清单中的复制引用为0时删除，取代按文件名清理的临时脚本
+    - 对象文件设为只读，防止就地改写一个章节的文件时波及其他共用同一对象的章节
+
+使用方法:
+    from asset_store import store_bytes, store_file
+
+    store_bytes(image_bytes, 'data/001/chapter_001/images/chapter_001_image_01_1.jpeg')
+    store_file('Character_Images/xxx.png', 'data/001/chapter_001/images/xxx.png')  # 替代shutil.copy2
+
+    # 把已有目录中的图片收进存储（重复文件改为硬链接）
+    python asset_store.py ingest data Character_Images
+    # 回收不再被引用的对象
+    python asset_store.py gc --dry-run
+    python asset_store.py gc
+    # 查看存储占用和节省的空间
+    python asset_store.py stats
+    # 校验对象内容与哈希一致
+    python asset_store.py verify
+
+环境变量:
+    ASSET_STORE_DIR        存储目录，默认 data/.assets（需与数据目录在同一文件系统才能硬链接）
+    ASSET_STORE_DISABLED=1 关闭存储，store_bytes/store_file退回直接写文件/复制
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import stat
+import sys
+import threading
+import time
+import uuid
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_STORE_DIR = os.path.join(PROJECT_ROOT, 'data', '.assets')
+
+# 默认收进存储的素材类型（视频会被ffmpeg以-y就地覆盖，不做硬链接）
+DEFAULT_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp')
+
+# 新写入的对象在这段时间内不回收，避免与写入后尚未链接到章节路径的并发写入竞争
+# （回收只删除存储中的名字，已链接的章节文件即使竞争失败也不会丢数据）
+GC_GRACE_SECONDS = 3600
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def store_disabled():
+    return os.environ.get('ASSET_STORE_DISABLED', '0') not in ('', '0')
+
+
+class AssetStore:
+    """
+    内容寻址素材存储
+
+    对象文件自身算一个硬链接，章节路径每多一个硬链接引用数加一；
+    清单（index.sqlite3的refs表）记录每个章节路径对应的对象，复制方式的引用只能靠清单计数
+    """
+
+    def __init__(self, root=None):
+        self.root = os.path.abspath(root or os.environ.get('ASSET_STORE_DIR') or DEFAULT_STORE_DIR)
+        self.objects_dir = os.path.join(self.root, 'objects')
+        self.db_path = os.path.join(self.root, 'index.sqlite3')
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(self.root, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS refs ('
+                'path TEXT PRIMARY KEY, digest TEXT NOT NULL, kind TEXT NOT NULL, '
+                'size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, updated_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS refs_digest ON refs (digest)')
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def _publish_object(self, digest, write):
+        """
+        确保对象存在：不存在时用write(临时路径)写入，再原子地链接为对象文件
+        """
+        obj = self.object_path(digest)
+        if os.path.exists(obj):
+            return obj
+        os.makedirs(os.path.dirname(obj), exist_ok=True)
+        tmp = f"{obj}.tmp-{uuid.uuid4().hex}"
+        try:
+            write(tmp)
+            os.chmod(tmp, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            try:
+                os.link(tmp, obj)
+            except FileExistsError:
+                pass
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return obj
+
+    def _link(self, obj, digest, path):
+        """
+        把章节路径指向对象：优先硬链接，失败时复制；通过临时文件+rename原子替换已有文件
+        """
+        path = os.path.abspath(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path) and os.path.samefile(obj, path):
+            kind = 'link'
+        else:
+            tmp = f"{path}.asset-{uuid.uuid4().hex}"
+            try:
+                try:
+                    os.link(obj, tmp)
+                    kind = 'link'
+                except OSError:
+                    shutil.copyfile(obj, tmp)
+                    kind = 'copy'
+                os.replace(tmp, path)
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+
+        st = os.stat(path)
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO refs (path, digest, kind, size, mtime_ns, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (path, digest, kind, st.st_size, st.st_mtime_ns, time.time()),
+            )
+        return kind
+
+    def put_bytes(self, data, path):
+        """
+        写入素材内容并让path指向它
+
+        Returns:
+            str: 内容哈希
+        """
+        digest = hash_bytes(data)
+
+        def write(tmp):
+            with open(tmp, 'wb') as f:
+                f.write(data)
+
+        for attempt in range(2):
+            obj = self._publish_object(digest, write)
+            try:
+                self._link(obj, digest, path)
+                return digest
+            except FileNotFoundError:
+                # 对象恰好被并发的gc删除，重新写入一次
+                if attempt:
+                    raise
+        return digest
+
+    def put_file(self, src, path=None):
+        """
+        把已有文件收进存储，并让path（默认为src本身）指向对象
+        对象不存在且与src同文件系统时直接链接src的inode，不复制内容
+
+        Returns:
+            str: 内容哈希
+        """
+        src = os.path.abspath(src)
+        path = os.path.abspath(path or src)
+        digest = hash_file(src)
+
+        def write(tmp):
+            try:
+                os.link(src, tmp)
+            except OSError:
+                shutil.copyfile(src, tmp)
+
+        for attempt in range(2):
+            obj = self._publish_object(digest, write)
+            try:
+                self._link(obj, digest, path)
+                return digest
+            except FileNotFoundError:
+                if attempt:
+                    raise
+        return digest
+
+    def _prune_refs(self, conn):
+        """
+        删除失效的清单条目：路径已不存在、已被改写成其他内容，或硬链接已断开
+        """
+        dropped = 0
+        rows = conn.execute('SELECT path, digest, kind, size, mtime_ns FROM refs').fetchall()
+        for path, digest, kind, size, mtime_ns in rows:
+            try:
+                st = os.stat(path)
+            except OSError:
+                st = None
+            valid = st is not None
+            if valid and kind == 'link':
+                obj = self.object_path(digest)
+                valid = os.path.exists(obj) and os.path.samefile(obj, path)
+            elif valid:
+                valid = (st.st_size, st.st_mtime_ns) == (size, mtime_ns)
+            if not valid:
+                conn.execute('DELETE FROM refs WHERE path = ?', (path,))
+                dropped += 1
+        return dropped
+
+    def iter_objects(self):
+        if not os.path.isdir(self.objects_dir):
+            return
+        for prefix in sorted(os.listdir(self.objects_dir)):
+            prefix_dir = os.path.join(self.objects_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for name in sorted(os.listdir(prefix_dir)):
+                yield name, os.path.join(prefix_dir, name)
+
+    def gc(self, dry_run=False, grace=GC_GRACE_SECONDS, now=None):
+        """
+        回收引用数为0的对象
+
+        Returns:
+            dict: {'objects': 对象总数, 'removed': 删除数, 'freed_bytes': 释放字节数, 'refs_dropped': 失效清单条目数}
+        """
+        now = time.time() if now is None else now
+        conn = self._connect()
+        try:
+            refs_dropped = self._prune_refs(conn)
+            copies = dict(conn.execute("SELECT digest, COUNT(*) FROM refs WHERE kind = 'copy' GROUP BY digest"))
+        finally:
+            # 试运行不修改清单
+            if dry_run:
+                conn.rollback()
+            else:
+                conn.commit()
+
+        stats = {'objects': 0, 'removed': 0, 'freed_bytes': 0, 'refs_dropped': refs_dropped}
+        for name, path in self.iter_objects():
+            st = os.stat(path)
+            if '.tmp-' in name:
+                # 写入中途退出留下的临时文件
+                if now - st.st_mtime > grace:
+                    if not dry_run:
+                        os.remove(path)
+                    stats['removed'] += 1
+                    stats['freed_bytes'] += st.st_size
+                continue
+            stats['objects'] += 1
+            references = (st.st_nlink - 1) + copies.get(name, 0)
+            if references > 0 or now - st.st_mtime < grace:
+                continue
+            if not dry_run:
+                os.remove(path)
+            stats['removed'] += 1
+            stats['freed_bytes'] += st.st_size
+        return stats
+
+    def stats(self):
+        """
+        统计对象数、实际占用和按章节文件名计算的逻辑大小
+        """
+        conn = self._connect()
+        copies = dict(conn.execute("SELECT digest, COUNT(*) FROM refs WHERE kind = 'copy' GROUP BY digest"))
+        refs = conn.execute('SELECT COUNT(*) FROM refs').fetchone()[0]
+        result = {'objects': 0, 'stored_bytes': 0, 'logical_bytes': 0, 'references': 0, 'unreferenced': 0, 'refs': refs}
+        for name, path in self.iter_objects():
+            if '.tmp-' in name:
+                continue
+            st = os.stat(path)
+            references = (st.st_nlink - 1) + copies.get(name, 0)
+            result['objects'] += 1
+            result['stored_bytes'] += st.st_size * (1 + copies.get(name, 0))
+            result['logical_bytes'] += st.st_size * references
+            result['references'] += references
+            if references == 0:
+                result['unreferenced'] += 1
+        result['saved_bytes'] = max(result['logical_bytes'] - result['stored_bytes'], 0)
+        return result
+
+    def verify(self):
+        """
+        校验对象内容与文件名中的哈希一致，返回不一致的对象路径（通常是有脚本绕过存储就地改写了文件）
+        """
+        return [path for name, path in self.iter_objects() if '.tmp-' not in name and hash_file(path) != name]
+
+    def refs(self, key):
+        """
+        按哈希或章节路径查询引用
+        """
+        conn = self._connect()
+        if os.path.exists(key):
+            row = conn.execute('SELECT digest FROM refs WHERE path = ?', (os.path.abspath(key),)).fetchone()
+            key = row[0] if row else hash_file(key)
+        rows = conn.execute('SELECT path, kind FROM refs WHERE digest = ? ORDER BY path', (key,)).fetchall()
+        return key, rows
+
+    def ingest(self, paths, extensions=DEFAULT_EXTENSIONS, dry_run=False):
+        """
+        把目录中已有的素材收进存储，内容相同的文件改为共用同一对象
+
+        Returns:
+            dict: {'files': 文件数, 'new_objects': 新对象数, 'deduplicated': 改为链接的重复文件数, 'saved_bytes': 节省字节数}
+        """
+        stats = {'files': 0, 'new_objects': 0, 'deduplicated': 0, 'saved_bytes': 0}
+        seen = set()
+        for top in paths:
+            for dirpath, dirnames, filenames in os.walk(os.path.abspath(top)):
+                if os.path.commonpath([dirpath, self.root]) == self.root:
+                    dirnames[:] = []
+                    continue
+                dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+                for filename in filenames:
+                    if not filename.lower().endswith(tuple(extensions)):
+                        continue
+                    path = os.path.join(dirpath, filename)
+                    if not os.path.isfile(path) or os.path.islink(path):
+                        continue
+                    stats['files'] += 1
+                    digest = hash_file(path)
+                    obj = self.object_path(digest)
+                    exists = os.path.exists(obj) or digest in seen
+                    if exists and os.path.exists(obj) and os.path.samefile(obj, path):
+                        continue
+                    size = os.path.getsize(path)
+                    if exists:
+                        stats['deduplicated'] += 1
+                        stats['saved_bytes'] += size
+                    else:
+                        stats['new_objects'] += 1
+                    seen.add(digest)
+                    if not dry_run:
+                        self.put_file(path)
+        return stats
+
+
+_shared_store = None
+_shared_store_lock = threading.Lock()
+
+
+def get_asset_store():
+    """
+    获取进程内共享的素材存储
+    """
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            _shared_store = AssetStore()
+        return _shared_store
+
+
+def store_bytes(data, path):
+    """
+    写入素材到path（替代open(path, 'wb').write(data)），关闭存储时直接写文件
+    """
+    if store_disabled():
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return None
+    return get_asset_store().put_bytes(data, path)
+
+
+def store_file(src, path):
+    """
+    让path与src内容相同（替代shutil.copy2），关闭存储时直接复制
+    """
+    if store_disabled():
+        shutil.copy2(src, path)
+        return None
+    return get_asset_store().put_file(src, path)
+
+
+def format_bytes(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.1f}{unit}" if unit != 'B' else f"{size}B"
+        size /= 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description='章节素材内容寻址存储')
+    parser.add_argument('--store-dir', default=None, help='存储目录，默认 data/.assets')
+    subparsers = parser.add_subparsers(dest='command')
+
+    ingest_parser = subparsers.add_parser('ingest', help='把已有目录中的素材收进存储，重复文件改为硬链接')
+    ingest_parser.add_argument('paths', nargs='+', help='要收录的目录')
+    ingest_parser.add_argument('--ext', nargs='*', default=list(DEFAULT_EXTENSIONS), help='收录的扩展名')
+    ingest_parser.add_argument('--dry-run', action='store_true', help='只统计，不修改文件')
+
+    gc_parser = subparsers.add_parser('gc', help='回收不再被引用的对象')
+    gc_parser.add_argument('--dry-run', action='store_true', help='只统计，不删除')
+    gc_parser.add_argument('--grace', type=float, default=GC_GRACE_SECONDS, help='最近变化的对象保留时间（秒）')
+
+    stats_parser = subparsers.add_parser('stats', help='查看存储占用')
+    stats_parser.add_argument('--json', action='store_true', help='以JSON输出')
+
+    subparsers.add_parser('verify', help='校验对象内容与哈希一致')
+
+    refs_parser = subparsers.add_parser('refs', help='查询某个文件或哈希被哪些路径引用')
+    refs_parser.add_argument('key', help='文件路径或内容哈希')
+
+    args = parser.parse_args()
+    store = AssetStore(args.store_dir) if args.store_dir else get_asset_store()
+
+    if args.command == 'ingest':
+        extensions = tuple(e.lower() if e.startswith('.') else f".{e.lower()}" for e in args.ext)
+        result = store.ingest(args.paths, extensions, dry_run=args.dry_run)
+        print(f"{'试运行: ' if args.dry_run else ''}扫描文件 {result['files']} 个，新对象 {result['new_objects']} 个，"
+              f"去重 {result['deduplicated']} 个，节省 {format_bytes(result['saved_bytes'])}")
+    elif args.command == 'gc':
+        result = store.gc(dry_run=args.dry_run, grace=args.grace)
+        print(f"{'试运行: ' if args.dry_run else ''}对象 {result['objects']} 个，回收 {result['removed']} 个，"
+              f"释放 {format_bytes(result['freed_bytes'])}，清理失效清单条目 {result['refs_dropped']} 条")
+    elif args.command == 'stats':
+        result = store.stats()
+        if args.json:
+            print(json.dumps(result, ensure_ascii=False, indent=2))
+        else:
+            print(f"存储目录: {store.root}")
+            print(f"对象数: {result['objects']}（无引用 {result['unreferenced']}）  引用数: {result['references']}")
+            print(f"实际占用: {format_bytes(result['stored_bytes'])}  按文件名计算: {format_bytes(result['logical_bytes'])}  "
+                  f"节省: {format_bytes(result['saved_bytes'])}")
+    elif args.command == 'verify':
+        broken = store.verify()
+        if not broken:
+            print("所有对象校验通过")
+            return 0
+        print(f"{len(broken)} 个对象内容与哈希不一致（有脚本绕过存储就地改写了文件）:")
+        for path in broken:
+            print(f"  {path}")
+        return 1
+    elif args.command == 'refs':
+        digest, rows = store.refs(args.key)
+        print(f"对象: {digest}")
+        if not rows:
+            print("清单中没有引用")
+        for path, kind in rows:
+            print(f"  [{'硬链接' if kind == 'link' else '复制'}] {path}")
+    else:
+        parser.print_help()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,570 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+异步任务目录变更订阅
+
+功能:
+    - 监听 data/<小说>/chapter_xxx/async_tasks 和项目根目录 async_tasks 的文件变化
+    - Linux上使用inotify（ctypes调用libc，无额外依赖），不可用时退回按目录mtime轮询
+    - 在内存中维护"有待处理任务的目录"集合，只在文件创建/修改时唤醒处理，
+      仍有未完成任务的目录按固定间隔复查（远端任务完成不会产生文件事件）
+    - 所有路径都是绝对路径，处理时不切换工作目录
+    - 启动和事件队列溢出时做一次全量对账扫描；定期全量扫描只作为兜底（见Celery Beat配置）
+
+使用方法:
+    # 独立运行：监听并直接处理待处理目录
+    python async_task_feed.py watch
+    python async_task_feed.py watch --polling --recheck-interval 30
+
+    # 查看当前有待处理任务的目录
+    python async_task_feed.py pending
+
+    # 在代码中使用（Celery worker启动时自动启动，见 web/video/tasks.py）
+    from async_task_feed import get_async_task_feed
+    feed = get_async_task_feed()
+    feed.start_thread(lambda task_dirs: process_async_task_dirs.delay(task_dirs))
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import json
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATA_DIR = os.path.join(PROJECT_ROOT, 'data')
+DEFAULT_TASKS_DIR = os.path.join(PROJECT_ROOT, 'async_tasks')
+
+# 仍有未完成任务的目录的复查间隔（秒），与原Beat扫描间隔一致
+RECHECK_INTERVAL = 15.0
+# 文件事件后等待的时间（秒），把同一批提交合并为一次处理
+DEBOUNCE = 1.0
+# 轮询后端的扫描间隔（秒）
+POLL_INTERVAL = 5.0
+# 没有待处理目录时单次等待事件的最长时间（秒）
+MAX_WAIT = 30.0
+
+TERMINAL_STATUSES = ('completed', 'failed')
+
+# inotify常量（见 linux/inotify.h）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+STRUCTURE_MASK = IN_CREATE | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+TASKS_MASK = (IN_CREATE | IN_MOVED_TO | IN_MODIFY | IN_CLOSE_WRITE | IN_DELETE | IN_MOVED_FROM
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+# kind取值: created / modified / deleted / gone（目录本身被删除或移走）/ overflow（事件丢失，需要对账）
+FeedEvent = namedtuple('FeedEvent', 'kind directory name is_dir')
+
+
+class InotifyWatcher:
+    """
+    基于inotify的目录监听，每个目录一个watch（inotify不递归）
+    """
+
+    name = 'inotify'
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise OSError('找不到libc')
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f'inotify_init1失败: {os.strerror(errno)}')
+        self._paths = {}
+
+    @staticmethod
+    def available():
+        return sys.platform.startswith('linux') and bool(ctypes.util.find_library('c'))
+
+    def add(self, path, track_files=False):
+        mask = TASKS_MASK if track_files else STRUCTURE_MASK
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f'inotify_add_watch失败 {path}: {os.strerror(errno)}')
+        self._paths[wd] = path
+
+    def read(self, timeout):
+        ready, _, _ = select.select([self._fd], [], [], max(timeout, 0))
+        if not ready:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                events.append(FeedEvent('overflow', None, '', False))
+                continue
+            directory = self._paths.get(wd)
+            if directory is None:
+                continue
+            is_dir = bool(mask & IN_ISDIR)
+            if mask & IN_IGNORED:
+                self._paths.pop(wd, None)
+                events.append(FeedEvent('gone', directory, '', True))
+            elif mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                events.append(FeedEvent('gone', directory, '', True))
+            elif mask & (IN_CREATE | IN_MOVED_TO):
+                events.append(FeedEvent('created', directory, name, is_dir))
+            elif mask & (IN_MODIFY | IN_CLOSE_WRITE):
+                events.append(FeedEvent('modified', directory, name, is_dir))
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                events.append(FeedEvent('deleted', directory, name, is_dir))
+        return events
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher:
+    """
+    轮询目录mtime的监听后端，用于没有inotify的环境
+
+    结构目录只在mtime变化时重新列目录；任务目录额外stat其中的文件以发现修改
+    """
+
+    name = 'polling'
+
+    def __init__(self, interval=POLL_INTERVAL, sleep=time.sleep):
+        self.interval = interval
+        self._sleep = sleep
+        self._watches = {}
+
+    @staticmethod
+    def _snapshot(path, track_files):
+        try:
+            dir_mtime = os.stat(path).st_mtime_ns
+            entries = {}
+            with os.scandir(path) as it:
+                for entry in it:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    if is_dir:
+                        entries[entry.name] = None
+                    elif track_files:
+                        stat = entry.stat(follow_symlinks=False)
+                        entries[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+        return dir_mtime, entries
+
+    def add(self, path, track_files=False):
+        self._watches[path] = (track_files, self._snapshot(path, track_files))
+
+    def read(self, timeout):
+        if timeout > 0:
+            self._sleep(min(timeout, self.interval))
+
+        events = []
+        for path, (track_files, old) in list(self._watches.items()):
+            if old is None:
+                del self._watches[path]
+                continue
+            try:
+                dir_mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                del self._watches[path]
+                events.append(FeedEvent('gone', path, '', True))
+                continue
+            if dir_mtime == old[0] and not track_files:
+                continue
+
+            new = self._snapshot(path, track_files)
+            if new is None:
+                del self._watches[path]
+                events.append(FeedEvent('gone', path, '', True))
+                continue
+            self._watches[path] = (track_files, new)
+
+            old_entries, new_entries = old[1], new[1]
+            for name, stat in new_entries.items():
+                if name not in old_entries:
+                    events.append(FeedEvent('created', path, name, stat is None))
+                elif stat is not None and stat != old_entries[name]:
+                    events.append(FeedEvent('modified', path, name, False))
+            for name, stat in old_entries.items():
+                if name not in new_entries:
+                    events.append(FeedEvent('deleted', path, name, stat is None))
+        return events
+
+    def close(self):
+        self._watches.clear()
+
+
+def create_watcher(polling=False):
+    """
+    创建监听后端：优先inotify，失败时退回轮询
+    """
+    if not polling and InotifyWatcher.available():
+        try:
+            return InotifyWatcher()
+        except OSError as e:
+            logger.warning(f"inotify不可用，改用轮询: {e}")
+    return PollingWatcher()
+
+
+def process_task_dir(task_dir, tasks_dir=None):
+    """
+    处理一个任务目录：项目根目录的async_tasks走check_all_tasks，章节async_tasks走process_chapter_async_tasks
+    """
+    from check_async_tasks import check_all_tasks, process_chapter_async_tasks
+
+    task_dir = os.path.abspath(task_dir)
+    if task_dir == os.path.abspath(tasks_dir or DEFAULT_TASKS_DIR):
+        return check_all_tasks(task_dir)
+    return process_chapter_async_tasks(os.path.dirname(task_dir))
+
+
+class AsyncTaskFeed:
+    """
+    异步任务目录变更订阅
+
+    data目录下按 data -> 小说(3位数字) -> chapter_xxx -> async_tasks 四层建立watch，
+    只有async_tasks层跟踪文件；内存中记录每个任务目录的文件名和下次处理时间
+    """
+
+    def __init__(self, data_dir=None, tasks_dir=None, watcher=None, recheck_interval=RECHECK_INTERVAL,
+                 debounce=DEBOUNCE, clock=time.monotonic):
+        self.data_dir = os.path.abspath(data_dir or DEFAULT_DATA_DIR)
+        self.tasks_dir = os.path.abspath(tasks_dir or DEFAULT_TASKS_DIR)
+        self.watcher = watcher or create_watcher()
+        self.recheck_interval = recheck_interval
+        self.debounce = debounce
+        self._clock = clock
+        self._lock = threading.RLock()
+        self._watched = set()
+        self._files = {}
+        self._due = {}
+        self._reconciled_at = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _classify(self, path):
+        if path == self.tasks_dir:
+            return 'tasks'
+        relative = os.path.relpath(path, self.data_dir)
+        if relative == '.':
+            return 'data'
+        parts = relative.split(os.sep)
+        if parts[0] == '..' or not (len(parts[0]) == 3 and parts[0].isdigit()):
+            return None
+        if len(parts) == 1:
+            return 'novel'
+        if not parts[1].startswith('chapter_'):
+            return None
+        if len(parts) == 2:
+            return 'chapter'
+        if len(parts) == 3 and parts[2] == 'async_tasks':
+            return 'tasks'
+        return None
+
+    def _watch(self, path, rescan=False):
+        kind = self._classify(path)
+        if kind is None or not os.path.isdir(path):
+            return
+        if path in self._watched:
+            if not rescan:
+                return
+        else:
+            # 先建watch再列目录，避免两者之间创建的文件被漏掉
+            try:
+                self.watcher.add(path, track_files=(kind == 'tasks'))
+            except OSError as e:
+                logger.warning(f"监听目录失败 {path}: {e}")
+                return
+            self._watched.add(path)
+
+        if kind == 'chapter':
+            self._watch(os.path.join(path, 'async_tasks'), rescan)
+            return
+        try:
+            entries = list(os.scandir(path))
+        except OSError as e:
+            logger.warning(f"读取目录失败 {path}: {e}")
+            return
+        if kind == 'tasks':
+            names = {entry.name for entry in entries
+                     if not entry.name.startswith('.') and entry.is_file(follow_symlinks=False)}
+            self._files[path] = names
+            if names:
+                self._schedule(path, self._clock())
+        else:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    self._watch(entry.path, rescan)
+
+    def _schedule(self, path, when):
+        current = self._due.get(path)
+        if current is None or when < current:
+            self._due[path] = when
+
+    def _forget(self, path):
+        prefix = path + os.sep
+        for watched in [p for p in self._watched if p == path or p.startswith(prefix)]:
+            self._watched.discard(watched)
+            self._files.pop(watched, None)
+            self._due.pop(watched, None)
+
+    def reconcile(self):
+        """
+        全量对账：重新建立所有watch并读取所有任务目录（启动时和事件溢出时调用）
+        """
+        with self._lock:
+            for path in [p for p in self._watched if not os.path.isdir(p)]:
+                self._forget(path)
+            self._watch(self.data_dir, rescan=True)
+            self._watch(self.tasks_dir, rescan=True)
+            self._reconciled_at = time.time()
+
+    start = reconcile
+
+    def apply(self, event):
+        """
+        应用一个文件事件，更新待处理集合
+        """
+        with self._lock:
+            if event.kind == 'overflow':
+                logger.warning("文件事件队列溢出，执行全量对账")
+                self.reconcile()
+                return
+            if event.kind == 'gone':
+                self._forget(event.directory)
+                return
+
+            path = os.path.join(event.directory, event.name)
+            if event.is_dir:
+                if event.kind == 'created':
+                    self._watch(path)
+                elif event.kind == 'deleted':
+                    self._forget(path)
+                return
+
+            names = self._files.get(event.directory)
+            if names is None or event.name.startswith('.'):
+                return
+            if event.kind in ('created', 'modified'):
+                names.add(event.name)
+                self._schedule(event.directory, self._clock() + self.debounce)
+            elif event.kind == 'deleted':
+                names.discard(event.name)
+                if not names:
+                    self._due.pop(event.directory, None)
+
+    def needs_processing(self, path):
+        """
+        目录中是否还有需要处理的文件
+
+        章节async_tasks中的任何文件都会被处理（完成/失败的任务会被移走）；
+        项目根目录async_tasks中完成/失败的任务文件会留在原处，只看未结束的任务
+        """
+        names = self._files.get(path)
+        if not names:
+            return False
+        if path != self.tasks_dir:
+            return True
+        for name in names:
+            if not name.endswith('.txt'):
+                continue
+            try:
+                with open(os.path.join(path, name), 'r', encoding='utf-8') as f:
+                    status = json.load(f).get('status')
+            except (OSError, ValueError, AttributeError):
+                # 文件可能正在写入，写完会再产生修改事件
+                continue
+            if status not in TERMINAL_STATUSES:
+                return True
+        return False
+
+    def take_due(self, now=None):
+        """
+        取出到期的待处理目录，并安排下一次复查
+        """
+        now = self._clock() if now is None else now
+        due = []
+        with self._lock:
+            for path, when in list(self._due.items()):
+                if when > now:
+                    continue
+                if self.needs_processing(path):
+                    due.append(path)
+                    self._due[path] = now + self.recheck_interval
+                else:
+                    del self._due[path]
+        return sorted(due)
+
+    def pending(self):
+        with self._lock:
+            return sorted(self._due)
+
+    def next_due_in(self):
+        with self._lock:
+            if not self._due:
+                return None
+            return max(min(self._due.values()) - self._clock(), 0.0)
+
+    def poll(self, timeout=0.0):
+        """
+        读取并应用一批文件事件，返回到期的待处理目录
+        """
+        for event in self.watcher.read(timeout):
+            self.apply(event)
+        return self.take_due()
+
+    def snapshot(self):
+        with self._lock:
+            now = self._clock()
+            return {
+                'backend': self.watcher.name,
+                'data_dir': self.data_dir,
+                'tasks_dir': self.tasks_dir,
+                'watched': len(self._watched),
+                'reconciled_at': self._reconciled_at,
+                'pending': [
+                    {'path': path, 'files': len(self._files.get(path, ())), 'due_in': round(max(when - now, 0.0), 1)}
+                    for path, when in sorted(self._due.items())
+                ],
+            }
+
+    def run(self, dispatch):
+        """
+        事件循环：有到期目录时调用dispatch(目录列表)，直到stop()
+        """
+        while not self._stop.is_set():
+            wait = self.next_due_in()
+            timeout = MAX_WAIT if wait is None else min(wait, MAX_WAIT)
+            try:
+                due = self.poll(timeout)
+            except Exception as e:
+                logger.error(f"读取文件事件失败: {e}", exc_info=True)
+                self._stop.wait(POLL_INTERVAL)
+                continue
+            if not due:
+                continue
+            try:
+                dispatch(due)
+            except Exception as e:
+                logger.error(f"分发待处理目录失败 {due}: {e}", exc_info=True)
+
+    def start_thread(self, dispatch):
+        """
+        在后台线程中对账并运行事件循环
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return self._thread
+            self._stop.clear()
+            self.reconcile()
+            self._thread = threading.Thread(target=self.run, args=(dispatch,), name='async-task-feed', daemon=True)
+            self._thread.start()
+            logger.info(f"异步任务变更订阅已启动: 后端={self.watcher.name}, 监听目录={len(self._watched)}, "
+                        f"待处理={len(self._due)}")
+            return self._thread
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        self._thread = None
+
+
+_shared_feed = None
+_shared_feed_lock = threading.Lock()
+
+
+def get_async_task_feed():
+    """
+    获取进程内共享的任务目录变更订阅
+    """
+    global _shared_feed
+    with _shared_feed_lock:
+        if _shared_feed is None:
+            _shared_feed = AsyncTaskFeed()
+        return _shared_feed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='异步任务目录变更订阅')
+    subparsers = parser.add_subparsers(dest='command')
+    for name, help_text in (('watch', '监听并处理有待处理任务的目录'), ('pending', '列出有待处理任务的目录')):
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help='数据根目录路径')
+        sub.add_argument('--tasks-dir', default=DEFAULT_TASKS_DIR, help='项目根目录任务目录路径')
+        sub.add_argument('--polling', action='store_true', help='强制使用轮询后端')
+    subparsers.choices['watch'].add_argument('--recheck-interval', type=float, default=RECHECK_INTERVAL,
+                                             help='仍有未完成任务的目录的复查间隔（秒）')
+    args = parser.parse_args()
+
+    if args.command not in ('watch', 'pending'):
+        parser.print_help()
+        return 0
+
+    feed = AsyncTaskFeed(args.data_dir, args.tasks_dir, watcher=create_watcher(args.polling),
+                         recheck_interval=getattr(args, 'recheck_interval', RECHECK_INTERVAL))
+    feed.reconcile()
+
+    if args.command == 'pending':
+        state = feed.snapshot()
+        print(f"后端: {state['backend']}  监听目录: {state['watched']}")
+        pending = [item for item in state['pending'] if feed.needs_processing(item['path'])]
+        if not pending:
+            print("没有待处理任务的目录")
+            return 0
+        for item in pending:
+            print(f"{item['files']:>5}  {item['path']}")
+        return 0
+
+    def dispatch(task_dirs):
+        for task_dir in task_dirs:
+            print(f"\n{time.strftime('%Y-%m-%d %H:%M:%S')} - 处理任务目录: {task_dir}")
+            print(f"  统计: {process_task_dir(task_dir, feed.tasks_dir)}")
+
+    state = feed.snapshot()
+    print(f"开始监听: 后端={state['backend']}, 监听目录={state['watched']}, 待处理={len(state['pending'])}")
+    print("按 Ctrl+C 停止\n")
+    try:
+        feed.run(dispatch)
+    except KeyboardInterrupt:
+        print("\n监听已停止")
+    finally:
+        feed.watcher.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
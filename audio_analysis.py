@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+音频响度分析（NumPy向量化）
+
+功能:
+    - 每个音频文件（narration MP3、音效、BGM）只用ffmpeg解码一次为PCM，用NumPy计算：
+      ITU-R BS.1770 积分响度（K加权、400ms块、绝对/相对门限）、4倍过采样真峰值、静音区间
+    - 分析结果按文件内容SHA-256缓存在 data/.audio_analysis，跨进程、跨运行复用
+    - 根据分析结果给出增益：narration统一到目标响度，音效和BGM相对narration保持固定差值，
+      同时保证真峰值不超过上限；渲染步骤在已有的滤镜图中用volume滤镜应用增益，不额外编码
+    - 根据静音区间给出narration结尾可裁掉的时长，片段拼接处不再留长静音
+
+使用方法:
+    from audio_analysis import analyze_audio, narration_gain_db
+
+    analysis = analyze_audio('data/001/chapter_001/chapter_001_narration_04.mp3')
+    print(analysis['integrated_lufs'], analysis['true_peak_dbtp'], analysis['silences'])
+    gain = narration_gain_db(analysis)
+
+    # 命令行
+    python audio_analysis.py data/001/chapter_001/*.mp3
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import numpy as np
+
+from asset_store import hash_file
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.path.join(PROJECT_ROOT, 'data', '.audio_analysis')
+
+# 分析采样率/声道与成片音频一致（见video_contract.py），单声道narration按成片的双声道测量
+SAMPLE_RATE = 44100
+CHANNELS = 2
+
+# BS.1770 门限块：400ms块，100ms步长
+SUB_BLOCK_SECONDS = 0.1
+BLOCK_SUB_BLOCKS = 4
+# 每次做FFT的子块数，限制长BGM音床分析时的内存占用
+FFT_BATCH_SUB_BLOCKS = 600
+ABSOLUTE_GATE_LUFS = -70.0
+RELATIVE_GATE_LU = -10.0
+
+# 真峰值：对采样峰值最高的若干个100ms段做4倍过采样
+TRUE_PEAK_OVERSAMPLE = 4
+TRUE_PEAK_CANDIDATES = 8
+
+# 静音判定：10ms帧RMS低于阈值且连续超过最短时长
+SILENCE_FRAME_SECONDS = 0.01
+SILENCE_THRESHOLD_DBFS = -50.0
+MIN_SILENCE_SECONDS = 0.3
+
+# 目标响度和增益限制
+NARRATION_TARGET_LUFS = -16.0
+EFFECT_TARGET_LUFS = -22.0
+BGM_BELOW_NARRATION_LU = 20.0
+TRUE_PEAK_CEILING_DBTP = -1.0
+MAX_GAIN_DB = 12.0
+
+# narration结尾静音裁剪后保留的尾音（秒）
+TAIL_PAD_SECONDS = 0.25
+
+# 分析算法或参数变化时递增，旧缓存自动失效
+ANALYSIS_VERSION = 1
+
+
+def decode_with_ffmpeg(path):
+    """
+    使用ffmpeg把音频解码为float32 PCM
+
+    Returns:
+        np.ndarray: 形状为 (采样数, CHANNELS)
+    """
+    cmd = [
+        'ffmpeg', '-v', 'error', '-i', path,
+        '-f', 'f32le', '-ac', str(CHANNELS), '-ar', str(SAMPLE_RATE),
+        'pipe:1'
+    ]
+    result = subprocess.run(cmd, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"音频解码失败: {path}: {result.stderr.decode('utf-8', errors='ignore')}")
+    return np.frombuffer(result.stdout, dtype='<f4').reshape(-1, CHANNELS)
+
+
+def k_weighting_power(frequencies, sample_rate):
+    """
+    BS.1770 K加权滤波器（高架+高通两级biquad）在给定频率上的功率响应|H|²
+    """
+    w = 2 * np.pi * np.asarray(frequencies) / sample_rate
+    z = np.exp(-1j * w)
+
+    def biquad(b, a):
+        return (b[0] + b[1] * z + b[2] * z ** 2) / (a[0] + a[1] * z + a[2] * z ** 2)
+
+    # 第一级：1681.97Hz 高架约+4dB（系数按采样率由模拟原型双线性变换得到，同libebur128）
+    k = np.tan(np.pi * 1681.974450955533 / sample_rate)
+    q = 0.7071752369554196
+    vh = 10 ** (3.999843853973347 / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = biquad(
+        ((vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0),
+        (1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0),
+    )
+
+    # 第二级：38.14Hz 高通
+    k = np.tan(np.pi * 38.13547087602444 / sample_rate)
+    q = 0.5003270373238773
+    a0 = 1 + k / q + k * k
+    highpass = biquad(
+        (1.0, -2.0, 1.0),
+        (1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0),
+    )
+    return np.abs(shelf * highpass) ** 2
+
+
+def integrated_loudness(pcm, sample_rate=SAMPLE_RATE):
+    """
+    计算积分响度（LUFS），有效音频不足一个400ms块或全部低于绝对门限时返回None
+
+    100ms子块在频域做K加权（Parseval），400ms块能量由相邻4个子块求和得到
+    """
+    sub_len = int(round(sample_rate * SUB_BLOCK_SECONDS))
+    n_sub = len(pcm) // sub_len
+    if n_sub < BLOCK_SUB_BLOCKS:
+        return None
+
+    weights = k_weighting_power(np.fft.rfftfreq(sub_len, 1.0 / sample_rate), sample_rate)
+    # 单边谱能量：除直流和奈奎斯特外乘2
+    weights[1:] *= 2.0
+    if sub_len % 2 == 0:
+        weights[-1] /= 2.0
+
+    frames = pcm[:n_sub * sub_len].reshape(n_sub, sub_len, -1)
+    sub_energy = np.empty((n_sub, frames.shape[2]))
+    for start in range(0, n_sub, FFT_BATCH_SUB_BLOCKS):
+        spectrum = np.fft.rfft(frames[start:start + FFT_BATCH_SUB_BLOCKS], axis=1)
+        sub_energy[start:start + FFT_BATCH_SUB_BLOCKS] = np.einsum(
+            'f,sfc->sc', weights, spectrum.real ** 2 + spectrum.imag ** 2) / sub_len
+
+    # 400ms块内的均方值，各声道相加（双声道权重均为1）
+    window = np.lib.stride_tricks.sliding_window_view(sub_energy, BLOCK_SUB_BLOCKS, axis=0)
+    block_power = window.sum(axis=-1).sum(axis=-1) / (BLOCK_SUB_BLOCKS * sub_len)
+    with np.errstate(divide='ignore'):
+        block_loudness = -0.691 + 10 * np.log10(block_power)
+
+    gated = block_power[block_loudness > ABSOLUTE_GATE_LUFS]
+    if len(gated) == 0:
+        return None
+    relative_gate = -0.691 + 10 * np.log10(gated.mean()) + RELATIVE_GATE_LU
+    gated = block_power[(block_loudness > ABSOLUTE_GATE_LUFS) & (block_loudness > relative_gate)]
+    return float(-0.691 + 10 * np.log10(gated.mean()))
+
+
+def _to_db(value):
+    return float(20 * np.log10(value)) if value > 0 else None
+
+
+def true_peak(pcm, sample_rate=SAMPLE_RATE):
+    """
+    计算真峰值（dBTP）和采样峰值（dBFS）
+
+    只对采样峰值最高的几个100ms段（连同前后各一段）做频域4倍过采样，取中间段的峰值
+    """
+    if len(pcm) == 0:
+        return None, None
+    samples = np.abs(pcm).max(axis=1)
+    sample_peak = float(samples.max())
+    sub_len = int(round(sample_rate * SUB_BLOCK_SECONDS))
+    n_sub = max(1, -(-len(samples) // sub_len))
+    padded = np.zeros(n_sub * sub_len, dtype=samples.dtype)
+    padded[:len(samples)] = samples
+    sub_peaks = padded.reshape(n_sub, sub_len).max(axis=1)
+
+    peak = sample_peak
+    for index in np.argsort(sub_peaks)[::-1][:TRUE_PEAK_CANDIDATES]:
+        start = max(0, (index - 1) * sub_len)
+        end = min(len(pcm), (index + 2) * sub_len)
+        segment = np.asarray(pcm[start:end], dtype=np.float64)
+        if len(segment) < 2:
+            continue
+        upsampled = np.fft.irfft(np.fft.rfft(segment, axis=0), n=len(segment) * TRUE_PEAK_OVERSAMPLE,
+                                 axis=0) * TRUE_PEAK_OVERSAMPLE
+        center_start = (index * sub_len - start) * TRUE_PEAK_OVERSAMPLE
+        center = upsampled[center_start:center_start + sub_len * TRUE_PEAK_OVERSAMPLE]
+        if len(center):
+            peak = max(peak, float(np.abs(center).max()))
+    return _to_db(peak), _to_db(sample_peak)
+
+
+def silence_map(pcm, sample_rate=SAMPLE_RATE):
+    """
+    找出静音区间
+
+    Returns:
+        list: [[开始秒, 结束秒], ...]
+    """
+    frame_len = int(round(sample_rate * SILENCE_FRAME_SECONDS))
+    n_frames = len(pcm) // frame_len
+    if n_frames == 0:
+        return []
+    frames = pcm[:n_frames * frame_len].reshape(n_frames, -1)
+    rms = np.sqrt(np.einsum('ij,ij->i', frames, frames, dtype=np.float64) / frames.shape[1])
+    silent = rms < 10 ** (SILENCE_THRESHOLD_DBFS / 20)
+    # 不足一帧的结尾并入最后一帧的判定
+    edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    total = len(pcm) / sample_rate
+    min_frames = int(round(MIN_SILENCE_SECONDS / SILENCE_FRAME_SECONDS))
+    silences = []
+    for start, end in zip(starts, ends):
+        if end - start < min_frames:
+            continue
+        end_seconds = total if end == n_frames else end * SILENCE_FRAME_SECONDS
+        silences.append([round(float(start * SILENCE_FRAME_SECONDS), 3), round(float(end_seconds), 3)])
+    return silences
+
+
+def analyze_pcm(pcm, sample_rate=SAMPLE_RATE):
+    """
+    分析PCM数组（float或int16），返回响度、峰值和静音信息
+    """
+    pcm = np.asarray(pcm)
+    if pcm.dtype == np.int16:
+        pcm = pcm.astype(np.float32) / 32768.0
+    if pcm.ndim == 1:
+        pcm = pcm[:, None]
+    duration = len(pcm) / sample_rate
+    tp, sp = true_peak(pcm, sample_rate)
+    silences = silence_map(pcm, sample_rate)
+
+    speech_start, speech_end = 0.0, duration
+    if silences and silences[0][0] == 0:
+        speech_start = silences[0][1]
+    if silences and silences[-1][1] >= duration - SILENCE_FRAME_SECONDS:
+        speech_end = silences[-1][0] if silences[-1][0] > speech_start else speech_start
+
+    return {
+        'version': ANALYSIS_VERSION,
+        'duration': round(duration, 3),
+        'integrated_lufs': integrated_loudness(pcm, sample_rate),
+        'true_peak_dbtp': tp,
+        'sample_peak_dbfs': sp,
+        'silences': silences,
+        'speech_start': round(float(speech_start), 3),
+        'speech_end': round(float(speech_end), 3),
+    }
+
+
+class AudioAnalyzer:
+    """
+    带缓存的音频分析器
+
+    Args:
+        cache_dir (str): 分析结果缓存目录
+        decoder (callable): 解码函数，输入文件路径返回float32 PCM数组，默认使用ffmpeg
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, decoder=decode_with_ffmpeg):
+        self.cache_dir = cache_dir
+        self.decoder = decoder
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def _cache_path(self, digest):
+        identity = f"{digest}|{ANALYSIS_VERSION}|{SAMPLE_RATE}|{CHANNELS}"
+        return os.path.join(self.cache_dir, hashlib.sha1(identity.encode('utf-8')).hexdigest() + '.json')
+
+    def analyze(self, path):
+        """
+        分析音频文件：进程内缓存 -> 磁盘缓存 -> 解码分析
+        """
+        cache_path = self._cache_path(hash_file(path))
+        with self._lock:
+            if cache_path in self._results:
+                return self._results[cache_path]
+
+        result = None
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'r', encoding='utf-8') as f:
+                    result = json.load(f)
+            except (OSError, ValueError):
+                result = None
+        if result is None:
+            result = analyze_pcm(self.decoder(path))
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = cache_path + f'.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, cache_path)
+
+        with self._lock:
+            self._results[cache_path] = result
+        return result
+
+
+def _limited_gain(gain_db, analysis):
+    """
+    限制提升幅度（衰减不限制，避免把底噪一并放大），并保证应用增益后真峰值不超过上限
+    """
+    gain_db = min(MAX_GAIN_DB, gain_db)
+    if analysis.get('true_peak_dbtp') is not None:
+        gain_db = min(gain_db, TRUE_PEAK_CEILING_DBTP - analysis['true_peak_dbtp'])
+    return round(gain_db, 2)
+
+
+def narration_gain_db(analysis, target=NARRATION_TARGET_LUFS):
+    """
+    把narration调整到目标响度所需的增益（dB），无法测量时返回0
+    """
+    if not analysis or analysis.get('integrated_lufs') is None:
+        return 0.0
+    return _limited_gain(target - analysis['integrated_lufs'], analysis)
+
+
+def effect_gain_db(analysis, target=EFFECT_TARGET_LUFS):
+    """
+    音效调整到目标响度所需的增益（dB）；短于400ms等无法测量积分响度时返回None
+    """
+    if not analysis or analysis.get('integrated_lufs') is None:
+        return None
+    return _limited_gain(target - analysis['integrated_lufs'], analysis)
+
+
+def bgm_gain_db(analysis, narration_lufs=NARRATION_TARGET_LUFS):
+    """
+    BGM相对narration低 BGM_BELOW_NARRATION_LU 所需的增益（dB），无法测量时返回None
+    """
+    if not analysis or analysis.get('integrated_lufs') is None:
+        return None
+    return _limited_gain(narration_lufs - BGM_BELOW_NARRATION_LU - analysis['integrated_lufs'], analysis)
+
+
+def trimmed_duration(analysis, min_duration=0.0):
+    """
+    裁掉narration结尾静音后的时长（保留一小段尾音），不短于min_duration（如字幕结束时间）
+    """
+    duration = analysis['duration']
+    return min(duration, max(analysis['speech_end'] + TAIL_PAD_SECONDS, min_duration))
+
+
+_analyzer = None
+_analyzer_lock = threading.Lock()
+
+
+def get_audio_analyzer():
+    """
+    获取进程内共享的分析器
+    """
+    global _analyzer
+    with _analyzer_lock:
+        if _analyzer is None:
+            _analyzer = AudioAnalyzer()
+        return _analyzer
+
+
+def analyze_audio(path):
+    return get_audio_analyzer().analyze(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='音频响度、真峰值和静音分析')
+    parser.add_argument('paths', nargs='+', help='音频文件')
+    parser.add_argument('--json', action='store_true', help='输出JSON')
+    args = parser.parse_args()
+
+    results = {}
+    for path in args.paths:
+        try:
+            results[path] = analyze_audio(path)
+        except Exception as e:
+            print(f"❌ {path}: {e}")
+            continue
+        if args.json:
+            continue
+        analysis = results[path]
+        loudness = analysis['integrated_lufs']
+        peak = analysis['true_peak_dbtp']
+        print(f"{path}")
+        print(f"  时长: {analysis['duration']:.2f}s，有声区间: "
+              f"{analysis['speech_start']:.2f}s - {analysis['speech_end']:.2f}s，静音段: {len(analysis['silences'])}")
+        print(f"  积分响度: {'-' if loudness is None else f'{loudness:.1f} LUFS'}，"
+              f"真峰值: {'-' if peak is None else f'{peak:.1f} dBTP'}，"
+              f"narration增益: {narration_gain_db(analysis):+.1f} dB")
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,6 +12,8 @@ import random
 # ART_STYLES 配置已移除
 from config.config import IMAGE_TWO_CONFIG
 from volcengine.visual.VisualService import VisualService
+from rate_limiter import rate_limited_call
+from asset_store import store_bytes
 
 def parse_directory_info(dir_path):
     """
@@ -147,7 +149,7 @@ def generate_image_api(prompt, output_path):
             }
         }
         
-        resp = visual_service.cv_process(form)
+        resp = rate_limited_call('visual_sync', visual_service.cv_process, form)
         
         # 检查响应
         if 'data' in resp and 'binary_data_base64' in resp['data']:
@@ -159,8 +161,7 @@ def generate_image_api(prompt, output_path):
             
             # 解码并保存图片
             image_data = base64.b64decode(base64_data)
-            with open(output_path, 'wb') as f:
-                f.write(image_data)
+            store_bytes(image_data, output_path)
             
             print(f"图片已保存: {output_path}")
             return True
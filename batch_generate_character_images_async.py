@@ -13,6 +13,7 @@ import time
 # ART_STYLES 配置已移除
 from config.config import IMAGE_TWO_CONFIG
 from volcengine.visual.VisualService import VisualService
+from rate_limiter import is_rate_limited, rate_limited_call
 
 def parse_directory_info(dir_path):
     """
@@ -157,7 +158,7 @@ def submit_image_task(prompt, task_info, max_retries=3, retry_delay=2):
             }
             
             # 提交异步任务
-            resp = visual_service.cv_sync2async_submit_task(form)
+            resp = rate_limited_call('visual_submit', visual_service.cv_sync2async_submit_task, form)
             
             # 检查响应
             if 'data' in resp and 'task_id' in resp['data']:
@@ -168,6 +169,10 @@ def submit_image_task(prompt, task_info, max_retries=3, retry_delay=2):
                 error_msg = str(resp)
                 print(f"任务提交失败: {error_msg}")
                 
+                # 被限流时共享限流器已进入冷却期，直接重试（提交前会等待冷却结束）
+                if attempt < max_retries and is_rate_limited(resp):
+                    continue
+                
                 # 如果是访问被拒绝错误且还有重试机会，则重试
                 if attempt < max_retries and ("Access Denied" in error_msg or "Internal Error" in error_msg):
                     print(f"等待 {retry_delay} 秒后重试...")
@@ -181,6 +186,10 @@ def submit_image_task(prompt, task_info, max_retries=3, retry_delay=2):
             error_msg = str(e)
             print(f"提交任务时发生错误: {error_msg}")
             
+            # 被限流时共享限流器已进入冷却期，直接重试（提交前会等待冷却结束）
+            if attempt < max_retries and is_rate_limited(e):
+                continue
+            
             # 如果是访问被拒绝错误且还有重试机会，则重试
             if attempt < max_retries and ("Access Denied" in error_msg or "Internal Error" in error_msg):
                 print(f"等待 {retry_delay} 秒后重试...")
@@ -365,10 +374,6 @@ def process_directory(base_dir, gender_dir, tasks_dir, filter_age=None, filter_s
                     print(f"  ✓ 成功提交第 {i}/2 个任务")
                 else:
                     print(f"  ✗ 第 {i}/2 个任务提交失败")
-                
-                # 添加请求间隔，避免API频率限制
-                if i < len(variations):  # 不是最后一个任务
-                    time.sleep(1)  # 等待1秒
     
     return submitted_count
 
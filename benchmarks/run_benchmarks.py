@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+渲染与文本流水线的离线基准测试
+
+功能:
+    - 每次重复都在临时目录中用固定seed重新生成合成章节（见synthetic_chapter.py），不访问任何外部接口
+    - 依次计时：narration解析、gen_ass.process_chapter、SoundEffectsProcessor、
+      concat_narration_video.process_chapter、concat_finish_video.process_single_chapter
+    - 渲染固定使用CPU编码器（FFMPEG_FORCE_CPU=1），结果在不同机器间可比
+    - 缺少依赖（jieba、ffmpeg-python、ffmpeg等）的项记为skipped，依赖它的后续项一并跳过
+    - 结果保存为JSON基线，compare命令按中位数对比并在出现回归时返回非零退出码
+
+使用方法:
+    # 运行并保存基线
+    python benchmarks/run_benchmarks.py run --repeat 3 --save-baseline main
+
+    # 运行并与基线对比（回归时退出码为1）
+    python benchmarks/run_benchmarks.py run --compare main
+
+    # 对比两个结果文件
+    python benchmarks/run_benchmarks.py compare main results.json --threshold 0.2
+
+    # 只运行部分项目（依赖项自动运行但不计入结果）
+    python benchmarks/run_benchmarks.py run --only gen_ass,sound_effects
+"""
+
+import argparse
+import contextlib
+import functools
+import importlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+PROJECT_ROOT = str(Path(__file__).resolve().parent.parent)
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.synthetic_chapter import build_workspace, ffmpeg_available
+
+BASELINE_DIR = os.path.join(PROJECT_ROOT, 'benchmarks', 'baselines')
+
+# 中位数变慢超过该比例且绝对值超过MIN_DELTA秒时判定为回归
+DEFAULT_THRESHOLD = 0.15
+DEFAULT_MIN_DELTA = 0.05
+
+# 基准测试期间的环境变量：固定CPU编码，关闭阶段追踪
+BENCHMARK_ENV = {'FFMPEG_FORCE_CPU': '1', 'PIPELINE_TRACE': '0'}
+
+
+class BenchmarkSkipped(Exception):
+    """依赖缺失，无法运行"""
+
+
+class Benchmark:
+    """
+    一个基准测试项
+
+    Args:
+        name (str): 名称
+        func (callable): 输入工作区字典，成功时返回真值
+        requires (tuple): 必须先成功运行的基准测试项（使用其输出文件）
+        needs_ffmpeg (bool): 是否需要ffmpeg可执行文件
+    """
+
+    def __init__(self, name, func, requires=(), needs_ffmpeg=False):
+        self.name = name
+        self.func = func
+        self.requires = requires
+        self.needs_ffmpeg = needs_ffmpeg
+
+
+def _import(module_name):
+    try:
+        return importlib.import_module(module_name)
+    except ImportError as e:
+        raise BenchmarkSkipped(f"无法导入 {module_name}: {e}")
+
+
+def _narration_path(workspace):
+    return os.path.join(workspace['chapter_path'], 'narration.txt')
+
+
+def bench_parse_gen_image_async(workspace):
+    scenes, _, character_map = _import('gen_image_async').parse_narration_file(_narration_path(workspace))
+    return scenes and character_map
+
+
+def bench_parse_gen_audio(workspace):
+    return _import('gen_audio').extract_narration_content(_narration_path(workspace))
+
+
+def bench_parse_gen_first_video(workspace):
+    return _import('gen_first_video_async').parse_narration_closeups(_narration_path(workspace))
+
+
+def bench_gen_ass(workspace):
+    return _import('gen_ass').process_chapter(workspace['chapter_path'])
+
+
+def bench_sound_effects(workspace):
+    processor_class = _import('src.sound_effects_processor').SoundEffectsProcessor
+    chapter_name = workspace['chapter_name']
+    ass_file = os.path.join(workspace['chapter_path'], f"{chapter_name}_narration_01.ass")
+    output_path = os.path.join(workspace['chapter_path'], f"{chapter_name}_sound_effects.mp3")
+    processor = processor_class(workspace['sound_effects_dir'])
+    return processor.process_chapter_sound_effects(ass_file, workspace['seconds'], output_path)
+
+
+def bench_narration_render(workspace):
+    return _import('concat_narration_video').process_chapter(workspace['chapter_path'], workspace['root'])
+
+
+def bench_finish_render(workspace):
+    module = _import('concat_finish_video')
+    bgm_bed = _import('bgm_bed')
+    original_service = module.BgmBedService
+    original_cwd = os.getcwd()
+    # 使用工作区中的BGM和缓存；finish视频路径相对于当前目录
+    module.BgmBedService = functools.partial(
+        bgm_bed.BgmBedService,
+        bgm_dir=workspace['bgm_dir'],
+        cache_dir=os.path.join(workspace['root'], 'data', '.bgm_cache')
+    )
+    os.chdir(workspace['root'])
+    try:
+        return module.process_single_chapter(workspace['data_dir'], workspace['chapter_name'])
+    finally:
+        os.chdir(original_cwd)
+        module.BgmBedService = original_service
+
+
+BENCHMARKS = [
+    Benchmark('parse_narration.gen_image_async', bench_parse_gen_image_async),
+    Benchmark('parse_narration.gen_audio', bench_parse_gen_audio),
+    Benchmark('parse_narration.gen_first_video_async', bench_parse_gen_first_video),
+    Benchmark('gen_ass', bench_gen_ass),
+    Benchmark('sound_effects', bench_sound_effects, requires=('gen_ass',), needs_ffmpeg=True),
+    Benchmark('narration_render', bench_narration_render, requires=('gen_ass',), needs_ffmpeg=True),
+    Benchmark('finish_render', bench_finish_render, requires=('narration_render',), needs_ffmpeg=True),
+]
+
+
+@contextlib.contextmanager
+def _benchmark_environment():
+    previous = {key: os.environ.get(key) for key in BENCHMARK_ENV}
+    os.environ.update(BENCHMARK_ENV)
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def _selected_with_requirements(only, benchmarks):
+    """
+    计算需要运行的项：选中的项加上其所有依赖
+    """
+    by_name = {benchmark.name: benchmark for benchmark in benchmarks}
+    needed = set()
+    stack = list(only)
+    while stack:
+        name = stack.pop()
+        if name not in by_name:
+            raise ValueError(f"未知的基准测试项: {name}")
+        if name not in needed:
+            needed.add(name)
+            stack.extend(by_name[name].requires)
+    return [benchmark for benchmark in benchmarks if benchmark.name in needed]
+
+
+def _run_once(benchmarks, workspace, verbose):
+    """
+    在一个工作区中依次运行各项，返回 {name: (status, seconds, reason)}
+    """
+    outcomes = {}
+    has_ffmpeg = ffmpeg_available()
+    for benchmark in benchmarks:
+        blocked = [name for name in benchmark.requires if outcomes.get(name, ('skipped',))[0] != 'ok']
+        if blocked:
+            outcomes[benchmark.name] = ('skipped', None, f"依赖项未成功: {', '.join(blocked)}")
+            continue
+        if benchmark.needs_ffmpeg and not has_ffmpeg:
+            outcomes[benchmark.name] = ('skipped', None, '未找到ffmpeg/ffprobe')
+            continue
+
+        # 渲染脚本中的随机效果（转场、BGM选择）固定种子，保证每次的工作量一致
+        random.seed(0)
+        output = io.StringIO()
+        redirect = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(output)
+        started = time.perf_counter()
+        try:
+            with redirect:
+                result = benchmark.func(workspace)
+            elapsed = time.perf_counter() - started
+            if result:
+                outcomes[benchmark.name] = ('ok', elapsed, None)
+            else:
+                tail = output.getvalue().strip().splitlines()[-3:]
+                outcomes[benchmark.name] = ('failed', elapsed, ' | '.join(tail) or '返回结果为空')
+        except BenchmarkSkipped as e:
+            outcomes[benchmark.name] = ('skipped', None, str(e))
+        except Exception as e:
+            outcomes[benchmark.name] = ('failed', None, f"{type(e).__name__}: {e}")
+    return outcomes
+
+
+def _environment_info():
+    info = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'ffmpeg': None,
+        'commit': None,
+    }
+    if ffmpeg_available():
+        result = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True)
+        info['ffmpeg'] = result.stdout.splitlines()[0] if result.stdout else None
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                                capture_output=True, text=True, timeout=10)
+        info['commit'] = result.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        pass
+    return info
+
+
+def run_benchmarks(only=None, repeat=3, narration_count=6, seconds=4.0, seed=0, verbose=False,
+                   benchmarks=None, workspace_builder=build_workspace):
+    """
+    运行基准测试
+
+    Args:
+        only (list): 只记录这些项（依赖项会运行但不记录），None表示全部
+        repeat (int): 重复次数，每次使用新生成的工作区
+        narration_count (int): 合成章节的解说段数
+        seconds (float): 每段音频时长
+        seed (int): 合成数据的随机种子
+        verbose (bool): 是否显示被测函数的输出
+
+    Returns:
+        dict: {'created_at', 'environment', 'config', 'results': {name: {...}}}
+    """
+    benchmarks = benchmarks if benchmarks is not None else BENCHMARKS
+    recorded = set(only) if only else {benchmark.name for benchmark in benchmarks}
+    to_run = _selected_with_requirements(recorded, benchmarks)
+    media = any(benchmark.needs_ffmpeg for benchmark in to_run) and ffmpeg_available()
+
+    runs = {benchmark.name: [] for benchmark in to_run}
+    with _benchmark_environment():
+        for iteration in range(repeat):
+            with tempfile.TemporaryDirectory(prefix='wrm_bench_') as root:
+                workspace = workspace_builder(root, narration_count=narration_count, seconds=seconds,
+                                              seed=seed, media=media)
+                workspace['seconds'] = seconds
+                for name, outcome in _run_once(to_run, workspace, verbose).items():
+                    runs[name].append(outcome)
+            print(f"第 {iteration + 1}/{repeat} 轮完成")
+
+    results = {}
+    for name, outcomes in runs.items():
+        if name not in recorded:
+            continue
+        times = [seconds_taken for status, seconds_taken, _ in outcomes if status == 'ok']
+        failures = [(status, reason) for status, _, reason in outcomes if status != 'ok']
+        if failures:
+            status, reason = failures[0]
+            results[name] = {'status': status, 'reason': reason, 'runs': [round(t, 4) for t in times]}
+            continue
+        results[name] = {
+            'status': 'ok',
+            'runs': [round(t, 4) for t in times],
+            'min': round(min(times), 4),
+            'median': round(statistics.median(times), 4),
+            'max': round(max(times), 4),
+        }
+
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'environment': _environment_info(),
+        'config': {'repeat': repeat, 'narration_count': narration_count, 'seconds': seconds, 'seed': seed},
+        'results': results,
+    }
+
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD, min_delta=DEFAULT_MIN_DELTA):
+    """
+    按中位数对比两次结果
+
+    Returns:
+        list: 每项 {'name', 'status', 'baseline', 'current', 'change'}，
+              status为 regression/improved/ok/failed/skipped/new/missing
+    """
+    rows = []
+    baseline_results = baseline.get('results', {})
+    current_results = current.get('results', {})
+    for name in sorted(set(baseline_results) | set(current_results)):
+        before = baseline_results.get(name)
+        after = current_results.get(name)
+        row = {'name': name, 'baseline': None, 'current': None, 'change': None}
+        if before and before.get('status') == 'ok':
+            row['baseline'] = before['median']
+        if after and after.get('status') == 'ok':
+            row['current'] = after['median']
+
+        if after is None:
+            row['status'] = 'missing'
+        elif after.get('status') != 'ok':
+            # 基线中能运行而现在失败视为回归；两边都跳过则只提示
+            row['status'] = 'failed' if after.get('status') == 'failed' or row['baseline'] is not None \
+                else after.get('status')
+        elif row['baseline'] is None:
+            row['status'] = 'new'
+        else:
+            delta = row['current'] - row['baseline']
+            row['change'] = round(delta / row['baseline'], 4) if row['baseline'] else None
+            if delta > min_delta and delta > row['baseline'] * threshold:
+                row['status'] = 'regression'
+            elif -delta > min_delta and -delta > row['baseline'] * threshold:
+                row['status'] = 'improved'
+            else:
+                row['status'] = 'ok'
+        rows.append(row)
+    return rows
+
+
+def has_regression(rows):
+    return any(row['status'] in ('regression', 'failed') for row in rows)
+
+
+def format_results(report):
+    lines = [f"{'基准测试项':<40} {'状态':<8} {'中位数':>9} {'最小':>9} {'最大':>9}"]
+    for name, result in report['results'].items():
+        if result['status'] == 'ok':
+            lines.append(f"{name:<40} {'ok':<8} {result['median']:>8.3f}s {result['min']:>8.3f}s {result['max']:>8.3f}s")
+        else:
+            lines.append(f"{name:<40} {result['status']:<8} {result.get('reason') or ''}")
+    return '\n'.join(lines)
+
+
+def format_comparison(rows):
+    labels = {'regression': '回归', 'improved': '提升', 'ok': '持平', 'failed': '失败',
+              'skipped': '跳过', 'new': '新增', 'missing': '缺失'}
+    lines = [f"{'基准测试项':<40} {'基线':>9} {'当前':>9} {'变化':>8}  结论"]
+    for row in rows:
+        baseline = f"{row['baseline']:.3f}s" if row['baseline'] is not None else '-'
+        current = f"{row['current']:.3f}s" if row['current'] is not None else '-'
+        change = f"{row['change'] * 100:+.1f}%" if row['change'] is not None else '-'
+        lines.append(f"{row['name']:<40} {baseline:>9} {current:>9} {change:>8}  {labels.get(row['status'], row['status'])}")
+    return '\n'.join(lines)
+
+
+def resolve_result_path(name_or_path):
+    """
+    基线可以是文件路径，也可以是baselines目录中的名称
+    """
+    if os.path.exists(name_or_path):
+        return name_or_path
+    return os.path.join(BASELINE_DIR, f"{name_or_path}.json")
+
+
+def load_result(name_or_path):
+    with open(resolve_result_path(name_or_path), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_result(report, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存: {path}")
+
+
+def _print_comparison(baseline, current, threshold, min_delta):
+    if baseline.get('environment', {}).get('ffmpeg') != current.get('environment', {}).get('ffmpeg'):
+        print("警告: 基线与当前结果的ffmpeg版本不同，对比结果仅供参考")
+    if baseline.get('config') != current.get('config'):
+        print("警告: 基线与当前结果的合成数据配置不同，对比结果仅供参考")
+    rows = compare_results(baseline, current, threshold, min_delta)
+    print(format_comparison(rows))
+    if has_regression(rows):
+        print(f"\n❌ 检测到性能回归（阈值 {threshold * 100:.0f}%，最小差值 {min_delta}s）")
+        return 1
+    print("\n✓ 未检测到性能回归")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='渲染与文本流水线的离线基准测试')
+    subparsers = parser.add_subparsers(dest='command')
+
+    run_parser = subparsers.add_parser('run', help='运行基准测试')
+    run_parser.add_argument('--only', help=f"逗号分隔的项目名，可选: {', '.join(b.name for b in BENCHMARKS)}")
+    run_parser.add_argument('--repeat', type=int, default=3, help='重复次数（默认3）')
+    run_parser.add_argument('--narrations', type=int, default=6, help='合成章节的解说段数（默认6）')
+    run_parser.add_argument('--seconds', type=float, default=4.0, help='每段音频时长（默认4秒）')
+    run_parser.add_argument('--seed', type=int, default=0, help='合成数据随机种子')
+    run_parser.add_argument('--output', help='结果JSON保存路径')
+    run_parser.add_argument('--save-baseline', metavar='NAME', help='保存为 benchmarks/baselines/NAME.json')
+    run_parser.add_argument('--compare', metavar='BASELINE', help='运行后与基线对比')
+    run_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='回归判定比例（默认0.15）')
+    run_parser.add_argument('--min-delta', type=float, default=DEFAULT_MIN_DELTA, help='回归判定最小差值秒数')
+    run_parser.add_argument('--verbose', action='store_true', help='显示被测函数的输出')
+
+    compare_parser = subparsers.add_parser('compare', help='对比两次结果')
+    compare_parser.add_argument('baseline', help='基线名称或JSON路径')
+    compare_parser.add_argument('current', help='当前结果名称或JSON路径')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='回归判定比例（默认0.15）')
+    compare_parser.add_argument('--min-delta', type=float, default=DEFAULT_MIN_DELTA, help='回归判定最小差值秒数')
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        only = [name.strip() for name in args.only.split(',') if name.strip()] if args.only else None
+        report = run_benchmarks(only=only, repeat=max(args.repeat, 1), narration_count=args.narrations,
+                                seconds=args.seconds, seed=args.seed, verbose=args.verbose)
+        print(format_results(report))
+        if args.output:
+            save_result(report, args.output)
+        if args.save_baseline:
+            save_result(report, os.path.join(BASELINE_DIR, f"{args.save_baseline}.json"))
+        if args.compare:
+            print()
+            return _print_comparison(load_result(args.compare), report, args.threshold, args.min_delta)
+        return 1 if any(result['status'] == 'failed' for result in report['results'].values()) else 0
+
+    if args.command == 'compare':
+        return _print_comparison(load_result(args.baseline), load_result(args.current),
+                                 args.threshold, args.min_delta)
+
+    parser.print_help()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线生成基准测试用的合成章节
+
+功能:
+    - 生成narration.txt（角色定义 + 分镜 + 图片特写 + 解说内容），以及与文本对应的 _timestamps.json
+    - 用ffmpeg生成正弦波加粉噪声的MP3、纯色/渐变图片、video_1/video_2开场视频
+    - 生成转场、水印、结尾视频、BGM和音效等素材，目录结构与项目根目录一致（src/banner、src/bgm、src/sound_effects）
+    - 所有内容由seed决定，同一seed在任何机器上生成的文本和时间戳完全相同
+
+使用方法:
+    from benchmarks.synthetic_chapter import build_workspace
+
+    workspace = build_workspace('/tmp/bench', narration_count=6, seconds=4.0)
+    workspace['chapter_path']  # /tmp/bench/data/900/chapter_001
+"""
+
+import json
+import math
+import os
+import random
+import shutil
+import struct
+import subprocess
+import wave
+
+NOVEL_ID = '900'
+CHAPTER_NAME = 'chapter_001'
+
+WIDTH = 720
+HEIGHT = 1280
+FPS = 30
+
+CHARACTER_NAMES = ['沈云舟', '顾长歌', '苏清寒', '陆惊鸿']
+
+# 句子片段，包含音效匹配用的关键词（脚步、剑、门、雨、马、夜、钟等）
+SUBJECT_PHRASES = ['踏着夜色走进长街', '推开朱红的宫门', '握紧手中的长剑', '冒着大雨赶到城外',
+                   '骑马穿过喧闹的市场', '听见远处的钟声', '在森林边缘停下脚步', '望着天边的雷光']
+RESULT_PHRASES = ['心中暗暗发誓一定要查清真相', '却发现身后早已埋伏了数名刺客', '只见一封密信静静躺在案上',
+                  '众人纷纷屏住了呼吸', '这一夜注定无人入眠', '一场更大的风波正在酝酿']
+
+# 音效文件（相对src/sound_effects），与concat_narration_video.find_sound_effect的映射一致
+SOUND_EFFECT_FILES = [
+    'action/footsteps_normal.wav', 'action/door_open.wav', 'combat/sword_clash.wav',
+    'environment/rain_light.wav', 'environment/night_crickets.wav', 'environment/wind_gentle.wav',
+    'misc/horse.wav', 'misc/bell.wav',
+]
+
+BGM_FILE = 'wn1.mp3'
+
+
+def make_sentences(count, seed=0):
+    """
+    生成count句解说内容
+    """
+    rng = random.Random(seed)
+    sentences = []
+    for index in range(count):
+        name = CHARACTER_NAMES[index % len(CHARACTER_NAMES)]
+        sentences.append(f"{name}{rng.choice(SUBJECT_PHRASES)}，{rng.choice(RESULT_PHRASES)}！")
+    return sentences
+
+
+def make_narration_text(sentences, closeups_per_scene=3):
+    """
+    按项目的narration.txt格式组织解说内容
+    """
+    lines = ['<第1章节>', '<章节风格>通用</章节风格>', '<绘画风格>古风言情</绘画风格>', '<出镜人物>']
+    for index, name in enumerate(CHARACTER_NAMES, 1):
+        lines.extend([
+            f'<角色{index}>', f'<姓名>{name}</姓名>', '<性别>Male</性别>', '<年龄段>23-30_YoungAdult</年龄段>',
+            '<外貌特征>', '<发型>束发</发型>', '<发色>黑色</发色>', '<面部特征>眉目清朗</面部特征>',
+            '<身材特征>身形修长</身材特征>', '<特殊标记>无</特殊标记>', '</外貌特征>',
+            '<服装风格>', '<上衣>青色长袍</上衣>', '<下装>深色长裤</下装>', '<配饰>玉佩</配饰>', '</服装风格>',
+            f'</角色{index}>',
+        ])
+    lines.append('</出镜人物>')
+
+    for scene_index in range(0, len(sentences), closeups_per_scene):
+        scene_number = scene_index // closeups_per_scene + 1
+        lines.append(f'<分镜{scene_number}>')
+        for offset, sentence in enumerate(sentences[scene_index:scene_index + closeups_per_scene], 1):
+            name = CHARACTER_NAMES[(scene_index + offset - 1) % len(CHARACTER_NAMES)]
+            lines.extend([
+                f'<图片特写{offset}>', '<特写人物>', f'<角色姓名>{name}</角色姓名>', '<时代背景>古代</时代背景>',
+                '<角色形象>古代形象</角色形象>', '</特写人物>', f'<解说内容>{sentence}</解说内容>',
+                f'<图片prompt>古风风格，{name}半身像，{sentence[:12]}，画面构图为中景</图片prompt>',
+                f'</图片特写{offset}>',
+            ])
+        lines.append(f'</分镜{scene_number}>')
+    lines.append('</第1章节>')
+    return '\n'.join(lines) + '\n'
+
+
+def make_timestamps(text, seconds, audio_file):
+    """
+    按字符均分时长生成与TTS接口返回格式一致的时间戳
+    """
+    step = seconds / max(len(text), 1)
+    return {
+        'text': text,
+        'audio_file': audio_file,
+        'duration': round(seconds, 3),
+        'character_timestamps': [
+            {'character': char, 'start_time': round(index * step, 3), 'end_time': round((index + 1) * step, 3)}
+            for index, char in enumerate(text)
+        ],
+        'generated_at': '2000-01-01T00:00:00',
+    }
+
+
+def write_tone_wav(path, seconds=0.5, frequency=440.0, sample_rate=44100):
+    """
+    用标准库写一段正弦波WAV（音效素材不依赖ffmpeg）
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    frames = bytearray()
+    for index in range(int(seconds * sample_rate)):
+        value = int(12000 * math.sin(2 * math.pi * frequency * index / sample_rate))
+        frames += struct.pack('<hh', value, value)
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(bytes(frames))
+
+
+def ffmpeg_available():
+    return shutil.which('ffmpeg') is not None and shutil.which('ffprobe') is not None
+
+
+def _ffmpeg(args):
+    result = subprocess.run(['ffmpeg', '-v', 'error', '-y'] + args, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg生成素材失败: {result.stderr.decode('utf-8', errors='ignore')}")
+
+
+def write_tone_mp3(path, seconds, frequency, seed):
+    """
+    正弦波叠加粉噪声的MP3，模拟配音音频
+    """
+    _ffmpeg([
+        '-f', 'lavfi', '-i', f'sine=frequency={frequency}:sample_rate=44100:duration={seconds}',
+        '-f', 'lavfi', '-i', f'anoisesrc=color=pink:amplitude=0.05:seed={seed}:duration={seconds}',
+        '-filter_complex', 'amix=inputs=2:duration=first', '-ac', '2', '-c:a', 'libmp3lame', '-b:a', '128k', path
+    ])
+
+
+def write_image(path, index):
+    """
+    奇数编号为纯色图片，偶数编号为渐变图片
+    """
+    if index % 2:
+        source = f'color=c=0x{(index * 2654435761) % 0xFFFFFF:06x}:s={WIDTH}x{HEIGHT}'
+    else:
+        source = f"nullsrc=s={WIDTH}x{HEIGHT},geq=r='X*255/W':g='Y*255/H':b='{(index * 37) % 256}'"
+    _ffmpeg(['-f', 'lavfi', '-i', source, '-frames:v', '1', '-q:v', '3', path])
+
+
+def write_video(path, seconds, with_alpha=False):
+    """
+    测试图案视频；with_alpha时生成带透明通道的mov（转场浮层）
+    """
+    if with_alpha:
+        _ffmpeg(['-f', 'lavfi', '-i', f'color=c=black@0.0:s={WIDTH}x{HEIGHT}:r={FPS}:d={seconds},format=argb',
+                 '-c:v', 'qtrle', path])
+        return
+    _ffmpeg([
+        '-f', 'lavfi', '-i', f'testsrc2=s={WIDTH}x{HEIGHT}:r={FPS}:d={seconds}',
+        '-f', 'lavfi', '-i', f'sine=frequency=330:sample_rate=44100:duration={seconds}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-shortest', path
+    ])
+
+
+def build_text_assets(chapter_path, narration_count=6, seconds=4.0, seed=0):
+    """
+    只生成文本素材（narration.txt和时间戳），不需要ffmpeg
+
+    Returns:
+        list: 每段解说内容
+    """
+    os.makedirs(chapter_path, exist_ok=True)
+    sentences = make_sentences(narration_count, seed)
+    with open(os.path.join(chapter_path, 'narration.txt'), 'w', encoding='utf-8') as f:
+        f.write(make_narration_text(sentences))
+
+    chapter_name = os.path.basename(chapter_path)
+    for index, sentence in enumerate(sentences, 1):
+        audio_file = os.path.join(chapter_path, f"{chapter_name}_narration_{index:02d}.mp3")
+        timestamps_path = os.path.join(chapter_path, f"{chapter_name}_narration_{index:02d}_timestamps.json")
+        with open(timestamps_path, 'w', encoding='utf-8') as f:
+            json.dump(make_timestamps(sentence, seconds, audio_file), f, ensure_ascii=False, indent=2)
+    return sentences
+
+
+def build_workspace(root, narration_count=6, seconds=4.0, seed=0, media=True):
+    """
+    生成完整的合成工作区
+
+    Args:
+        root (str): 工作区根目录，相当于项目根目录（渲染脚本的work_dir）
+        narration_count (int): 解说段数
+        seconds (float): 每段音频时长
+        seed (int): 随机种子
+        media (bool): 是否生成音视频和图片素材（需要ffmpeg）
+
+    Returns:
+        dict: {'root', 'data_dir', 'chapter_path', 'chapter_name', 'sound_effects_dir', 'bgm_dir', 'sentences'}
+    """
+    data_dir = os.path.join(root, 'data', NOVEL_ID)
+    chapter_path = os.path.join(data_dir, CHAPTER_NAME)
+    sound_effects_dir = os.path.join(root, 'src', 'sound_effects')
+    bgm_dir = os.path.join(root, 'src', 'bgm')
+    banner_dir = os.path.join(root, 'src', 'banner')
+
+    sentences = build_text_assets(chapter_path, narration_count, seconds, seed)
+    for index, relative_path in enumerate(SOUND_EFFECT_FILES):
+        write_tone_wav(os.path.join(sound_effects_dir, relative_path), frequency=300 + 60 * index)
+
+    if media:
+        os.makedirs(bgm_dir, exist_ok=True)
+        os.makedirs(banner_dir, exist_ok=True)
+        for index in range(1, narration_count + 1):
+            prefix = os.path.join(chapter_path, f"{CHAPTER_NAME}_narration_{index:02d}")
+            write_tone_mp3(f"{prefix}.mp3", seconds, 200 + 40 * index, seed + index)
+            write_image(os.path.join(chapter_path, f"{CHAPTER_NAME}_image_{index:02d}.jpeg"), index)
+        for index in (1, 2):
+            write_video(os.path.join(chapter_path, f"{CHAPTER_NAME}_video_{index}.mp4"), seconds + 1)
+        write_tone_mp3(os.path.join(bgm_dir, BGM_FILE), 20, 220, seed)
+        write_video(os.path.join(banner_dir, 'fuceng1.mov'), 1, with_alpha=True)
+        write_video(os.path.join(banner_dir, 'finish_compatible.mp4'), 1)
+        _ffmpeg(['-f', 'lavfi', '-i', 'color=c=white:s=200x80', '-frames:v', '1',
+                 os.path.join(banner_dir, 'rmxs.png')])
+
+    return {
+        'root': root,
+        'data_dir': data_dir,
+        'chapter_path': chapter_path,
+        'chapter_name': CHAPTER_NAME,
+        'sound_effects_dir': sound_effects_dir,
+        'bgm_dir': bgm_dir,
+        'sentences': sentences,
+    }
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BGM音床缓存服务
+
+功能:
+    - 每首BGM只用ffmpeg解码一次（同时做loudnorm响度标准化），PCM缓存为.npy文件
+    - 按任意目标时长从缓存切片生成音床，循环接缝处做等功率交叉淡化，结尾淡出
+    - 生成的PCM可直接通过管道送入最终混音，不再生成中间AAC文件
+    - 每个章节选用的曲目记录在 chapter_xxx_bgm.json 中，重新渲染时复用同一首BGM
+
+使用方法:
+    from bgm_bed import BgmBedService
+
+    service = BgmBedService()
+    track = service.choose_track(chapter_path, chapter_name)
+    pcm = service.render_bed(track, target_duration)
+"""
+
+import hashlib
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BGM_DIR = os.path.join(PROJECT_ROOT, 'src', 'bgm')
+DEFAULT_CACHE_DIR = os.path.join(PROJECT_ROOT, 'data', '.bgm_cache')
+
+# 缓存PCM格式：16bit小端、44.1kHz、双声道
+SAMPLE_RATE = 44100
+CHANNELS = 2
+PCM_FORMAT = 's16le'
+
+# 解码时的响度标准化参数，修改后缓存自动失效
+LOUDNORM_FILTER = 'loudnorm=I=-16:TP=-1.5:LRA=11'
+
+# 循环接缝交叉淡化时长和结尾淡出时长（秒）
+LOOP_CROSSFADE_SECONDS = 1.0
+FADE_OUT_SECONDS = 3.0
+
+# 可选的BGM曲目
+BGM_FILES = [
+    "wn1.mp3", "wn3.mp3", "wn4.mp3", "wn5.mp3", "wn6.mp3",
+    "wn7.mp3", "wn8.mp3", "wn9.mp3", "wn10.mp3", "wn11.mp3",
+    "wn12.mp3", "wn13.mp3", "wn14.mp3"
+]
+
+
+def decode_track_with_ffmpeg(track_path):
+    """
+    使用ffmpeg将BGM解码为响度标准化后的PCM
+
+    Returns:
+        np.ndarray: int16数组，形状为 (采样数, CHANNELS)
+    """
+    cmd = [
+        'ffmpeg', '-v', 'error', '-i', track_path,
+        '-af', LOUDNORM_FILTER,
+        '-f', PCM_FORMAT, '-ac', str(CHANNELS), '-ar', str(SAMPLE_RATE),
+        'pipe:1'
+    ]
+    result = subprocess.run(cmd, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"BGM解码失败: {track_path}: {result.stderr.decode('utf-8', errors='ignore')}")
+    return np.frombuffer(result.stdout, dtype='<i2').reshape(-1, CHANNELS)
+
+
+class BgmBedService:
+    """
+    BGM音床服务
+
+    Args:
+        bgm_dir (str): BGM曲目目录
+        cache_dir (str): 解码后PCM的缓存目录
+        decoder (callable): 解码函数，输入曲目路径返回int16 PCM数组，默认使用ffmpeg
+    """
+
+    def __init__(self, bgm_dir=DEFAULT_BGM_DIR, cache_dir=DEFAULT_CACHE_DIR, decoder=decode_track_with_ffmpeg):
+        self.bgm_dir = bgm_dir
+        self.cache_dir = cache_dir
+        self.decoder = decoder
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def available_tracks(self, bgm_files=BGM_FILES):
+        """
+        获取存在的BGM曲目路径列表
+        """
+        available_files = []
+        for bgm_file in bgm_files:
+            bgm_path = os.path.join(self.bgm_dir, bgm_file)
+            if os.path.exists(bgm_path):
+                available_files.append(bgm_path)
+            else:
+                print(f"警告: BGM文件不存在: {bgm_path}")
+        return available_files
+
+    def _cache_path(self, track_path):
+        """
+        缓存文件名由曲目内容标识（文件名、大小、修改时间）和解码参数共同决定
+        """
+        stat = os.stat(track_path)
+        identity = f"{os.path.basename(track_path)}|{stat.st_size}|{int(stat.st_mtime)}|" \
+                   f"{LOUDNORM_FILTER}|{SAMPLE_RATE}|{CHANNELS}"
+        digest = hashlib.sha1(identity.encode('utf-8')).hexdigest()[:16]
+        name = os.path.splitext(os.path.basename(track_path))[0]
+        return os.path.join(self.cache_dir, f"{name}_{digest}.npy")
+
+    def load_track(self, track_path):
+        """
+        加载曲目PCM：进程内缓存 -> 磁盘缓存 -> 解码
+
+        Returns:
+            np.ndarray: int16数组，形状为 (采样数, CHANNELS)
+        """
+        cache_path = self._cache_path(track_path)
+        with self._lock:
+            if cache_path in self._buffers:
+                return self._buffers[cache_path]
+
+            if os.path.exists(cache_path):
+                pcm = np.load(cache_path, mmap_mode='r')
+            else:
+                started = time.time()
+                pcm = np.ascontiguousarray(self.decoder(track_path), dtype=np.int16)
+                os.makedirs(self.cache_dir, exist_ok=True)
+                temp_path = cache_path + f'.{os.getpid()}.tmp.npy'
+                np.save(temp_path, pcm)
+                os.replace(temp_path, cache_path)
+                print(f"BGM已解码并缓存: {os.path.basename(track_path)} "
+                      f"({len(pcm) / SAMPLE_RATE:.1f}s, 耗时{time.time() - started:.1f}s)")
+
+            self._buffers[cache_path] = pcm
+            return pcm
+
+    def render_bed(self, track_path, target_duration, crossfade_seconds=LOOP_CROSSFADE_SECONDS,
+                   fade_out_seconds=FADE_OUT_SECONDS):
+        """
+        生成指定时长的音床
+
+        曲目比目标时长短时循环拼接：每次回到开头前，曲目末尾的crossfade段与开头段做等功率交叉淡化，
+        循环单元为 [交叉淡化段 + 曲目中间部分]，可无缝重复。
+
+        Returns:
+            np.ndarray: int16数组，形状为 (采样数, CHANNELS)
+        """
+        source = self.load_track(track_path)
+        total = int(round(target_duration * SAMPLE_RATE))
+        length = len(source)
+        if total <= 0 or length == 0:
+            return np.zeros((0, CHANNELS), dtype=np.int16)
+
+        if length >= total:
+            bed = np.array(source[:total], dtype=np.float32)
+        else:
+            crossfade = min(int(crossfade_seconds * SAMPLE_RATE), length // 2)
+            head = np.asarray(source[:length - crossfade], dtype=np.float32)
+            if crossfade > 0:
+                t = np.linspace(0, np.pi / 2, crossfade, dtype=np.float32)[:, None]
+                seam = np.asarray(source[length - crossfade:], dtype=np.float32) * np.cos(t) + \
+                    np.asarray(source[:crossfade], dtype=np.float32) * np.sin(t)
+                loop_unit = np.concatenate([seam, head[crossfade:]])
+            else:
+                loop_unit = head
+            repeats = -(-(total - len(head)) // len(loop_unit))
+            bed = np.concatenate([head, np.tile(loop_unit, (repeats, 1))])[:total]
+
+        fade_samples = min(int(fade_out_seconds * SAMPLE_RATE), total)
+        if fade_samples > 0:
+            bed[-fade_samples:] *= np.linspace(1.0, 0.0, fade_samples, dtype=np.float32)[:, None]
+
+        return np.clip(np.round(bed), -32768, 32767).astype(np.int16)
+
+    def manifest_path(self, chapter_path, chapter_name):
+        return os.path.join(chapter_path, f"{chapter_name}_bgm.json")
+
+    def choose_track(self, chapter_path, chapter_name, reroll=False):
+        """
+        为章节选择BGM：优先复用已记录的曲目，否则随机选择并记录
+
+        Args:
+            reroll (bool): 忽略已记录的曲目重新随机选择
+
+        Returns:
+            str: 曲目路径，没有可用曲目时返回None
+        """
+        manifest_path = self.manifest_path(chapter_path, chapter_name)
+        if not reroll and os.path.exists(manifest_path):
+            try:
+                with open(manifest_path, 'r', encoding='utf-8') as f:
+                    recorded = json.load(f)
+                track_path = os.path.join(self.bgm_dir, recorded['track'])
+                if os.path.exists(track_path):
+                    print(f"章节 {chapter_name} 复用已记录的BGM: {recorded['track']}")
+                    return track_path
+                print(f"警告: 已记录的BGM不存在，重新选择: {recorded['track']}")
+            except (OSError, ValueError, KeyError) as e:
+                print(f"警告: BGM记录文件无法读取，重新选择: {e}")
+
+        tracks = self.available_tracks()
+        if not tracks:
+            return None
+
+        track_path = random.choice(tracks)
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'chapter': chapter_name,
+                'track': os.path.basename(track_path),
+                'loudnorm': LOUDNORM_FILTER,
+                'selected_at': time.strftime('%Y-%m-%d %H:%M:%S')
+            }, f, ensure_ascii=False, indent=2)
+        print(f"为章节 {chapter_name} 随机选择的BGM: {os.path.basename(track_path)}")
+        return track_path
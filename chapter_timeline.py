@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+章节时间线：TTS和字幕生成后一次性计算的章节媒体元数据
+
+功能:
+    - 每个narration的音频时长、字幕时长、渲染时长（裁掉结尾静音后）、在章节中的起止时间、
+      字幕对话、对应图片、音效事件（含响度增益），写入章节目录的 <chapter>_timeline.json（紧凑JSON）
+    - 以各narration的MP3/ASS文件状态、音效库文件状态和算法版本计算输入哈希，
+      任一输入变化时时间线失效，下次读取时重建；图片在TTS之后才生成，读取时间线时再解析，不影响失效
+    - concat_narration_video 渲染时直接读取时长、对话、增益和音效，不再逐段探测和解析；
+      合并的narration_01-03字幕由时间线中的对话直接写出
+    - 渲染完成的narration视频时长记录在时间线中，concat_finish_video 拼接时按文件状态复用，不再重复探测
+    - 网页章节详情和音频文件列表读取时间线显示每段的起止时间（只读取，不在请求中重建）
+
+使用方法:
+    from chapter_timeline import get_timeline, narration_entry
+
+    timeline = get_timeline(chapter_path)          # 读取，失效或不存在时重建
+    entry = narration_entry(timeline, '04')
+    entry['duration'], entry['dialogues'], entry['sound_effects']
+
+    # 命令行：生成或查看时间线
+    python chapter_timeline.py build data/001/chapter_001
+    python chapter_timeline.py show data/001/chapter_001
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# 时间线结构或计算方式变化时递增，旧时间线自动失效
+TIMELINE_VERSION = 1
+
+SOUND_EFFECT_DIRS = (os.path.join('src', 'sound_effects'), 'sound')
+
+# 与审核页面一致，chapter_xxx_image_NN.* 中只认这些图片扩展名
+IMAGE_EXTENSIONS = ('.jpeg', '.jpg', '.png', '.gif', '.webp')
+
+# 音效库状态按进程缓存：{work_dir: {'dirs', 'dir_states', 'state'}}
+# 文件增删、重命名都会更新所在目录的mtime，目录状态都未变化时复用上次的结果
+_sound_library_cache = {}
+
+
+def timeline_path(chapter_path):
+    chapter_name = os.path.basename(os.path.normpath(chapter_path))
+    return os.path.join(chapter_path, f"{chapter_name}_timeline.json")
+
+
+def narration_numbers(chapter_path):
+    """
+    章节中有字幕文件的narration编号，按编号排序
+    """
+    chapter_name = os.path.basename(os.path.normpath(chapter_path))
+    numbers = []
+    for path in glob.glob(os.path.join(chapter_path, f"{chapter_name}_narration_*.ass")):
+        match = re.search(r'narration_(\d+)\.ass$', path)
+        if match:
+            numbers.append(match.group(1))
+    return sorted(numbers)
+
+
+def parse_ass_time(time_str):
+    """
+    解析ASS时间格式 (H:MM:SS.CC) 为秒数
+    """
+    hours, minutes, seconds = time_str.strip().split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def read_ass_dialogues(ass_path):
+    """
+    读取ASS字幕中的对话
+
+    Returns:
+        list: [[开始秒数, 结束秒数, 文本], ...]
+    """
+    dialogues = []
+    with open(ass_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line.startswith('Dialogue:'):
+                continue
+            # 格式: Dialogue: Layer,Start,End,Style,Name,MarginL,MarginR,MarginV,Effect,Text
+            parts = line.split(',')
+            if len(parts) < 10:
+                continue
+            try:
+                start, end = parse_ass_time(parts[1]), parse_ass_time(parts[2])
+            except ValueError:
+                continue
+            dialogues.append([start, end, ','.join(parts[9:]).strip()])
+    return dialogues
+
+
+def _file_state(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _sound_library_state(work_dir):
+    """
+    音效库文件状态，音效文件增删或替换时时间线失效
+    """
+    cached = _sound_library_cache.get(work_dir)
+    if cached and [_file_state(path) for path in cached['dirs']] == cached['dir_states']:
+        return cached['state']
+
+    state = []
+    sound_dirs = []
+    for sound_dir in SOUND_EFFECT_DIRS:
+        root_dir = os.path.join(work_dir, sound_dir)
+        sound_dirs.append(root_dir)
+        for root, dirs, files in os.walk(root_dir):
+            dirs.sort()
+            sound_dirs.extend(os.path.join(root, name) for name in dirs)
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                state.append([os.path.relpath(path, work_dir), _file_state(path)])
+    _sound_library_cache[work_dir] = {'dirs': sound_dirs, 'dir_states': [_file_state(path) for path in sound_dirs],
+                                      'state': state}
+    return state
+
+
+def _narration_files(chapter_path, num):
+    chapter_name = os.path.basename(os.path.normpath(chapter_path))
+    return {
+        'audio': f"{chapter_name}_narration_{num}.mp3",
+        'ass': f"{chapter_name}_narration_{num}.ass",
+    }
+
+
+def _find_image(chapter_path, num):
+    """
+    查找分镜图片 chapter_xxx_image_NN.*，忽略.json等非图片文件
+
+    Returns:
+        str: 图片文件名，不存在时返回None
+    """
+    chapter_name = os.path.basename(os.path.normpath(chapter_path))
+    pattern = os.path.join(glob.escape(chapter_path), f"{chapter_name}_image_{num}.*")
+    images = sorted(os.path.basename(path) for path in glob.glob(pattern) if path.lower().endswith(IMAGE_EXTENSIONS))
+    return images[0] if images else None
+
+
+def input_hash(chapter_path, work_dir=PROJECT_ROOT):
+    """
+    计算时间线的输入哈希
+    """
+    from audio_analysis import ANALYSIS_VERSION
+
+    inputs = {'version': TIMELINE_VERSION, 'analysis': ANALYSIS_VERSION, 'narrations': [],
+              'sound_library': _sound_library_state(work_dir)}
+    for num in narration_numbers(chapter_path):
+        files = _narration_files(chapter_path, num)
+        inputs['narrations'].append([
+            num,
+            _file_state(os.path.join(chapter_path, files['audio'])),
+            _file_state(os.path.join(chapter_path, files['ass'])),
+        ])
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _default_probe_duration(path):
+    from concat_narration_video import get_audio_duration
+    return get_audio_duration(path)
+
+
+def _default_sound_effects(dialogues, num, work_dir):
+    from concat_narration_video import get_sound_effects_for_narration
+    return get_sound_effects_for_narration(dialogues, num, work_dir)
+
+
+def _default_analyze(path):
+    from audio_analysis import analyze_audio
+    return analyze_audio(path)
+
+
+def build_timeline(chapter_path, work_dir=PROJECT_ROOT, probe_duration=None, analyze=None, sound_effects_for=None):
+    """
+    计算并保存章节时间线
+
+    Args:
+        chapter_path (str): 章节目录
+        work_dir (str): 项目根目录（音效库所在位置）
+        probe_duration (callable): probe_duration(音频路径) -> 秒数，默认ffprobe
+        analyze (callable): analyze(音频路径) -> 响度分析结果，默认audio_analysis
+        sound_effects_for (callable): sound_effects_for(对话列表, 编号, work_dir) -> 音效列表，
+            默认concat_narration_video的关键词匹配
+
+    Returns:
+        dict: 时间线
+    """
+    from audio_analysis import effect_gain_db, narration_gain_db, trimmed_duration
+
+    probe_duration = probe_duration or _default_probe_duration
+    analyze = analyze or _default_analyze
+    sound_effects_for = sound_effects_for or _default_sound_effects
+
+    digest = input_hash(chapter_path, work_dir)
+    narrations = []
+    offset = 0.0
+    effect_gains = {}
+    for num in narration_numbers(chapter_path):
+        files = _narration_files(chapter_path, num)
+        audio_path = os.path.join(chapter_path, files['audio'])
+        ass_path = os.path.join(chapter_path, files['ass'])
+        try:
+            dialogues = read_ass_dialogues(ass_path)
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"⚠ 读取ASS字幕失败 {files['ass']}: {e}")
+            dialogues = []
+        ass_duration = max((dialogue[1] for dialogue in dialogues), default=0.0)
+        audio_duration = probe_duration(audio_path) if os.path.exists(audio_path) else 0.0
+
+        # 渲染时长与add_effects_and_audio一致：以音频为准，裁掉结尾静音但不早于字幕结束
+        duration = audio_duration
+        gain_db = 0.0
+        if audio_duration > 0:
+            try:
+                analysis = analyze(audio_path)
+                gain_db = narration_gain_db(analysis)
+                trimmed = trimmed_duration(analysis, min_duration=ass_duration)
+                if trimmed < audio_duration - 0.05:
+                    duration = trimmed
+            except Exception as e:
+                print(f"⚠ 响度分析失败，使用原始时长和音量 {files['audio']}: {e}")
+
+        effects = []
+        for effect in sound_effects_for(
+                [{'start_time': start, 'end_time': end, 'text': text} for start, end, text in dialogues], num, work_dir):
+            path = effect['path']
+            if path not in effect_gains:
+                try:
+                    effect_gains[path] = effect_gain_db(analyze(path))
+                except Exception as e:
+                    print(f"⚠ 音效响度分析失败 {os.path.basename(path)}: {e}")
+                    effect_gains[path] = None
+            effects.append(dict(effect, gain_db=effect_gains[path]))
+
+        image = _find_image(chapter_path, num)
+        narrations.append({
+            'num': num,
+            'audio': files['audio'],
+            'ass': files['ass'],
+            'image': image,
+            'audio_duration': round(audio_duration, 3),
+            'ass_duration': round(ass_duration, 3),
+            'duration': round(duration, 3),
+            'gain_db': gain_db,
+            'start': round(offset, 3),
+            'end': round(offset + duration, 3),
+            'dialogues': dialogues,
+            'sound_effects': effects,
+        })
+        offset += duration
+
+    timeline = {
+        'version': TIMELINE_VERSION,
+        'chapter': os.path.basename(os.path.normpath(chapter_path)),
+        'inputs': digest,
+        'duration': round(offset, 3),
+        'narrations': narrations,
+        'videos': {},
+    }
+    save_timeline(chapter_path, timeline)
+    return timeline
+
+
+def save_timeline(chapter_path, timeline):
+    path = timeline_path(chapter_path)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(timeline, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def read_timeline(chapter_path):
+    """
+    读取时间线文件，不校验输入是否变化
+    """
+    try:
+        with open(timeline_path(chapter_path), 'r', encoding='utf-8') as f:
+            timeline = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return timeline if timeline.get('version') == TIMELINE_VERSION else None
+
+
+def load_timeline(chapter_path, work_dir=PROJECT_ROOT):
+    """
+    读取时间线，输入已变化时返回None；各narration的图片按当前文件重新解析
+    """
+    timeline = read_timeline(chapter_path)
+    if timeline is None or timeline.get('inputs') != input_hash(chapter_path, work_dir):
+        return None
+    for entry in timeline['narrations']:
+        entry['image'] = _find_image(chapter_path, entry['num'])
+    return timeline
+
+
+def get_timeline(chapter_path, work_dir=PROJECT_ROOT, **build_options):
+    """
+    读取时间线，不存在或已失效时重建
+    """
+    timeline = load_timeline(chapter_path, work_dir)
+    if timeline is None:
+        print(f"生成章节时间线: {os.path.basename(os.path.normpath(chapter_path))}")
+        timeline = build_timeline(chapter_path, work_dir, **build_options)
+    return timeline
+
+
+def narration_entry(timeline, num):
+    if timeline is None:
+        return None
+    return next((entry for entry in timeline['narrations'] if entry['num'] == num), None)
+
+
+def merged_dialogues(timeline, nums):
+    """
+    把多个narration的对话按顺序首尾相接，后一段从前一段最后一条字幕结束时开始（与merge_ass_files一致）
+    """
+    merged = []
+    offset = 0.0
+    for num in nums:
+        entry = narration_entry(timeline, num)
+        if entry is None or not entry['dialogues']:
+            return None
+        merged.extend([start + offset, end + offset, text] for start, end, text in entry['dialogues'])
+        offset = max(end for _, end, _ in merged)
+    return merged
+
+
+def record_video(chapter_path, video_path, duration):
+    """
+    记录渲染完成的narration视频时长，拼接阶段按文件状态复用
+    """
+    timeline = read_timeline(chapter_path)
+    state = _file_state(video_path)
+    if timeline is None or state is None or not duration:
+        return False
+    timeline['videos'][os.path.basename(video_path)] = state + [round(duration, 3)]
+    save_timeline(chapter_path, timeline)
+    return True
+
+
+def recorded_video_duration(video_path):
+    """
+    渲染时记录的视频时长，视频文件之后被替换过时返回None
+    """
+    chapter_path = os.path.dirname(os.path.abspath(video_path))
+    timeline = read_timeline(chapter_path)
+    if timeline is None:
+        return None
+    record = timeline.get('videos', {}).get(os.path.basename(video_path))
+    if record is None or record[:2] != _file_state(video_path):
+        return None
+    return record[2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='章节时间线')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help='生成章节时间线（已是最新时跳过）')
+    build_parser.add_argument('chapters', nargs='+', help='章节目录')
+    build_parser.add_argument('--force', action='store_true', help='忽略输入哈希强制重建')
+    show_parser = subparsers.add_parser('show', help='查看章节时间线')
+    show_parser.add_argument('chapter', help='章节目录')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        for chapter_path in args.chapters:
+            timeline = build_timeline(chapter_path) if args.force else get_timeline(chapter_path)
+            print(f"{timeline['chapter']}: {len(timeline['narrations'])} 段，总时长 {timeline['duration']:.2f}s")
+        return 0
+
+    timeline = load_timeline(args.chapter)
+    if timeline is None:
+        print("时间线不存在或已失效，请先运行 build")
+        return 1
+    print(f"{timeline['chapter']}  总时长 {timeline['duration']:.2f}s")
+    for entry in timeline['narrations']:
+        print(f"  narration_{entry['num']}  {entry['start']:>8.2f}s - {entry['end']:>8.2f}s  "
+              f"对话 {len(entry['dialogues']):>3}  音效 {len(entry['sound_effects'])}  图片 {entry['image'] or '-'}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -14,6 +14,24 @@ import urllib.request
 from config.config import IMAGE_TWO_CONFIG, ARK_CONFIG
 from volcengine.visual.VisualService import VisualService
 from volcenginesdkarkruntime import Ark
+from pipeline_trace import span, path_attributes
+from rate_limiter import rate_limited_call
+from asset_store import store_bytes
+from image_derivatives import ingest_image
+from video_clip_cache import record_task_completed, record_task_failed
+
+# 任务文件中的output_path和done_tasks目录都相对于项目根目录，
+# 按项目根目录解析，调用方（如Celery worker）无需切换工作目录
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DONE_TASKS_DIR = os.path.join(PROJECT_ROOT, 'done_tasks')
+
+def resolve_project_path(path):
+    """
+    将相对路径解析为项目根目录下的绝对路径，绝对路径原样返回
+    """
+    if os.path.isabs(path):
+        return path
+    return os.path.join(PROJECT_ROOT, path)
 
 def load_task_info(task_file):
     """
@@ -72,7 +90,8 @@ def query_image_task_status(task_id, max_retries=2, retry_delay=1):
                 "task_id": task_id
             }
             
-            resp = visual_service.cv_sync2async_get_result(form)
+            with span('task_poll', api='visual_query'):
+                resp = rate_limited_call('visual_query', visual_service.cv_sync2async_get_result, form)
             return resp
             
         except Exception as e:
@@ -110,7 +129,7 @@ def query_video_task_status(task_id, max_retries=2, retry_delay=1):
             client = Ark(api_key=ARK_CONFIG["api_key"])
             
             # 查询任务状态
-            resp = client.content_generation.tasks.get(task_id=task_id)
+            resp = rate_limited_call('ark_video_query', client.content_generation.tasks.get, task_id=task_id)
             return resp
             
         except Exception as e:
@@ -147,11 +166,14 @@ def download_image(image_data_base64, output_path):
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
         
         # 解码并保存图片
-        image_data = base64.b64decode(image_data_base64)
-        with open(output_path, 'wb') as f:
-            f.write(image_data)
+        with span('image_save', bytes=len(image_data_base64) * 3 // 4, **path_attributes(output_path)):
+            image_data = base64.b64decode(image_data_base64)
+            store_bytes(image_data, output_path)
         
         print(f"图片已保存: {output_path}")
+        
+        # 生成渲染用派生图和缩略图
+        ingest_image(output_path)
         return True
         
     except Exception as e:
@@ -182,17 +204,20 @@ def download_video(video_url, output_path):
         print(f"下载视频失败 {output_path}: {e}")
         return False
 
-def move_task_to_done(task_file, done_tasks_dir='done_tasks'):
+def move_task_to_done(task_file, done_tasks_dir=None):
     """
     将任务文件移动到done_tasks目录
     
     Args:
         task_file: 任务文件路径
-        done_tasks_dir: 完成任务目录
+        done_tasks_dir: 完成任务目录，默认为项目根目录下的done_tasks
     
     Returns:
         bool: 是否成功移动
     """
+    if done_tasks_dir is None:
+        done_tasks_dir = DEFAULT_DONE_TASKS_DIR
+    
     try:
         # 确保done_tasks目录存在
         os.makedirs(done_tasks_dir, exist_ok=True)
@@ -226,7 +251,7 @@ def process_completed_image_task(task_info, task_file, resp_data):
         if 'binary_data_base64' in resp_data and resp_data['binary_data_base64']:
             # 下载图片
             image_data = resp_data['binary_data_base64'][0]
-            output_path = task_info['output_path']
+            output_path = resolve_project_path(task_info['output_path'])
             
             if download_image(image_data, output_path):
                 # 更新任务状态
@@ -269,9 +294,12 @@ def process_completed_video_task(task_info, task_file, resp):
         if hasattr(resp, 'content') and hasattr(resp.content, 'video_url'):
             # 下载视频
             video_url = resp.content.video_url
-            output_path = task_info['output_path']
+            output_path = resolve_project_path(task_info['output_path'])
             
             if download_video(video_url, output_path):
+                # 写入片段缓存，并分发给等待同一片段的其他输出路径
+                record_task_completed(task_info, output_path)
+                
                 # 更新任务状态
                 task_info['status'] = 'completed'
                 task_info['completed_time'] = time.time()
@@ -309,6 +337,7 @@ def process_failed_task(task_info, task_file, error_msg):
     task_info['error_msg'] = error_msg
     task_info['failed_time'] = time.time()
     save_task_info(task_info, task_file)
+    record_task_failed(task_info)
     
     print(f"✗ 任务失败: {task_info['filename']} - {error_msg}")
 
@@ -3,13 +3,18 @@
 """
 清理regenerated文件脚本
 用于删除Character_Images目录下的regenerated文件和备份文件
+这些文件通常与原图共用素材存储中的同一对象，删除文件名只会减少引用，
+实际空间由 asset_store.py gc 按引用计数回收（执行模式下删除后自动运行）
 """
 
 import os
-import glob
 from pathlib import Path
 from typing import List
 
+from asset_store import format_bytes, get_asset_store
+
+CHARACTER_IMAGES_DIR = Path(__file__).resolve().parent / "Character_Images"
+
 def find_files_to_cleanup() -> tuple[List[str], List[str]]:
     """
     查找需要清理的文件
@@ -17,7 +22,7 @@ def find_files_to_cleanup() -> tuple[List[str], List[str]]:
     Returns:
         tuple[List[str], List[str]]: (regenerated_files, backup_files)
     """
-    character_images_dir = Path("/Users/xunan/Projects/wrmVideo/Character_Images")
+    character_images_dir = CHARACTER_IMAGES_DIR
     
     # 查找所有regenerated文件
     regenerated_files = list(character_images_dir.rglob("*_regenerated.jpeg"))
@@ -140,12 +145,17 @@ def main():
     if cleanup_backup:
         total_deleted += cleanup_files(backup_files, "备份", dry_run)
     
+    # 回收不再被任何文件名引用的素材对象
+    gc_stats = get_asset_store().gc(dry_run=dry_run)
+    
     print(f"\n{'=' * 40}")
     if dry_run:
         print(f"试运行完成，共找到 {total_deleted} 个文件可删除")
+        print(f"素材存储中当前可回收 {gc_stats['removed']} 个对象（{format_bytes(gc_stats['freed_bytes'])}）")
         print("💡 如需实际删除，请添加 --execute 参数")
     else:
         print(f"清理完成，共删除 {total_deleted} 个文件")
+        print(f"素材存储回收 {gc_stats['removed']} 个对象，释放 {format_bytes(gc_stats['freed_bytes'])}")
     print(f"{'=' * 40}")
 
 if __name__ == "__main__":
@@ -3,6 +3,7 @@
 concat_finish_video.py
 
 拼接每个chapter下面的narration视频文件，配上随机选择的BGM，并在最后拼接finish.mp4文件。
+BGM由bgm_bed.py的音床服务生成：曲目只解码一次并缓存，章节选用的曲目记录在chapter_xxx_bgm.json中。
 
 新逻辑：
 - 收集合并的narration_01-03视频（chapter_xxx_narration_01-03_video.mp4）
@@ -14,16 +15,22 @@ concat_finish_video.py
     python concat_finish_video.py data/001 --chapter 001      # 处理指定章节
     python concat_finish_video.py data/001 --chapter 001,002  # 处理多个章节
     python concat_finish_video.py data/001 -c 001-005         # 处理章节范围
+    python concat_finish_video.py data/001 -c 001 --reroll-bgm  # 重新随机选择BGM
 """
 
 import os
 import sys
 import subprocess
-import random
 import glob
 import argparse
 from pathlib import Path
 import ffmpeg
+from bgm_bed import BgmBedService, SAMPLE_RATE as BGM_SAMPLE_RATE, CHANNELS as BGM_CHANNELS, PCM_FORMAT as BGM_PCM_FORMAT
+from pipeline_trace import traced
+from ffmpeg_runner import run_ffmpeg
+from audio_analysis import analyze_audio, analyze_pcm, bgm_gain_db
+from chapter_timeline import recorded_video_duration
+from video_contract import ContractViolation, audio_encode_args, check_copy_concat, ensure_conforming, normalized_asset
 
 def check_macos_videotoolbox():
     """检测macOS系统是否支持VideoToolbox硬件编码器"""
@@ -123,8 +130,11 @@ def check_nvidia_gpu():
 
 def get_ffmpeg_gpu_params():
     """获取FFmpeg GPU优化参数 - 支持L4 GPU优化配置和macOS VideoToolbox"""
+    # 设置 FFMPEG_FORCE_CPU=1 时跳过硬件检测，固定使用CPU编码（基准测试需要可比的结果）
+    force_cpu = os.environ.get('FFMPEG_FORCE_CPU') == '1'
+    
     # 首先检测macOS VideoToolbox
-    videotoolbox_available, videotoolbox_info = check_macos_videotoolbox()
+    videotoolbox_available, videotoolbox_info = (False, None) if force_cpu else check_macos_videotoolbox()
     if videotoolbox_available:
         # 优先使用h264_videotoolbox，如果不可用则使用hevc_videotoolbox
         if videotoolbox_info['h264']:
@@ -149,8 +159,8 @@ def get_ffmpeg_gpu_params():
     is_l4_gpu = False
     
     try:
-        result = subprocess.run(['nvidia-smi'], capture_output=True, text=True, timeout=10)
-        if result.returncode == 0:
+        result = None if force_cpu else subprocess.run(['nvidia-smi'], capture_output=True, text=True, timeout=10)
+        if result is not None and result.returncode == 0:
             gpu_available = True
             # 检查是否为L4 GPU
             if 'L4' in result.stdout:
@@ -159,7 +169,7 @@ def get_ffmpeg_gpu_params():
         pass
     
     # 如果没有nvidia-smi，尝试其他检测方法
-    if not gpu_available:
+    if not gpu_available and not force_cpu:
         gpu_available = check_nvidia_gpu()
     
     if gpu_available:
@@ -302,25 +312,6 @@ def parse_chapter_args(chapter_arg):
     
     return sorted(chapters)
 
-def get_available_bgm_files():
-    """获取可用的BGM文件列表"""
-    bgm_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src", "bgm")
-    bgm_files = [
-        "wn1.mp3", "wn3.mp3", "wn4.mp3", "wn5.mp3", "wn6.mp3", 
-        "wn7.mp3", "wn8.mp3", "wn9.mp3", "wn10.mp3", "wn11.mp3", 
-        "wn12.mp3", "wn13.mp3", "wn14.mp3"
-    ]
-    
-    available_files = []
-    for bgm_file in bgm_files:
-        bgm_path = os.path.join(bgm_dir, bgm_file)
-        if os.path.exists(bgm_path):
-            available_files.append(bgm_path)
-        else:
-            print(f"警告: BGM文件不存在: {bgm_path}")
-    
-    return available_files
-
 def collect_chapter_narration_videos(chapter_path, chapter_name):
     """收集单个chapter目录下的narration视频文件
     
@@ -366,10 +357,12 @@ def collect_chapter_narration_videos(chapter_path, chapter_name):
     return video_files
 
 def get_total_video_duration(video_files):
-    """计算所有视频的总时长"""
+    """计算所有视频的总时长（优先使用渲染时记入章节时间线的时长）"""
     total_duration = 0
     for video_file in video_files:
-        width, height, fps, duration = get_video_info(video_file)
+        duration = recorded_video_duration(video_file)
+        if duration is None:
+            width, height, fps, duration = get_video_info(video_file)
         if duration:
             total_duration += duration
         else:
@@ -377,69 +370,11 @@ def get_total_video_duration(video_files):
     
     return total_duration
 
-def create_bgm_audio(bgm_file, target_duration, output_path):
-    """创建与视频时长匹配的BGM音频，支持循环和淡出"""
-    try:
-        # 获取BGM原始时长
-        bgm_duration = get_audio_duration(bgm_file)
-        if bgm_duration <= 0:
-            print(f"错误: 无法获取BGM时长: {bgm_file}")
-            return False
-        
-        print(f"BGM原始时长: {bgm_duration:.2f}s, 目标时长: {target_duration:.2f}s")
-        
-        # 获取GPU优化参数
-        gpu_params = get_ffmpeg_gpu_params()
-        
-        # 构建FFmpeg命令
-        cmd = ["ffmpeg", "-y"]
-        
-        # 添加硬件加速参数（如果可用）
-        if 'hwaccel' in gpu_params:
-            cmd.extend(["-hwaccel", gpu_params['hwaccel']])
-        if 'hwaccel_output_format' in gpu_params:
-            cmd.extend(["-hwaccel_output_format", gpu_params['hwaccel_output_format']])
-        
-        if bgm_duration >= target_duration:
-            # BGM比视频长，直接裁剪并在最后3秒淡出
-            cmd.extend([
-                "-i", bgm_file,
-                "-t", str(target_duration),
-                "-af", f"afade=t=out:st={max(0, target_duration-3)}:d=3",
-                "-c:a", "aac",
-                "-b:a", "128k",
-                output_path
-            ])
-        else:
-            # BGM比视频短，需要循环播放并在最后3秒淡出
-            # 计算需要循环的次数，确保生成足够长的音频
-            loop_count = int(target_duration / bgm_duration) + 1
-            cmd.extend([
-                "-stream_loop", str(loop_count),
-                "-i", bgm_file,
-                "-t", f"{target_duration:.3f}",  # 精确到毫秒
-                "-af", f"afade=t=out:st={max(0, target_duration-3):.3f}:d=3",
-                "-c:a", "aac",
-                "-b:a", "128k",
-                output_path
-            ])
-        
-        print(f"执行BGM处理命令: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=False)
-        
-        if result.returncode != 0:
-            print(f"BGM处理失败: {result.stderr}")
-            return False
-        
-        print(f"BGM音频创建成功: {output_path}")
-        return True
-        
-    except Exception as e:
-        print(f"创建BGM音频时发生错误: {e}")
-        return False
+def concat_videos_with_bgm(video_files, bgm_audio_path, output_path, bgm_pcm=None):
+    """拼接视频并添加BGM，混合原有音频和BGM
 
-def concat_videos_with_bgm(video_files, bgm_audio_path, output_path):
-    """拼接视频并添加BGM，混合原有音频和BGM"""
+    传入bgm_pcm（音床服务生成的int16 PCM数组）时通过stdin管道输入BGM，忽略bgm_audio_path
+    """
     try:
         # 创建临时文件列表
         temp_dir = os.path.dirname(output_path)
@@ -450,57 +385,57 @@ def concat_videos_with_bgm(video_files, bgm_audio_path, output_path):
             for video_file in video_files:
                 f.write(f"file '{os.path.abspath(video_file)}'\n")
         
-        # 获取GPU优化参数
+        # narration视频由add_effects_and_audio按编码约定生成（已含调色和尺寸统一），
+        # 视频流直接复制，只重新混合音频；约定之前生成的旧片段先单独转码
         gpu_params = get_ffmpeg_gpu_params()
+        ensure_conforming(video_files, gpu_params=gpu_params, label='conform_narration')
+        check_copy_concat(video_files)
+        
+        # BGM音量按响度分析结果设置：比narration目标响度低固定差值，无法测量时沿用0.1
+        try:
+            bgm_analysis = analyze_pcm(bgm_pcm, BGM_SAMPLE_RATE) if bgm_pcm is not None else analyze_audio(bgm_audio_path)
+            bgm_gain = bgm_gain_db(bgm_analysis)
+        except Exception as e:
+            print(f"BGM响度分析失败，使用默认音量: {e}")
+            bgm_gain = None
+        bgm_volume = f"{bgm_gain}dB" if bgm_gain is not None else "0.1"
+        print(f"BGM音量: {bgm_volume}")
         
         # 使用FFmpeg拼接视频并混合音频（原有音频+BGM）
         cmd = ["ffmpeg", "-y"]
         
-        # 添加硬件加速参数（如果可用）
-        if 'hwaccel' in gpu_params:
-            cmd.extend(["-hwaccel", gpu_params['hwaccel']])
-        if 'hwaccel_output_format' in gpu_params:
-            cmd.extend(["-hwaccel_output_format", gpu_params['hwaccel_output_format']])
-        
         cmd.extend([
             "-f", "concat",
             "-safe", "0",
-            "-i", concat_list_path,
-            "-i", bgm_audio_path,
-            "-c:v", gpu_params.get('video_codec', 'libx264'),  # 使用GPU编码器或CPU编码器
-            "-filter_complex", "[0:a]dynaudnorm=f=75:g=25:p=0.95:m=10.0:r=0.9:n=1:c=1,volume=1.0[original];[1:a]volume=0.1[bgm];[original][bgm]amix=inputs=2:duration=first:dropout_transition=3[mixed]",
-            "-map", "0:v:0",  # 使用第一个输入的视频流
-            "-map", "[mixed]",  # 使用混合后的音频流
-            "-c:a", "aac",
-            "-b:a", "128k"
+            "-i", concat_list_path
         ])
+        if bgm_pcm is not None:
+            cmd.extend([
+                "-f", BGM_PCM_FORMAT,
+                "-ar", str(BGM_SAMPLE_RATE),
+                "-ac", str(BGM_CHANNELS),
+                "-i", "pipe:0"
+            ])
+        else:
+            cmd.extend(["-i", bgm_audio_path])
         
-        # 统一视频分辨率并居中内容，避免左右偏移与尺寸不一致
-        # 同时降低红色饱和度，让血色不那么显眼
         cmd.extend([
-            "-vf",
-            f"scale={VIDEO_STANDARDS['width']}:{VIDEO_STANDARDS['height']}:force_original_aspect_ratio=decrease,pad={VIDEO_STANDARDS['width']}:{VIDEO_STANDARDS['height']}:(ow-iw)/2:(oh-ih)/2:black,setsar=1,colorchannelmixer=rr=0.8:rg=0.1:rb=0.1:gr=0:gg=1:gb=0:br=0:bg=0:bb=1"
+            "-filter_complex", f"[0:a]dynaudnorm=f=75:g=25:p=0.95:m=10.0:r=0.9:n=1:c=1,volume=1.0[original];[1:a]volume={bgm_volume}[bgm];[original][bgm]amix=inputs=2:duration=first:dropout_transition=3[mixed]",
+            "-map", "0:v:0",  # 使用第一个输入的视频流
+            "-map", "[mixed]",  # 使用混合后的音频流
+            "-c:v", "copy"
         ])
-        
-        # 添加GPU特定的编码参数
-        # 只有非VideoToolbox编码器才添加preset参数
-        if 'preset' in gpu_params and not gpu_params['video_codec'].endswith('_videotoolbox'):
-            cmd.extend(["-preset", gpu_params['preset']])
-        
-        # 添加profile参数（如果有，用于nvenc编码器）
-        if 'profile' in gpu_params and not gpu_params['video_codec'].endswith('_videotoolbox'):
-            cmd.extend(["-profile:v", gpu_params['profile']])
-        
-        if 'tune' in gpu_params:
-            cmd.extend(["-tune", gpu_params['tune']])
-        
-        # 添加额外的优化参数
-        cmd.extend(gpu_params.get('extra_params', []))
+        cmd.extend(audio_encode_args())
         
         cmd.append(output_path)
         
         print(f"执行视频拼接命令: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=False)
+        result = run_ffmpeg(
+            cmd,
+            duration=get_total_video_duration(video_files),
+            label='concat_bgm',
+            input=bgm_pcm.tobytes() if bgm_pcm is not None else None
+        )
         
         if result.returncode != 0:
             print(f"视频拼接失败: {result.stderr}")
@@ -570,7 +505,7 @@ def super_compress_video(input_path, output_path):
         cmd.append(output_path)
         
         print(f"执行超级压缩命令: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=False)
+        result = run_ffmpeg(cmd, duration=get_video_info(input_path)[3], label='super_compress')
         
         if result.returncode != 0:
             print(f"超级压缩失败: {result.stderr}")
@@ -635,7 +570,7 @@ def compress_final_video(input_path, output_path):
         cmd.append(output_path)
         
         print(f"执行最终压缩命令: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=False)
+        result = run_ffmpeg(cmd, duration=get_video_info(input_path)[3], label='compress')
         
         if result.returncode != 0:
             print(f"最终压缩失败: {result.stderr}")
@@ -660,6 +595,9 @@ def add_finish_video(main_video_path, finish_video_path, final_output_path):
             f.write(f"file '{os.path.abspath(main_video_path)}'\n")
             f.write(f"file '{os.path.abspath(finish_video_path)}'\n")
         
+        # 片尾已按编码约定预转码，确认两段参数一致后再流复制
+        check_copy_concat([main_video_path, finish_video_path])
+        
         # 使用FFmpeg拼接，使用流复制避免重新编码导致的时长问题
         cmd = [
             "ffmpeg", "-y",
@@ -672,7 +610,8 @@ def add_finish_video(main_video_path, finish_video_path, final_output_path):
         ]
         
         print(f"执行最终拼接命令: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=False)
+        result = run_ffmpeg(cmd, duration=get_total_video_duration([main_video_path, finish_video_path]),
+                            label='add_finish')
         
         if result.returncode != 0:
             print(f"最终拼接失败: {result.stderr}")
@@ -685,11 +624,15 @@ def add_finish_video(main_video_path, finish_video_path, final_output_path):
         print(f"最终视频生成成功: {final_output_path}")
         return True
         
+    except ContractViolation as e:
+        print(f"片尾与主视频编码参数不一致，不能流复制拼接: {e}")
+        return False
     except Exception as e:
         print(f"添加finish视频时发生错误: {e}")
         return False
 
-def process_single_chapter(data_dir, chapter_dir):
+@traced('finish', path_arg=('data_dir', 'chapter_dir'))
+def process_single_chapter(data_dir, chapter_dir, reroll_bgm=False):
     """处理单个chapter，生成该chapter的完整视频"""
     chapter_path = os.path.join(data_dir, chapter_dir)
     chapter_name = chapter_dir  # 例如: chapter_001
@@ -708,35 +651,35 @@ def process_single_chapter(data_dir, chapter_dir):
     total_duration = get_total_video_duration(video_files)
     print(f"章节 {chapter_name} 视频总时长: {total_duration:.2f}s ({total_duration/60:.2f}分钟)")
     
-    # 3. 随机选择BGM
-    bgm_files = get_available_bgm_files()
-    if not bgm_files:
+    # 3. 选择BGM（优先复用章节已记录的曲目）
+    bgm_service = BgmBedService()
+    selected_bgm = bgm_service.choose_track(chapter_path, chapter_name, reroll=reroll_bgm)
+    if not selected_bgm:
         print("错误: 没有找到可用的BGM文件")
         return False
     
-    selected_bgm = random.choice(bgm_files)
-    print(f"为章节 {chapter_name} 随机选择的BGM: {os.path.basename(selected_bgm)}")
-    
     # 4. 创建输出文件路径
-    temp_bgm_path = os.path.join(chapter_path, f"{chapter_name}_temp_bgm_audio.aac")
     main_video_path = os.path.join(chapter_path, f"{chapter_name}_main_video.mp4")
     final_output_path = os.path.join(chapter_path, f"{chapter_name}_complete_video.mp4")
     
     try:
-        # 5. 创建匹配时长的BGM音频
-        print(f"\n=== 为章节 {chapter_name} 创建BGM音频 ===")
-        if not create_bgm_audio(selected_bgm, total_duration, temp_bgm_path):
-            print(f"错误: 章节 {chapter_name} BGM音频创建失败")
+        # 5. 从缓存的BGM生成匹配时长的音床
+        print(f"\n=== 为章节 {chapter_name} 创建BGM音床 ===")
+        try:
+            bgm_pcm = bgm_service.render_bed(selected_bgm, total_duration)
+        except Exception as e:
+            print(f"错误: 章节 {chapter_name} BGM音床创建失败: {e}")
             return False
+        print(f"BGM音床时长: {len(bgm_pcm) / BGM_SAMPLE_RATE:.2f}s")
         
         # 6. 拼接该章节的narration视频并添加BGM
         print(f"\n=== 拼接章节 {chapter_name} 的narration视频 ===")
-        if not concat_videos_with_bgm(video_files, temp_bgm_path, main_video_path):
+        if not concat_videos_with_bgm(video_files, None, main_video_path, bgm_pcm=bgm_pcm):
             print(f"错误: 章节 {chapter_name} 视频拼接失败")
             return False
         
-        # 7. 添加finish.mp4（使用兼容版本）
-        finish_video_path = "src/banner/finish_compatible.mp4"
+        # 7. 添加finish.mp4（使用兼容版本，按编码约定预转码并缓存）
+        finish_video_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src", "banner", "finish_compatible.mp4")
         if not os.path.exists(finish_video_path):
             print(f"警告: finish.mp4文件不存在: {finish_video_path}")
             print(f"跳过finish视频拼接，使用主视频作为章节 {chapter_name} 的最终输出")
@@ -744,13 +687,12 @@ def process_single_chapter(data_dir, chapter_dir):
             shutil.copy2(main_video_path, final_output_path)
         else:
             print(f"\n=== 为章节 {chapter_name} 添加finish视频 ===")
+            finish_video_path = normalized_asset(finish_video_path, gpu_params=get_ffmpeg_gpu_params())
             if not add_finish_video(main_video_path, finish_video_path, final_output_path):
                 print(f"错误: 章节 {chapter_name} finish视频拼接失败")
                 return False
         
         # 8. 清理临时文件
-        if os.path.exists(temp_bgm_path):
-            os.remove(temp_bgm_path)
         if os.path.exists(main_video_path) and os.path.exists(final_output_path):
             os.remove(main_video_path)
         
@@ -824,6 +766,7 @@ def main():
   %(prog)s data/001 --chapter 001      # 处理指定章节
   %(prog)s data/001 --chapter 001,002  # 处理多个章节
   %(prog)s data/001 -c 001-005         # 处理章节范围
+  %(prog)s data/001 -c 001 --reroll-bgm  # 重新随机选择BGM
         """
     )
     
@@ -837,6 +780,11 @@ def main():
         action='store_true',
         help='列出数据目录中所有可用的章节'
     )
+    parser.add_argument(
+        '--reroll-bgm',
+        action='store_true',
+        help='忽略章节已记录的BGM，重新随机选择'
+    )
     
     args = parser.parse_args()
     
@@ -893,7 +841,7 @@ def main():
     failed_chapters = []
     
     for chapter_dir in chapter_dirs:
-        if process_single_chapter(args.data_dir, chapter_dir):
+        if process_single_chapter(args.data_dir, chapter_dir, reroll_bgm=args.reroll_bgm):
             success_count += 1
         else:
             failed_chapters.append(chapter_dir)
@@ -21,6 +21,10 @@ import subprocess
 from pathlib import Path
 from typing import List
 
+from ffmpeg_runner import run_ffmpeg
+from video_contract import (CONTRACT, audio_encode_args, check_copy_concat, conform_video,
+                            hwaccel_args, probe_media, video_encode_args)
+
 def check_macos_videotoolbox():
     """检测macOS系统是否支持VideoToolbox硬件编码器"""
     try:
@@ -260,22 +264,17 @@ TEMP_DIR_NAME = "temp_concat_first_video"
 
 # ------------------------- 工具函数 ------------------------- #
 
-def run_cmd(cmd: List[str]) -> None:
-    """运行 shell 命令并在失败时抛异常。"""
-    try:
-        subprocess.run(cmd, check=True)
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError(f"命令执行失败: {' '.join(cmd)}\n{e}")
+def run_cmd(cmd: List[str], label: str | None = None) -> None:
+    """运行 ffmpeg 命令（带进度和资源遥测）并在失败时抛异常。"""
+    result = run_ffmpeg(cmd, label=label, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"命令执行失败: {' '.join(cmd)}\n{result.stderr[-2000:]}")
 
 
 def generate_overlay_video(video2: Path, temp_dir: Path) -> Path:
     """在 video2 上叠加 fuceng1.mov 转场特效和 rmxs.png 角标，返回处理后的视频路径。"""
     output_path = temp_dir / f"{video2.stem}_overlay.mp4"
-    width, height, fps = (
-        VIDEO_STANDARDS["width"],
-        VIDEO_STANDARDS["height"],
-        VIDEO_STANDARDS["fps"],
-    )
+    width, height = VIDEO_STANDARDS["width"], VIDEO_STANDARDS["height"]
 
     # 检查是否有转场特效和角标
     has_fuceng = FUCENG_PATH.exists()
@@ -328,15 +327,17 @@ def generate_overlay_video(video2: Path, temp_dir: Path) -> Path:
             filter_parts[-1] = filter_parts[-1].replace("[v1]", "[v]")
             current_video = "[v]"
     
+    # 最后统一为编码约定的像素格式
+    filter_parts.append(f"{current_video}format={CONTRACT['pix_fmt']}[vout]")
     filter_complex = ";".join(filter_parts)
 
+    # 没有音轨时补静音轨，保证与 video_1 能直接流复制拼接
+    has_audio = bool(probe_media(str(video2))['audio'])
+
     cmd = ["ffmpeg", "-y"]
     
     # 添加硬件加速参数（如果可用）
-    if 'hwaccel' in gpu_params:
-        cmd.extend(["-hwaccel", gpu_params['hwaccel']])
-    if 'hwaccel_output_format' in gpu_params:
-        cmd.extend(["-hwaccel_output_format", gpu_params['hwaccel_output_format']])
+    cmd.extend(hwaccel_args(gpu_params))
     
     # 添加输入文件
     cmd.extend(["-i", str(video2)])
@@ -344,40 +345,31 @@ def generate_overlay_video(video2: Path, temp_dir: Path) -> Path:
         cmd.extend(["-i", str(FUCENG_PATH)])
     if has_rmxs:
         cmd.extend(["-i", str(RMXS_PATH)])
+    if not has_audio:
+        cmd.extend(["-f", "lavfi", "-i",
+                    f"anullsrc=channel_layout={CONTRACT['channel_layout']}:sample_rate={CONTRACT['audio_rate']}"])
     
     cmd.extend([
         "-filter_complex", filter_complex,
-        "-map", "[v]",
-        "-map", "0:a?",  # 若存在音轨则保留
-        "-c:v", gpu_params.get('video_codec', VIDEO_STANDARDS["video_codec"]),
-        "-c:a", VIDEO_STANDARDS["audio_codec"],
-        "-r", str(fps)
+        "-map", "[vout]",
+        "-map", "0:a:0" if has_audio else f"{input_idx + int(has_rmxs)}:a:0",
     ])
     
-    # 添加GPU特定的编码参数
-    # 只有非VideoToolbox编码器才添加preset参数
-    if 'preset' in gpu_params and not gpu_params['video_codec'].endswith('_videotoolbox'):
-        cmd.extend(["-preset", gpu_params['preset']])
-    
-    # 添加profile参数（如果有，用于nvenc编码器）
-    if 'profile' in gpu_params and not gpu_params['video_codec'].endswith('_videotoolbox'):
-        cmd.extend(["-profile:v", gpu_params['profile']])
-    
-    if 'tune' in gpu_params:
-        cmd.extend(["-tune", gpu_params['tune']])
-    
-    # 添加额外的优化参数
-    cmd.extend(gpu_params.get('extra_params', []))
-    
-    cmd.extend(["-pix_fmt", "yuv420p", str(output_path)])
+    # 编码约定参数（编码器、帧率、GOP、profile、像素格式、音频采样率和声道）
+    cmd.extend(video_encode_args(gpu_params))
+    cmd.extend(audio_encode_args())
+    if not has_audio:
+        cmd.append("-shortest")
+    cmd.append(str(output_path))
 
     print("执行转场叠加...", " ".join(cmd))
-    run_cmd(cmd)
+    run_cmd(cmd, label='overlay')
     return output_path
 
 
 def concat_videos(video1: Path, video2: Path, output: Path) -> None:
-    """利用 concat demuxer 无损拼接两个 mp4（需封装相同编码）。"""
+    """利用 concat demuxer 无损拼接两个 mp4（需封装相同编码，拼接前按编码约定校验）。"""
+    check_copy_concat([str(video1), str(video2)])
     concat_list = output.parent / (output.stem + "_list.txt")
     concat_list.write_text(f"file '{video1.resolve()}'\nfile '{video2.resolve()}'\n", encoding="utf-8")
 
@@ -395,7 +387,7 @@ def concat_videos(video1: Path, video2: Path, output: Path) -> None:
         str(output),
     ]
     print("执行视频拼接...", " ".join(cmd))
-    run_cmd(cmd)
+    run_cmd(cmd, label='concat')
     concat_list.unlink(missing_ok=True)
 
 # ------------------------- 主逻辑 ------------------------- #
@@ -420,42 +412,10 @@ def process_chapter(chapter_dir: Path) -> None:
     # 获取GPU优化参数
     gpu_params = get_ffmpeg_gpu_params()
     
-    # 统一分辨率与帧率到 video1
+    # 按编码约定统一 video1 的分辨率、帧率和编码参数
     scaled_video1 = temp_dir / f"{video1.stem}_scaled.mp4"
-    cmd_scale_v1 = ["ffmpeg", "-y"]
-    
-    # 添加硬件加速参数（如果可用）
-    if 'hwaccel' in gpu_params:
-        cmd_scale_v1.extend(["-hwaccel", gpu_params['hwaccel']])
-    if 'hwaccel_output_format' in gpu_params:
-        cmd_scale_v1.extend(["-hwaccel_output_format", gpu_params['hwaccel_output_format']])
-    
-    cmd_scale_v1.extend([
-        "-i", str(video1),
-        "-vf", f"scale={VIDEO_STANDARDS['width']}:{VIDEO_STANDARDS['height']}:force_original_aspect_ratio=decrease,pad={VIDEO_STANDARDS['width']}:{VIDEO_STANDARDS['height']}:(ow-iw)/2:(oh-ih)/2:black",
-        "-c:v", gpu_params.get('video_codec', VIDEO_STANDARDS["video_codec"]),
-        "-c:a", VIDEO_STANDARDS["audio_codec"],
-        "-r", str(VIDEO_STANDARDS["fps"])
-    ])
-    
-    # 添加GPU特定的编码参数
-    # 只有非VideoToolbox编码器才添加preset参数
-    if 'preset' in gpu_params and not gpu_params['video_codec'].endswith('_videotoolbox'):
-        cmd_scale_v1.extend(["-preset", gpu_params['preset']])
-    
-    # 添加profile参数（如果有，用于nvenc编码器）
-    if 'profile' in gpu_params and not gpu_params['video_codec'].endswith('_videotoolbox'):
-        cmd_scale_v1.extend(["-profile:v", gpu_params['profile']])
-    
-    if 'tune' in gpu_params:
-        cmd_scale_v1.extend(["-tune", gpu_params['tune']])
-    
-    # 添加额外的优化参数
-    cmd_scale_v1.extend(gpu_params.get('extra_params', []))
-    
-    cmd_scale_v1.extend(["-pix_fmt", "yuv420p", str(scaled_video1)])
-    print("统一 video_1 分辨率...", " ".join(cmd_scale_v1))
-    run_cmd(cmd_scale_v1)
+    print("统一 video_1 分辨率...")
+    conform_video(str(video1), str(scaled_video1), gpu_params=gpu_params, fit='pad', label='scale_video_1')
 
     # 对 video2 处理叠加 & 分辨率
     processed_video2 = generate_overlay_video(video2, temp_dir)
@@ -466,40 +426,8 @@ def process_chapter(chapter_dir: Path) -> None:
     else:
         # 若未叠加则仍需缩放裁剪
         scaled_video2 = temp_dir / f"{video2.stem}_scaled.mp4"
-        cmd_scale_v2 = ["ffmpeg", "-y"]
-        
-        # 添加硬件加速参数（如果可用）
-        if 'hwaccel' in gpu_params:
-            cmd_scale_v2.extend(["-hwaccel", gpu_params['hwaccel']])
-        if 'hwaccel_output_format' in gpu_params:
-            cmd_scale_v2.extend(["-hwaccel_output_format", gpu_params['hwaccel_output_format']])
-        
-        cmd_scale_v2.extend([
-            "-i", str(video2),
-            "-vf", f"scale={VIDEO_STANDARDS['width']}:{VIDEO_STANDARDS['height']}:force_original_aspect_ratio=decrease,pad={VIDEO_STANDARDS['width']}:{VIDEO_STANDARDS['height']}:(ow-iw)/2:(oh-ih)/2:black",
-            "-c:v", gpu_params.get('video_codec', VIDEO_STANDARDS["video_codec"]),
-            "-c:a", VIDEO_STANDARDS["audio_codec"],
-            "-r", str(VIDEO_STANDARDS["fps"])
-        ])
-        
-        # 添加GPU特定的编码参数
-        # 只有非VideoToolbox编码器才添加preset参数
-        if 'preset' in gpu_params and not gpu_params['video_codec'].endswith('_videotoolbox'):
-            cmd_scale_v2.extend(["-preset", gpu_params['preset']])
-        
-        # 添加profile参数（如果有，用于nvenc编码器）
-        if 'profile' in gpu_params and not gpu_params['video_codec'].endswith('_videotoolbox'):
-            cmd_scale_v2.extend(["-profile:v", gpu_params['profile']])
-        
-        if 'tune' in gpu_params:
-            cmd_scale_v2.extend(["-tune", gpu_params['tune']])
-        
-        # 添加额外的优化参数
-        cmd_scale_v2.extend(gpu_params.get('extra_params', []))
-        
-        cmd_scale_v2.extend(["-pix_fmt", "yuv420p", str(scaled_video2)])
-        print("统一 video_2 分辨率...", " ".join(cmd_scale_v2))
-        run_cmd(cmd_scale_v2)
+        print("统一 video_2 分辨率...")
+        conform_video(str(video2), str(scaled_video2), gpu_params=gpu_params, fit='pad', label='scale_video_2')
 
     concat_videos(scaled_video1, scaled_video2, output_video)
     print(f"✅ 章节合并完成: {output_video}")
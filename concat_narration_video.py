@@ -21,6 +21,12 @@ import glob
 import random
 import subprocess
 from pathlib import Path
+from pipeline_trace import traced
+from ffmpeg_runner import run_ffmpeg, run_ffmpeg_stream
+from video_contract import audio_encode_args, contract_filter, video_encode_args
+from audio_analysis import analyze_audio, effect_gain_db, narration_gain_db, trimmed_duration
+from image_derivatives import render_image_path
+from chapter_timeline import get_timeline, merged_dialogues, narration_entry, record_video
 
 def check_macos_videotoolbox():
     """检测macOS系统是否支持VideoToolbox硬件编码器"""
@@ -120,8 +126,11 @@ def check_nvidia_gpu():
 
 def get_ffmpeg_gpu_params():
     """获取FFmpeg GPU优化参数 - 支持L4 GPU优化配置和macOS VideoToolbox"""
+    # 设置 FFMPEG_FORCE_CPU=1 时跳过硬件检测，固定使用CPU编码（基准测试需要可比的结果）
+    force_cpu = os.environ.get('FFMPEG_FORCE_CPU') == '1'
+    
     # 首先检测macOS VideoToolbox
-    videotoolbox_available, videotoolbox_info = check_macos_videotoolbox()
+    videotoolbox_available, videotoolbox_info = (False, None) if force_cpu else check_macos_videotoolbox()
     if videotoolbox_available:
         # 优先使用h264_videotoolbox，如果不可用则使用hevc_videotoolbox
         if videotoolbox_info['h264']:
@@ -146,8 +155,8 @@ def get_ffmpeg_gpu_params():
     is_l4_gpu = False
     
     try:
-        result = subprocess.run(['nvidia-smi'], capture_output=True, text=True, timeout=10)
-        if result.returncode == 0:
+        result = None if force_cpu else subprocess.run(['nvidia-smi'], capture_output=True, text=True, timeout=10)
+        if result is not None and result.returncode == 0:
             gpu_available = True
             # 检查是否为L4 GPU
             if 'L4' in result.stdout:
@@ -156,7 +165,7 @@ def get_ffmpeg_gpu_params():
         pass
     
     # 如果没有nvidia-smi，尝试其他检测方法
-    if not gpu_available:
+    if not gpu_available and not force_cpu:
         gpu_available = check_nvidia_gpu()
     
     if gpu_available:
@@ -319,8 +328,8 @@ def get_file_size_mb(file_path):
         print(f"获取文件大小失败: {e}")
         return 0
 
-def check_video_standards(video_path):
-    """检查视频是否符合输出标准（从 gen_video.py 复制）"""
+def check_video_standards(video_path, chapter_path=None):
+    """检查视频是否符合输出标准（从 gen_video.py 复制），指定章节目录时把时长记入章节时间线"""
     try:
         # 检查文件大小
         file_size_mb = get_file_size_mb(video_path)
@@ -333,6 +342,10 @@ def check_video_standards(video_path):
             
         print(f"视频参数: {width}x{height}px, {fps}fps, {duration:.2f}s")
         
+        # 拼接阶段按文件状态复用这里测得的时长，不再逐个probe
+        if chapter_path:
+            record_video(chapter_path, video_path, duration)
+        
         # 检查时长（仅提醒）
         if duration < VIDEO_STANDARDS['min_duration_warning']:
             print(f"⚠️  提醒: 视频时长 {duration:.2f}s 小于建议的 {VIDEO_STANDARDS['min_duration_warning']}s (3分钟)")
@@ -533,7 +546,7 @@ def get_sound_effects_for_narration(dialogues, narration_num, work_dir):
     
     return sound_effects
 
-def merge_ass_files(chapter_path, narration_nums, output_path):
+def merge_ass_files(chapter_path, narration_nums, output_path, timeline=None):
     """
     合并多个ASS文件为一个
     
@@ -541,6 +554,7 @@ def merge_ass_files(chapter_path, narration_nums, output_path):
         chapter_path: 章节目录路径
         narration_nums: narration编号列表（如 ["01", "02", "03"]）
         output_path: 输出ASS文件路径
+        timeline: 章节时间线，提供时直接使用其中的对话，不再解析各ASS文件
     
     Returns:
         bool: 是否成功
@@ -552,6 +566,15 @@ def merge_ass_files(chapter_path, narration_nums, output_path):
         all_dialogues = []
         current_time_offset = 0.0
         
+        if timeline is not None:
+            merged = merged_dialogues(timeline, narration_nums)
+            if not merged:
+                print(f"章节时间线中缺少 narration_{'/'.join(narration_nums)} 的对话")
+                return False
+            all_dialogues = timeline_dialogues(merged)
+            current_time_offset = max(d['end_time'] for d in all_dialogues)
+            narration_nums = []
+        
         for narration_num in narration_nums:
             ass_file = os.path.join(chapter_path, f"{chapter_name}_narration_{narration_num}.ass")
             if not os.path.exists(ass_file):
@@ -594,7 +617,7 @@ def merge_ass_files(chapter_path, narration_nums, output_path):
                 end_time_str = format_ass_time(dialogue['end_time'])
                 f.write(f"Dialogue: 0,{start_time_str},{end_time_str},Default,,0,0,0,,{dialogue['text']}\n")
         
-        print(f"成功合并 {len(narration_nums)} 个ASS文件到: {output_path}")
+        print(f"成功合并ASS文件到: {output_path}")
         print(f"总时长: {current_time_offset:.2f}秒, 总对话数: {len(all_dialogues)}")
         return True
         
@@ -615,6 +638,13 @@ def merge_mp3_files(chapter_path, narration_nums, output_path):
         bool: 是否成功
     """
     chapter_name = os.path.basename(chapter_path)
+    mp3_files = [os.path.join(chapter_path, f"{chapter_name}_narration_{narration_num}.mp3") for narration_num in narration_nums]
+    
+    # 合并结果比所有输入都新时直接复用
+    if os.path.exists(output_path) and all(os.path.exists(mp3_file) for mp3_file in mp3_files):
+        if os.path.getmtime(output_path) >= max(os.path.getmtime(mp3_file) for mp3_file in mp3_files):
+            print(f"合并MP3已是最新，直接使用: {output_path}")
+            return True
     
     try:
         # 创建临时文件列表
@@ -636,7 +666,7 @@ def merge_mp3_files(chapter_path, narration_nums, output_path):
             output_path
         ]
         
-        result = subprocess.run(cmd, capture_output=True, text=False)
+        result = run_ffmpeg(cmd, label='merge_narration')
         
         # 清理临时文件
         if os.path.exists(temp_list_file):
@@ -719,6 +749,35 @@ def parse_ass_dialogues(ass_file_path):
         print(f"解析ASS文件失败: {e}")
         return []
 
+def load_timeline_entry(chapter_path, narration_num, work_dir):
+    """
+    从章节时间线读取narration的时长、对话、增益和音效（时间线失效时重建）
+    
+    Returns:
+        dict: 时间线条目，缺少该narration或时间线无法生成时返回None
+    """
+    try:
+        entry = narration_entry(get_timeline(chapter_path, work_dir), narration_num)
+    except Exception as e:
+        print(f"读取章节时间线失败: {e}")
+        return None
+    if entry is None:
+        print(f"章节时间线中没有 narration_{narration_num}")
+        return None
+    if entry['audio_duration'] <= 0:
+        print(f"无法获取音频时长: {entry['audio']}")
+        return None
+    if entry['ass_duration'] <= 0 or not entry['dialogues']:
+        print(f"无法解析ASS文件: {entry['ass']}")
+        return None
+    return entry
+
+def timeline_dialogues(dialogues):
+    """
+    时间线中的 [开始, 结束, 文本] 对话转换为parse_ass_dialogues的格式
+    """
+    return [{'start_time': start, 'end_time': end, 'text': text} for start, end, text in dialogues]
+
 def create_image_video_with_effects(image_path, output_path, duration, width=720, height=1280, fps=30):
     """
     创建带有动态效果的图片视频
@@ -737,6 +796,9 @@ def create_image_video_with_effects(image_path, output_path, duration, width=720
     print(f"创建图片视频: {image_path} -> {output_path}, 时长: {duration}s")
     
     try:
+        # 优先使用下载时生成的画布尺寸派生图，避免每次渲染解码和缩放原始分辨率大图
+        source_path = render_image_path(image_path, width, height)
+        
         # 定义Ken Burns动态效果（仅上下或左右移动，不含旋转/斜线）
         total_frames = int(duration * fps)
         effects = [
@@ -770,7 +832,7 @@ def create_image_video_with_effects(image_path, output_path, duration, width=720
             cmd.extend(['-hwaccel_output_format', gpu_params['hwaccel_output_format']])
         
         cmd.extend([
-            '-loop', '1', '-i', image_path,
+            '-loop', '1', '-i', source_path,
             '-t', str(duration),
             '-vf', f'scale={width}:{height}:force_original_aspect_ratio=increase,crop={width}:{height},{selected_effect}',
             '-c:v', gpu_params['video_codec'], 
@@ -797,7 +859,7 @@ def create_image_video_with_effects(image_path, output_path, duration, width=720
         
         cmd.append(output_path)
         
-        result = subprocess.run(cmd, capture_output=True, text=False)
+        result = run_ffmpeg(cmd, duration=duration, label='base_video')
         if result.returncode != 0:
             print(f"FFmpeg错误: {result.stderr}")
             return False
@@ -845,16 +907,12 @@ def create_first_narration_video(chapter_path, work_dir):
         print(f"video_1文件不存在: {video_1_file}")
         return None
     
-    # 获取音频时长和字幕时长
-    audio_duration = get_audio_duration(mp3_file)
-    if audio_duration <= 0:
-        print(f"无法获取音频时长: {mp3_file}")
-        return None
-    
-    ass_duration = get_ass_duration(ass_file)
-    if ass_duration <= 0:
-        print(f"无法获取ASS字幕时长: {ass_file}")
+    # 从章节时间线读取音频时长、字幕时长和对话时间戳
+    entry = load_timeline_entry(chapter_path, "01", work_dir)
+    if entry is None:
         return None
+    audio_duration = entry['audio_duration']
+    ass_duration = entry['ass_duration']
     
     # 使用音频时长作为视频时长，确保音频不被截断
     video_duration = audio_duration
@@ -862,12 +920,6 @@ def create_first_narration_video(chapter_path, work_dir):
     print(f"音频时长: {audio_duration:.2f}s, 字幕时长: {ass_duration:.2f}s")
     print(f"使用视频时长: {video_duration:.2f}s (以音频时长为准，确保音频完整)")
     
-    # 解析ASS文件获取对话时间戳
-    dialogues = parse_ass_dialogues(ass_file)
-    if not dialogues:
-        print(f"无法解析ASS文件: {ass_file}")
-        return None
-    
     # 创建视频片段列表 - 使用video_1作为基础视频
     video_segments = []
     video_segments.append({
@@ -907,7 +959,7 @@ def create_first_narration_video(chapter_path, work_dir):
                                             hwaccel=gpu_params['hwaccel'],
                                             hwaccel_output_format=gpu_params['hwaccel_output_format'])
                 
-                stream.output(temp_video, **output_params).overwrite_output().run(quiet=True)
+                run_ffmpeg_stream(stream.output(temp_video, **output_params).overwrite_output(), label='trim_segment')
                 segment_files.append(temp_video)
             except Exception as e:
                 print(f"裁剪视频失败: {e}")
@@ -925,11 +977,9 @@ def create_first_narration_video(chapter_path, work_dir):
     # 收集片段时长信息
     segment_durations = [segment['duration'] for segment in video_segments]
     
-    # 获取音效列表
-    sound_effects = get_sound_effects_for_narration(dialogues, "01", work_dir)
-    
-    # 添加转场、水印、字幕和音频
-    final_video = add_effects_and_audio(base_video, output_video, ass_file, mp3_file, work_dir, segment_durations, sound_effects)
+    # 添加转场、水印、字幕和音频（音效和增益来自时间线）
+    final_video = add_effects_and_audio(base_video, output_video, ass_file, mp3_file, work_dir, segment_durations,
+                                        entry['sound_effects'], timeline_entry=entry)
     
     return final_video if final_video else None
 
@@ -969,16 +1019,12 @@ def create_second_narration_video(chapter_path, work_dir):
         print(f"video_2文件不存在: {video_2_file}")
         return None
     
-    # 获取音频时长和字幕时长
-    audio_duration = get_audio_duration(mp3_file)
-    if audio_duration <= 0:
-        print(f"无法获取音频时长: {mp3_file}")
-        return None
-    
-    ass_duration = get_ass_duration(ass_file)
-    if ass_duration <= 0:
-        print(f"无法获取ASS字幕时长: {ass_file}")
+    # 从章节时间线读取音频时长、字幕时长和对话时间戳
+    entry = load_timeline_entry(chapter_path, "02", work_dir)
+    if entry is None:
         return None
+    audio_duration = entry['audio_duration']
+    ass_duration = entry['ass_duration']
     
     # 使用音频时长作为视频时长，确保音频不被截断
     video_duration = audio_duration
@@ -986,12 +1032,6 @@ def create_second_narration_video(chapter_path, work_dir):
     print(f"音频时长: {audio_duration:.2f}s, 字幕时长: {ass_duration:.2f}s")
     print(f"使用视频时长: {video_duration:.2f}s (以音频时长为准，确保音频完整)")
     
-    # 解析ASS文件获取对话时间戳
-    dialogues = parse_ass_dialogues(ass_file)
-    if not dialogues:
-        print(f"无法解析ASS文件: {ass_file}")
-        return None
-    
     # 创建视频片段列表 - 使用video_2作为基础视频
     video_segments = []
     video_segments.append({
@@ -1031,7 +1071,7 @@ def create_second_narration_video(chapter_path, work_dir):
                                             hwaccel=gpu_params['hwaccel'],
                                             hwaccel_output_format=gpu_params['hwaccel_output_format'])
                 
-                stream.output(temp_video, **output_params).overwrite_output().run(quiet=True)
+                run_ffmpeg_stream(stream.output(temp_video, **output_params).overwrite_output(), label='trim_segment')
                 segment_files.append(temp_video)
             except Exception as e:
                 print(f"裁剪视频失败: {e}")
@@ -1049,11 +1089,9 @@ def create_second_narration_video(chapter_path, work_dir):
     # 收集片段时长信息
     segment_durations = [segment['duration'] for segment in video_segments]
     
-    # 获取音效列表
-    sound_effects = get_sound_effects_for_narration(dialogues, "02", work_dir)
-    
-    # 添加转场、水印、字幕和音频
-    final_video = add_effects_and_audio(base_video, output_video, ass_file, mp3_file, work_dir, segment_durations, sound_effects)
+    # 添加转场、水印、字幕和音频（音效和增益来自时间线）
+    final_video = add_effects_and_audio(base_video, output_video, ass_file, mp3_file, work_dir, segment_durations,
+                                        entry['sound_effects'], timeline_entry=entry)
     
     return final_video if final_video else None
 
@@ -1080,21 +1118,36 @@ def create_merged_narration_video(chapter_path, work_dir):
     
     print(f"\n开始处理合并的 narration_01-03")
     
+    # 章节时间线提供各段时长和对话，合并字幕不再重新解析
+    narration_nums = ["01", "02", "03"]
+    try:
+        timeline = get_timeline(chapter_path, work_dir)
+        entries = [narration_entry(timeline, num) for num in narration_nums]
+        if not all(entries):
+            timeline = None
+    except Exception as e:
+        print(f"读取章节时间线失败，重新解析字幕: {e}")
+        timeline = None
+    
     # 合并ASS文件
-    if not merge_ass_files(chapter_path, ["01", "02", "03"], merged_ass_file):
+    if not merge_ass_files(chapter_path, narration_nums, merged_ass_file, timeline=timeline):
         return None
     
     # 合并MP3文件
-    if not merge_mp3_files(chapter_path, ["01", "02", "03"], merged_mp3_file):
+    if not merge_mp3_files(chapter_path, narration_nums, merged_mp3_file):
         return None
     
-    # 获取音频时长和字幕时长
-    audio_duration = get_audio_duration(merged_mp3_file)
+    # 获取音频时长和字幕时长（有时间线时为各段之和）
+    if timeline is not None:
+        audio_duration = sum(entry['audio_duration'] for entry in entries)
+        ass_duration = max(end for _, end, _ in merged_dialogues(timeline, narration_nums))
+    else:
+        audio_duration = get_audio_duration(merged_mp3_file)
+        ass_duration = get_ass_duration(merged_ass_file)
     if audio_duration <= 0:
         print(f"无法获取音频时长: {merged_mp3_file}")
         return None
     
-    ass_duration = get_ass_duration(merged_ass_file)
     if ass_duration <= 0:
         print(f"无法获取ASS字幕时长: {merged_ass_file}")
         return None
@@ -1105,8 +1158,11 @@ def create_merged_narration_video(chapter_path, work_dir):
     print(f"音频时长: {audio_duration:.2f}s, 字幕时长: {ass_duration:.2f}s")
     print(f"使用视频时长: {video_duration:.2f}s (以音频时长为准，确保音频完整)")
     
-    # 解析ASS文件获取对话时间戳
-    dialogues = parse_ass_dialogues(merged_ass_file)
+    # 对话时间戳
+    if timeline is not None:
+        dialogues = timeline_dialogues(merged_dialogues(timeline, narration_nums))
+    else:
+        dialogues = parse_ass_dialogues(merged_ass_file)
     if not dialogues:
         print(f"无法解析合并的ASS文件: {merged_ass_file}")
         return None
@@ -1184,7 +1240,7 @@ def create_merged_narration_video(chapter_path, work_dir):
                                                 hwaccel=gpu_params['hwaccel'],
                                                 hwaccel_output_format=gpu_params['hwaccel_output_format'])
                     
-                    stream.output(temp_video, **output_params).overwrite_output().run(quiet=True)
+                    run_ffmpeg_stream(stream.output(temp_video, **output_params).overwrite_output(), label='trim_segment')
                     segment_files.append(temp_video)
                 except Exception as e:
                     print(f"裁剪视频失败: {e}")
@@ -1218,12 +1274,13 @@ def create_merged_narration_video(chapter_path, work_dir):
             if 'tune' in gpu_params:
                 output_params['tune'] = gpu_params['tune']
             
-            (
+            run_ffmpeg_stream(
                 ffmpeg
                 .input(concat_list_file, format='concat', safe=0)
                 .output(base_video, **output_params)
-                .overwrite_output()
-                .run(quiet=True)
+                .overwrite_output(),
+                duration=sum(segment['duration'] for segment in video_segments),
+                label='concat_segments'
             )
         except Exception as e:
             print(f"合并视频片段失败: {e}")
@@ -1278,36 +1335,25 @@ def create_narration_video(chapter_path, narration_num, work_dir):
         print(f"MP3文件不存在: {mp3_file}")
         return None
     
-    # 获取音频时长和字幕时长
-    audio_duration = get_audio_duration(mp3_file)
-    if audio_duration <= 0:
-        print(f"无法获取音频时长: {mp3_file}")
-        return None
-    
-    # 获取ASS字幕文件的时长
-    ass_duration = get_ass_duration(ass_file)
-    if ass_duration <= 0:
-        print(f"无法获取ASS字幕时长: {ass_file}")
+    # 从章节时间线读取音频时长、字幕时长和对话时间戳
+    print(f"\n开始处理 narration_{narration_num}")
+    entry = load_timeline_entry(chapter_path, narration_num, work_dir)
+    if entry is None:
         return None
+    audio_duration = entry['audio_duration']
+    ass_duration = entry['ass_duration']
     
     # 使用音频时长作为视频时长，确保音频不被截断
     video_duration = audio_duration
     
-    print(f"\n开始处理 narration_{narration_num}")
     print(f"音频时长: {audio_duration:.2f}s, 字幕时长: {ass_duration:.2f}s")
     print(f"使用视频时长: {video_duration:.2f}s (以音频时长为准，确保音频完整)")
     
-    # 解析ASS文件获取对话时间戳
-    dialogues = parse_ass_dialogues(ass_file)
-    if not dialogues:
-        print(f"无法解析ASS文件: {ass_file}")
-        return None
-    
-    # 获取对应的图片文件
-    image_file = get_images_for_narration(chapter_path, narration_num)
-    if not image_file:
+    # 对应的图片文件（时间线中记录的图片分配）
+    if not entry['image']:
         print(f"没有找到图片文件用于 narration_{narration_num}")
         return None
+    image_file = os.path.join(chapter_path, entry['image'])
     
     # 创建视频片段列表
     video_segments = []
@@ -1372,7 +1418,7 @@ def create_narration_video(chapter_path, narration_num, work_dir):
                                                 hwaccel=gpu_params['hwaccel'],
                                                 hwaccel_output_format=gpu_params['hwaccel_output_format'])
                     
-                    stream.output(temp_video, **output_params).overwrite_output().run(quiet=True)
+                    run_ffmpeg_stream(stream.output(temp_video, **output_params).overwrite_output(), label='trim_segment')
                     segment_files.append(temp_video)
                 except Exception as e:
                     print(f"裁剪视频失败: {e}")
@@ -1415,12 +1461,13 @@ def create_narration_video(chapter_path, narration_num, work_dir):
             if 'tune' in gpu_params:
                 output_params['tune'] = gpu_params['tune']
             
-            (
+            run_ffmpeg_stream(
                 ffmpeg
                 .input(concat_list_file, format='concat', safe=0)
                 .output(base_video, **output_params)
-                .overwrite_output()
-                .run(quiet=True)
+                .overwrite_output(),
+                duration=sum(segment['duration'] for segment in video_segments),
+                label='concat_segments'
             )
         except Exception as e:
             print(f"合并视频片段失败: {e}")
@@ -1431,15 +1478,14 @@ def create_narration_video(chapter_path, narration_num, work_dir):
     for segment in video_segments:
         segment_durations.append(segment['duration'])
     
-    # 获取音效列表
-    sound_effects = get_sound_effects_for_narration(dialogues, narration_num, work_dir)
-    
-    # 添加转场、水印、字幕和音频
-    final_video = add_effects_and_audio(base_video, output_video, ass_file, mp3_file, work_dir, segment_durations, sound_effects)
+    # 添加转场、水印、字幕和音频（音效和增益来自时间线）
+    final_video = add_effects_and_audio(base_video, output_video, ass_file, mp3_file, work_dir, segment_durations,
+                                        entry['sound_effects'], timeline_entry=entry)
     
     return final_video if final_video else None
 
-def add_effects_and_audio(base_video, output_video, ass_file, mp3_file, work_dir, segment_durations=None, sound_effects=None):
+def add_effects_and_audio(base_video, output_video, ass_file, mp3_file, work_dir, segment_durations=None, sound_effects=None,
+                          timeline_entry=None):
     """
     为基础视频添加转场、水印、字幕和音频
     
@@ -1451,18 +1497,38 @@ def add_effects_and_audio(base_video, output_video, ass_file, mp3_file, work_dir
         work_dir: 工作目录
         segment_durations: 视频片段时长列表，用于计算转场时间点
         sound_effects: 音效列表，每个元素包含音效信息
+        timeline_entry: 章节时间线中的narration条目，提供时直接使用其中的输出时长和增益
     
     Returns:
         str: 输出视频路径，失败时返回None
     """
-    # 获取音频文件的时长作为最大输出时长，确保音频不被截断
-    max_duration = get_audio_duration(mp3_file)
-    if max_duration <= 0:
-        print(f"无法获取音频时长，使用ASS字幕时长: {mp3_file}")
-        max_duration = get_ass_duration(ass_file)
+    if timeline_entry is not None:
+        # 章节时间线已记录输出时长（已裁掉结尾静音）和响度增益
+        max_duration = timeline_entry['duration'] or None
+        narration_gain = timeline_entry['gain_db']
+    else:
+        # 获取音频文件的时长作为最大输出时长，确保音频不被截断
+        max_duration = get_audio_duration(mp3_file)
         if max_duration <= 0:
-            print(f"无法获取ASS字幕时长，使用默认处理: {ass_file}")
-            max_duration = None
+            print(f"无法获取音频时长，使用ASS字幕时长: {mp3_file}")
+            max_duration = get_ass_duration(ass_file)
+            if max_duration <= 0:
+                print(f"无法获取ASS字幕时长，使用默认处理: {ass_file}")
+                max_duration = None
+        
+        # 响度分析（结果缓存）：narration统一到目标响度，并裁掉结尾静音（不早于字幕结束）
+        narration_gain = 0.0
+        try:
+            narration_analysis = analyze_audio(mp3_file)
+            narration_gain = narration_gain_db(narration_analysis)
+            if max_duration:
+                trimmed = trimmed_duration(narration_analysis, min_duration=get_ass_duration(ass_file))
+                if trimmed < max_duration - 0.05:
+                    print(f"裁掉结尾静音: {max_duration:.2f}s -> {trimmed:.2f}s")
+                    max_duration = trimmed
+            print(f"narration响度: {narration_analysis['integrated_lufs']} LUFS，增益 {narration_gain:+.2f} dB")
+        except Exception as e:
+            print(f"响度分析失败，使用原始音量: {e}")
     try:
         # 文件路径
         fuceng_path = os.path.join(work_dir, 'src', 'banner', 'fuceng1.mov')
@@ -1515,12 +1581,17 @@ def add_effects_and_audio(base_video, output_video, ass_file, mp3_file, work_dir
         if sound_effects:
             for i, effect in enumerate(sound_effects):
                 cmd.extend(['-i', effect['path']])
-                sound_effect_inputs.append({
+                effect_input = {
                     'index': input_count,
                     'start_time': effect['start_time'],
                     'duration': effect['duration'],
-                    'volume': effect['volume']
-                })
+                    'volume': effect['volume'],
+                    'path': effect['path']
+                }
+                # 章节时间线中的音效已测好增益（None表示无法测量）
+                if 'gain_db' in effect:
+                    effect_input['gain_db'] = effect['gain_db']
+                sound_effect_inputs.append(effect_input)
                 input_count += 1
         
         # 构建滤镜链
@@ -1581,67 +1652,51 @@ def add_effects_and_audio(base_video, output_video, ass_file, mp3_file, work_dir
         # 对于FFmpeg的subtitles滤镜，直接使用路径，转义特殊字符
         # 转义反斜杠、冒号、等号和逗号
         escaped_ass_file = ass_file.replace('\\', '\\\\').replace(':', '\\:').replace('=', '\\=').replace(',', '\\,')
+        # 字幕之后再做一次调色（原先在章节拼接时整体重编码时做的第二次调色，保持成片观感不变），
+        # 最后统一为编码约定的尺寸/SAR/像素格式，章节拼接时视频流可以直接复制
         filter_complex.append(
-            f"{current_video}subtitles={escaped_ass_file}[vout]"
+            f"{current_video}subtitles={escaped_ass_file},"
+            f"colorchannelmixer=rr=0.8:rg=0.1:rb=0.1:gr=0:gg=1:gb=0:br=0:bg=0:bb=1,"
+            f"{contract_filter('pad')}[vout]"
         )
         
-        # 处理音频混合
+        # 处理音频混合：narration和音效按响度分析结果调整增益
+        filter_complex.append(f'[{audio_input_idx}:a]volume={narration_gain}dB[narration]')
         if sound_effect_inputs:
             # 构建音频混合滤镜
-            audio_inputs = [f'[{audio_input_idx}:a]']  # 主音频
+            audio_inputs = ['[narration]']  # 主音频
             
-            # 为每个音效添加延迟和音量调整
+            # 为每个音效添加延迟和音量调整（无法测量响度的短音效沿用固定音量）
             for i, effect_input in enumerate(sound_effect_inputs):
-                effect_filter = f'[{effect_input["index"]}:a]adelay={int(effect_input["start_time"] * 1000)}|{int(effect_input["start_time"] * 1000)},volume={effect_input["volume"]}[se{i}]'
+                if 'gain_db' in effect_input:
+                    gain = effect_input['gain_db']
+                else:
+                    try:
+                        gain = effect_gain_db(analyze_audio(effect_input['path']))
+                    except Exception as e:
+                        print(f"音效响度分析失败: {e}")
+                        gain = None
+                volume = f'{gain}dB' if gain is not None else effect_input['volume']
+                delay_ms = int(effect_input["start_time"] * 1000)
+                effect_filter = f'[{effect_input["index"]}:a]adelay={delay_ms}|{delay_ms},volume={volume}[se{i}]'
                 filter_complex.append(effect_filter)
                 audio_inputs.append(f'[se{i}]')
             
             # 混合所有音频
-            if len(audio_inputs) > 1:
-                mix_filter = f'{"".join(audio_inputs)}amix=inputs={len(audio_inputs)}:duration=longest:dropout_transition=2[aout]'
-                filter_complex.append(mix_filter)
-                audio_map = '[aout]'
-            else:
-                audio_map = f'[{audio_input_idx}:a]'
+            mix_filter = f'{"".join(audio_inputs)}amix=inputs={len(audio_inputs)}:duration=longest:dropout_transition=2[aout]'
+            filter_complex.append(mix_filter)
         else:
-            audio_map = f'{audio_input_idx}:a'
+            filter_complex[-1] = filter_complex[-1].replace('[narration]', '[aout]')
         
         # 添加滤镜复合参数
-        if filter_complex:
-            cmd.extend(['-filter_complex', ';'.join(filter_complex)])
-            cmd.extend(['-map', '[vout]'])  # 映射处理后的视频
-            if sound_effect_inputs and len(sound_effect_inputs) > 0:
-                cmd.extend(['-map', '[aout]'])  # 映射混合后的音频
-            else:
-                cmd.extend(['-map', f'{audio_input_idx}:a'])  # 映射原音频
-        else:
-            cmd.extend(['-map', '0:v'])  # 直接映射原视频
-            cmd.extend(['-map', f'{audio_input_idx}:a'])  # 映射音频
-        
-        # 输出参数
-        cmd.extend([
-            '-c:v', gpu_params['video_codec'],
-            '-c:a', VIDEO_STANDARDS['audio_codec'],
-            '-b:v', VIDEO_STANDARDS.get('video_bitrate', '1500k'),
-            '-b:a', VIDEO_STANDARDS['audio_bitrate'],
-            '-r', str(VIDEO_STANDARDS['fps'])
-        ])
+        cmd.extend(['-filter_complex', ';'.join(filter_complex)])
+        cmd.extend(['-map', '[vout]'])  # 映射处理后的视频
+        cmd.extend(['-map', '[aout]'])  # 映射调整增益（和混合音效）后的音频
         
-        # 只有非VideoToolbox编码器才添加preset参数
-        if 'preset' in gpu_params and not gpu_params['video_codec'].endswith('_videotoolbox'):
-            cmd.extend(['-preset', gpu_params['preset']])
-        
-        # 添加profile参数（如果有，用于nvenc编码器）
-        if 'profile' in gpu_params and not gpu_params['video_codec'].endswith('_videotoolbox'):
-            cmd.extend(['-profile:v', gpu_params['profile']])
-        
-        # 添加调优参数（如果有）
-        if 'tune' in gpu_params:
-            cmd.extend(['-tune', gpu_params['tune']])
-        
-        # 添加额外参数
-        if gpu_params['extra_params']:
-            cmd.extend(gpu_params['extra_params'])
+        # 输出参数（编码约定：帧率、GOP、profile、像素格式、音频采样率和声道）
+        cmd.extend(video_encode_args(gpu_params))
+        cmd.extend(['-b:v', VIDEO_STANDARDS.get('video_bitrate', '1500k')])
+        cmd.extend(audio_encode_args())
         
         # 添加时长限制，确保不超过ASS字幕文件时长
         if max_duration:
@@ -1651,7 +1706,7 @@ def add_effects_and_audio(base_video, output_video, ass_file, mp3_file, work_dir
         
         # 执行命令
         print(f"执行FFmpeg命令: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=False)
+        result = run_ffmpeg(cmd, label='effects_audio')
         
         if result.returncode != 0:
             # 安全地解码stderr，忽略无法解码的字符
@@ -1669,6 +1724,7 @@ def add_effects_and_audio(base_video, output_video, ass_file, mp3_file, work_dir
         print(f"添加效果和音频失败: {e}")
         return None
 
+@traced('render', path_arg='chapter_path')
 def process_chapter(chapter_path, work_dir):
     """
     处理单个章节的所有narration
@@ -1714,7 +1770,7 @@ def process_chapter(chapter_path, work_dir):
             generated_videos.append(first_video_path)
             
             # 检查视频标准
-            if check_video_standards(first_video_path):
+            if check_video_standards(first_video_path, chapter_path):
                 print(f"✓ 第一个narration视频符合标准")
             else:
                 print(f"⚠️  第一个narration视频不完全符合标准")
@@ -1734,7 +1790,7 @@ def process_chapter(chapter_path, work_dir):
             generated_videos.append(second_video_path)
             
             # 检查视频标准
-            if check_video_standards(second_video_path):
+            if check_video_standards(second_video_path, chapter_path):
                 print(f"✓ 第二个narration视频符合标准")
             else:
                 print(f"⚠️  第二个narration视频不完全符合标准")
@@ -1757,7 +1813,7 @@ def process_chapter(chapter_path, work_dir):
                 generated_videos.append(video_path)
                 
                 # 检查视频标准
-                if check_video_standards(video_path):
+                if check_video_standards(video_path, chapter_path):
                     print(f"✓ narration_{narration_num} 视频符合标准")
                 else:
                     print(f"⚠️  narration_{narration_num} 视频不完全符合标准")
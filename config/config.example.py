@@ -27,6 +27,16 @@ COMFYUI_CONFIG = {
     "poll_interval": 1.0  # 轮询间隔（秒）
 }
 
+# 接口共享限流配置（可选，见rate_limiter.py）
+# limits的键为接口名或"接口名:模型"，rate为每秒请求数，burst为允许的突发请求数
+RATE_LIMIT_CONFIG = {
+    "redis_url": "redis://localhost:6379/0",
+    "limits": {
+        "visual_submit": {"rate": 2, "burst": 2},
+        "ark_chat": {"rate": 5, "burst": 5}
+    }
+}
+
 # 火山引擎视觉服务配置（用于T2P图片生成）
 IMAGE_TWO_CONFIG = {
     "access_key": "ak",  # 请替换为您的实际access_key
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ffmpeg统一执行器
+
+功能:
+    - 自动添加 -progress pipe:1，实时解析 frame/out_time/speed/bitrate，按已知时长计算完成百分比
+    - 子进程结束时通过wait4读取峰值内存（RSS）和CPU时间
+    - 进度和结束事件以结构化字典发送给回调；设置 FFMPEG_EVENTS=stdout 时同时输出
+      "FFMPEG_EVENT {json}" 行，供Celery任务解析后写入任务meta
+    - 每个输出文件的结束事件追加到所在目录的 .ffmpeg_telemetry.jsonl，便于找出慢编码
+    - 每次调用记录一个 'ffmpeg' 追踪span（见pipeline_trace.py）
+
+使用方法:
+    from ffmpeg_runner import run_ffmpeg
+
+    result = run_ffmpeg(cmd, duration=audio_duration, label='narration_04')
+    if result.returncode != 0:
+        print(result.stderr)
+    print(result.telemetry['peak_rss_mb'], result.telemetry['speed'])
+
+    # 查看最慢的编码
+    python ffmpeg_runner.py report data/001 --top 20
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+from pipeline_trace import ffmpeg_encoder, span
+
+TELEMETRY_FILE = '.ffmpeg_telemetry.jsonl'
+EVENT_PREFIX = 'FFMPEG_EVENT '
+
+# 进度事件最小间隔（秒），避免刷屏和频繁写任务状态
+PROGRESS_INTERVAL = 1.0
+
+_listeners = []
+_listeners_lock = threading.Lock()
+
+
+def add_listener(listener):
+    """
+    注册全局事件监听器，listener(event)
+    """
+    with _listeners_lock:
+        _listeners.append(listener)
+
+
+def remove_listener(listener):
+    with _listeners_lock:
+        if listener in _listeners:
+            _listeners.remove(listener)
+
+
+def parse_time(value):
+    """
+    解析ffmpeg时间参数：秒数或 HH:MM:SS(.ms)
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        if ':' in value:
+            seconds = 0.0
+            for part in value.split(':'):
+                seconds = seconds * 60 + float(part)
+            return seconds
+        return float(value)
+    except ValueError:
+        return None
+
+
+def infer_duration(cmd):
+    """
+    从命令行的 -t 参数推断输出时长，没有时返回None
+    """
+    for index in range(len(cmd) - 2, 0, -1):
+        if cmd[index] == '-t':
+            return parse_time(cmd[index + 1])
+    return None
+
+
+def infer_output(cmd):
+    """
+    命令行最后一个参数通常是输出文件；输出到管道时返回None
+    """
+    if not cmd:
+        return None
+    last = str(cmd[-1])
+    if last.startswith('-') or last.startswith('pipe:'):
+        return None
+    return last
+
+
+def _with_progress(cmd):
+    """
+    添加进度输出参数；输出本身使用stdout管道时不添加
+    """
+    cmd = [str(part) for part in cmd]
+    if '-progress' in cmd or 'pipe:1' in cmd or (cmd and cmd[-1] == '-'):
+        return cmd, False
+    return [cmd[0], '-progress', 'pipe:1', '-nostats'] + cmd[1:], True
+
+
+def _parse_bitrate(value):
+    match = re.match(r'([\d.]+)kbits/s', value or '')
+    return float(match.group(1)) if match else None
+
+
+def _parse_speed(value):
+    match = re.match(r'([\d.]+)x', (value or '').strip())
+    return float(match.group(1)) if match else None
+
+
+def progress_event(fields, duration, started_at, label=None, output=None):
+    """
+    将一组 -progress 字段转换为进度事件
+    """
+    out_time_us = fields.get('out_time_us') or fields.get('out_time_ms')
+    try:
+        media_time = max(int(out_time_us), 0) / 1_000_000 if out_time_us not in (None, 'N/A') else None
+    except ValueError:
+        media_time = None
+    if media_time is None:
+        media_time = parse_time(fields.get('out_time'))
+
+    percent = None
+    if duration and media_time is not None:
+        percent = round(min(media_time / duration * 100.0, 100.0), 1)
+    if fields.get('progress') == 'end' and duration:
+        percent = 100.0
+
+    try:
+        frame = int(fields.get('frame', 0))
+    except ValueError:
+        frame = None
+
+    return {
+        'event': 'progress',
+        'label': label,
+        'output': output,
+        'frame': frame,
+        'time': round(media_time, 3) if media_time is not None else None,
+        'duration': duration,
+        'percent': percent,
+        'speed': _parse_speed(fields.get('speed')),
+        'bitrate_kbps': _parse_bitrate(fields.get('bitrate')),
+        'elapsed': round(time.time() - started_at, 3),
+    }
+
+
+def _emit(event, on_event):
+    if on_event:
+        try:
+            on_event(event)
+        except Exception as e:
+            print(f"ffmpeg事件回调失败: {e}")
+    with _listeners_lock:
+        listeners = list(_listeners)
+    for listener in listeners:
+        try:
+            listener(event)
+        except Exception as e:
+            print(f"ffmpeg事件监听器失败: {e}")
+    if os.environ.get('FFMPEG_EVENTS') == 'stdout':
+        print(EVENT_PREFIX + json.dumps(event, ensure_ascii=False), flush=True)
+
+
+def persist_telemetry(event):
+    """
+    将结束事件追加到输出文件所在目录的 .ffmpeg_telemetry.jsonl
+    """
+    output = event.get('output')
+    if not output:
+        return
+    directory = os.path.dirname(os.path.abspath(output))
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, TELEMETRY_FILE), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(event, ensure_ascii=False) + '\n')
+    except OSError as e:
+        print(f"保存ffmpeg遥测数据失败: {e}")
+
+
+def _wait_with_usage(process):
+    """
+    等待子进程结束并读取资源占用
+
+    Returns:
+        tuple: (返回码, 用户CPU秒, 系统CPU秒, 峰值RSS字节数)，平台不支持wait4时资源项为None
+    """
+    if not hasattr(os, 'wait4'):
+        return process.wait(), None, None, None
+    try:
+        _, status, usage = os.wait4(process.pid, 0)
+    except ChildProcessError:
+        return process.wait(), None, None, None
+    process.returncode = os.waitstatus_to_exitcode(status)
+    # Linux的ru_maxrss单位为KB，macOS为字节
+    peak_rss = usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+    return process.returncode, usage.ru_utime, usage.ru_stime, peak_rss
+
+
+def run_ffmpeg(cmd, duration=None, label=None, output_path=None, input=None, text=False,
+               timeout=None, on_event=None, persist=True):
+    """
+    执行ffmpeg命令并收集进度和资源占用
+
+    Args:
+        cmd (list): ffmpeg命令
+        duration (float): 输出时长（秒），用于计算百分比；不传时从 -t 参数推断
+        label (str): 事件标签，如 'narration_04'、'concat_bgm'
+        output_path (str): 输出文件，不传时取命令最后一个参数
+        input (bytes): 写入stdin的数据
+        text (bool): stderr是否解码为字符串
+        timeout (float): 超时秒数，超时后终止进程并抛出subprocess.TimeoutExpired
+        on_event (callable): 事件回调
+        persist (bool): 是否把结束事件写入输出目录的遥测文件
+
+    Returns:
+        subprocess.CompletedProcess: stdout为空，stderr为ffmpeg日志，telemetry属性为结束事件
+    """
+    full_cmd, has_progress = _with_progress(cmd)
+    duration = duration if duration is not None else infer_duration(full_cmd)
+    output_path = output_path or infer_output(full_cmd)
+    encoder = ffmpeg_encoder(full_cmd)
+    started_at = time.time()
+
+    with span('ffmpeg', step=label, encoder=encoder) as ffmpeg_span:
+        process = subprocess.Popen(
+            full_cmd,
+            stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+
+        stderr_chunks = []
+        stdout_chunks = []
+
+        def read_stderr():
+            for chunk in iter(lambda: process.stderr.read(65536), b''):
+                stderr_chunks.append(chunk)
+
+        def write_stdin():
+            try:
+                process.stdin.write(input)
+            except (BrokenPipeError, OSError):
+                pass
+            finally:
+                try:
+                    process.stdin.close()
+                except OSError:
+                    pass
+
+        threads = [threading.Thread(target=read_stderr, daemon=True)]
+        if input is not None:
+            threads.append(threading.Thread(target=write_stdin, daemon=True))
+        for thread in threads:
+            thread.start()
+
+        timed_out = threading.Event()
+        timer = None
+        if timeout:
+            def kill():
+                timed_out.set()
+                process.kill()
+            timer = threading.Timer(timeout, kill)
+            timer.start()
+
+        last = None
+        last_emitted = 0.0
+        fields = {}
+        try:
+            for raw_line in process.stdout:
+                if not has_progress:
+                    stdout_chunks.append(raw_line)
+                    continue
+                line = raw_line.decode('utf-8', errors='ignore').strip()
+                if '=' not in line:
+                    continue
+                key, value = line.split('=', 1)
+                fields[key] = value
+                if key != 'progress':
+                    continue
+                last = progress_event(fields, duration, started_at, label, output_path)
+                now = time.time()
+                if value == 'end' or now - last_emitted >= PROGRESS_INTERVAL:
+                    _emit(last, on_event)
+                    last_emitted = now
+                fields = {}
+        finally:
+            process.stdout.close()
+            returncode, user_time, system_time, peak_rss = _wait_with_usage(process)
+            if timer:
+                timer.cancel()
+            for thread in threads:
+                thread.join(timeout=5)
+
+        wall_time = time.time() - started_at
+        media_time = (last or {}).get('time') or duration
+        cpu_time = user_time + system_time if user_time is not None else None
+        telemetry = {
+            'event': 'finished',
+            'label': label,
+            'output': output_path,
+            'encoder': encoder,
+            'returncode': returncode,
+            'duration': duration,
+            'frames': (last or {}).get('frame'),
+            'wall_time': round(wall_time, 3),
+            'cpu_time': round(cpu_time, 3) if cpu_time is not None else None,
+            'user_time': round(user_time, 3) if user_time is not None else None,
+            'system_time': round(system_time, 3) if system_time is not None else None,
+            'peak_rss_mb': round(peak_rss / (1024 * 1024), 1) if peak_rss is not None else None,
+            'speed': round(media_time / wall_time, 3) if media_time and wall_time > 0 else None,
+            'bitrate_kbps': (last or {}).get('bitrate_kbps'),
+            'finished_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        ffmpeg_span.set(returncode=returncode, cpu_time=telemetry['cpu_time'],
+                        peak_rss_mb=telemetry['peak_rss_mb'], speed=telemetry['speed'])
+
+        _emit(telemetry, on_event)
+        if persist:
+            persist_telemetry(telemetry)
+
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(full_cmd, timeout, stderr=b''.join(stderr_chunks))
+
+    stderr = b''.join(stderr_chunks)
+    stdout = b''.join(stdout_chunks)
+    result = subprocess.CompletedProcess(
+        full_cmd, returncode,
+        stdout=stdout.decode('utf-8', errors='ignore') if text else stdout,
+        stderr=stderr.decode('utf-8', errors='ignore') if text else stderr,
+    )
+    result.telemetry = telemetry
+    return result
+
+
+def run_ffmpeg_stream(stream, **kwargs):
+    """
+    执行ffmpeg-python构建的输出流（替代 stream.run(quiet=True)），失败时抛出RuntimeError
+    """
+    result = run_ffmpeg(stream.compile(), **kwargs)
+    if result.returncode != 0:
+        stderr = result.stderr if isinstance(result.stderr, str) else result.stderr.decode('utf-8', errors='ignore')
+        raise RuntimeError(f"ffmpeg执行失败（返回码{result.returncode}）: {stderr[-2000:]}")
+    return result
+
+
+def parse_event_line(line):
+    """
+    解析脚本输出中的 "FFMPEG_EVENT {json}" 行，不是事件行时返回None
+    """
+    if not line.startswith(EVENT_PREFIX):
+        return None
+    try:
+        return json.loads(line[len(EVENT_PREFIX):])
+    except ValueError:
+        return None
+
+
+def load_telemetry(root):
+    """
+    递归读取目录下所有遥测文件
+    """
+    records = []
+    for directory, _, files in os.walk(root):
+        if TELEMETRY_FILE not in files:
+            continue
+        with open(os.path.join(directory, TELEMETRY_FILE), 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ffmpeg编码遥测')
+    subparsers = parser.add_subparsers(dest='command')
+    report_parser = subparsers.add_parser('report', help='列出最慢的编码')
+    report_parser.add_argument('path', help='数据目录，如 data/001')
+    report_parser.add_argument('--top', type=int, default=20, help='显示条数（默认20）')
+    report_parser.add_argument('--sort', choices=['speed', 'wall_time', 'peak_rss_mb', 'cpu_time'],
+                               default='speed', help='排序字段，speed按实时倍速从慢到快，其余从大到小')
+    args = parser.parse_args()
+
+    if args.command != 'report':
+        parser.print_help()
+        return 0
+
+    records = load_telemetry(args.path)
+    if not records:
+        print(f"未找到遥测数据: {args.path}")
+        return 0
+
+    if args.sort == 'speed':
+        records.sort(key=lambda record: record.get('speed') if record.get('speed') is not None else float('inf'))
+    else:
+        records.sort(key=lambda record: -(record.get(args.sort) or 0))
+
+    print(f"{'输出文件':<60} {'编码器':<12} {'墙钟':>8} {'CPU':>8} {'倍速':>7} {'峰值内存':>9}  返回码")
+    for record in records[:args.top]:
+        output = os.path.relpath(record['output'], args.path) if record.get('output') else '-'
+        wall_time = f"{record['wall_time']:.1f}s" if record.get('wall_time') is not None else '-'
+        cpu_time = f"{record['cpu_time']:.1f}s" if record.get('cpu_time') is not None else '-'
+        speed = f"{record['speed']:.2f}x" if record.get('speed') is not None else '-'
+        rss = f"{record['peak_rss_mb']:.0f}MB" if record.get('peak_rss_mb') is not None else '-'
+        print(f"{output:<60} {record.get('encoder') or '-':<12} {wall_time:>8} {cpu_time:>8} {speed:>7} {rss:>9}  "
+              f"{record.get('returncode')}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,6 +12,7 @@ import re
 from typing import List, Dict, Any
 import jieba
 import jieba.posseg as pseg
+from pipeline_trace import traced
 
 def format_time_for_ass(seconds: float) -> str:
     """将秒数转换为ASS时间格式 (H:MM:SS.CC)"""
@@ -565,6 +566,7 @@ Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
     
     return ass_header + "\n".join(events)
 
+@traced('ass', path_arg='chapter_path')
 def process_chapter(chapter_path: str, max_length: int = 12) -> bool:
     """处理单个章节"""
     chapter_name = os.path.basename(chapter_path)
@@ -644,6 +646,15 @@ def process_chapter(chapter_path: str, max_length: int = 12) -> bool:
             continue
     
     print(f"\n章节 {chapter_name} 处理完成: {success_count}/{len(timestamps_files)} 个文件成功")
+    
+    # 字幕和音频都已就绪，生成章节时间线供渲染阶段和页面直接读取
+    if success_count > 0:
+        try:
+            from chapter_timeline import get_timeline
+            get_timeline(chapter_path)
+        except Exception as e:
+            print(f"⚠️  章节时间线生成失败（渲染时会重新生成）: {e}")
+    
     return success_count > 0
 
 def main():
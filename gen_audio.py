@@ -18,6 +18,7 @@ sys.path.insert(0, src_dir)
 
 from config.config import TTS_CONFIG
 from src.voice.gen_voice import VoiceGenerator
+from pipeline_trace import span, path_attributes
 
 def clean_text_for_tts(text):
     """
@@ -153,7 +154,10 @@ def generate_single_narration_voice(voice_generator, chapter_dir, chapter_name,
         print(f"文本内容: {clean_narration[:50]}{'...' if len(clean_narration) > 50 else ''}")
         
         # 使用语音生成器生成语音并获取时间戳（1.2倍速）
-        result = voice_generator.generate_voice_with_timestamps(clean_narration, audio_path, speed_ratio=1.2)
+        with span('tts', api='bytedance_tts', narration=index, **path_attributes(chapter_dir)) as tts_span:
+            result = voice_generator.generate_voice_with_timestamps(clean_narration, audio_path, speed_ratio=1.2)
+            if os.path.exists(audio_path):
+                tts_span.set(bytes=os.path.getsize(audio_path))
         if result and result.get('success', False):
             print(f"✓ 第 {index} 段语音生成成功: {audio_path}")
             
@@ -14,6 +14,7 @@ import json
 import time
 from config.config import build_character_prompt, IMAGE_TWO_CONFIG
 from volcengine.visual.VisualService import VisualService
+from rate_limiter import rate_limited_call
 
 def parse_character_info(narration_file_path):
     """
@@ -425,7 +426,7 @@ def generate_character_image_async(prompt, output_path, character_name, chapter_
             if attempt == 0:
                 print("提交异步任务...")
             
-            resp = visual_service.cv_sync2async_submit_task(form)
+            resp = rate_limited_call('visual_submit', visual_service.cv_sync2async_submit_task, form)
             
             if attempt == 0:
                 print(f"异步任务响应: {resp}")
@@ -4,15 +4,14 @@
 异步视频生成脚本
 遍历每个章节目录，使用每个章节的第一张和第二张图片异步生成视频
 任务提交后将task_id保存到async_tasks目录，由check_async_tasks.py负责下载
+相同图片、提示词、时长和模型的片段从缓存复用，其余跨章节并发提交（见video_clip_cache.py）
 """
 
 import os
 import sys
 import time
 import json
-import base64
 import random
-import imghdr
 import ffmpeg
 from volcenginesdkarkruntime import Ark
 
@@ -22,6 +21,16 @@ sys.path.insert(0, config_dir)
 
 # 导入配置
 from config import ARK_CONFIG, IMAGE_TO_VIDEO_CONFIG
+from reference_image_cache import get_reference_image_cache
+from rate_limiter import rate_limited_call
+from video_clip_cache import ClipJob, run_clip_jobs
+
+# 图生视频模型和默认提示词
+VIDEO_MODEL = "doubao-seedance-1-0-lite-i2v-250428"
+DEFAULT_VIDEO_PROMPT = "画面有明显的动态效果，动作大一些"
+
+# 接口支持的最大视频时长（秒）
+MAX_VIDEO_DURATION = 12
 
 def get_audio_duration(audio_path):
     """
@@ -200,6 +209,7 @@ def get_sound_effects_for_first_video(chapter_path, work_dir):
 def upload_image_to_server(image_path):
     """
     将图片转换为base64编码的data URL
+    结果按图片内容缓存（见reference_image_cache.py），过大的图片会先缩小
     
     Args:
         image_path: 图片路径
@@ -209,44 +219,7 @@ def upload_image_to_server(image_path):
     """
     try:
         print(f"处理图片: {image_path}")
-        
-        # 读取图片文件并转换为base64
-        with open(image_path, 'rb') as image_file:
-            image_data = image_file.read()
-            base64_encoded = base64.b64encode(image_data).decode('utf-8')
-        
-        # 根据文件实际内容确定MIME类型
-        image_format = imghdr.what(image_path)
-        if image_format == 'jpeg':
-            mime_type = 'image/jpeg'
-        elif image_format == 'png':
-            mime_type = 'image/png'
-        elif image_format == 'gif':
-            mime_type = 'image/gif'
-        elif image_format == 'bmp':
-            mime_type = 'image/bmp'
-        elif image_format == 'webp':
-            mime_type = 'image/webp'
-        else:
-            # 如果imghdr无法识别，尝试通过文件头手动检测
-            with open(image_path, 'rb') as f:
-                header = f.read(16)
-                if header.startswith(b'\xff\xd8\xff'):
-                    mime_type = 'image/jpeg'
-                elif header.startswith(b'\x89PNG\r\n\x1a\n'):
-                    mime_type = 'image/png'
-                elif header.startswith(b'GIF87a') or header.startswith(b'GIF89a'):
-                    mime_type = 'image/gif'
-                elif header.startswith(b'BM'):
-                    mime_type = 'image/bmp'
-                elif header.startswith(b'RIFF') and b'WEBP' in header:
-                    mime_type = 'image/webp'
-                else:
-                    mime_type = 'image/jpeg'  # 默认使用jpeg
-        
-        # 返回data URL格式
-        print(mime_type)
-        data_url = f"data:{mime_type};base64,{base64_encoded}"
+        data_url = get_reference_image_cache().get_data_url(image_path)
         print(f"图片转换成功: {os.path.basename(image_path)}")
         return data_url
         
@@ -274,57 +247,54 @@ def save_task_info(task_id, task_info, tasks_dir):
     
     print(f"任务信息已保存: {task_file}")
 
-def create_video_from_single_image_async(image_path, duration, output_path, max_retries=3):
+def make_clip_job(image_path, duration, output_path):
+    """
+    构建图生视频片段任务，时长限制为接口支持的最大值
     """
-    使用单张图片异步生成视频，带重试机制
+    limited_duration = min(duration, MAX_VIDEO_DURATION)
+    if duration > MAX_VIDEO_DURATION:
+        print(f"  原始时长 {duration}s 超过限制，调整为 {limited_duration}s")
+    return ClipJob(image_path, limited_duration, output_path, DEFAULT_VIDEO_PROMPT, VIDEO_MODEL)
+
+def submit_video_task(job, clip_key=None, max_retries=3):
+    """
+    提交图生视频任务，带重试机制，成功后保存任务信息到async_tasks目录
     
     Args:
-        image_path: 图片路径
-        duration: 视频时长
-        output_path: 输出视频路径
+        job: ClipJob
+        clip_key: 片段缓存key，下载完成后check_async_tasks.py据此写入缓存
         max_retries: 最大重试次数
     
     Returns:
-        bool: 是否成功提交任务
+        str: 任务ID，失败返回None
     """
-    # 检查视频是否已存在
-    if os.path.exists(output_path):
-        print(f"✓ 视频已存在，跳过生成: {os.path.basename(output_path)}")
-        return True
-    
+    output_path = job.output_path
     for attempt in range(max_retries + 1):
         try:
             if attempt > 0:
                 print(f"🔄 第 {attempt} 次重试生成视频: {os.path.basename(output_path)}")
                 time.sleep(2 * attempt)  # 递增延迟
             
-            print(f"开始生成视频: {image_path}")
-            
-            # 限制 duration 最大为 12 秒
-            limited_duration = min(duration, 12)
-            if duration > 12:
-                print(f"  原始时长 {duration}s 超过限制，调整为 {limited_duration}s")
-            else:
-                print(f"  视频时长: {limited_duration}s")
+            print(f"开始生成视频: {job.image_path}（时长 {job.duration}s）")
             
             # 将图片转换为base64编码的data URL
-            image_url = upload_image_to_server(image_path)
+            image_url = upload_image_to_server(job.image_path)
             
             if not image_url:
                 print("图片处理失败")
                 if attempt == max_retries:
-                    return False
+                    return None
                 continue
             
             # 创建视频生成任务
             client = Ark(api_key=ARK_CONFIG["api_key"])
             
-            resp = client.content_generation.tasks.create(
-                model="doubao-seedance-1-0-lite-i2v-250428",
+            resp = rate_limited_call('ark_video_submit', client.content_generation.tasks.create,
+                model=job.model,
                 content=[
                     {
                         "type": "text",
-                        "text": f"画面有明显的动态效果，动作大一些 --ratio 9:16 --dur {limited_duration}"
+                        "text": f"{job.prompt} --ratio 9:16 --dur {job.duration}"
                     },
                     {
                         "type": "image_url",
@@ -344,8 +314,9 @@ def create_video_from_single_image_async(image_path, duration, output_path, max_
                 'task_type': 'video',  # 标识为视频任务
                 'output_path': output_path,
                 'filename': os.path.basename(output_path),
-                'image_path': image_path,
-                'duration': duration,
+                'image_path': job.image_path,
+                'duration': job.duration,
+                'clip_key': clip_key,
                 'submit_time': time.time(),
                 'status': 'submitted',
                 'attempt': attempt + 1
@@ -354,19 +325,36 @@ def create_video_from_single_image_async(image_path, duration, output_path, max_
             # 使用统一的保存函数
             async_tasks_dir = 'async_tasks'
             save_task_info(task_id, task_info, async_tasks_dir)
-            return True
+            return task_id
             
         except Exception as e:
             print(f"✗ 生成视频时发生错误 (尝试 {attempt + 1}/{max_retries + 1}): {e}")
             
             if attempt == max_retries:
                 print(f"✗ 达到最大重试次数，任务最终失败")
-                return False
+                return None
             
             # 继续下一次重试
             continue
     
-    return False
+    return None
+
+def create_video_from_single_image_async(image_path, duration, output_path, max_retries=3):
+    """
+    使用单张图片异步生成视频：已存在或缓存命中时直接返回，否则提交任务
+    
+    Args:
+        image_path: 图片路径
+        duration: 视频时长
+        output_path: 输出视频路径
+        max_retries: 最大重试次数
+    
+    Returns:
+        bool: 视频已就绪或任务提交成功
+    """
+    job = make_clip_job(image_path, duration, output_path)
+    results = run_clip_jobs([job], lambda job, clip_key: submit_video_task(job, clip_key, max_retries))
+    return results[output_path]
 
 def parse_narration_closeups(narration_file_path):
     """
@@ -554,15 +542,15 @@ def get_chapter_images(chapter_path):
         print(f"获取章节图片时发生错误: {e}")
         return None, None
 
-def generate_videos_for_chapter(chapter_dir):
+def prepare_chapter_jobs(chapter_dir):
     """
-    为单个章节生成视频，并匹配音效
+    为单个章节匹配音效并构建两个开头视频的片段任务
     
     Args:
         chapter_dir: 章节目录路径
     
     Returns:
-        bool: 是否成功提交所有任务
+        list: ClipJob列表，图片不足或出错时返回None
     """
     try:
         chapter_name = os.path.basename(chapter_dir)
@@ -576,7 +564,7 @@ def generate_videos_for_chapter(chapter_dir):
         
         if not first_image or not second_image:
             print(f"✗ 章节 {chapter_name} 跳过，图片不足")
-            return False
+            return None
         
         # 生成两个视频的输出路径
         first_video_path = os.path.join(chapter_dir, f"{chapter_name}_video_1.mp4")
@@ -609,31 +597,48 @@ def generate_videos_for_chapter(chapter_dir):
         else:
             print(f"⚠ 未找到匹配的音效")
         
-        success_count = 0
-        
-        # 生成第一个视频
-        print(f"\n提交第一个视频生成任务...")
-        if create_video_from_single_image_async(first_image, duration_1, first_video_path):
-            success_count += 1
-        
-        # 生成第二个视频
-        print(f"\n提交第二个视频生成任务...")
-        if create_video_from_single_image_async(second_image, duration_2, second_video_path):
-            success_count += 1
-        
-        if success_count == 2:
-            print(f"✓ 章节 {chapter_name} 所有视频任务提交成功")
-            return True
-        elif success_count == 1:
-            print(f"⚠ 章节 {chapter_name} 部分视频任务提交成功")
-            return True
-        else:
-            print(f"✗ 章节 {chapter_name} 所有视频任务提交失败")
-            return False
+        return [
+            make_clip_job(first_image, duration_1, first_video_path),
+            make_clip_job(second_image, duration_2, second_video_path),
+        ]
         
     except Exception as e:
         print(f"处理章节 {chapter_dir} 时发生错误: {e}")
+        return None
+
+def report_chapter_results(chapter_name, jobs, results):
+    """
+    输出单个章节的提交结果
+    
+    Returns:
+        bool: 是否至少有一个视频就绪或提交成功
+    """
+    success_count = sum(1 for job in jobs if results.get(job.output_path))
+    if success_count == len(jobs):
+        print(f"✓ 章节 {chapter_name} 所有视频任务提交成功")
+        return True
+    elif success_count > 0:
+        print(f"⚠ 章节 {chapter_name} 部分视频任务提交成功")
+        return True
+    else:
+        print(f"✗ 章节 {chapter_name} 所有视频任务提交失败")
+        return False
+
+def generate_videos_for_chapter(chapter_dir):
+    """
+    为单个章节生成视频，并匹配音效
+    
+    Args:
+        chapter_dir: 章节目录路径
+    
+    Returns:
+        bool: 是否成功提交所有任务
+    """
+    jobs = prepare_chapter_jobs(chapter_dir)
+    if not jobs:
         return False
+    results = run_clip_jobs(jobs, submit_video_task)
+    return report_chapter_results(os.path.basename(chapter_dir), jobs, results)
 
 def process_single_chapter(data_dir, chapter_name):
     """
@@ -709,14 +714,21 @@ def process_chapters(data_dir):
         
         print(f"找到 {len(chapter_dirs)} 个章节目录")
         
+        # 先收集所有章节的片段任务，再统一查缓存并跨章节并发提交
+        chapter_jobs = {}
+        for chapter_dir in chapter_dirs:
+            jobs = prepare_chapter_jobs(chapter_dir)
+            if jobs:
+                chapter_jobs[chapter_dir] = jobs
+        
+        results = run_clip_jobs([job for jobs in chapter_jobs.values() for job in jobs], submit_video_task)
+        
         success_count = 0
         total_tasks = 0
-        
-        # 处理每个章节
-        for chapter_dir in chapter_dirs:
-            if generate_videos_for_chapter(chapter_dir):
+        for chapter_dir, jobs in chapter_jobs.items():
+            if report_chapter_results(os.path.basename(chapter_dir), jobs, results):
                 success_count += 1
-            total_tasks += 2  # 每个章节生成2个视频
+            total_tasks += len(jobs)
         
         print(f"\n=== 处理完成 ===")
         print(f"成功处理章节: {success_count}/{len(chapter_dirs)}")
@@ -15,6 +15,9 @@ import time
 import random
 from config.config import IMAGE_TWO_CONFIG
 from volcengine.visual.VisualService import VisualService
+from rate_limiter import rate_limited_call
+from asset_store import store_bytes
+from image_derivatives import ingest_image
 
 def parse_character_gender(content, character_name):
     """
@@ -530,11 +533,13 @@ def download_image(image_data_base64, output_path):
         # 解码base64数据
         image_data = base64.b64decode(image_data_base64)
         
-        # 保存到文件
-        with open(output_path, 'wb') as f:
-            f.write(image_data)
+        # 保存到文件（按内容写入素材存储，output_path为硬链接）
+        store_bytes(image_data, output_path)
         
         print(f"图片已保存: {output_path}")
+        
+        # 生成渲染用派生图和缩略图
+        ingest_image(output_path)
         return True
         
     except Exception as e:
@@ -646,7 +651,7 @@ def generate_image_with_character(prompt, output_path, character_images=None, st
                 print("未能获取随机角色图片")
         
         # 调用同步API
-        resp = visual_service.cv_process(form)
+        resp = rate_limited_call('visual_sync', visual_service.cv_process, form)
         print(resp)
         
         # 检查响应
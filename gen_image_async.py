@@ -8,14 +8,16 @@
 import os
 import re
 import argparse
-import base64
 import sys
 import json
 import time
-import shutil
 import random
 from config.config import IMAGE_TWO_CONFIG, build_scene_prompt
 from volcengine.visual.VisualService import VisualService
+from reference_image_cache import get_reference_image_cache
+from pipeline_trace import span, traced
+from rate_limiter import rate_limited_call
+from asset_store import store_file
 
 def parse_character_gender(content, character_name):
     """
@@ -655,7 +657,7 @@ def ensure_21_images_per_chapter(chapter_dir):
             if source_image:
                 try:
                     # 复制图片并重命名
-                    shutil.copy2(source_image, new_filepath)
+                    store_file(source_image, new_filepath)
                     print(f"    ✓ 复制图片: {os.path.basename(source_image)} -> {new_filename}")
                     success_count += 1
                 except Exception as e:
@@ -683,6 +685,7 @@ def ensure_21_images_per_chapter(chapter_dir):
 def encode_image_to_base64(image_path):
     """
     将图片文件编码为base64格式，包含实际图片类型信息
+    结果按图片内容缓存（见reference_image_cache.py），过大的图片会先缩小
     
     Args:
         image_path: 图片文件路径
@@ -692,30 +695,7 @@ def encode_image_to_base64(image_path):
              如果编码失败返回None
     """
     try:
-        with open(image_path, 'rb') as image_file:
-            # 读取图片二进制数据
-            image_data = image_file.read()
-            # 编码为base64
-            base64_data = base64.b64encode(image_data).decode('utf-8')
-            
-            # 获取图片格式 - 根据实际文件内容而不是扩展名
-            import imghdr
-            from pathlib import Path
-            detected_format = imghdr.what(image_path)
-            if detected_format:
-                # 使用检测到的实际格式
-                image_format = detected_format
-            else:
-                # 如果检测失败，回退到扩展名判断
-                file_extension = Path(image_path).suffix.lower()
-                if file_extension == '.jpg':
-                    image_format = 'jpeg'
-                else:
-                    image_format = file_extension[1:]  # 去掉点号
-            
-            # 构造完整的data URL
-            return f"data:image/{image_format};base64,{base64_data}"
-            
+        return get_reference_image_cache().get_data_url(image_path)
     except Exception as e:
         print(f"编码图片为base64时发生错误: {e}")
         return None
@@ -888,7 +868,8 @@ def generate_image_with_character_async(prompt, output_path, character_images=No
             if attempt == 0:  # 只在第一次尝试时打印详细信息
                 print("这里是响应前===============")
             print(form.keys())
-            resp = visual_service.cv_sync2async_submit_task(form)
+            with span('image_submit', api='visual_submit'):
+                resp = rate_limited_call('visual_submit', visual_service.cv_sync2async_submit_task, form)
             if attempt == 0:
                 print("这里是响应参数===============")
                 print(resp)
@@ -954,6 +935,7 @@ def generate_image_with_character(prompt, output_path, character_images=None, st
     """
     return generate_image_with_character_async(prompt, output_path, character_images)
 
+@traced('images', path_arg='chapter_dir')
 def generate_images_for_chapter(chapter_dir):
     """
     为单个章节生成图片 - 按照7个分镜每个分镜3张图片的规则生成21张图片
@@ -1081,7 +1063,7 @@ def generate_images_for_chapter(chapter_dir):
                     source_image = get_random_character_image()
                     if source_image:
                         try:
-                            shutil.copy2(source_image, image_path)
+                            store_file(source_image, image_path)
                             print(f"    ✓ 复制成功: {os.path.basename(source_image)} -> {image_filename}")
                             success_count += 1
                         except Exception as e:
@@ -26,6 +26,7 @@ from typing import Dict, List, Tuple, Optional
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from config.config import IMAGE_TWO_CONFIG
 from volcengine.visual.VisualService import VisualService
+from rate_limiter import rate_limited_call
 
 # 配置日志
 # 确保logs目录存在
@@ -419,7 +420,7 @@ class ImageGenerator:
                 
                 logger.info("prompt ===>>> {}".format(json.dumps(form_data, indent=2, ensure_ascii=False))) 
                 # 调用API
-                resp = self.visual_service.cv_sync2async_submit_task(form_data)
+                resp = rate_limited_call('visual_submit', self.visual_service.cv_sync2async_submit_task, form_data)
                 
                 logger.info("resp ===>>> {}".format(json.dumps(resp, indent=2, ensure_ascii=False)))
                 
@@ -466,9 +467,8 @@ class ImageGenerator:
                     
                     # 检查是否是API限制错误
                     if 'API Limit' in str(error_msg) or '50429' in str(error_msg):
-                        wait_time = (retry + 1) * 5  # 递增等待时间
-                        logger.warning(f"API限制错误，等待 {wait_time} 秒后重试 (第 {retry + 1}/{max_retries} 次)")
-                        time.sleep(wait_time)
+                        # 共享限流器已进入冷却期，下一次提交会自动等待
+                        logger.warning(f"API限制错误，等待限流冷却后重试 (第 {retry + 1}/{max_retries} 次)")
                         continue
                     else:
                         logger.error(f"提交图片生成任务失败，场景: {scene_number}, 错误: {error_msg}")
@@ -479,9 +479,7 @@ class ImageGenerator:
                 
                 # 检查是否是API限制错误
                 if 'API Limit' in error_str or '50429' in error_str:
-                    wait_time = (retry + 1) * 5  # 递增等待时间
-                    logger.warning(f"API限制错误，等待 {wait_time} 秒后重试 (第 {retry + 1}/{max_retries} 次): {e}")
-                    time.sleep(wait_time)
+                    logger.warning(f"API限制错误，等待限流冷却后重试 (第 {retry + 1}/{max_retries} 次): {e}")
                     continue
                 else:
                     logger.error(f"生成图片失败: {e}")
@@ -491,13 +489,13 @@ class ImageGenerator:
         return None
 
 
-def process_chapter(chapter_dir: str, delay_between_requests: float = 2.0) -> int:
+def process_chapter(chapter_dir: str, delay_between_requests: float = 0.0) -> int:
     """
     处理单个章节
     
     Args:
         chapter_dir: 章节目录路径
-        delay_between_requests: 请求间延迟时间（秒）
+        delay_between_requests: 请求间额外延迟时间（秒），提交频率由共享限流器控制
         
     Returns:
         int: 成功提交的任务数量
@@ -552,8 +550,8 @@ def process_chapter(chapter_dir: str, delay_between_requests: float = 2.0) -> in
             if task_id:
                 success_count += 1
             
-            # 添加延迟避免API限制
-            if i < len(scenes):  # 最后一个请求不需要延迟
+            # 额外延迟（默认不延迟，提交频率由共享限流器控制）
+            if delay_between_requests and i < len(scenes):  # 最后一个请求不需要延迟
                 logger.debug(f"等待 {delay_between_requests} 秒后处理下一个场景...")
                 time.sleep(delay_between_requests)
         
@@ -29,6 +29,7 @@ from volcenginesdkarkruntime import Ark
 # 导入现有模块
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from config.config import ARK_CONFIG
+from asset_store import store_bytes
 
 # 配置日志
 # 确保logs目录存在
@@ -483,8 +484,7 @@ class ArkImageGenerator:
             response.raise_for_status()
             
             # 保存到本地
-            with open(output_path, 'wb') as f:
-                f.write(response.content)
+            store_bytes(response.content, output_path)
             
             return True
             
@@ -513,8 +513,7 @@ class ArkImageGenerator:
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
             
             # 保存图片
-            with open(output_path, 'wb') as f:
-                f.write(image_data)
+            store_bytes(image_data, output_path)
             
             return True
         except Exception as e:
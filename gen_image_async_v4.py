@@ -29,6 +29,8 @@ import requests
 # 导入配置
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from config.config import COMFYUI_CONFIG
+from image_derivatives import ingest_image
+from asset_store import store_bytes
 
 # ComfyUI 默认主机常量，可通过环境变量 COMFYUI_HOST 覆盖
 COMFYUI_DEFAULT_HOST = os.getenv("COMFYUI_HOST", COMFYUI_CONFIG["default_host"])
@@ -479,15 +481,15 @@ class ComfyUIClient:
         # 追加用于路由/调试的请求级标识，不影响真实 filename
         url = self._append_query_param(url, 'image', filename_param)
         try:
-            resp = self.session.get(url, stream=True, timeout=self.timeout)
+            resp = self.session.get(url, timeout=self.timeout)
             if resp.status_code == 200:
                 os.makedirs(save_dir, exist_ok=True)
                 local_path = os.path.join(save_dir, save_as)
-                with open(local_path, 'wb') as f:
-                    for chunk in resp.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
+                # 经素材存储写入：替换硬链接而不是覆盖共享的只读对象
+                store_bytes(resp.content, local_path)
                 logger.info(f"文件已下载到: {local_path}")
+                # 生成渲染用派生图和缩略图
+                ingest_image(local_path)
                 return local_path
             else:
                 logger.error(f"下载失败，状态码: {resp.status_code}")
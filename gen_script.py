@@ -32,6 +32,7 @@ sys.path.insert(0, project_root)
 
 from config.prompt_config import prompt_config, SCRIPT_CONFIG
 from config.config import ARK_CONFIG
+from rate_limiter import rate_limited_call
 
 class ScriptGenerator:
     """
@@ -490,7 +491,7 @@ class ScriptGenerator:
             print(f"Prompt长度: {len(prompt)} 字符")
             
             # 调用API
-            completion = self.client.chat.completions.create(
+            completion = rate_limited_call('ark_chat', self.client.chat.completions.create,
                 model=self.model,
                 messages=[
                     {"role": "user", "content": prompt}
@@ -1107,7 +1108,7 @@ class ScriptGenerator:
             print(f"正在为第{chapter_num}章生成解说文案...")
             
             # 调用API生成解说
-            completion = self.client.chat.completions.create(
+            completion = rate_limited_call('ark_chat', self.client.chat.completions.create,
                 model=self.model,
                 messages=[
                     {"role": "user", "content": custom_prompt}
@@ -20,7 +20,6 @@ import re
 import json
 import argparse
 import tempfile
-import zipfile
 import shutil
 import time
 from pathlib import Path
@@ -29,10 +28,6 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
 from volcenginesdkarkruntime import Ark
 from jinja2 import Environment, FileSystemLoader
-try:
-    import rarfile
-except ImportError:
-    rarfile = None
 
 # 添加项目根目录到路径
 project_root = os.path.dirname(os.path.abspath(__file__))
@@ -40,6 +35,13 @@ sys.path.insert(0, project_root)
 
 from config.prompt_config import prompt_config, SCRIPT_CONFIG
 from config.config import ARK_CONFIG
+from pipeline_trace import span
+from rate_limiter import rate_limited_call
+from novel_source import (CHAPTER_PATTERNS, NovelSource, chapter_spans, decode_novel_bytes, get_novel_source,
+                          normalize_novel_text, read_novel_bytes)
+
+# 流式读取小说时每次读取的字符数
+STREAM_CHUNK_SIZE = 256 * 1024
 
 class ContentFilter:
     """
@@ -198,157 +200,196 @@ class ScriptGeneratorV2:
     def read_novel_file(self, file_path: str) -> str:
         """
         读取小说文件，支持多种格式和编码
+        解码结果缓存在 data/.novel_cache，同一文件只解码一次
         
         Args:
             file_path: 小说文件路径
             
         Returns:
-            str: 小说内容
+            str: 清理空白行后的小说内容
         """
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"文件不存在：{file_path}")
-        
-        file_ext = os.path.splitext(file_path)[1].lower()
-        
-        if file_ext == '.zip':
-            return self._read_zip_file(file_path)
-        elif file_ext == '.rar':
-            return self._read_rar_file(file_path)
-        else:
-            # 普通文本文件
-            encodings = ['utf-8', 'gbk', 'gb2312', 'utf-16']
-            for encoding in encodings:
-                try:
-                    with open(file_path, 'r', encoding=encoding) as f:
-                        content = f.read()
-                    print(f"成功使用 {encoding} 编码读取文件")
-                    return content
-                except UnicodeDecodeError:
-                    continue
-            
-            raise ValueError(f"无法解码文件：{file_path}")
+        return get_novel_source(file_path).text()
     
     def _read_zip_file(self, zip_path: str) -> str:
         """读取ZIP文件中的文本内容"""
-        with zipfile.ZipFile(zip_path, 'r') as zip_file:
-            file_list = zip_file.namelist()
-            txt_files = [f for f in file_list if f.lower().endswith('.txt')]
-            
-            if not txt_files:
-                raise ValueError("ZIP文件中没有找到.txt文件")
-            
-            # 选择第一个txt文件
-            txt_file = txt_files[0]
-            print(f"从ZIP文件中读取：{txt_file}")
-            
-            with zip_file.open(txt_file) as f:
-                file_content = f.read()
-            
-            return self._decode_file_content(file_content, txt_file)
+        return self._decode_file_content(*read_novel_bytes(zip_path))
     
     def _read_rar_file(self, rar_path: str) -> str:
         """读取RAR文件中的文本内容"""
-        if rarfile is None:
-            raise ImportError("需要安装rarfile库来处理RAR文件")
-        
-        with rarfile.RarFile(rar_path) as rar_file:
-            file_list = rar_file.namelist()
-            txt_files = [f for f in file_list if f.lower().endswith('.txt')]
-            
-            if not txt_files:
-                raise ValueError("RAR文件中没有找到.txt文件")
-            
-            txt_file = txt_files[0]
-            print(f"从RAR文件中读取：{txt_file}")
-            
-            with rar_file.open(txt_file) as f:
-                file_content = f.read()
-            
-            return self._decode_file_content(file_content, txt_file)
+        return self._decode_file_content(*read_novel_bytes(rar_path))
     
     def _decode_file_content(self, file_content: bytes, filename: str) -> str:
         """解码文件内容"""
-        encodings = ['utf-8', 'gbk', 'gb2312', 'utf-16']
-        
-        for encoding in encodings:
-            try:
-                content = file_content.decode(encoding)
-                print(f"成功使用 {encoding} 编码解码文件 {filename}")
-                return content
-            except UnicodeDecodeError:
-                continue
+        return decode_novel_bytes(file_content, filename)
+    
+    def open_novel_source(self, file_path: str):
+        """
+        打开小说文件用于分章
+        返回内存映射的NovelSource：首次打开时解码一次并缓存为UTF-8文件，之后按章节偏移索引切片读取
         
-        raise ValueError(f"无法解码文件内容：{filename}")
+        Args:
+            file_path: 小说文件路径
+            
+        Returns:
+            NovelSource: 可传给split_novel_into_chapters的小说内容
+        """
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"文件不存在：{file_path}")
+        return get_novel_source(file_path)
     
-    def split_novel_into_chapters(self, novel_content: str, target_chapters: int = 50) -> List[str]:
+    def split_novel_into_chapters(self, novel_content, target_chapters: int = 50) -> List[str]:
         """
         将小说内容分割成指定数量的章节
         
         Args:
-            novel_content: 小说内容
+            novel_content: 小说内容字符串、NovelSource（按持久化的章节偏移索引切片），或可重复打开的数据源
+                （有open()方法返回文本流，如正文压缩存储的BlobTextSource），数据源按块流式读取，不会拼出整本小说的字符串
             target_chapters: 目标章节数量
             
         Returns:
             List[str]: 章节内容列表
         """
-        # 清理文本
-        novel_content = re.sub(r'\n\s*\n', '\n\n', novel_content)
-        novel_content = novel_content.strip()
-        
-        # 尝试按章节标题分割
-        chapter_patterns = [
-            r'第[一二三四五六七八九十百千万\d]+章[^\n]*',
-            r'第[\d]+章[^\n]*',
-            r'Chapter\s*\d+[^\n]*',
-            r'章节\s*\d+[^\n]*'
-        ]
+        if isinstance(novel_content, NovelSource):
+            chapters = novel_content.chapters(target_chapters)
+            print(f"成功分割为 {len(chapters)} 个章节")
+            return chapters
+        
+        if not isinstance(novel_content, str):
+            chapters = self._split_novel_source(novel_content, target_chapters)
+            chapters = self._merge_chapters(chapters, target_chapters)
+            print(f"成功分割为 {len(chapters)} 个章节")
+            return chapters
+        
+        # 清理文本后按章节标题分割，没有章节标题时按长度分割
+        novel_content = normalize_novel_text(novel_content)
+        chapters = ['\n\n'.join(novel_content[start:end] for start, end in spans)
+                    for spans in chapter_spans(novel_content, target_chapters)]
+        print(f"成功分割为 {len(chapters)} 个章节")
+        return chapters
+    
+    def _merge_chapters(self, chapters: List[str], target_chapters: int) -> List[str]:
+        """如果章节数量超过目标，合并较短的章节"""
+        if len(chapters) <= target_chapters:
+            return chapters
+        
+        merged_chapters = []
+        current_chapter = ""
+        target_length = sum(len(ch) for ch in chapters) // target_chapters
+        
+        for chapter in chapters:
+            if len(current_chapter) < target_length:
+                current_chapter += "\n\n" + chapter if current_chapter else chapter
+            else:
+                merged_chapters.append(current_chapter)
+                current_chapter = chapter
+        
+        if current_chapter:
+            if merged_chapters:
+                merged_chapters[-1] += "\n\n" + current_chapter
+            else:
+                merged_chapters.append(current_chapter)
         
+        return merged_chapters[:target_chapters]
+    
+    def _iter_normalized_lines(self, source):
+        """
+        按块读取数据源并逐行输出清理后的文本，效果等同于normalize_novel_text：
+        统一换行符，连续空白行合并为一个空行，去掉首尾空白
+        """
+        def raw_lines():
+            with source.open() as f:
+                pending = ''
+                for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), ''):
+                    text = pending + chunk
+                    # 块末尾的\r可能与下一块开头的\n组成\r\n，留到下一块处理
+                    carry = '\r' if text.endswith('\r') else ''
+                    if carry:
+                        text = text[:-1]
+                    lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+                    pending = lines.pop() + carry
+                    yield from lines
+                yield from pending.replace('\r', '\n').split('\n')
+        
+        started = False
+        blank_pending = False
+        previous = None
+        for line in raw_lines():
+            if not line.strip():
+                blank_pending = started
+                continue
+            if not started:
+                line = line.lstrip()
+                started = True
+            if previous is not None:
+                yield previous
+                if blank_pending:
+                    yield ''
+            blank_pending = False
+            previous = line
+        if previous is not None:
+            yield previous.rstrip()
+    
+    def _split_novel_source(self, source, target_chapters: int) -> List[str]:
+        """
+        流式分章：第一遍统计各章节标题模式的匹配数和总长度，第二遍按选定方式切分
+        """
+        match_counts = [0] * len(CHAPTER_PATTERNS)
+        total_length = -1
+        for line in self._iter_normalized_lines(source):
+            total_length += len(line) + 1
+            for index, pattern in enumerate(CHAPTER_PATTERNS):
+                if re.search(pattern, line, re.IGNORECASE):
+                    match_counts[index] += 1
+        total_length = max(total_length, 0)
+        
+        selected = next((p for p, count in zip(CHAPTER_PATTERNS, match_counts) if count >= 2), None)
         chapters = []
-        for pattern in chapter_patterns:
-            matches = list(re.finditer(pattern, novel_content, re.IGNORECASE))
-            if len(matches) >= 2:
-                for i, match in enumerate(matches):
-                    start = match.start()
-                    end = matches[i + 1].start() if i + 1 < len(matches) else len(novel_content)
-                    chapter_content = novel_content[start:end].strip()
-                    if len(chapter_content) > 100:
-                        chapters.append(chapter_content)
-                break
+        if selected:
+            # 按章节标题切分，第一个标题之前的内容丢弃
+            current = None
+            for line in self._iter_normalized_lines(source):
+                match = re.search(selected, line, re.IGNORECASE)
+                if match:
+                    if current is not None:
+                        current.append(line[:match.start()])
+                        chapter_content = ''.join(current).strip()
+                        if len(chapter_content) > 100:
+                            chapters.append(chapter_content)
+                    current = [line[match.start():], '\n']
+                elif current is not None:
+                    current.extend((line, '\n'))
+            if current is not None:
+                chapter_content = ''.join(current).strip()
+                if len(chapter_content) > 100:
+                    chapters.append(chapter_content)
         
         # 如果没有找到章节标题，按长度分割
         if not chapters:
-            total_length = len(novel_content)
             chunk_size = total_length // target_chapters
-            
-            for i in range(target_chapters):
-                start = i * chunk_size
-                end = (i + 1) * chunk_size if i < target_chapters - 1 else total_length
-                chapter_content = novel_content[start:end].strip()
-                if chapter_content:
-                    chapters.append(chapter_content)
-        
-        # 如果章节数量超过目标，合并较短的章节
-        if len(chapters) > target_chapters:
-            merged_chapters = []
-            current_chapter = ""
-            target_length = sum(len(ch) for ch in chapters) // target_chapters
-            
-            for chapter in chapters:
-                if len(current_chapter) < target_length:
-                    current_chapter += "\n\n" + chapter if current_chapter else chapter
-                else:
-                    merged_chapters.append(current_chapter)
-                    current_chapter = chapter
-            
-            if current_chapter:
-                if merged_chapters:
-                    merged_chapters[-1] += "\n\n" + current_chapter
-                else:
-                    merged_chapters.append(current_chapter)
-            
-            chapters = merged_chapters[:target_chapters]
+            boundaries = [(i + 1) * chunk_size for i in range(target_chapters - 1)]
+            boundary_index = 0
+            position = 0
+            current = []
+            for line in self._iter_normalized_lines(source):
+                text = line + '\n' if position + len(line) < total_length else line
+                while text:
+                    if boundary_index < len(boundaries):
+                        take = min(len(text), boundaries[boundary_index] - position)
+                    else:
+                        take = len(text)
+                    current.append(text[:take])
+                    position += take
+                    text = text[take:]
+                    while boundary_index < len(boundaries) and position >= boundaries[boundary_index]:
+                        chapter_content = ''.join(current).strip()
+                        if chapter_content:
+                            chapters.append(chapter_content)
+                        current = []
+                        boundary_index += 1
+            chapter_content = ''.join(current).strip()
+            if chapter_content:
+                chapters.append(chapter_content)
         
-        print(f"成功分割为 {len(chapters)} 个章节")
         return chapters
     
     def generate_chapter_narration(self, chapter_content: str, chapter_num: int, total_chapters: int) -> str:
@@ -382,8 +423,8 @@ class ScriptGeneratorV2:
             )
             
             # 调用API生成
-            with self.lock:
-                response = self.client.chat.completions.create(
+            with self.lock, span('llm_call', api='ark_chat', model=self.model):
+                response = rate_limited_call('ark_chat', self.client.chat.completions.create,
                     model=self.model,
                     messages=[
                         {"role": "user", "content": prompt}
@@ -972,13 +1013,16 @@ class ScriptGeneratorV2:
             print(f"验证第{chapter_num}章时出错：{e}")
             return 'other_invalid'
     
-    def regenerate_invalid_chapters(self, output_dir: str, invalid_chapters: List[int]) -> bool:
+    def regenerate_invalid_chapters(self, output_dir: str, invalid_chapters: List[int],
+                                    novel_file: Optional[str] = None, target_chapters: int = 50) -> bool:
         """
         重新生成无效的章节
         
         Args:
             output_dir: 输出目录
             invalid_chapters: 需要重新生成的章节编号列表
+            novel_file: 小说文件路径，章节缺少original_content.txt时按章节偏移索引只读取该章原文
+            target_chapters: 分章时的目标章节数量
             
         Returns:
             bool: 是否全部重新生成成功
@@ -993,13 +1037,20 @@ class ScriptGeneratorV2:
             chapter_dir = os.path.join(output_dir, f"chapter_{chapter_num:03d}")
             original_content_file = os.path.join(chapter_dir, "original_content.txt")
             
-            if not os.path.exists(original_content_file):
+            if not os.path.exists(original_content_file) and not novel_file:
                 print(f"第{chapter_num}章缺少original_content.txt文件，跳过重新生成")
                 continue
             
             try:
-                with open(original_content_file, 'r', encoding='utf-8') as f:
-                    chapter_content = f.read()
+                if os.path.exists(original_content_file):
+                    with open(original_content_file, 'r', encoding='utf-8') as f:
+                        chapter_content = f.read()
+                else:
+                    print(f"第{chapter_num}章缺少original_content.txt文件，从小说中读取该章原文")
+                    chapter_content = get_novel_source(novel_file).chapter(chapter_num, target_chapters)
+                    os.makedirs(chapter_dir, exist_ok=True)
+                    with open(original_content_file, 'w', encoding='utf-8') as f:
+                        f.write(chapter_content)
                 
                 print(f"\n--- 重新生成第 {chapter_num} 章 ---")
                 
@@ -1058,26 +1109,28 @@ class ScriptGeneratorV2:
             
             # 读取小说内容
             print("\n--- 读取小说文件 ---")
-            novel_content = self.read_novel_file(novel_file)
-            print(f"小说总长度：{len(novel_content)}字")
+            novel_source = self.open_novel_source(novel_file)
+            print(f"小说总长度：{len(novel_source)}字")
             
-            # 分割章节
+            # 分割章节（章节偏移索引已存在时直接切片，只读取需要生成的章节）
             print("\n--- 分割章节 ---")
-            chapters = self.split_novel_into_chapters(novel_content, target_chapters)
+            chapter_count = novel_source.chapter_count(target_chapters)
+            print(f"成功分割为 {chapter_count} 个章节")
+            chapters = novel_source.chapters(target_chapters, limit=chapter_limit)
             
             # 应用章节限制
-            if chapter_limit and chapter_limit < len(chapters):
-                chapters = chapters[:chapter_limit]
+            if len(chapters) < chapter_count:
                 print(f"应用章节限制，实际生成：{len(chapters)}个章节")
             
-            # 释放小说原始内容内存（已分割完成）
-            del novel_content
-            
             # 生成解说文案
             print(f"\n--- 生成解说文案（{len(chapters)}个章节）---")
             
             def generate_single_chapter(chapter_data):
                 chapter_num, chapter_content = chapter_data
+                with span('script', novel=os.path.basename(os.path.normpath(output_dir)), chapter=f"chapter_{chapter_num:03d}"):
+                    return generate_single_chapter_traced(chapter_num, chapter_content)
+            
+            def generate_single_chapter_traced(chapter_num, chapter_content):
                 try:
                     narration = self.generate_chapter_narration_with_retry(
                         chapter_content, chapter_num, len(chapters),
@@ -1152,7 +1205,7 @@ class ScriptGeneratorV2:
             # 重新生成无效章节
             if all_invalid:
                 print(f"\n--- 重新生成无效章节 ---")
-                regenerate_success = self.regenerate_invalid_chapters(output_dir, all_invalid)
+                regenerate_success = self.regenerate_invalid_chapters(output_dir, all_invalid, novel_file, target_chapters)
                 
                 if regenerate_success:
                     print("\n✓ 所有无效章节重新生成成功")
@@ -1244,7 +1297,7 @@ def main():
             
             if args.regenerate and all_invalid:
                 print("\n=== 重新生成模式 ===")
-                generator.regenerate_invalid_chapters(args.output, all_invalid)
+                generator.regenerate_invalid_chapters(args.output, all_invalid, args.novel_file, args.chapters)
         
         else:
             # 生成模式
@@ -10,9 +10,10 @@ import sys
 import json
 import time
 import base64
-import shutil
 from config.config import build_character_prompt, IMAGE_TWO_CONFIG
 from volcengine.visual.VisualService import VisualService
+from rate_limiter import rate_limited_call
+from asset_store import store_bytes, store_file
 
 def copy_image_to_chapter_images(image_path, novel_id, chapter_id):
     """
@@ -47,7 +48,7 @@ def copy_image_to_chapter_images(image_path, novel_id, chapter_id):
         target_path = os.path.join(chapter_images_dir, image_filename)
         
         # 复制图片
-        shutil.copy2(image_path, target_path)
+        store_file(image_path, target_path)
         
         print(f"✓ 图片已复制到: {target_path}")
         return target_path
@@ -185,7 +186,7 @@ def generate_single_character_image():
                 
                 # 第一步：提交异步任务
                 print(f"提交异步任务 {i+1}/{image_count}...")
-                submit_resp = visual_service.cv_sync2async_submit_task(form)
+                submit_resp = rate_limited_call('visual_submit', visual_service.cv_sync2async_submit_task, form)
                 
                 # 检查提交响应
                 if 'data' not in submit_resp or 'task_id' not in submit_resp['data']:
@@ -213,7 +214,7 @@ def generate_single_character_image():
                         "req_key": IMAGE_TWO_CONFIG['req_key'],
                         "task_id": async_task_id
                     }
-                    result_resp = visual_service.cv_sync2async_get_result(query_form)
+                    result_resp = rate_limited_call('visual_query', visual_service.cv_sync2async_get_result, query_form)
                     
                     if 'data' not in result_resp:
                         print(f"查询响应异常: {result_resp}")
@@ -230,8 +231,7 @@ def generate_single_character_image():
                             image_filename = f"{character_name}.png"
                             image_path = os.path.join(output_dir, image_filename)
                             
-                            with open(image_path, 'wb') as f:
-                                f.write(image_bytes)
+                            store_bytes(image_bytes, image_path)
                             
                             # 复制图片到章节images目录
                             copied_path = copy_image_to_chapter_images(image_path, novel_id, chapter_id)
@@ -12,11 +12,16 @@ import subprocess
 from pathlib import Path
 import glob
 
-def standardize_segments(data_path, target_width=720, target_height=1280, fps=30):
-    """将每个章节目录下 temp_narration_videos 内的 segment_*.mp4 标准化为 720x1280。
+from video_contract import CONTRACT, check_contract, conform_video
+
+# 中间片段后续还会重新编码，标准化时用高质量CPU编码
+SEGMENT_GPU_PARAMS = {'video_codec': 'libx264', 'preset': 'medium', 'extra_params': ['-crf', '20']}
+
+def standardize_segments(data_path, target_width=CONTRACT['width'], target_height=CONTRACT['height'], fps=CONTRACT['fps']):
+    """将每个章节目录下 temp_narration_videos 内的 segment_*.mp4 标准化为编码约定（video_contract.py）。
     - 使用 scale=force_original_aspect_ratio=increase + 居中 crop，避免拉伸
-    - 设置 setsar=1，确保像素宽高比正确
-    - 保持或可选混入原音频（若有）
+    - 设置 setsar=1，确保像素宽高比正确，帧率/像素格式/profile按约定统一
+    - 保持原音频，没有音轨时补静音轨
     """
     print(f"\n=== 标准化 segment 视频到 {target_width}x{target_height} ===")
     changed = 0
@@ -35,53 +40,20 @@ def standardize_segments(data_path, target_width=720, target_height=1280, fps=30
         print(f"{os.path.basename(chapter_dir)}: 找到 {len(segment_files)} 段")
         for seg in segment_files:
             try:
-                probe = subprocess.run(
-                    [
-                        "ffprobe", "-v", "error",
-                        "-select_streams", "v:0",
-                        "-show_entries", "stream=width,height",
-                        "-of", "csv=p=0:s=x",
-                        seg,
-                    ],
-                    capture_output=True,
-                    text=True,
-                )
-                if probe.returncode != 0:
-                    print(f"  ❌ ffprobe 失败: {os.path.basename(seg)}")
-                    continue
-
-                res = probe.stdout.strip()
-                w, h = (0, 0)
-                if "x" in res:
-                    try:
-                        w, h = map(int, res.split("x"))
-                    except Exception:
-                        pass
-
-                if w == target_width and h == target_height:
-                    print(f"  ✓ 已是 {target_width}x{target_height}: {os.path.basename(seg)}")
+                problems = check_contract(seg, video_only=True)
+                if not problems:
+                    print(f"  ✓ 已符合约定 {target_width}x{target_height}: {os.path.basename(seg)}")
                     continue
 
                 tmp_out = seg + ".std.mp4"
-                vf = (
-                    f"scale={target_width}:{target_height}:force_original_aspect_ratio=increase,"
-                    f"crop={target_width}:{target_height}:(in_w-{target_width})/2:(in_h-{target_height})/2,"
-                    "setsar=1"
-                )
-                cmd = [
-                    "ffmpeg", "-y", "-i", seg,
-                    "-map", "0:v:0", "-map", "0:a?",
-                    "-vf", vf,
-                    "-r", str(fps),
-                    "-c:v", "libx264", "-crf", "20", "-preset", "medium",
-                    "-pix_fmt", "yuv420p",
-                    "-c:a", "aac", "-b:a", "160k",
-                    "-movflags", "+faststart",
-                    tmp_out,
-                ]
+                try:
+                    conform_video(seg, tmp_out, gpu_params=SEGMENT_GPU_PARAMS, fit='crop', label='standardize_segment')
+                    ok = True
+                except RuntimeError as e:
+                    print(f"  ❌ ffmpeg 失败: {e}")
+                    ok = False
 
-                proc = subprocess.run(cmd, capture_output=True, text=True)
-                if proc.returncode == 0 and os.path.exists(tmp_out):
+                if ok and os.path.exists(tmp_out):
                     os.replace(tmp_out, seg)
                     print(f"  ✓ 已标准化: {os.path.basename(seg)} -> {target_width}x{target_height}")
                     changed += 1
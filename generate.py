@@ -27,6 +27,7 @@ from config.config import TTS_CONFIG, ARK_CONFIG, IMAGE_TWO_CONFIG
 from src.script.gen_script import ScriptGenerator
 from src.voice.gen_voice import VoiceGenerator
 from src.image.gen_image import generate_image_with_volcengine
+from rate_limiter import rate_limited_call
 import time
 import urllib.request
 
@@ -111,7 +112,7 @@ def create_video_from_images(first_image_path, second_image_path, duration, outp
         # 创建视频生成任务
         client = Ark(api_key=ARK_CONFIG["api_key"])
         
-        resp = client.content_generation.tasks.create(
+        resp = rate_limited_call('ark_video_submit', client.content_generation.tasks.create,
             model="doubao-seedance-1-0-lite-i2v-250428",
             content=[
                 {
@@ -148,7 +149,7 @@ def create_video_from_images(first_image_path, second_image_path, duration, outp
             waited_time += wait_interval
             
             # 查询任务状态
-            status_resp = client.content_generation.tasks.get(task_id=task_id)
+            status_resp = rate_limited_call('ark_video_query', client.content_generation.tasks.get, task_id=task_id)
             
             if status_resp.status == "succeeded":
                 video_url = status_resp.content.video_url
@@ -281,7 +282,7 @@ def generate_audio(text, output_path):
         }
         
         print(f"正在生成音频: {os.path.basename(output_path)}")
-        resp = requests.post(api_url, json.dumps(request_json), headers=header)
+        resp = rate_limited_call('bytedance_tts', requests.post, api_url, json.dumps(request_json), headers=header)
         
         if "data" in resp.json():
             data = resp.json()["data"]
@@ -363,7 +364,7 @@ def generate_audio(text, output_path):
             }
         }
         
-        resp = visual_service.cv_process(form)
+        resp = rate_limited_call('visual_sync', visual_service.cv_process, form)
         
         # 检查响应
         if 'data' in resp and 'binary_data_base64' in resp['data']:
@@ -456,7 +457,7 @@ def generate_audio(text, output_path):
                     }
                 }
                 
-                resp = client.cv_process(form)
+                resp = rate_limited_call('visual_sync', client.cv_process, form)
                 
                 # 处理图片数据并保存
                 if 'data' in resp and 'binary_data_base64' in resp['data']:
@@ -1076,7 +1077,7 @@ def generate_chapter_narration(chapter_content, chapter_num, total_chapters):
         print(f"正在为第{chapter_num}章生成解说文案...")
         
         # 调用API生成解说
-        completion = generator.client.chat.completions.create(
+        completion = rate_limited_call('ark_chat', generator.client.chat.completions.create,
             model=generator.model,
             messages=[
                 {"role": "user", "content": custom_prompt}
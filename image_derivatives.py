@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+生成图片的渲染派生图与缩略图
+
+功能:
+    - 图片下载落盘时（check_async_tasks、gen_image、ComfyUI下载、Celery图片任务）立即生成派生图，原图保留不动
+    - render: 按视频画布（video_contract约定的宽高）居中裁剪并缩放好的JPEG，
+      create_image_video_with_effects 直接用它做动态效果，不再每次渲染都解码、缩放原始分辨率大图
+    - thumb: 不超过360x640的小JPEG，审查页面列表显示缩略图，点击查看时仍然打开原图
+    - 按原图内容SHA-256 + 派生参数缓存在 data/.image_derivatives，重新生成的图片自动得到新的派生图；
+      下载时未生成（如未安装PIL、历史图片）的在首次使用时补生成，生成失败时退回原图
+
+使用方法:
+    from image_derivatives import ingest_image, render_image_path, thumbnail_path
+
+    ingest_image(image_path)                      # 图片落盘后调用，不抛异常
+    source = render_image_path(image_path, 720, 1280)
+    thumb = thumbnail_path(image_path)            # 没有缩略图时返回None
+
+    # 命令行：为已有图片补生成派生图、查看统计、清理长期未使用的派生图
+    python image_derivatives.py ingest data/001
+    python image_derivatives.py stats
+    python image_derivatives.py prune --days 30 --dry-run
+
+环境变量:
+    IMAGE_DERIVATIVES_DISABLED=1  不生成也不使用派生图，全部使用原图
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+from asset_store import format_bytes, hash_file
+from video_contract import CONTRACT
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.path.join(PROJECT_ROOT, 'data', '.image_derivatives')
+
+IMAGE_EXTENSIONS = ('.jpeg', '.jpg', '.png', '.webp')
+
+# 派生图规格：cover为按画布居中裁剪后缩放，contain为等比缩放到不超过该尺寸
+VARIANTS = {
+    'render': {'size': (CONTRACT['width'], CONTRACT['height']), 'fit': 'cover', 'quality': 95},
+    'thumb': {'size': (360, 640), 'fit': 'contain', 'quality': 85},
+}
+
+# 派生算法变化时递增，旧派生图自动失效
+DERIVATIVE_VERSION = 1
+
+
+def derivatives_disabled():
+    return os.environ.get('IMAGE_DERIVATIVES_DISABLED') == '1'
+
+
+def pil_derive(data, size, fit, quality):
+    """
+    使用PIL生成派生图：cover按目标宽高比居中裁剪后缩放到size，contain等比缩小到不超过size
+    统一编码为baseline JPEG（透明通道铺白底），解码速度快
+
+    Returns:
+        bytes: JPEG字节，未安装PIL时返回None
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None
+
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image.convert('RGBA'), mask=image.convert('RGBA').getchannel('A'))
+            image = background
+        else:
+            image = image.convert('RGB')
+
+        if fit == 'cover':
+            image = ImageOps.fit(image, size, Image.LANCZOS)
+        elif image.width > size[0] or image.height > size[1]:
+            image.thumbnail(size, Image.LANCZOS)
+
+        output = io.BytesIO()
+        image.save(output, format='JPEG', quality=quality)
+        return output.getvalue()
+
+
+class ImageDerivatives:
+    """
+    派生图缓存：<key[:2]>/<key>.jpg，key由原图内容哈希和派生规格计算
+
+    Args:
+        cache_dir (str): 缓存目录
+        deriver (callable): deriver(图片字节, size, fit, quality) -> JPEG字节 或 None，默认使用PIL
+        clock (callable): 当前时间，用于记录派生图最近使用时间
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, deriver=pil_derive, clock=time.time):
+        self.cache_dir = cache_dir
+        self.deriver = deriver
+        self.clock = clock
+        self._lock = threading.Lock()
+        # (路径, 大小, 修改时间) -> 内容哈希，原图未变化时不再重新计算
+        self._digests = {}
+        self.stats = {'hits': 0, 'built': 0, 'failed': 0}
+
+    def _digest(self, image_path):
+        stat = os.stat(image_path)
+        stat_key = (os.path.abspath(image_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            digest = self._digests.get(stat_key)
+        if digest is None:
+            digest = hash_file(image_path)
+            with self._lock:
+                self._digests[stat_key] = digest
+        return digest
+
+    def key_for(self, digest, variant):
+        payload = json.dumps({'image': digest, 'variant': VARIANTS[variant], 'version': DERIVATIVE_VERSION},
+                             sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def derivative_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.jpg")
+
+    def _build(self, image_path, path, variant):
+        spec = VARIANTS[variant]
+        with open(image_path, 'rb') as f:
+            data = f.read()
+        try:
+            payload = self.deriver(data, spec['size'], spec['fit'], spec['quality'])
+        except Exception as e:
+            print(f"⚠ 生成派生图失败 {os.path.basename(image_path)} ({variant}): {e}")
+            payload = None
+        if not payload:
+            with self._lock:
+                self.stats['failed'] += 1
+            return False
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.stats['built'] += 1
+        return True
+
+    def get(self, image_path, variant, build=True):
+        """
+        获取原图的派生图路径，缺失时（build=True）现场生成
+
+        Returns:
+            str: 派生图路径，原图不存在或无法生成时返回None
+        """
+        if not os.path.exists(image_path):
+            return None
+        path = self.derivative_path(self.key_for(self._digest(image_path), variant))
+        if os.path.exists(path):
+            # 记录使用时间，prune按最近使用时间清理
+            now = self.clock()
+            os.utime(path, (now, now))
+            with self._lock:
+                self.stats['hits'] += 1
+            return path
+        if build and self._build(image_path, path, variant):
+            return path
+        return None
+
+    def ingest(self, image_path):
+        """
+        生成原图的全部派生图
+
+        Returns:
+            dict: {variant: 派生图路径或None}
+        """
+        return {variant: self.get(image_path, variant) for variant in VARIANTS}
+
+    def iter_files(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.jpg'):
+                    yield os.path.join(root, name)
+
+    def disk_stats(self):
+        files = list(self.iter_files())
+        return {'files': len(files), 'bytes': sum(os.path.getsize(path) for path in files)}
+
+    def prune(self, max_age_days, dry_run=False):
+        """
+        删除超过max_age_days天未被使用的派生图，需要时会按原图重新生成
+        """
+        cutoff = self.clock() - max_age_days * 86400
+        removed = 0
+        for path in list(self.iter_files()):
+            if os.path.getmtime(path) < cutoff:
+                removed += 1
+                if not dry_run:
+                    os.remove(path)
+        return removed
+
+
+_derivatives = None
+_derivatives_lock = threading.Lock()
+
+
+def get_image_derivatives():
+    """
+    获取进程内共享的派生图缓存
+    """
+    global _derivatives
+    with _derivatives_lock:
+        if _derivatives is None:
+            _derivatives = ImageDerivatives()
+        return _derivatives
+
+
+def ingest_image(image_path):
+    """
+    图片落盘后生成派生图，失败只打印警告，不影响下载流程
+    """
+    if derivatives_disabled():
+        return {}
+    try:
+        return get_image_derivatives().ingest(image_path)
+    except Exception as e:
+        print(f"⚠ 生成派生图失败 {image_path}: {e}")
+        return {}
+
+
+def render_image_path(image_path, width=CONTRACT['width'], height=CONTRACT['height']):
+    """
+    返回渲染用的图片路径：画布尺寸与派生图一致时使用派生图，否则或无法生成时使用原图
+    """
+    if derivatives_disabled() or (width, height) != VARIANTS['render']['size']:
+        return image_path
+    try:
+        return get_image_derivatives().get(image_path, 'render') or image_path
+    except OSError as e:
+        print(f"⚠ 读取渲染派生图失败，使用原图 {image_path}: {e}")
+        return image_path
+
+
+def thumbnail_path(image_path):
+    """
+    返回缩略图路径，没有可用缩略图时返回None
+    """
+    if derivatives_disabled():
+        return None
+    try:
+        return get_image_derivatives().get(image_path, 'thumb')
+    except OSError:
+        return None
+
+
+def iter_images(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+                for name in sorted(files):
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        yield os.path.join(root, name)
+        elif path.lower().endswith(IMAGE_EXTENSIONS):
+            yield path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='图片渲染派生图与缩略图')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='缓存目录')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    ingest_parser = subparsers.add_parser('ingest', help='为已有图片补生成派生图')
+    ingest_parser.add_argument('paths', nargs='+', help='图片文件或目录')
+    subparsers.add_parser('stats', help='查看缓存统计')
+    prune_parser = subparsers.add_parser('prune', help='清理长期未使用的派生图')
+    prune_parser.add_argument('--days', type=float, default=30, help='未使用天数，默认30')
+    prune_parser.add_argument('--dry-run', action='store_true', help='只统计不删除')
+    args = parser.parse_args()
+
+    derivatives = ImageDerivatives(args.cache_dir)
+    if args.command == 'ingest':
+        count = 0
+        for image_path in iter_images(args.paths):
+            derivatives.ingest(image_path)
+            count += 1
+        stats = derivatives.stats
+        print(f"处理图片 {count} 张：新生成 {stats['built']} 个，已存在 {stats['hits']} 个，失败 {stats['failed']} 个")
+        return 1 if stats['failed'] else 0
+    if args.command == 'stats':
+        stats = derivatives.disk_stats()
+        print(f"派生图: {stats['files']} 个，共 {format_bytes(stats['bytes'])}")
+    else:
+        removed = derivatives.prune(args.days, dry_run=args.dry_run)
+        print(f"{'将清理' if args.dry_run else '已清理'} {removed} 个派生图")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
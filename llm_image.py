@@ -49,6 +49,7 @@ from volcenginesdkarkruntime import Ark
 
 # 导入配置
 from config.config import ARK_CONFIG
+from rate_limiter import rate_limited_call
 
 # 导入图片生成功能
 try:
@@ -366,7 +367,7 @@ def analyze_image_with_llm(client: Ark, image_base64: str, prompt: str = "请仔
     token_usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
     
     try:
-        resp = client.chat.completions.create(
+        resp = rate_limited_call('ark_chat', client.chat.completions.create,
             model="doubao-seed-1-6-flash-250715",
             messages=[
                 {
@@ -503,7 +504,7 @@ def generate_image_with_character_to_chapter_async(prompt: str, output_path: str
             
             # 调用异步API提交任务
             print("提交异步任务...")
-            resp = visual_service.cv_sync2async_submit_task(form)
+            resp = rate_limited_call('visual_submit', visual_service.cv_sync2async_submit_task, form)
             
             # 检查响应
             if 'data' in resp and 'task_id' in resp['data']:
@@ -18,6 +18,8 @@ LLM旁白图片分析工具
 - 使用base64编码处理图片
 - 详细的进度反馈和错误处理
 - 自动记录失败的图片到fail.txt文件（批量模式）
+- 并发审查：在共享限流器（ark_chat桶）控制下并发调用视觉模型，失败图片的重新生成与后续审查重叠执行
+- 审查账本：按图片内容哈希和提示词版本持久化审查结论，未变化的图片不再重复审查
 
 使用方法:
     # 批量检查data/004目录下所有chapter中的旁白图片
@@ -29,6 +31,10 @@ LLM旁白图片分析工具
     # 限制处理数量
     python llm_narration_image.py data/004 --max-images 10
     
+    # 调整并发审查数（请求速率由共享限流器的ark_chat桶控制），或忽略历史结论强制重新审查
+    python llm_narration_image.py data/004 --concurrency 8
+    python llm_narration_image.py data/004 --no-ledger
+    
     # 启用自动重新生成失败图片
     python llm_narration_image.py data/004 --auto-regenerate
     
@@ -45,14 +51,23 @@ LLM旁白图片分析工具
 import os
 import argparse
 import base64
+import hashlib
+import shutil
+import sqlite3
 import sys
 import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import List, Optional
 from volcenginesdkarkruntime import Ark
 
 # 导入配置
 from config.config import ARK_CONFIG
+from reference_image_cache import get_reference_image_cache
+from rate_limiter import rate_limited_call
 
 # 导入图片生成功能
 try:
@@ -179,7 +194,7 @@ def resize_image_if_needed(image_path: str, max_size_mb: float = 4.7) -> str:
 
 def encode_image_to_base64(image_path: str) -> Optional[str]:
     """
-    将图片文件编码为base64格式，会先转换为JPG格式并在必要时进行压缩
+    将图片文件编码为base64格式，结果按图片内容缓存，过大的图片会先缩小重新编码
     
     Args:
         image_path: 图片文件路径
@@ -188,45 +203,11 @@ def encode_image_to_base64(image_path: str) -> Optional[str]:
         base64编码的图片数据，格式为 data:image/<format>;base64,<data>
         如果编码失败返回None
     """
-    temp_path = None
     try:
-        # 处理图片：转换为JPG格式，如果过大则压缩
-        processed_path = resize_image_if_needed(image_path)
-        temp_path = processed_path if processed_path != image_path else None
-        
-        with open(processed_path, 'rb') as image_file:
-            # 读取图片二进制数据
-            image_data = image_file.read()
-            # 编码为base64
-            base64_data = base64.b64encode(image_data).decode('utf-8')
-            
-            # 获取图片格式 - 根据实际文件内容而不是扩展名
-            import imghdr
-            detected_format = imghdr.what(processed_path)
-            if detected_format:
-                # 使用检测到的实际格式
-                image_format = detected_format
-            else:
-                # 如果检测失败，回退到扩展名判断
-                file_extension = Path(processed_path).suffix.lower()
-                if file_extension == '.jpg':
-                    image_format = 'jpeg'
-                else:
-                    image_format = file_extension[1:]  # 去掉点号
-            
-            # 构造完整的data URL
-            return f"data:image/{image_format};base64,{base64_data}"
-            
+        return get_reference_image_cache().get_data_url(image_path)
     except Exception as e:
         print(f"编码图片失败 {image_path}: {e}")
         return None
-    finally:
-        # 清理临时文件
-        if temp_path and os.path.exists(temp_path):
-            try:
-                os.unlink(temp_path)
-            except:
-                pass
 
 def find_narration_images_in_chapters(data_directory: str) -> List[str]:
     """
@@ -275,6 +256,9 @@ def find_narration_images_in_chapters(data_directory: str) -> List[str]:
     print(f"总共找到 {len(narration_images)} 张旁白图片")
     return sorted(narration_images)
 
+# 审查使用的视觉模型，模型变化后历史结论自动失效
+REVIEW_MODEL = "doubao-seed-1-6-flash-250715"
+
 def analyze_image_with_llm(client: Ark, image_base64: str, prompt: str = "\
     请仔细观察这张旁白图片，进行以下全面审查：\n\n【领口审查标准】\n✅ 通过的领口类型：圆领、立领、高领、方领、一字领等完全遮盖脖子和胸部的领口\n❌ 失败的领口类型：\n\
         - 交领/衽领：左右衣襟交叉重叠，形成V字形开口，露出脖子和胸部皮肤\n- V领：任何形式的V字形领口\n- y字型领：形成Y字形状的领口\n- 低领：领口过低，露出脖子以下皮肤\n\
@@ -299,8 +283,8 @@ def analyze_image_with_llm(client: Ark, image_base64: str, prompt: str = "\
     token_usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
     
     try:
-        resp = client.chat.completions.create(
-            model="doubao-seed-1-6-flash-250715",
+        resp = rate_limited_call('ark_chat', client.chat.completions.create,
+            model=REVIEW_MODEL,
             messages=[
                 {
                     "content": [
@@ -332,6 +316,196 @@ def analyze_image_with_llm(client: Ark, image_base64: str, prompt: str = "\
         print(f"LLM分析失败: {e}")
         return None, token_usage
 
+# 审查账本与审查图片缓存目录（位于data目录下，多次运行之间共享）
+REVIEW_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', '.image_review')
+
+class ReviewLedger:
+    """
+    图片审查结论账本，按 (图片内容哈希, 提示词版本) 持久化审查结论
+    使用SQLite存储，支持多个进程（CLI与Celery worker）同时读写
+    """
+    
+    def __init__(self, cache_dir: str = REVIEW_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.jpeg_dir = os.path.join(cache_dir, 'jpeg')
+        os.makedirs(self.jpeg_dir, exist_ok=True)
+        self.db_path = os.path.join(cache_dir, 'ledger.sqlite3')
+        self.lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS verdicts ("
+                "content_hash TEXT NOT NULL, prompt_version TEXT NOT NULL, verdict TEXT NOT NULL, "
+                "result TEXT, image_path TEXT, reviewed_at REAL NOT NULL, "
+                "PRIMARY KEY (content_hash, prompt_version))"
+            )
+    
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+    
+    def get(self, content_hash: str, prompt_version: str) -> Optional[dict]:
+        with self.lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT verdict, result FROM verdicts WHERE content_hash = ? AND prompt_version = ?",
+                (content_hash, prompt_version)
+            ).fetchone()
+        if row:
+            return {'verdict': row[0], 'result': row[1]}
+        return None
+    
+    def put(self, content_hash: str, prompt_version: str, verdict: str, result: str, image_path: str):
+        with self.lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?, ?)",
+                (content_hash, prompt_version, verdict, result, image_path, time.time())
+            )
+
+def get_prompt_version(prompt: str) -> str:
+    """
+    根据审查提示词和模型计算提示词版本，提示词或模型变化后旧结论不再复用
+    """
+    return hashlib.sha256(f"{REVIEW_MODEL}\n{prompt}".encode('utf-8')).hexdigest()[:16]
+
+def get_review_data_url(image_path: str, image_data: bytes, content_hash: str, jpeg_dir: str) -> Optional[str]:
+    """
+    获取用于审查的JPEG data URL
+    已是合规JPEG的图片直接使用原始字节，其余图片规范化后缓存到jpeg_dir，后续运行直接复用
+    
+    Args:
+        image_path: 图片文件路径
+        image_data: 图片原始字节
+        content_hash: 图片内容哈希
+        jpeg_dir: 规范化JPEG缓存目录
+        
+    Returns:
+        data URL字符串，失败返回None
+    """
+    if image_data[:2] == b'\xff\xd8' and len(image_data) <= 4.7 * 1024 * 1024:
+        return "data:image/jpeg;base64," + base64.b64encode(image_data).decode('utf-8')
+    
+    cached_path = os.path.join(jpeg_dir, f"{content_hash}.jpg")
+    if not os.path.exists(cached_path):
+        processed_path = resize_image_if_needed(image_path)
+        if processed_path == image_path:
+            # 规范化失败（如缺少PIL），退化为原有的编码方式
+            return encode_image_to_base64(image_path)
+        # 临时文件可能位于其他文件系统（如tmpfs），先移动到缓存目录内再原子替换
+        staging_path = f"{cached_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.move(processed_path, staging_path)
+        os.replace(staging_path, cached_path)
+    
+    with open(cached_path, 'rb') as f:
+        return "data:image/jpeg;base64," + base64.b64encode(f.read()).decode('utf-8')
+
+def parse_review_verdict(result: str) -> str:
+    """
+    解析LLM审查结果，优先检查失败关键词，结果不明确时视为失败
+
+    Returns:
+        str: 'pass'、'fail' 或 'unclear'
+    """
+    if "失败" in result or "fail" in result.lower():
+        return 'fail'
+    if "通过" in result or "pass" in result.lower():
+        return 'pass'
+    return 'unclear'
+
+def review_images_concurrently(client: Ark, image_files: List[str], prompt: str, auto_regenerate: bool = False,
+                               concurrency: int = 4,
+                               ledger: Optional[ReviewLedger] = None, on_result=None) -> dict:
+    """
+    并发审查图片：按内容哈希复用历史结论，未命中时在限流器控制下并发调用视觉模型，
+    审查失败的图片在独立线程池中提交重新生成任务，与后续审查重叠执行
+    
+    Args:
+        client: Ark客户端实例
+        image_files: 图片路径列表
+        prompt: 审查提示词
+        auto_regenerate: 是否自动重新生成失败的图片
+        concurrency: 同时进行的审查数
+        ledger: 审查账本，None表示不使用缓存
+        on_result: 单张图片处理完成时的回调 on_result(record, done, total)
+        
+    Returns:
+        dict: 包含records（逐图结果）、token统计和重新生成数量
+    """
+    prompt_version = get_prompt_version(prompt)
+    jpeg_dir = ledger.jpeg_dir if ledger else tempfile.mkdtemp(prefix='image_review_')
+    
+    def review(image_path: str) -> dict:
+        record = {'image_path': image_path, 'verdict': 'error', 'result': None, 'cached': False,
+                  'token_usage': {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}}
+        if not os.path.exists(image_path):
+            record['result'] = '文件不存在'
+            return record
+        
+        with open(image_path, 'rb') as f:
+            image_data = f.read()
+        content_hash = hashlib.sha256(image_data).hexdigest()
+        record['content_hash'] = content_hash
+        
+        if ledger:
+            cached = ledger.get(content_hash, prompt_version)
+            if cached:
+                record.update(verdict=cached['verdict'], result=cached['result'], cached=True)
+                return record
+        
+        image_base64 = get_review_data_url(image_path, image_data, content_hash, jpeg_dir)
+        if not image_base64:
+            record['result'] = '图片编码失败'
+            return record
+        
+        result, token_usage = analyze_image_with_llm(client, image_base64, prompt)
+        record['token_usage'] = token_usage
+        if not result:
+            record['result'] = 'LLM分析失败'
+            return record
+        
+        record['result'] = result
+        record['verdict'] = parse_review_verdict(result)
+        if ledger:
+            ledger.put(content_hash, prompt_version, record['verdict'], result, image_path)
+        return record
+    
+    summary = {'records': [], 'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0,
+               'regenerated': 0, 'cached': 0}
+    regenerate_futures = []
+    
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as review_pool, \
+            ThreadPoolExecutor(max_workers=2) as regenerate_pool:
+        futures = {review_pool.submit(review, image_path): image_path for image_path in image_files}
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                record = future.result()
+            except Exception as e:
+                record = {'image_path': futures[future], 'verdict': 'error', 'result': str(e), 'cached': False,
+                          'token_usage': {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}}
+            
+            for key in ('prompt_tokens', 'completion_tokens', 'total_tokens'):
+                summary[key] += record['token_usage'][key]
+            if record['cached']:
+                summary['cached'] += 1
+            summary['records'].append(record)
+            
+            if auto_regenerate and record['verdict'] in ('fail', 'unclear'):
+                regenerate_futures.append(regenerate_pool.submit(regenerate_failed_image, record['image_path']))
+            
+            if on_result:
+                on_result(record, done, len(image_files))
+        
+        for future in regenerate_futures:
+            try:
+                if future.result():
+                    summary['regenerated'] += 1
+            except Exception as e:
+                print(f"重新生成图片时发生错误: {e}")
+    
+    if not ledger:
+        shutil.rmtree(jpeg_dir, ignore_errors=True)
+    
+    order = {image_path: i for i, image_path in enumerate(image_files)}
+    summary['records'].sort(key=lambda r: order.get(r['image_path'], 0))
+    return summary
+
 def generate_image_with_character_to_chapter_async(prompt: str, output_path: str, character_images=None, style=None, max_retries=3) -> bool:
     """
     使用角色图片异步生成图片，将任务保存到对应chapter的async_tasks目录
@@ -441,7 +615,7 @@ def generate_image_with_character_to_chapter_async(prompt: str, output_path: str
             
             # 调用异步API提交任务
             print("提交异步任务...")
-            resp = visual_service.cv_sync2async_submit_task(form)
+            resp = rate_limited_call('visual_submit', visual_service.cv_sync2async_submit_task, form)
             
             # 检查响应
             if 'data' in resp and 'task_id' in resp['data']:
@@ -715,7 +889,8 @@ def regenerate_single_image_with_custom_prompt(image_path: str, custom_prompt: s
         print(f"✗ 重新生成图片时发生错误: {e}")
         return False
 
-def process_narration_images(data_directory: str, prompt: str = "请仔细观察这张旁白图片，进行以下全面审查：\n\n【领口审查标准】\n✅ 通过的领口类型：圆领、立领、高领、方领、一字领等完全遮盖脖子和胸部的领口\n❌ 失败的领口类型：\n- 交领/衽领：左右衣襟交叉重叠，形成V字形开口，露出脖子和胸部皮肤\n- V领：任何形式的V字形领口\n- y字型领：形成Y字形状的领口\n- 低领：领口过低，露出脖子以下皮肤\n- 开胸装：胸前有明显开口或缝隙\n\n【皮肤暴露检查】\n检查角色是否存在以下问题：\n- 脖子暴露：脖子部位不能有任何皮肤暴露\n- 后背脖子以下皮肤暴露：后背脖子以下区域不能有皮肤暴露\n- 胸部皮肤暴露：胸前不能有皮肤暴露\n\n【手部检测】\n检查角色是否存在以下问题：\n- 三只手或更多手臂\n- 多余的手指\n- 手部位置不合理\n- 手部形状异常\n\n【内容审查】\n检查图片中是否存在文字、乱码、水印等不当内容\n\n【判断要求】\n请重点关注：\n1. 领口是否露出脖子以下的皮肤区域\n2. 脖子是否有任何暴露\n3. 后背脖子以下是否有皮肤暴露\n4. 角色手部数量是否正常（最多两只手）\n5. 如果角色穿着交领袍服、汉服等传统服装，要特别注意交领处是否形成开口露出胸部\n\n如果发现任何问题，请返回'失败'并详细说明原因。如果完全符合要求，请返回'通过'。", max_images: Optional[int] = None, start_from: Optional[str] = None, auto_regenerate: bool = False):
+def process_narration_images(data_directory: str, prompt: str = "请仔细观察这张旁白图片，进行以下全面审查：\n\n【领口审查标准】\n✅ 通过的领口类型：圆领、立领、高领、方领、一字领等完全遮盖脖子和胸部的领口\n❌ 失败的领口类型：\n- 交领/衽领：左右衣襟交叉重叠，形成V字形开口，露出脖子和胸部皮肤\n- V领：任何形式的V字形领口\n- y字型领：形成Y字形状的领口\n- 低领：领口过低，露出脖子以下皮肤\n- 开胸装：胸前有明显开口或缝隙\n\n【皮肤暴露检查】\n检查角色是否存在以下问题：\n- 脖子暴露：脖子部位不能有任何皮肤暴露\n- 后背脖子以下皮肤暴露：后背脖子以下区域不能有皮肤暴露\n- 胸部皮肤暴露：胸前不能有皮肤暴露\n\n【手部检测】\n检查角色是否存在以下问题：\n- 三只手或更多手臂\n- 多余的手指\n- 手部位置不合理\n- 手部形状异常\n\n【内容审查】\n检查图片中是否存在文字、乱码、水印等不当内容\n\n【判断要求】\n请重点关注：\n1. 领口是否露出脖子以下的皮肤区域\n2. 脖子是否有任何暴露\n3. 后背脖子以下是否有皮肤暴露\n4. 角色手部数量是否正常（最多两只手）\n5. 如果角色穿着交领袍服、汉服等传统服装，要特别注意交领处是否形成开口露出胸部\n\n如果发现任何问题，请返回'失败'并详细说明原因。如果完全符合要求，请返回'通过'。", max_images: Optional[int] = None, start_from: Optional[str] = None, auto_regenerate: bool = False,
+                             concurrency: int = 4, use_ledger: bool = True, progress_callback=None, log=print):
     """
     批量处理旁白图片分析
     
@@ -725,22 +900,29 @@ def process_narration_images(data_directory: str, prompt: str = "请仔细观察
         max_images: 最大处理图片数量，None表示处理所有图片
         start_from: 从指定图片开始处理，None表示从头开始
         auto_regenerate: 是否自动重新生成失败的图片
+        concurrency: 同时进行的审查数
+        use_ledger: 是否复用审查账本中相同图片内容和提示词的历史结论
+        progress_callback: 单张图片处理完成时的回调 progress_callback(record, done, total)
+        log: 输出审查消息的函数，默认print
+        
+    Returns:
+        dict: 处理统计，未找到图片或配置错误时返回None
     """
     # 从配置文件获取API密钥
     api_key = ARK_CONFIG.get("api_key")
     if not api_key:
-        print("错误: 请在 config/config.py 中配置 ARK_CONFIG['api_key']")
+        log("错误: 请在 config/config.py 中配置 ARK_CONFIG['api_key']")
         return
     
     # 初始化客户端
     client = Ark(api_key=api_key)
     
     # 查找旁白图片文件
-    print(f"正在搜索数据目录中的旁白图片: {data_directory}")
+    log(f"正在搜索数据目录中的旁白图片: {data_directory}")
     image_files = find_narration_images_in_chapters(data_directory)
     
     if not image_files:
-        print("未找到任何旁白图片文件")
+        log("未找到任何旁白图片文件")
         return
     
     # 查找起始位置
@@ -748,29 +930,24 @@ def process_narration_images(data_directory: str, prompt: str = "请仔细观察
     if start_from:
         try:
             start_index = image_files.index(start_from)
-            print(f"从指定图片开始: {start_from} (索引: {start_index + 1})")
+            log(f"从指定图片开始: {start_from} (索引: {start_index + 1})")
         except ValueError:
-            print(f"警告: 未找到指定的起始图片 {start_from}，将从头开始处理")
+            log(f"警告: 未找到指定的起始图片 {start_from}，将从头开始处理")
             start_index = 0
     
     # 从指定位置开始处理
     if start_index > 0:
         image_files = image_files[start_index:]
-        print(f"跳过前 {start_index} 张图片")
+        log(f"跳过前 {start_index} 张图片")
     
     # 限制处理数量
     if max_images and len(image_files) > max_images:
         image_files = image_files[:max_images]
-        print(f"限制处理前 {max_images} 张图片")
+        log(f"限制处理前 {max_images} 张图片")
     
-    print(f"找到 {len(image_files)} 张旁白图片，开始分析...")
-    print(f"分析提示词: {prompt}")
-    print("-" * 80)
-    
-    # Token 统计变量
-    total_prompt_tokens = 0
-    total_completion_tokens = 0
-    total_tokens = 0
+    log(f"找到 {len(image_files)} 张旁白图片，开始分析...")
+    log(f"分析提示词: {prompt}")
+    log("-" * 80)
     
     # 失败图片记录文件路径
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -783,115 +960,95 @@ def process_narration_images(data_directory: str, prompt: str = "请仔细观察
     if start_index == 0:
         with open(failed_file_path, 'w', encoding='utf-8') as f:
             pass  # 创建空文件
-        print("已清空失败记录文件")
+        log("已清空失败记录文件")
     else:
-        print("续传模式，将追加到现有失败记录文件")
+        log("续传模式，将追加到现有失败记录文件")
     
     # 统计变量
     processed_count = 0
     passed_count = 0
     failed_count = 0
     error_count = 0
-    regenerated_count = 0
     
-    # 处理每张图片
-    for i, image_path in enumerate(image_files, 1):
-        print(f"\n[{i}/{len(image_files)}] 正在分析: {os.path.basename(image_path)}")
-        print(f"完整路径: {image_path}")
+    def on_result(record, done, total):
+        nonlocal processed_count, passed_count, failed_count, error_count
+        image_path = record['image_path']
+        cached_info = " (复用历史结论)" if record['cached'] else ""
+        log(f"\n[{done}/{total}] {os.path.basename(image_path)}{cached_info}")
+        log(f"完整路径: {image_path}")
         
-        # 检查文件是否存在
-        if not os.path.exists(image_path):
-            print(f"✗ 文件不存在，跳过")
+        if record['verdict'] == 'error':
+            log(f"✗ {record['result']}，跳过")
             error_count += 1
-            continue
-        
-        # 编码图片
-        image_base64 = encode_image_to_base64(image_path)
-        if not image_base64:
-            print(f"✗ 图片编码失败，跳过")
-            error_count += 1
-            continue
-        
-        # 分析图片
-        result, token_usage = analyze_image_with_llm(client, image_base64, prompt)
-        
-        # 更新token统计
-        total_prompt_tokens += token_usage["prompt_tokens"]
-        total_completion_tokens += token_usage["completion_tokens"]
-        total_tokens += token_usage["total_tokens"]
-        
-        processed_count += 1
-        
-        if result:
-            print(f"分析结果: {result}")
-            
-            # 判断是否通过 - 修复逻辑：优先检查失败关键词
-            if "失败" in result or "fail" in result.lower():
-                print(f"✗ 检查失败")
-                failed_count += 1
-                
-                # 记录失败图片到文件
-                with open(failed_file_path, 'a', encoding='utf-8') as f:
-                    f.write(f"{image_path}\n")
-                    f.write(f"失败原因: {result}\n")
-                    f.write("-" * 50 + "\n")
-                
-                # 如果启用自动重新生成
-                if auto_regenerate:
-                    print(f"正在尝试重新生成失败的图片...")
-                    if regenerate_failed_image(image_path):
-                        regenerated_count += 1
-                        print(f"✓ 重新生成任务已提交")
-                    else:
-                        print(f"✗ 重新生成失败")
-                        
-            elif "通过" in result or "pass" in result.lower():
-                print(f"✓ 检查通过")
+        else:
+            processed_count += 1
+            log(f"分析结果: {record['result']}")
+            if record['verdict'] == 'pass':
+                log(f"✓ 检查通过")
                 passed_count += 1
             else:
-                print(f"? 结果不明确，默认为失败")
+                log(f"✗ 检查失败" if record['verdict'] == 'fail' else f"? 结果不明确，默认为失败")
                 failed_count += 1
                 
                 # 记录失败图片到文件
                 with open(failed_file_path, 'a', encoding='utf-8') as f:
                     f.write(f"{image_path}\n")
-                    f.write(f"失败原因: {result}\n")
+                    f.write(f"失败原因: {record['result']}\n")
                     f.write("-" * 50 + "\n")
                 
-                # 如果启用自动重新生成
                 if auto_regenerate:
-                    print(f"正在尝试重新生成失败的图片...")
-                    if regenerate_failed_image(image_path):
-                        regenerated_count += 1
-                        print(f"✓ 重新生成任务已提交")
-                    else:
-                        print(f"✗ 重新生成失败")
-        else:
-            print(f"✗ LLM分析失败")
-            error_count += 1
+                    log(f"已加入重新生成队列")
+        
+        if progress_callback:
+            progress_callback(record, done, total)
+    
+    ledger = ReviewLedger() if use_ledger else None
+    summary = review_images_concurrently(
+        client, image_files, prompt,
+        auto_regenerate=auto_regenerate,
+        concurrency=concurrency,
+        ledger=ledger,
+        on_result=on_result
+    )
+    
+    total_prompt_tokens = summary['prompt_tokens']
+    total_completion_tokens = summary['completion_tokens']
+    total_tokens = summary['total_tokens']
+    regenerated_count = summary['regenerated']
     
     # 输出统计结果
-    print("\n" + "=" * 80)
-    print("处理完成统计")
-    print("=" * 80)
-    print(f"总处理数量: {processed_count}")
-    print(f"检查通过: {passed_count}")
-    print(f"检查失败: {failed_count}")
-    print(f"处理错误: {error_count}")
+    log("\n" + "=" * 80)
+    log("处理完成统计")
+    log("=" * 80)
+    log(f"总处理数量: {processed_count}")
+    log(f"复用历史结论: {summary['cached']}")
+    log(f"检查通过: {passed_count}")
+    log(f"检查失败: {failed_count}")
+    log(f"处理错误: {error_count}")
     if auto_regenerate:
-        print(f"重新生成: {regenerated_count}")
-    print(f"\nToken使用统计:")
-    print(f"输入Token: {total_prompt_tokens:,}")
-    print(f"输出Token: {total_completion_tokens:,}")
-    print(f"总Token: {total_tokens:,}")
+        log(f"重新生成: {regenerated_count}")
+    log(f"\nToken使用统计:")
+    log(f"输入Token: {total_prompt_tokens:,}")
+    log(f"输出Token: {total_completion_tokens:,}")
+    log(f"总Token: {total_tokens:,}")
     
     if failed_count > 0:
-        print(f"\n失败图片已记录到: {failed_file_path}")
+        log(f"\n失败图片已记录到: {failed_file_path}")
         if auto_regenerate:
-            print(f"已提交 {regenerated_count} 个重新生成任务")
-            print(f"请稍后使用 check_async_tasks.py 检查生成结果")
-    
-    print("\n分析完成!")
+            log(f"已提交 {regenerated_count} 个重新生成任务")
+            log(f"请稍后使用 check_async_tasks.py 检查生成结果")
+    
+    log("\n分析完成!")
+    
+    return {
+        'processed': processed_count,
+        'passed': passed_count,
+        'failed': failed_count,
+        'errors': error_count,
+        'regenerated': regenerated_count,
+        'cached': summary['cached'],
+        'total_tokens': total_tokens
+    }
 
 def main():
     """
@@ -944,6 +1101,19 @@ def main():
         help='自动重新生成检测失败的图片'
     )
     
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=4,
+        help='同时进行的图片审查数 (默认: 4)'
+    )
+    
+    parser.add_argument(
+        '--no-ledger',
+        action='store_true',
+        help='不复用审查账本中的历史结论，强制重新审查所有图片'
+    )
+    
     parser.add_argument(
         '--custom-prompt', '-c',
         help='自定义重新生成图片的提示词 (如: "去掉眼镜", "换成短发")，仅在处理单个图片且启用--auto-regenerate时有效'
@@ -1002,7 +1172,8 @@ def main():
         print()
         
         # 执行批量旁白图片分析
-        process_narration_images(input_path, args.prompt, args.max_images, args.start_from, args.auto_regenerate)
+        process_narration_images(input_path, args.prompt, args.max_images, args.start_from, args.auto_regenerate,
+                                 concurrency=args.concurrency, use_ledger=not args.no_ledger)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
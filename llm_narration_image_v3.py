@@ -59,6 +59,9 @@ from volcenginesdkarkruntime import Ark
 
 # 导入配置
 from config.config import ARK_CONFIG
+from rate_limiter import rate_limited_call
+from asset_store import store_bytes
+from image_derivatives import ingest_image
 
 # 支持的图片格式
 SUPPORTED_FORMATS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'}
@@ -213,7 +216,7 @@ def analyze_image_with_llm(client: Ark, image_base64: str, prompt: str) -> Tuple
         ]
         
         # 调用API
-        response = client.chat.completions.create(
+        response = rate_limited_call('ark_chat', client.chat.completions.create,
             model=ARK_CONFIG.get("model", "doubao-seed-1-6-250615"),
             messages=messages,
             max_tokens=1000,
@@ -356,9 +359,9 @@ def regenerate_image_with_ark(image_path: str, custom_prompt: Optional[str] = No
             print("错误: 图片数据为空")
             return False
         
-        # 保存新图片，替换原图片
-        with open(image_path, 'wb') as f:
-            f.write(image_data)
+        # 保存新图片，替换原图片（原子替换硬链接，不改写与其他章节共用的对象）
+        store_bytes(image_data, image_path)
+        ingest_image(image_path)
         
         print(f"✓ 图片重新生成成功: {os.path.basename(image_path)}")
         
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+小说数据源：一次解码、内存映射、持久化章节偏移索引
+
+功能:
+    - 小说文件（txt/zip/rar）只在第一次打开时读取并按 utf-8/gbk/gb2312/utf-16 依次尝试解码，
+      清理空白行后保存为UTF-8缓存文件 data/.novel_cache/<内容哈希>/text.txt，之后以mmap方式打开
+    - 按目标章节数分章后，把每章在缓存文件中的字节区间写入 index.json；再次生成、--limit 只生成前N章、
+      补生成缺少原文的章节时直接按区间切片，不再解码整本小说或重新跑章节标题正则
+    - 缓存按原始文件内容SHA-256寻址，文件大小和修改时间不变时不重新计算哈希
+    - 分章结果与 ScriptGeneratorV2.split_novel_into_chapters 对字符串分章完全一致
+
+使用方法:
+    from novel_source import get_novel_source
+
+    source = get_novel_source('data/001/novel.txt')
+    chapters = source.chapters(target_chapters=50, limit=5)
+    chapter_37 = source.chapter(37, target_chapters=50)
+
+    # 命令行
+    python novel_source.py info data/001/novel.txt --chapters 50
+    python novel_source.py chapter data/001/novel.txt 37 --chapters 50
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import mmap
+import os
+import re
+import sys
+import threading
+import zipfile
+
+try:
+    import rarfile
+except ImportError:
+    rarfile = None
+
+from asset_store import hash_file
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.path.join(PROJECT_ROOT, 'data', '.novel_cache')
+
+# 章节标题匹配模式，按优先级排列
+CHAPTER_PATTERNS = [
+    r'第[一二三四五六七八九十百千万\d]+章[^\n]*',
+    r'第[\d]+章[^\n]*',
+    r'Chapter\s*\d+[^\n]*',
+    r'章节\s*\d+[^\n]*'
+]
+
+# 依次尝试的编码
+NOVEL_ENCODINGS = ['utf-8', 'gbk', 'gb2312', 'utf-16']
+
+# 解码、清理或分章规则变化时递增，旧缓存自动重建
+NOVEL_CACHE_VERSION = 2
+
+
+def decode_novel_bytes(data, filename):
+    """
+    按NOVEL_ENCODINGS依次尝试解码
+
+    Raises:
+        ValueError: 所有编码都无法解码
+    """
+    for encoding in NOVEL_ENCODINGS:
+        try:
+            content = data.decode(encoding)
+            print(f"成功使用 {encoding} 编码解码文件 {filename}")
+            return content
+        except UnicodeDecodeError:
+            continue
+    raise ValueError(f"无法解码文件内容：{filename}")
+
+
+def _read_archive_text(archive, kind):
+    txt_files = [name for name in archive.namelist() if name.lower().endswith('.txt')]
+    if not txt_files:
+        raise ValueError(f"{kind}文件中没有找到.txt文件")
+    # 选择第一个txt文件
+    print(f"从{kind}文件中读取：{txt_files[0]}")
+    with archive.open(txt_files[0]) as f:
+        return f.read(), txt_files[0]
+
+
+def read_novel_bytes(file_path):
+    """
+    读取小说原始字节：普通文本文件直接读取，ZIP/RAR读取其中第一个.txt文件
+
+    Returns:
+        tuple: (原始字节, 文件名)
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"文件不存在：{file_path}")
+
+    file_ext = os.path.splitext(file_path)[1].lower()
+    if file_ext == '.zip':
+        with zipfile.ZipFile(file_path, 'r') as archive:
+            return _read_archive_text(archive, 'ZIP')
+    if file_ext == '.rar':
+        if rarfile is None:
+            raise ImportError("需要安装rarfile库来处理RAR文件")
+        with rarfile.RarFile(file_path) as archive:
+            return _read_archive_text(archive, 'RAR')
+    with open(file_path, 'rb') as f:
+        return f.read(), os.path.basename(file_path)
+
+
+def normalize_novel_text(text):
+    """
+    统一换行符（\r\n和单独的\r视为\n，与文本模式读取文件一致），连续空白行合并为一个空行，去掉首尾空白
+    """
+    text = re.sub(r'\r\n?', '\n', text)
+    return re.sub(r'\n\s*\n', '\n\n', text).strip()
+
+
+def _strip_span(text, start, end):
+    """
+    返回 text[start:end].strip() 在text中的区间
+    """
+    segment = text[start:end]
+    stripped = segment.strip()
+    if not stripped:
+        return start, start
+    offset = start + len(segment) - len(segment.lstrip())
+    return offset, offset + len(stripped)
+
+
+def _merge_spans(chapters, target_chapters):
+    """
+    与ScriptGeneratorV2._merge_chapters相同的合并规则，章节以区间列表表示，合并时以空行连接
+    """
+    if len(chapters) <= target_chapters:
+        return chapters
+
+    def length(spans):
+        if not spans:
+            return 0
+        return sum(end - start for start, end in spans) + 2 * (len(spans) - 1)
+
+    target_length = sum(length(spans) for spans in chapters) // target_chapters
+    merged = []
+    current = []
+    for spans in chapters:
+        if length(current) < target_length:
+            current = current + spans
+        else:
+            merged.append(current)
+            current = spans
+    if current:
+        if merged:
+            merged[-1] = merged[-1] + current
+        else:
+            merged.append(current)
+    return merged[:target_chapters]
+
+
+def chapter_spans(text, target_chapters):
+    """
+    对清理后的全文分章，返回每章的字符区间列表（合并的章节有多个区间，以空行连接）
+    """
+    chapters = []
+    for pattern in CHAPTER_PATTERNS:
+        matches = list(re.finditer(pattern, text, re.IGNORECASE))
+        if len(matches) >= 2:
+            for i, match in enumerate(matches):
+                end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+                start, end = _strip_span(text, match.start(), end)
+                if end - start > 100:
+                    chapters.append([(start, end)])
+            break
+
+    # 如果没有找到章节标题，按长度分割
+    if not chapters:
+        total_length = len(text)
+        chunk_size = total_length // target_chapters
+        for i in range(target_chapters):
+            end = (i + 1) * chunk_size if i < target_chapters - 1 else total_length
+            start, end = _strip_span(text, i * chunk_size, end)
+            if end > start:
+                chapters.append([(start, end)])
+
+    return _merge_spans(chapters, target_chapters)
+
+
+def _byte_offsets(text, offsets):
+    """
+    把一组字符偏移转换为UTF-8字节偏移
+    """
+    result = {}
+    position = 0
+    byte_position = 0
+    for offset in sorted(set(offsets)):
+        byte_position += len(text[position:offset].encode('utf-8'))
+        position = offset
+        result[offset] = byte_position
+    return result
+
+
+class NovelSource:
+    """
+    单个小说文件的数据源，open()返回清理后全文的文本流，可直接传给split_novel_into_chapters
+
+    Args:
+        novel_path (str): 小说文件路径
+        cache_dir (str): 缓存根目录
+    """
+
+    def __init__(self, novel_path, cache_dir=DEFAULT_CACHE_DIR):
+        self.novel_path = novel_path
+        self.cache_root = cache_dir
+        self._lock = threading.RLock()
+        self._digest = None
+        self._stat_key = None
+        self._index = None
+        self._file = None
+        self._mmap = None
+
+    def _path_record(self):
+        name = hashlib.sha1(os.path.abspath(self.novel_path).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_root, 'paths', f"{name}.json")
+
+    @staticmethod
+    def _write_json(path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _read_json(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @property
+    def digest(self):
+        """
+        原始文件内容哈希；文件大小和修改时间与上次记录一致时直接使用记录值
+        """
+        stat = os.stat(self.novel_path)
+        stat_key = [stat.st_size, stat.st_mtime_ns]
+        with self._lock:
+            if self._digest and self._stat_key == stat_key:
+                return self._digest
+            record = self._read_json(self._path_record())
+            if record and record.get('stat') == stat_key:
+                digest = record['digest']
+            else:
+                digest = hash_file(self.novel_path)
+                self._write_json(self._path_record(), {'path': os.path.abspath(self.novel_path),
+                                                      'stat': stat_key, 'digest': digest})
+            if digest != self._digest:
+                self._close_mmap()
+                self._index = None
+            self._digest, self._stat_key = digest, stat_key
+            return digest
+
+    @property
+    def cache_dir(self):
+        digest = self.digest
+        return os.path.join(self.cache_root, digest[:2], digest)
+
+    @property
+    def text_path(self):
+        return os.path.join(self.cache_dir, 'text.txt')
+
+    def _index_path(self):
+        return os.path.join(self.cache_dir, 'index.json')
+
+    def _build(self):
+        """
+        解码原始文件，写入清理后的UTF-8缓存和空索引
+        """
+        data, filename = read_novel_bytes(self.novel_path)
+        text = normalize_novel_text(decode_novel_bytes(data, filename))
+        encoded = text.encode('utf-8')
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self.text_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(encoded)
+        os.replace(tmp_path, self.text_path)
+        index = {'version': NOVEL_CACHE_VERSION, 'source': filename, 'chars': len(text),
+                 'bytes': len(encoded), 'splits': {}}
+        self._write_json(self._index_path(), index)
+        return index
+
+    def _load(self):
+        """
+        加载索引并映射缓存文件，缓存缺失或版本不符时重建
+        """
+        with self._lock:
+            # 原文件内容变化时，计算digest会清空已加载的索引和映射
+            self.digest
+            if self._index is not None:
+                return self._index
+            index = self._read_json(self._index_path())
+            if (not index or index.get('version') != NOVEL_CACHE_VERSION or not os.path.exists(self.text_path)
+                    or os.path.getsize(self.text_path) != index.get('bytes')):
+                index = self._build()
+            self._file = open(self.text_path, 'rb')
+            if index['bytes']:
+                self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._index = index
+            return index
+
+    def _close_mmap(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        with self._lock:
+            self._close_mmap()
+            self._index = None
+
+    def __len__(self):
+        return self._load()['chars']
+
+    @property
+    def size_bytes(self):
+        return self._load()['bytes']
+
+    def _slice(self, start, end):
+        if self._mmap is None:
+            return ''
+        return self._mmap[start:end].decode('utf-8')
+
+    def text(self):
+        """
+        清理后的全文
+        """
+        with self._lock:
+            index = self._load()
+            return self._slice(0, index['bytes'])
+
+    def open(self):
+        self._load()
+        return io.TextIOWrapper(open(self.text_path, 'rb'), encoding='utf-8', newline='')
+
+    def chapter_index(self, target_chapters):
+        """
+        按目标章节数分章的字节区间，首次计算后写入index.json
+
+        Returns:
+            list: 每章一个 [[起始字节, 结束字节], ...] 列表
+        """
+        key = str(target_chapters)
+        with self._lock:
+            index = self._load()
+            if key not in index['splits']:
+                text = self.text()
+                spans = chapter_spans(text, target_chapters)
+                offsets = _byte_offsets(text, [offset for chapter in spans for span in chapter for offset in span])
+                index['splits'][key] = [[[offsets[start], offsets[end]] for start, end in chapter]
+                                        for chapter in spans]
+                self._write_json(self._index_path(), index)
+            return index['splits'][key]
+
+    def chapter_count(self, target_chapters):
+        return len(self.chapter_index(target_chapters))
+
+    def chapter(self, chapter_num, target_chapters):
+        """
+        读取第chapter_num章（从1开始），只解码该章所在的区间
+
+        Raises:
+            IndexError: 章节编号超出范围
+        """
+        chapters = self.chapter_index(target_chapters)
+        if not 1 <= chapter_num <= len(chapters):
+            raise IndexError(f"章节编号超出范围：{chapter_num}（共{len(chapters)}章）")
+        with self._lock:
+            return '\n\n'.join(self._slice(start, end) for start, end in chapters[chapter_num - 1])
+
+    def chapters(self, target_chapters, limit=None):
+        """
+        读取前limit章（默认全部）
+        """
+        count = self.chapter_count(target_chapters)
+        if limit:
+            count = min(count, limit)
+        return [self.chapter(num, target_chapters) for num in range(1, count + 1)]
+
+
+_sources = {}
+_sources_lock = threading.Lock()
+
+
+def get_novel_source(novel_path):
+    """
+    获取进程内共享的小说数据源（按绝对路径）
+    """
+    key = os.path.abspath(novel_path)
+    with _sources_lock:
+        source = _sources.get(key)
+        if source is None:
+            source = _sources[key] = NovelSource(novel_path)
+        return source
+
+
+def main():
+    parser = argparse.ArgumentParser(description='小说数据源缓存与章节索引')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='缓存目录')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    info_parser = subparsers.add_parser('info', help='建立缓存并显示分章信息')
+    info_parser.add_argument('novel_file', help='小说文件路径')
+    info_parser.add_argument('--chapters', '-c', type=int, default=50, help='目标章节数量（默认：50）')
+    chapter_parser = subparsers.add_parser('chapter', help='输出指定章节内容')
+    chapter_parser.add_argument('novel_file', help='小说文件路径')
+    chapter_parser.add_argument('number', type=int, help='章节编号（从1开始）')
+    chapter_parser.add_argument('--chapters', '-c', type=int, default=50, help='目标章节数量（默认：50）')
+    args = parser.parse_args()
+
+    source = NovelSource(args.novel_file, cache_dir=args.cache_dir)
+    try:
+        if args.command == 'info':
+            count = source.chapter_count(args.chapters)
+            print(f"缓存目录：{source.cache_dir}")
+            print(f"小说总长度：{len(source)}字（{source.size_bytes / 1024 / 1024:.2f}MB）")
+            print(f"分章结果：{count}个章节（目标{args.chapters}）")
+        else:
+            print(source.chapter(args.number, args.chapters))
+    except (OSError, ValueError, IndexError) as e:
+        print(f"错误：{e}")
+        return 1
+    finally:
+        source.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
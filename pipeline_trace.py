@@ -0,0 +1,519 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流水线阶段追踪
+
+功能:
+    - 以span记录各阶段耗时（脚本生成、校验、配音、字幕、图片、异步轮询、ffmpeg渲染、Celery任务）
+    - span可嵌套，子span自动继承父span的小说、章节、旁白属性
+    - 每条span以一行JSON追加写入 data/.traces/spans-YYYYMMDD.jsonl，多进程同时写入互不影响
+    - 报告按章节和小说汇总：关键路径、最慢阶段、接口延迟分位数、编码器耗时
+
+使用方法:
+    from pipeline_trace import span, traced
+
+    with span('tts', api='bytedance_tts', chapter='chapter_001') as s:
+        ...
+        s.set(bytes=len(audio_data))
+
+    @traced('ass', path_arg='chapter_path')
+    def process_chapter(chapter_path):
+        ...
+
+    # 查看报告
+    python pipeline_trace.py report --novel 031 --days 7
+    python pipeline_trace.py report --chapter chapter_001 --json
+
+环境变量:
+    PIPELINE_TRACE=0        关闭追踪
+    PIPELINE_TRACE_DIR      span文件目录，默认 data/.traces
+"""
+
+import argparse
+import contextvars
+import functools
+import glob
+import inspect
+import json
+import os
+import re
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_TRACE_DIR = os.path.join(PROJECT_ROOT, 'data', '.traces')
+
+# 子span从父span继承的属性
+INHERITED_ATTRIBUTES = ('novel', 'chapter', 'narration')
+
+# 从路径中识别小说编号和章节目录，如 data/031/chapter_001/...
+CHAPTER_PATH_PATTERN = re.compile(r'(?:^|[\\/])(\d{3,})[\\/](chapter_\d+)(?:[\\/]|$)')
+CHAPTER_NAME_PATTERN = re.compile(r'(chapter_\d+)')
+
+_current_span = contextvars.ContextVar('pipeline_trace_span', default=None)
+
+
+def tracing_enabled():
+    return os.environ.get('PIPELINE_TRACE', '1') != '0'
+
+
+def get_trace_dir():
+    return os.environ.get('PIPELINE_TRACE_DIR') or DEFAULT_TRACE_DIR
+
+
+def path_attributes(path):
+    """
+    从文件或目录路径中提取小说编号和章节名
+
+    Returns:
+        dict: 可能包含 'novel'、'chapter'
+    """
+    if not path:
+        return {}
+    path = str(path)
+    match = CHAPTER_PATH_PATTERN.search(path)
+    if match:
+        return {'novel': match.group(1), 'chapter': match.group(2)}
+    match = CHAPTER_NAME_PATTERN.search(os.path.basename(os.path.normpath(path)))
+    return {'chapter': match.group(1)} if match else {}
+
+
+class JsonlSpanSink:
+    """
+    按天分文件追加写入span，每条一行JSON
+    """
+
+    def __init__(self, trace_dir=None):
+        self.trace_dir = trace_dir or get_trace_dir()
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False, default=str) + '\n'
+        path = os.path.join(self.trace_dir, f"spans-{datetime.now().strftime('%Y%m%d')}.jsonl")
+        with self._lock:
+            os.makedirs(self.trace_dir, exist_ok=True)
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def get_sink():
+    global _sink
+    with _sink_lock:
+        if _sink is None:
+            _sink = JsonlSpanSink()
+        return _sink
+
+
+def set_sink(sink):
+    """
+    替换span输出（测试或自定义存储使用），传None恢复默认
+    """
+    global _sink
+    with _sink_lock:
+        _sink = sink
+
+
+class Span:
+    """
+    一次计时区间
+    """
+
+    def __init__(self, name, attributes, trace_id=None, parent_id=None):
+        self.name = name
+        self.attributes = attributes
+        self.trace_id = trace_id or uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.status = 'ok'
+        self.error = None
+        self.start = time.time()
+        self._perf_start = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attributes):
+        """
+        补充属性（如完成后才知道的字节数）
+        """
+        self.attributes.update(attributes)
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._perf_start
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start': round(self.start, 6),
+            'end': round(self.start + (self.duration or 0.0), 6),
+            'duration': round(self.duration or 0.0, 6),
+            'status': self.status,
+            'error': self.error,
+            'attributes': self.attributes,
+            'pid': os.getpid(),
+            'host': socket.gethostname(),
+        }
+
+
+class _NoopSpan:
+    def set(self, **attributes):
+        pass
+
+
+def _emit(record):
+    try:
+        get_sink().write(record)
+    except Exception as e:
+        # 追踪失败不能影响流水线本身
+        print(f"写入追踪记录失败: {e}")
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    记录一个阶段的耗时，异常时状态记为error并继续抛出
+
+    Args:
+        name (str): 阶段名，如 'script'、'tts'、'ffmpeg'
+        **attributes: 属性，如 novel、chapter、narration、api、encoder、bytes
+    """
+    if not tracing_enabled():
+        yield _NoopSpan()
+        return
+
+    parent = _current_span.get()
+    inherited = {key: parent.attributes[key] for key in INHERITED_ATTRIBUTES if parent and key in parent.attributes}
+    current = Span(
+        name,
+        {**inherited, **{key: value for key, value in attributes.items() if value is not None}},
+        trace_id=parent.trace_id if parent else None,
+        parent_id=parent.span_id if parent else None
+    )
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = 'error'
+        current.error = f"{type(e).__name__}: {e}"[:500]
+        raise
+    finally:
+        _current_span.reset(token)
+        current.finish()
+        _emit(current.to_dict())
+
+
+def traced(name, path_arg=None, **attributes):
+    """
+    装饰器：函数每次调用记录一个span
+
+    Args:
+        name (str): 阶段名
+        path_arg (str|tuple): 路径参数名，从该参数中提取小说编号和章节名；
+            为元组时按顺序拼接多个参数，如 ('data_dir', 'chapter_dir')
+        **attributes: 固定属性
+    """
+    path_args = (path_arg,) if isinstance(path_arg, str) else tuple(path_arg or ())
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            span_attributes = dict(attributes)
+            if path_args:
+                try:
+                    bound = signature.bind_partial(*args, **kwargs)
+                    parts = [str(bound.arguments[arg]) for arg in path_args if bound.arguments.get(arg)]
+                    span_attributes.update(path_attributes(os.path.join(*parts) if parts else None))
+                except TypeError:
+                    pass
+            with span(name, **span_attributes):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def ffmpeg_encoder(cmd):
+    """
+    从ffmpeg命令行中取出视频编码器名称，用作span的encoder属性
+    """
+    if '-c:v' in cmd[:-1]:
+        return cmd[cmd.index('-c:v') + 1]
+    if '-vcodec' in cmd[:-1]:
+        return cmd[cmd.index('-vcodec') + 1]
+    return 'ffmpeg'
+
+
+def record_span(name, start, end, status='ok', error=None, **attributes):
+    """
+    记录已在别处计时的区间（如Celery信号中的任务开始和结束）
+    """
+    if not tracing_enabled():
+        return
+    _emit({
+        'name': name,
+        'trace_id': uuid.uuid4().hex[:16],
+        'span_id': uuid.uuid4().hex[:16],
+        'parent_id': None,
+        'start': round(start, 6),
+        'end': round(end, 6),
+        'duration': round(max(end - start, 0.0), 6),
+        'status': status,
+        'error': error,
+        'attributes': {key: value for key, value in attributes.items() if value is not None},
+        'pid': os.getpid(),
+        'host': socket.gethostname(),
+    })
+
+
+# ---------------------------------------------------------------------------
+# 报告
+# ---------------------------------------------------------------------------
+
+def load_spans(trace_dir=None, days=None):
+    """
+    读取span文件，days指定时只读取最近几天的文件；损坏的行跳过
+    """
+    trace_dir = trace_dir or get_trace_dir()
+    cutoff = (datetime.now() - timedelta(days=days - 1)).strftime('%Y%m%d') if days else None
+    spans = []
+    for path in sorted(glob.glob(os.path.join(trace_dir, 'spans-*.jsonl'))):
+        date = os.path.basename(path)[len('spans-'):-len('.jsonl')]
+        if cutoff and date < cutoff:
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    spans.append(json.loads(line))
+                except ValueError:
+                    continue
+    return spans
+
+
+def percentile(values, percent):
+    """
+    最近秩法分位数
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(int(len(ordered) * percent / 100.0 + 0.999999) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def _union_length(intervals):
+    total = 0.0
+    current_start = current_end = None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+
+def _critical_path(spans):
+    """
+    从最后结束的span开始，向前寻找在其开始之前最晚结束的span，得到决定章节总耗时的阶段链
+    相邻阶段之间的空档记为gap（等待调度或人工操作的时间）
+    """
+    if not spans:
+        return []
+    ordered = sorted(spans, key=lambda item: item['end'])
+    current = ordered[-1]
+    path = []
+    # 时长为0的span可能互为前驱，已走过的span不再选取，保证回溯终止
+    visited = set()
+    while current is not None:
+        visited.add(id(current))
+        previous = None
+        for candidate in ordered:
+            if candidate['end'] <= current['start'] + 1e-6 and id(candidate) not in visited:
+                previous = candidate
+        path.append({
+            'name': current['name'],
+            'duration': round(current['duration'], 3),
+            'gap': round(current['start'] - previous['end'], 3) if previous else 0.0,
+            'attributes': current.get('attributes', {})
+        })
+        current = previous
+    path.reverse()
+    return path
+
+
+def _stage_totals(spans):
+    totals = {}
+    for item in spans:
+        entry = totals.setdefault(item['name'], {'stage': item['name'], 'count': 0, 'total': 0.0, 'errors': 0})
+        entry['count'] += 1
+        entry['total'] += item['duration']
+        entry['errors'] += item.get('status') == 'error'
+    for entry in totals.values():
+        entry['total'] = round(entry['total'], 3)
+    return sorted(totals.values(), key=lambda entry: -entry['total'])
+
+
+def _latency_table(spans, key):
+    groups = {}
+    for item in spans:
+        value = item.get('attributes', {}).get(key)
+        if value:
+            groups.setdefault(value, []).append(item)
+    table = []
+    for value, items in groups.items():
+        durations = [item['duration'] for item in items]
+        table.append({
+            key: value,
+            'count': len(items),
+            'errors': sum(1 for item in items if item.get('status') == 'error'),
+            'total': round(sum(durations), 3),
+            'p50': round(percentile(durations, 50), 3),
+            'p90': round(percentile(durations, 90), 3),
+            'p99': round(percentile(durations, 99), 3),
+            'max': round(max(durations), 3),
+            'bytes': sum(item.get('attributes', {}).get('bytes') or 0 for item in items),
+        })
+    return sorted(table, key=lambda entry: -entry['total'])
+
+
+def build_report(spans, novel=None, chapter=None, top=5):
+    """
+    汇总span
+
+    Args:
+        spans (list): load_spans返回的span列表
+        novel (str): 只统计指定小说
+        chapter (str): 只统计指定章节
+        top (int): 每个章节列出的最慢span数量
+
+    Returns:
+        dict: {'chapters', 'novels', 'apis', 'encoders', 'span_count'}
+    """
+    selected = []
+    for item in spans:
+        attributes = item.get('attributes', {})
+        if novel and str(attributes.get('novel')) != str(novel):
+            continue
+        if chapter and attributes.get('chapter') != chapter:
+            continue
+        selected.append(item)
+
+    by_chapter = {}
+    for item in selected:
+        attributes = item.get('attributes', {})
+        if attributes.get('chapter'):
+            by_chapter.setdefault((str(attributes.get('novel') or ''), attributes['chapter']), []).append(item)
+
+    chapters = []
+    for (novel_key, chapter_key), items in sorted(by_chapter.items()):
+        span_ids = {item['span_id'] for item in items}
+        # 只用章节内的顶层span计算墙钟时间和关键路径，避免嵌套span重复计算
+        roots = [item for item in items if item.get('parent_id') not in span_ids]
+        wall_time = max(item['end'] for item in roots) - min(item['start'] for item in roots)
+        busy_time = _union_length([(item['start'], item['end']) for item in roots])
+        chapters.append({
+            'novel': novel_key,
+            'chapter': chapter_key,
+            'span_count': len(items),
+            'wall_time': round(wall_time, 3),
+            'busy_time': round(busy_time, 3),
+            'idle_time': round(max(wall_time - busy_time, 0.0), 3),
+            'stages': _stage_totals(roots),
+            'slowest': [
+                {'name': item['name'], 'duration': round(item['duration'], 3), 'attributes': item.get('attributes', {})}
+                for item in sorted(items, key=lambda item: -item['duration'])[:top]
+            ],
+            'critical_path': _critical_path(roots),
+            'errors': sum(1 for item in items if item.get('status') == 'error'),
+        })
+
+    novels = {}
+    for entry in chapters:
+        summary = novels.setdefault(entry['novel'], {'novel': entry['novel'], 'chapters': 0, 'wall_time': 0.0,
+                                                     'busy_time': 0.0, 'errors': 0, 'stages': {}})
+        summary['chapters'] += 1
+        summary['wall_time'] = round(summary['wall_time'] + entry['wall_time'], 3)
+        summary['busy_time'] = round(summary['busy_time'] + entry['busy_time'], 3)
+        summary['errors'] += entry['errors']
+        for stage in entry['stages']:
+            total = summary['stages'].setdefault(stage['stage'], {'stage': stage['stage'], 'count': 0, 'total': 0.0})
+            total['count'] += stage['count']
+            total['total'] = round(total['total'] + stage['total'], 3)
+    for summary in novels.values():
+        summary['stages'] = sorted(summary['stages'].values(), key=lambda entry: -entry['total'])
+
+    return {
+        'span_count': len(selected),
+        'chapters': chapters,
+        'novels': sorted(novels.values(), key=lambda entry: entry['novel']),
+        'apis': _latency_table(selected, 'api'),
+        'encoders': _latency_table(selected, 'encoder'),
+    }
+
+
+def format_report(report):
+    """
+    将报告格式化为文本
+    """
+    lines = [f"共 {report['span_count']} 条span"]
+    for summary in report['novels']:
+        lines.append(f"\n小说 {summary['novel'] or '-'}：{summary['chapters']} 个章节，"
+                     f"阶段累计 {summary['busy_time']:.1f}秒，失败span {summary['errors']} 个")
+        for stage in summary['stages']:
+            lines.append(f"  {stage['stage']:<16} {stage['count']:>5} 次  {stage['total']:>10.1f}秒")
+
+    for entry in report['chapters']:
+        lines.append(f"\n[{entry['novel'] or '-'}/{entry['chapter']}] 墙钟 {entry['wall_time']:.1f}秒，"
+                     f"执行 {entry['busy_time']:.1f}秒，空闲 {entry['idle_time']:.1f}秒")
+        path = ' -> '.join(f"{step['name']}({step['duration']:.1f}s)" for step in entry['critical_path'])
+        lines.append(f"  关键路径: {path}")
+        slowest = ', '.join(f"{item['name']} {item['duration']:.1f}s" for item in entry['slowest'])
+        lines.append(f"  最慢: {slowest}")
+
+    for title, key, rows in (('接口延迟', 'api', report['apis']), ('编码器耗时', 'encoder', report['encoders'])):
+        if not rows:
+            continue
+        lines.append(f"\n{title}:")
+        for row in rows:
+            lines.append(f"  {row[key]:<20} {row['count']:>5} 次  失败 {row['errors']:>3}  "
+                         f"p50 {row['p50']:.2f}s  p90 {row['p90']:.2f}s  p99 {row['p99']:.2f}s  max {row['max']:.2f}s")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='流水线阶段追踪报告')
+    subparsers = parser.add_subparsers(dest='command')
+    report_parser = subparsers.add_parser('report', help='按章节和小说汇总span')
+    report_parser.add_argument('--novel', help='小说编号，如 031')
+    report_parser.add_argument('--chapter', help='章节目录名，如 chapter_001')
+    report_parser.add_argument('--days', type=int, help='只统计最近几天的记录')
+    report_parser.add_argument('--trace-dir', help='span文件目录')
+    report_parser.add_argument('--json', action='store_true', help='输出JSON')
+    args = parser.parse_args()
+
+    if args.command != 'report':
+        parser.print_help()
+        return
+
+    report = build_report(load_spans(args.trace_dir, args.days), novel=args.novel, chapter=args.chapter)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(format_report(report))
+
+
+if __name__ == '__main__':
+    main()
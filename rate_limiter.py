@@ -0,0 +1,508 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+火山引擎/方舟接口共享限流器
+
+功能:
+    - 每个接口+模型一个令牌桶，所有Celery worker和命令行脚本共用同一组桶
+    - 优先使用Redis（Lua脚本原子扣减），Redis不可用时退回本机SQLite文件（BEGIN IMMEDIATE加文件锁）
+    - 遇到429/50429限流响应时读取Retry-After，在冷却期内所有调用方一起暂停，而不是各自固定sleep
+    - 记录每个桶的调用次数、累计等待时间和被限流次数，可通过命令行或管理页面查看
+
+使用方法:
+    from rate_limiter import rate_limited_call
+
+    resp = rate_limited_call('visual_submit', visual_service.cv_sync2async_submit_task, form)
+    completion = rate_limited_call('ark_chat', client.chat.completions.create, model=model, messages=messages)
+
+    # 查看当前用量
+    python rate_limiter.py usage
+
+配置（config/config.py中的RATE_LIMIT_CONFIG，可选）:
+    RATE_LIMIT_CONFIG = {
+        "redis_url": "redis://localhost:6379/0",
+        "limits": {"visual_submit": {"rate": 2, "burst": 2}, "ark_chat:doubao-seed-1.6-250615": {"rate": 5, "burst": 10}}
+    }
+
+环境变量:
+    RATE_LIMIT_BACKEND=redis|sqlite   指定后端，默认先尝试Redis
+    RATE_LIMIT_REDIS_URL              Redis地址，优先于配置文件
+    RATE_LIMIT_DB                     SQLite文件路径，默认 data/.rate_limits.sqlite3
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB_PATH = os.path.join(PROJECT_ROOT, 'data', '.rate_limits.sqlite3')
+DEFAULT_REDIS_URL = 'redis://localhost:6379/0'
+REDIS_KEY_PREFIX = 'ratelimit:'
+
+# 各接口默认限额：rate为每秒补充的令牌数，burst为桶容量
+DEFAULT_LIMITS = {
+    'visual_submit': {'rate': 2, 'burst': 2},        # 图片生成提交（同步转异步）
+    'visual_query': {'rate': 10, 'burst': 10},       # 图片生成结果查询
+    'visual_sync': {'rate': 1, 'burst': 1},          # 同步图片生成（cv_process）
+    'ark_chat': {'rate': 5, 'burst': 5},             # 方舟大模型对话
+    'ark_video_submit': {'rate': 1, 'burst': 2},     # 图生视频提交
+    'ark_video_query': {'rate': 5, 'burst': 5},      # 图生视频查询
+    'bytedance_tts': {'rate': 5, 'burst': 5},        # 语音合成
+}
+FALLBACK_LIMIT = {'rate': 1, 'burst': 1}
+
+# 没有Retry-After时的冷却时间（秒）
+DEFAULT_COOLDOWN = 5.0
+# 单次休眠上限，便于及时感知其他进程设置的冷却期
+MAX_SLEEP_STEP = 5.0
+
+RATE_LIMIT_MARKERS = ('50429', 'API Limit', 'Too Many Requests', 'RateLimitError')
+
+
+class RateLimitTimeout(Exception):
+    """
+    在指定时间内未能获取令牌
+    """
+
+
+def bucket_key(api, model=None):
+    return f"{api}:{model}" if model else api
+
+
+def refill(state, rate, burst, now):
+    """
+    按经过的时间补充令牌
+
+    Args:
+        state (dict): 桶状态，包含tokens和ts，没有记录时为None
+
+    Returns:
+        float: 补充后的令牌数
+    """
+    if not state or state.get('ts') is None:
+        return float(burst)
+    return min(float(burst), float(state['tokens']) + max(0.0, now - float(state['ts'])) * rate)
+
+
+class SqliteBucketBackend:
+    """
+    本机SQLite令牌桶，多进程通过BEGIN IMMEDIATE串行化
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.environ.get('RATE_LIMIT_DB') or DEFAULT_DB_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS buckets ('
+                'key TEXT PRIMARY KEY, tokens REAL, ts REAL, cooldown_until REAL DEFAULT 0, '
+                'acquired INTEGER DEFAULT 0, wait_total REAL DEFAULT 0, limited INTEGER DEFAULT 0, '
+                'last_limited REAL)'
+            )
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def _load(self, conn, key):
+        row = conn.execute('SELECT tokens, ts, cooldown_until FROM buckets WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            conn.execute('INSERT INTO buckets (key) VALUES (?)', (key,))
+            return None
+        return {'tokens': row[0], 'ts': row[1], 'cooldown_until': row[2] or 0}
+
+    def try_acquire(self, key, rate, burst, tokens, now, waited):
+        """
+        尝试取出令牌
+
+        Returns:
+            float: 0表示已取得，否则为建议等待的秒数
+        """
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            state = self._load(conn, key)
+            cooldown_until = (state or {}).get('cooldown_until') or 0
+            if cooldown_until > now:
+                conn.execute('COMMIT')
+                return cooldown_until - now
+            available = refill(state, rate, burst, now)
+            if available >= tokens:
+                conn.execute(
+                    'UPDATE buckets SET tokens = ?, ts = ?, acquired = acquired + 1, '
+                    'wait_total = wait_total + ? WHERE key = ?',
+                    (available - tokens, now, waited, key)
+                )
+                wait = 0.0
+            else:
+                conn.execute('UPDATE buckets SET tokens = ?, ts = ? WHERE key = ?', (available, now, key))
+                wait = (tokens - available) / rate
+            conn.execute('COMMIT')
+            return wait
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def penalize(self, key, cooldown, now):
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            self._load(conn, key)
+            conn.execute(
+                'UPDATE buckets SET tokens = 0, ts = ?, cooldown_until = MAX(COALESCE(cooldown_until, 0), ?), '
+                'limited = limited + 1, last_limited = ? WHERE key = ?',
+                (now, now + cooldown, now, key)
+            )
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+
+    def snapshot(self):
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                'SELECT key, tokens, ts, cooldown_until, acquired, wait_total, limited, last_limited FROM buckets'
+            ).fetchall()
+        finally:
+            conn.close()
+        fields = ('tokens', 'ts', 'cooldown_until', 'acquired', 'wait_total', 'limited', 'last_limited')
+        return {row[0]: dict(zip(fields, row[1:])) for row in rows}
+
+
+class RedisBucketBackend:
+    """
+    Redis令牌桶，所有主机共享，扣减逻辑在Lua脚本中原子执行
+    """
+
+    name = 'redis'
+
+    ACQUIRE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local waited = tonumber(ARGV[5])
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts', 'cooldown_until')
+local cooldown_until = tonumber(data[3]) or 0
+if cooldown_until > now then
+    return tostring(cooldown_until - now)
+end
+local tokens = burst
+if data[1] and data[2] then
+    tokens = math.min(burst, tonumber(data[1]) + math.max(0, now - tonumber(data[2])) * rate)
+end
+local wait = 0
+if tokens >= requested then
+    tokens = tokens - requested
+    redis.call('HINCRBY', KEYS[1], 'acquired', 1)
+    redis.call('HINCRBYFLOAT', KEYS[1], 'wait_total', waited)
+else
+    wait = (requested - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], 604800)
+return tostring(wait)
+"""
+
+    PENALIZE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local until_ts = now + tonumber(ARGV[2])
+local current = tonumber(redis.call('HGET', KEYS[1], 'cooldown_until')) or 0
+if until_ts < current then
+    until_ts = current
+end
+redis.call('HSET', KEYS[1], 'tokens', '0', 'ts', tostring(now), 'cooldown_until', tostring(until_ts),
+           'last_limited', tostring(now))
+redis.call('HINCRBY', KEYS[1], 'limited', 1)
+redis.call('EXPIRE', KEYS[1], 604800)
+return 1
+"""
+
+    def __init__(self, url):
+        import redis
+
+        self.url = url
+        self.client = redis.Redis.from_url(url, socket_connect_timeout=2, socket_timeout=5)
+        self.client.ping()
+        self._acquire = self.client.register_script(self.ACQUIRE_SCRIPT)
+        self._penalize = self.client.register_script(self.PENALIZE_SCRIPT)
+
+    def try_acquire(self, key, rate, burst, tokens, now, waited):
+        return float(self._acquire(keys=[REDIS_KEY_PREFIX + key], args=[rate, burst, tokens, now, waited]))
+
+    def penalize(self, key, cooldown, now):
+        self._penalize(keys=[REDIS_KEY_PREFIX + key], args=[now, cooldown])
+
+    def snapshot(self):
+        buckets = {}
+        for redis_key in self.client.scan_iter(match=REDIS_KEY_PREFIX + '*'):
+            raw = self.client.hgetall(redis_key)
+            key = redis_key.decode('utf-8')[len(REDIS_KEY_PREFIX):]
+            buckets[key] = {field.decode('utf-8'): float(value) for field, value in raw.items()}
+        return buckets
+
+
+def load_rate_limit_config():
+    """
+    读取config/config.py中的RATE_LIMIT_CONFIG，没有时返回空字典
+    """
+    try:
+        if PROJECT_ROOT not in sys.path:
+            sys.path.insert(0, PROJECT_ROOT)
+        from config.config import RATE_LIMIT_CONFIG
+        return RATE_LIMIT_CONFIG
+    except (ImportError, AttributeError):
+        return {}
+
+
+def create_backend(config=None):
+    """
+    按环境变量和配置创建后端：指定sqlite时直接使用SQLite，否则先尝试Redis，失败时退回SQLite
+    """
+    config = config if config is not None else load_rate_limit_config()
+    backend = os.environ.get('RATE_LIMIT_BACKEND', '').lower()
+    if backend != 'sqlite':
+        url = os.environ.get('RATE_LIMIT_REDIS_URL') or config.get('redis_url') or DEFAULT_REDIS_URL
+        try:
+            return RedisBucketBackend(url)
+        except Exception as e:
+            if backend == 'redis':
+                raise
+            print(f"限流器无法连接Redis（{e}），使用本机SQLite限流")
+    return SqliteBucketBackend(config.get('db_path'))
+
+
+class RateLimiter:
+    """
+    按接口和模型限流的令牌桶集合
+    """
+
+    def __init__(self, backend=None, limits=None, clock=time.time, sleep=time.sleep):
+        config = load_rate_limit_config() if backend is None or limits is None else {}
+        self.backend = backend or create_backend(config)
+        self.limits = dict(DEFAULT_LIMITS)
+        self.limits.update(limits if limits is not None else config.get('limits', {}))
+        self.clock = clock
+        self.sleep = sleep
+        self._fallback_lock = threading.Lock()
+
+    def limit_for(self, api, model=None):
+        """
+        查找限额，先按 接口:模型 查找，再按接口的默认限额
+        """
+        return self.limits.get(bucket_key(api, model)) or self.limits.get(api) or FALLBACK_LIMIT
+
+    def _call_backend(self, method, *args):
+        """
+        Redis调用失败时切换到SQLite后端继续限流
+        """
+        try:
+            return getattr(self.backend, method)(*args)
+        except Exception as e:
+            if isinstance(self.backend, SqliteBucketBackend):
+                raise
+            with self._fallback_lock:
+                if not isinstance(self.backend, SqliteBucketBackend):
+                    print(f"限流器Redis后端出错（{e}），切换到本机SQLite限流")
+                    self.backend = SqliteBucketBackend()
+            return getattr(self.backend, method)(*args)
+
+    def acquire(self, api, model=None, tokens=1, timeout=None):
+        """
+        阻塞直到取得令牌
+
+        Args:
+            api (str): 接口名，如 'visual_submit'、'ark_chat'
+            model (str): 模型或req_key，有单独限额时使用独立的桶
+            tokens (int): 需要的令牌数
+            timeout (float): 最长等待秒数，超时抛出RateLimitTimeout
+
+        Returns:
+            float: 实际等待的秒数
+        """
+        limit = self.limit_for(api, model)
+        key = bucket_key(api, model)
+        waited = 0.0
+        while True:
+            wait = self._call_backend('try_acquire', key, limit['rate'], limit['burst'], tokens, self.clock(), waited)
+            if wait <= 0:
+                return waited
+            if timeout is not None and waited + wait > timeout:
+                raise RateLimitTimeout(f"{key} 等待令牌超过 {timeout}s")
+            # 加少量抖动，避免多个进程同时醒来再次争抢
+            step = min(wait, MAX_SLEEP_STEP) * (1 + random.random() * 0.1)
+            self.sleep(step)
+            waited += step
+
+    def penalize(self, api, model=None, retry_after=None):
+        """
+        收到限流响应后让该桶进入冷却期，所有调用方共同等待
+        """
+        key = bucket_key(api, model)
+        cooldown = retry_after if retry_after is not None else DEFAULT_COOLDOWN
+        print(f"接口 {key} 被限流，暂停 {cooldown:.1f}s")
+        self._call_backend('penalize', key, cooldown, self.clock())
+
+    def call(self, api, func, *args, **kwargs):
+        """
+        取得令牌后调用func，根据返回值或异常判断是否被限流
+        模型默认取kwargs中的model或表单（第一个参数）中的req_key
+        """
+        model = kwargs.get('model') or (args[0].get('req_key') if args and isinstance(args[0], dict) else None)
+        self.acquire(api, model)
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if is_rate_limited(e):
+                self.penalize(api, model, retry_after_seconds(e))
+            raise
+        if is_rate_limited(result):
+            self.penalize(api, model, retry_after_seconds(result))
+        return result
+
+    def usage(self):
+        """
+        当前各桶用量
+
+        Returns:
+            list: 每个桶的 {'key', 'rate', 'burst', 'tokens', 'cooldown', 'acquired', 'wait_total', 'limited', 'last_limited'}
+        """
+        now = self.clock()
+        rows = []
+        for key, state in sorted(self._call_backend('snapshot').items()):
+            api, _, model = key.partition(':')
+            limit = self.limit_for(api, model or None)
+            rows.append({
+                'key': key,
+                'backend': self.backend.name,
+                'rate': limit['rate'],
+                'burst': limit['burst'],
+                'tokens': round(refill(state, limit['rate'], limit['burst'], now), 2),
+                'cooldown': round(max(0.0, (state.get('cooldown_until') or 0) - now), 2),
+                'acquired': int(state.get('acquired') or 0),
+                'wait_total': round(state.get('wait_total') or 0, 2),
+                'limited': int(state.get('limited') or 0),
+                'last_limited': state.get('last_limited'),
+            })
+        return rows
+
+    def cooldown_remaining(self, api, model=None):
+        """
+        该接口剩余的冷却秒数
+        """
+        key = bucket_key(api, model)
+        return next((row['cooldown'] for row in self.usage() if row['key'] == key), 0.0)
+
+
+def _status_and_headers(value):
+    response = getattr(value, 'response', None)
+    status = getattr(value, 'status_code', None) or getattr(response, 'status_code', None)
+    headers = getattr(value, 'headers', None) or getattr(response, 'headers', None) or {}
+    return status, headers
+
+
+def is_rate_limited(value):
+    """
+    判断接口返回值或异常是否为限流：HTTP 429、火山引擎50429/API Limit、方舟RateLimitError
+    """
+    if value is None:
+        return False
+    status, _ = _status_and_headers(value)
+    if status == 429:
+        return True
+    if isinstance(value, dict):
+        metadata = value.get('ResponseMetadata') or {}
+        text = f"{metadata.get('Error', '')} {value.get('code', '')} {value.get('message', '')}"
+    elif isinstance(value, Exception):
+        text = f"{type(value).__name__} {value}"
+    else:
+        return False
+    return any(marker in text for marker in RATE_LIMIT_MARKERS)
+
+
+def retry_after_seconds(value):
+    """
+    读取Retry-After（秒数或HTTP日期），没有时返回None
+    """
+    _, headers = _status_and_headers(value)
+    try:
+        retry_after = headers.get('Retry-After') or headers.get('retry-after')
+    except AttributeError:
+        return None
+    if not retry_after:
+        return None
+    try:
+        return max(float(retry_after), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+_shared_limiter = None
+_shared_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """
+    获取进程内共享的限流器
+    """
+    global _shared_limiter
+    with _shared_limiter_lock:
+        if _shared_limiter is None:
+            _shared_limiter = RateLimiter()
+        return _shared_limiter
+
+
+def rate_limited_call(api, func, /, *args, **kwargs):
+    """
+    使用共享限流器调用接口，参数原样传给func
+    """
+    return get_rate_limiter().call(api, func, *args, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='接口限流器')
+    subparsers = parser.add_subparsers(dest='command')
+    usage_parser = subparsers.add_parser('usage', help='查看各接口当前用量')
+    usage_parser.add_argument('--json', action='store_true', help='以JSON输出')
+    args = parser.parse_args()
+
+    if args.command != 'usage':
+        parser.print_help()
+        return 0
+
+    limiter = get_rate_limiter()
+    rows = limiter.usage()
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+        return 0
+
+    print(f"后端: {limiter.backend.name}")
+    if not rows:
+        print("暂无调用记录")
+        return 0
+    print(f"{'接口':<48} {'限额':>10} {'剩余令牌':>8} {'冷却':>7} {'调用':>8} {'累计等待':>9} {'限流次数':>8}")
+    for row in rows:
+        print(f"{row['key']:<48} {row['rate']:>6}/s×{row['burst']:<2} {row['tokens']:>8} {row['cooldown']:>6}s "
+              f"{row['acquired']:>8} {row['wait_total']:>8}s {row['limited']:>8}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+参考图片data URL缓存
+
+功能:
+    - 角色参考图、首帧图片按内容SHA-256缓存编码后的data URL，同一张图片只读取、识别、编码一次
+    - 超过接口所需尺寸或大小的图片先缩小并重新编码，不再以原始分辨率发送
+    - 内存中按LRU缓存，总大小有上限；编码结果同时保存在磁盘上，跨进程、跨运行复用
+    - 图片生成、首帧视频生成、图片审查等脚本共用同一个缓存实例
+
+使用方法:
+    from reference_image_cache import get_reference_image_cache
+
+    data_url = get_reference_image_cache().get_data_url(image_path)
+"""
+
+import base64
+import hashlib
+import io
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.path.join(PROJECT_ROOT, 'data', '.ref_image_cache')
+
+# 发送给接口的参考图最长边和最大字节数，超过时缩小并重新编码
+DEFAULT_MAX_SIDE = 1536
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024
+DEFAULT_JPEG_QUALITY = 90
+
+# 内存中缓存的data URL总大小上限（字符数）
+DEFAULT_MEMORY_LIMIT = 64 * 1024 * 1024
+
+# 接口可直接接收的图片类型，其余类型一律重新编码
+API_MIME_TYPES = {'image/jpeg', 'image/png', 'image/webp'}
+
+MIME_EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/webp': '.webp',
+    'image/gif': '.gif',
+    'image/bmp': '.bmp',
+}
+
+
+def sniff_image_mime(data):
+    """
+    根据文件头识别图片类型，不依赖扩展名（替代已废弃的imghdr）
+
+    Returns:
+        str: MIME类型，无法识别时返回None
+    """
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if data.startswith(b'GIF87a') or data.startswith(b'GIF89a'):
+        return 'image/gif'
+    if data.startswith(b'BM'):
+        return 'image/bmp'
+    if data.startswith(b'RIFF') and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def pil_transcode(data, max_side, quality):
+    """
+    使用PIL将图片缩小到最长边不超过max_side并重新编码
+    有透明通道时编码为PNG，否则编码为JPEG
+
+    Returns:
+        tuple: (图片字节, MIME类型)，未安装PIL时返回None
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+        if max(image.size) > max_side:
+            image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+        output = io.BytesIO()
+        if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+            image.convert('RGBA').save(output, format='PNG', optimize=True)
+            return output.getvalue(), 'image/png'
+        image.convert('RGB').save(output, format='JPEG', quality=quality, optimize=True)
+        return output.getvalue(), 'image/jpeg'
+
+
+def image_dimensions(data):
+    """
+    读取图片尺寸，未安装PIL或无法识别时返回None
+    """
+    try:
+        from PIL import Image
+        with Image.open(io.BytesIO(data)) as image:
+            return image.size
+    except Exception:
+        return None
+
+
+class ReferenceImageCache:
+    """
+    参考图片data URL缓存
+
+    Args:
+        cache_dir (str): 磁盘缓存目录
+        max_side (int): 图片最长边上限（像素）
+        max_bytes (int): 图片字节数上限
+        jpeg_quality (int): 重新编码JPEG的质量
+        memory_limit (int): 内存LRU缓存的总字符数上限
+        transcoder (callable): transcoder(图片字节, max_side, quality) -> (字节, MIME) 或 None，默认使用PIL
+        dimension_reader (callable): dimension_reader(图片字节) -> (宽, 高) 或 None
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_side=DEFAULT_MAX_SIDE, max_bytes=DEFAULT_MAX_BYTES,
+                 jpeg_quality=DEFAULT_JPEG_QUALITY, memory_limit=DEFAULT_MEMORY_LIMIT,
+                 transcoder=pil_transcode, dimension_reader=image_dimensions):
+        self.cache_dir = cache_dir
+        self.max_side = max_side
+        self.max_bytes = max_bytes
+        self.jpeg_quality = jpeg_quality
+        self.memory_limit = memory_limit
+        self.transcoder = transcoder
+        self.dimension_reader = dimension_reader
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        # (路径, 大小, 修改时间) -> 内容哈希，文件未变化时不再重新读取和计算哈希
+        self._digests = {}
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'encoded': 0, 'evicted': 0}
+
+    def _variant_key(self, digest):
+        # 缩放参数变化后缓存自动失效
+        return f"{digest}_{self.max_side}_{self.max_bytes}_{self.jpeg_quality}"
+
+    def _disk_path(self, key, mime):
+        return os.path.join(self.cache_dir, key[:2], f"{key}{MIME_EXTENSIONS[mime]}")
+
+    def _content_digest(self, image_path):
+        stat = os.stat(image_path)
+        stat_key = (os.path.abspath(image_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            digest = self._digests.get(stat_key)
+        if digest:
+            return digest, None
+
+        with open(image_path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            self._digests[stat_key] = digest
+        return digest, data
+
+    def _remember(self, key, data_url):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return
+            self._memory[key] = data_url
+            self._memory_size += len(data_url)
+            while self._memory_size > self.memory_limit and len(self._memory) > 1:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_size -= len(evicted)
+                self.stats['evicted'] += 1
+
+    def _load_from_disk(self, key):
+        for mime in MIME_EXTENSIONS:
+            path = self._disk_path(key, mime)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    return f.read(), mime
+        return None
+
+    def _save_to_disk(self, key, payload, mime):
+        path = self._disk_path(key, mime)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(temp_path, path)
+
+    def _needs_transcode(self, data, mime):
+        if mime not in API_MIME_TYPES or len(data) > self.max_bytes:
+            return True
+        size = self.dimension_reader(data)
+        return bool(size) and max(size) > self.max_side
+
+    def _encode(self, data):
+        """
+        生成发送给接口的图片字节：尺寸和大小合规的图片保持原样，否则缩小重新编码
+        """
+        mime = sniff_image_mime(data)
+        if self._needs_transcode(data, mime):
+            result = self.transcoder(data, self.max_side, self.jpeg_quality)
+            if result:
+                return result
+        # 无法重新编码（如未安装PIL）时退化为原始字节
+        return data, mime or 'image/jpeg'
+
+    def get_data_url(self, image_path):
+        """
+        获取图片的data URL，格式为 data:<MIME>;base64,<数据>
+
+        Args:
+            image_path (str): 图片路径
+
+        Returns:
+            str: data URL
+
+        Raises:
+            OSError: 图片无法读取
+        """
+        digest, data = self._content_digest(image_path)
+        key = self._variant_key(digest)
+
+        with self._lock:
+            data_url = self._memory.get(key)
+            if data_url is not None:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return data_url
+
+        cached = self._load_from_disk(key)
+        if cached:
+            payload, mime = cached
+            with self._lock:
+                self.stats['disk_hits'] += 1
+        else:
+            if data is None:
+                with open(image_path, 'rb') as f:
+                    data = f.read()
+            payload, mime = self._encode(data)
+            if mime in MIME_EXTENSIONS:
+                self._save_to_disk(key, payload, mime)
+            with self._lock:
+                self.stats['encoded'] += 1
+
+        data_url = f"data:{mime};base64,{base64.b64encode(payload).decode('ascii')}"
+        self._remember(key, data_url)
+        return data_url
+
+    def get_base64(self, image_path):
+        """
+        获取不带data URL前缀的纯base64数据
+        """
+        return self.get_data_url(image_path).split(',', 1)[1]
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_reference_image_cache():
+    """
+    获取进程内共享的参考图片缓存
+    """
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = ReferenceImageCache()
+        return _shared_cache
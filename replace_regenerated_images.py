@@ -3,14 +3,16 @@
 """
 替换regenerated图片脚本
 将Character_Images目录下所有regenerated图片替换为原始图片
+原始图片、备份和regenerated图片通过素材存储共用对象（硬链接），不再复制内容
 """
 
 import os
 import json
-import shutil
 from pathlib import Path
 from typing import List, Tuple
 
+from asset_store import store_file
+
 def find_regenerated_tasks() -> List[str]:
     """
     查找所有regenerated任务文件
@@ -99,11 +101,11 @@ def replace_regenerated_images(dry_run: bool = True) -> None:
                 # 创建原始文件的备份
                 if os.path.exists(original_path):
                     backup_path = original_path + ".backup"
-                    shutil.copy2(original_path, backup_path)
+                    store_file(original_path, backup_path)
                     print(f"  💾 备份原始文件: {backup_path}")
                 
                 # 复制regenerated图片到原始位置
-                shutil.copy2(regenerated_path, original_path)
+                store_file(regenerated_path, original_path)
                 print(f"  ✅ 替换成功: {os.path.basename(original_path)}")
                 
             replaced_count += 1
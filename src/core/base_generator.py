@@ -8,7 +8,10 @@
 import os
 import time
 import logging
-from typing import Any, Dict, List, Optional
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 from abc import ABC
 
 from .interfaces import (
@@ -16,6 +19,17 @@ from .interfaces import (
     GenerationResult, GenerationStatus
 )
 
+# 延迟分位数统计保留的最近样本数
+LATENCY_WINDOW = 1000
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    """最近秩法计算分位数，sorted_values需已排序"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(len(sorted_values) * percent / 100.0 + 0.999999) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
 
 class DefaultLogger(ILogger):
     """默认日志记录器实现"""
@@ -93,16 +107,39 @@ class BaseGenerator(IGenerator, ABC):
         self.event_handler = event_handler or DefaultEventHandler()
         self.logger = logger or DefaultLogger(self.name)
         
-        # 性能统计
+        # 性能统计，批量生成时多个线程同时更新，统一在锁内修改
+        self._stats_lock = threading.Lock()
         self._generation_count = 0
         self._total_duration = 0.0
         self._success_count = 0
         self._error_count = 0
+        self._in_flight = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._first_started_at = None
+        self._last_finished_at = None
+    
+    def _record_start(self, start_time: float) -> None:
+        with self._stats_lock:
+            self._generation_count += 1
+            self._in_flight += 1
+            if self._first_started_at is None:
+                self._first_started_at = start_time
+    
+    def _record_finish(self, duration: float, success: bool) -> None:
+        with self._stats_lock:
+            self._in_flight -= 1
+            self._total_duration += duration
+            self._latencies.append(duration)
+            self._last_finished_at = time.time()
+            if success:
+                self._success_count += 1
+            else:
+                self._error_count += 1
     
     def generate(self, input_data: Any, output_path: str, **kwargs) -> GenerationResult:
         """生成内容的通用流程"""
         start_time = time.time()
-        self._generation_count += 1
+        self._record_start(start_time)
         
         try:
             # 触发开始事件
@@ -118,16 +155,10 @@ class BaseGenerator(IGenerator, ABC):
             # 执行具体的生成逻辑
             result = self._do_generate(input_data, output_path, **kwargs)
             
-            # 计算耗时
+            # 计算耗时并更新统计
             duration = time.time() - start_time
             result.duration = duration
-            self._total_duration += duration
-            
-            # 更新统计
-            if result.is_success:
-                self._success_count += 1
-            else:
-                self._error_count += 1
+            self._record_finish(duration, result.is_success)
             
             # 触发完成事件
             self.event_handler.on_generation_complete(self.name, result)
@@ -137,7 +168,7 @@ class BaseGenerator(IGenerator, ABC):
         except Exception as e:
             # 处理异常
             duration = time.time() - start_time
-            self._error_count += 1
+            self._record_finish(duration, False)
             
             error_result = GenerationResult(
                 status=GenerationStatus.FAILED,
@@ -168,26 +199,46 @@ class BaseGenerator(IGenerator, ABC):
         return default
     
     def get_statistics(self) -> Dict[str, Any]:
-        """获取生成器统计信息"""
-        avg_duration = self._total_duration / max(self._generation_count, 1)
-        success_rate = self._success_count / max(self._generation_count, 1)
+        """获取生成器统计信息
         
+        吞吐量按第一次开始到最后一次完成的墙钟时间计算，并发执行时高于 1/平均耗时；
+        延迟分位数基于最近 LATENCY_WINDOW 次生成
+        """
+        with self._stats_lock:
+            generation_count = self._generation_count
+            success_count = self._success_count
+            error_count = self._error_count
+            total_duration = self._total_duration
+            in_flight = self._in_flight
+            latencies = sorted(self._latencies)
+            wall_time = (self._last_finished_at - self._first_started_at) if self._last_finished_at else 0.0
+        
+        completed = success_count + error_count
         return {
             "name": self.name,
-            "generation_count": self._generation_count,
-            "success_count": self._success_count,
-            "error_count": self._error_count,
-            "success_rate": success_rate,
-            "total_duration": self._total_duration,
-            "average_duration": avg_duration
+            "generation_count": generation_count,
+            "success_count": success_count,
+            "error_count": error_count,
+            "in_flight": in_flight,
+            "success_rate": success_count / max(generation_count, 1),
+            "total_duration": total_duration,
+            "average_duration": total_duration / max(completed, 1),
+            "throughput": completed / wall_time if wall_time > 0 else 0.0,
+            "latency_p50": _percentile(latencies, 50),
+            "latency_p90": _percentile(latencies, 90),
+            "latency_p99": _percentile(latencies, 99)
         }
     
     def reset_statistics(self) -> None:
         """重置统计信息"""
-        self._generation_count = 0
-        self._total_duration = 0.0
-        self._success_count = 0
-        self._error_count = 0
+        with self._stats_lock:
+            self._generation_count = self._in_flight
+            self._total_duration = 0.0
+            self._success_count = 0
+            self._error_count = 0
+            self._latencies.clear()
+            self._first_started_at = time.time() if self._in_flight else None
+            self._last_finished_at = None
         self.logger.info(f"{self.name} 统计信息已重置")
     
     def validate_input(self, input_data: Any) -> bool:
@@ -208,29 +259,102 @@ class BaseGenerator(IGenerator, ABC):
 class BatchGenerator(BaseGenerator):
     """批量生成器基类
     
-    提供批量处理的通用功能
+    提供批量处理的通用功能：
+    - 线程池并发执行，并发数由max_workers控制
+    - 背压：已提交未取走的任务不超过max_pending，输入可以是惰性的迭代器
+    - 结果按完成顺序流式返回（iter_generate），或按输入顺序汇总返回（generate_batch）
+    - 可通过cancel()或工作流编排器的cancel_workflow取消，未开始的任务不再执行
     """
     
-    def __init__(self, batch_size: int = 10, **kwargs):
+    def __init__(self, batch_size: int = 10, max_workers: int = 4, max_pending: int = None, **kwargs):
+        """
+        Args:
+            batch_size: 每完成多少项输出一次进度日志
+            max_workers: 并发执行的最大任务数
+            max_pending: 已提交但结果尚未取走的最大任务数，默认为max_workers的2倍
+        """
         super().__init__(**kwargs)
         self.batch_size = batch_size
+        self.max_workers = max(max_workers, 1)
+        self.max_pending = max(max_pending or self.max_workers * 2, self.max_workers)
+        self._cancel_events = set()
+    
+    def cancel(self) -> None:
+        """取消正在进行的批量生成"""
+        with self._stats_lock:
+            events = list(self._cancel_events)
+        for event in events:
+            event.set()
+        if events:
+            self.logger.info(f"{self.name} 批量生成已取消")
+    
+    def _item_output_path(self, output_dir: str, index: int) -> str:
+        return os.path.join(output_dir, f"item_{index:03d}")
+    
+    def iter_generate(self, inputs: Iterable[Any], output_dir: str, start_index: int = 0, **kwargs) -> Iterator[GenerationResult]:
+        """并发生成，按完成顺序逐个返回结果
+        
+        每个结果的metadata['batch_index']为其在输入中的序号（从start_index开始）；
+        取消后尚未开始的任务返回CANCELLED结果，已开始的任务正常结束
+        """
+        cancel_event = threading.Event()
+        with self._stats_lock:
+            self._cancel_events.add(cancel_event)
+        
+        source = enumerate(inputs, start_index)
+        exhausted = False
+        pending = {}
+        completed = 0
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+        
+        def finish(result: GenerationResult, index: int) -> GenerationResult:
+            result.metadata = dict(result.metadata or {}, batch_index=index)
+            return result
+        
+        try:
+            while True:
+                # 只在调用方取走结果后补充新任务，调用方处理慢时不会无限堆积
+                while not exhausted and not cancel_event.is_set() and len(pending) < self.max_pending:
+                    try:
+                        index, item = next(source)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    future = executor.submit(self.generate, item, self._item_output_path(output_dir, index), **kwargs)
+                    pending[future] = index
+                
+                if cancel_event.is_set():
+                    for future in [f for f in pending if f.cancel()]:
+                        yield finish(GenerationResult(
+                            status=GenerationStatus.CANCELLED,
+                            error_message="批量生成已取消"
+                        ), pending.pop(future))
+                
+                if not pending:
+                    break
+                
+                done, _ = wait(list(pending), timeout=0.2, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = pending.pop(future)
+                    completed += 1
+                    if completed % self.batch_size == 0:
+                        self.logger.info(f"批量生成进度: 已完成 {completed} 项，进行中 {len(pending)} 项")
+                    yield finish(future.result(), index)
+        finally:
+            # 调用方提前停止迭代时，取消排队中的任务并等待执行中的任务结束
+            cancel_event.set()
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+            with self._stats_lock:
+                self._cancel_events.discard(cancel_event)
     
     def generate_batch(self, input_list: List[Any], output_dir: str, **kwargs) -> List[GenerationResult]:
-        """批量生成"""
-        results = []
+        """批量生成，结果按输入顺序返回"""
         total_items = len(input_list)
+        self.logger.info(f"开始批量生成，总数: {total_items}，并发数: {self.max_workers}")
         
-        self.logger.info(f"开始批量生成，总数: {total_items}，批次大小: {self.batch_size}")
-        
-        for i in range(0, total_items, self.batch_size):
-            batch = input_list[i:i + self.batch_size]
-            batch_results = self._process_batch(batch, output_dir, i, **kwargs)
-            results.extend(batch_results)
-            
-            # 进度报告
-            completed = min(i + self.batch_size, total_items)
-            progress = completed / total_items * 100
-            self.logger.info(f"批量生成进度: {completed}/{total_items} ({progress:.1f}%)")
+        results = self._process_batch(input_list, output_dir, 0, **kwargs)
         
         # 统计结果
         success_count = sum(1 for r in results if r.is_success)
@@ -239,10 +363,17 @@ class BatchGenerator(BaseGenerator):
         return results
     
     def _process_batch(self, batch: List[Any], output_dir: str, batch_index: int, **kwargs) -> List[GenerationResult]:
-        """处理单个批次，由子类实现"""
-        results = []
-        for i, item in enumerate(batch):
-            output_path = os.path.join(output_dir, f"item_{batch_index + i:03d}")
-            result = self.generate(item, output_path, **kwargs)
-            results.append(result)
-        return results
\ No newline at end of file
+        """并发处理一个批次，结果按输入顺序返回，输出文件序号从batch_index开始"""
+        results: List[Optional[GenerationResult]] = [None] * len(batch)
+        for result in self.iter_generate(batch, output_dir, start_index=batch_index, **kwargs):
+            results[result.metadata['batch_index'] - batch_index] = result
+        
+        # 取消时尚未提交的任务同样返回CANCELLED结果
+        for i, result in enumerate(results):
+            if result is None:
+                results[i] = GenerationResult(
+                    status=GenerationStatus.CANCELLED,
+                    error_message="批量生成已取消",
+                    metadata={'batch_index': batch_index + i}
+                )
+        return results
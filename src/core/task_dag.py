@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+任务DAG调度
+
+遵循SRP原则：只负责依赖调度、资源并发控制和断点记录，不关心具体生成逻辑
+每个节点声明所需资源（如TTS接口、图片接口、本地编码器），同一资源的节点共享一个并发池，
+不同资源的节点互不阻塞，从而让不同章节的不同阶段重叠执行。
+"""
+
+import heapq
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .interfaces import GenerationResult, GenerationStatus
+
+
+@dataclass
+class TaskNode:
+    """DAG节点"""
+    node_id: str
+    resource: str
+    func: Callable[[Dict[str, Any]], GenerationResult]
+    deps: List[str] = field(default_factory=list)
+    priority: Tuple = ()
+    status: GenerationStatus = GenerationStatus.PENDING
+    result: Optional[GenerationResult] = None
+    error_message: Optional[str] = None
+    retry_count: int = 0
+    queued_at: Optional[float] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    restored: bool = False
+
+    @property
+    def execution_time(self) -> float:
+        if self.started_at is None or self.finished_at is None:
+            return 0.0
+        return self.finished_at - self.started_at
+
+
+class TaskGraph:
+    """
+    任务依赖图
+
+    节点按添加顺序保存，依赖必须指向已添加的节点，因此图天然无环
+    """
+
+    def __init__(self):
+        self.nodes: Dict[str, TaskNode] = {}
+        self.dependents: Dict[str, List[str]] = {}
+
+    def add_node(self, node: TaskNode) -> TaskNode:
+        if node.node_id in self.nodes:
+            raise ValueError(f"重复的节点: {node.node_id}")
+        for dep in node.deps:
+            if dep not in self.nodes:
+                raise ValueError(f"节点 {node.node_id} 依赖的节点 {dep} 不存在")
+            self.dependents[dep].append(node.node_id)
+        self.nodes[node.node_id] = node
+        self.dependents[node.node_id] = []
+        return node
+
+    def descendants(self, node_id: str) -> List[str]:
+        """获取节点的所有下游节点"""
+        result = []
+        stack = list(self.dependents[node_id])
+        seen = set()
+        while stack:
+            current = stack.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            result.append(current)
+            stack.extend(self.dependents[current])
+        return result
+
+    def critical_path(self) -> Dict[str, Any]:
+        """
+        根据实际执行时间计算关键路径
+
+        从最后完成的节点开始，沿“最晚完成的依赖”回溯，得到决定总耗时的节点链；
+        每个节点的等待时间是其依赖全部完成到实际开始之间的时间，即排队等待资源的时间
+
+        Returns:
+            Dict: {'total_time', 'busy_time', 'wait_time', 'nodes': [{'node_id', 'resource', 'execution_time', 'wait_time'}]}
+        """
+        finished = [node for node in self.nodes.values() if node.finished_at is not None and not node.restored]
+        if not finished:
+            return {'total_time': 0.0, 'busy_time': 0.0, 'wait_time': 0.0, 'nodes': []}
+
+        start = min(node.queued_at or node.started_at for node in finished)
+        current = max(finished, key=lambda node: node.finished_at)
+        path = []
+        while current is not None:
+            deps = [self.nodes[dep] for dep in current.deps
+                    if self.nodes[dep].finished_at is not None and not self.nodes[dep].restored]
+            blocker = max(deps, key=lambda node: node.finished_at) if deps else None
+            ready_at = blocker.finished_at if blocker else start
+            path.append({
+                'node_id': current.node_id,
+                'resource': current.resource,
+                'execution_time': round(current.execution_time, 3),
+                'wait_time': round(max(current.started_at - ready_at, 0.0), 3)
+            })
+            current = blocker
+        path.reverse()
+
+        return {
+            'total_time': round(max(node.finished_at for node in finished) - start, 3),
+            'busy_time': round(sum(item['execution_time'] for item in path), 3),
+            'wait_time': round(sum(item['wait_time'] for item in path), 3),
+            'nodes': path
+        }
+
+
+class DagCheckpoint:
+    """
+    节点完成记录，保存在JSON文件中
+    进程崩溃后重新运行时，已完成的节点直接恢复结果，不再重复执行；
+    fingerprint标识本次运行的输入，与断点文件中记录的不一致时忽略已有记录
+    """
+
+    def __init__(self, path: Optional[str], fingerprint: Optional[str] = None):
+        self.path = path
+        self.fingerprint = fingerprint
+        self._lock = threading.Lock()
+        self._completed: Dict[str, Dict[str, Any]] = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('fingerprint') == fingerprint:
+                    self._completed = data.get('completed', {})
+            except (OSError, ValueError):
+                self._completed = {}
+
+    def get(self, node_id: str) -> Optional[GenerationResult]:
+        record = self._completed.get(node_id)
+        if record is None:
+            return None
+        return GenerationResult(
+            status=GenerationStatus.SUCCESS,
+            output_path=record.get('output_path'),
+            metadata=record.get('metadata'),
+            duration=record.get('duration')
+        )
+
+    def mark_completed(self, node_id: str, result: GenerationResult) -> None:
+        with self._lock:
+            self._completed[node_id] = {
+                'output_path': result.output_path,
+                'metadata': result.metadata,
+                'duration': result.duration,
+                'completed_at': time.time()
+            }
+            self._save()
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'fingerprint': self.fingerprint, 'completed': self._completed}, f,
+                      ensure_ascii=False, indent=2, default=str)
+        os.replace(temp_path, self.path)
+
+    def clear(self) -> None:
+        """全部节点完成后删除断点文件，之后的运行从头执行"""
+        with self._lock:
+            self._completed = {}
+            if self.path and os.path.exists(self.path):
+                os.remove(self.path)
+
+
+class DagExecutor:
+    """
+    DAG执行器
+
+    每种资源一个线程池，并发数由resource_limits控制（未配置的资源并发为1）；
+    就绪节点按priority排序，优先推进靠前的章节。
+    节点失败（重试后仍失败）时只阻断其下游节点，其他分支继续执行。
+    """
+
+    def __init__(
+        self,
+        resource_limits: Dict[str, int],
+        checkpoint: DagCheckpoint = None,
+        retry_count: int = 0,
+        backoff: Callable[[int], float] = lambda attempt: 2 ** attempt,
+        log: Callable[[str, str], None] = None,
+        should_stop: Callable[[], bool] = None
+    ):
+        self.resource_limits = resource_limits
+        self.checkpoint = checkpoint or DagCheckpoint(None)
+        self.retry_count = retry_count
+        self.backoff = backoff
+        self.log = log or (lambda level, message: print(f"[{level}] {message}"))
+        self.should_stop = should_stop or (lambda: False)
+
+    def run(self, graph: TaskGraph) -> TaskGraph:
+        remaining = {node_id: len(node.deps) for node_id, node in graph.nodes.items()}
+        resources = {node.resource for node in graph.nodes.values()}
+        ready: Dict[str, List] = {resource: [] for resource in resources}
+        sequence = 0
+
+        def release(node_id):
+            nonlocal sequence
+            for dependent_id in graph.dependents[node_id]:
+                remaining[dependent_id] -= 1
+                if remaining[dependent_id] == 0:
+                    dependent = graph.nodes[dependent_id]
+                    dependent.queued_at = time.time()
+                    heapq.heappush(ready[dependent.resource], (dependent.priority, sequence, dependent_id))
+                    sequence += 1
+
+        def block(node_id, reason):
+            for descendant_id in graph.descendants(node_id):
+                descendant = graph.nodes[descendant_id]
+                if descendant.status == GenerationStatus.PENDING:
+                    descendant.status = GenerationStatus.CANCELLED
+                    descendant.error_message = reason
+
+        # 没有依赖的节点直接就绪；断点中已完成的节点在出队时恢复结果
+        now = time.time()
+        for node_id, node in graph.nodes.items():
+            if remaining[node_id] == 0:
+                node.queued_at = now
+                heapq.heappush(ready[node.resource], (node.priority, sequence, node_id))
+                sequence += 1
+
+        pools = {resource: ThreadPoolExecutor(max_workers=max(self.resource_limits.get(resource, 1), 1),
+                                              thread_name_prefix=f"dag-{resource}")
+                 for resource in resources}
+        running = {}
+        in_flight = {resource: 0 for resource in pools}
+
+        try:
+            while True:
+                for resource, queue in ready.items():
+                    limit = max(self.resource_limits.get(resource, 1), 1)
+                    while queue and in_flight[resource] < limit:
+                        _, _, node_id = heapq.heappop(queue)
+                        node = graph.nodes[node_id]
+                        if node.status == GenerationStatus.CANCELLED:
+                            continue
+
+                        restored = self.checkpoint.get(node_id)
+                        if restored is not None:
+                            node.status = GenerationStatus.SUCCESS
+                            node.result = restored
+                            node.restored = True
+                            node.started_at = node.finished_at = time.time()
+                            self.log('INFO', f"节点 {node_id} 已在断点中完成，跳过")
+                            release(node_id)
+                            continue
+
+                        if self.should_stop():
+                            node.status = GenerationStatus.CANCELLED
+                            node.error_message = "工作流已取消"
+                            block(node_id, "工作流已取消")
+                            continue
+
+                        upstream = {dep: graph.nodes[dep].result for dep in node.deps}
+                        node.status = GenerationStatus.PROCESSING
+                        running[pools[resource].submit(self._run_node, node, upstream)] = node_id
+                        in_flight[resource] += 1
+
+                if not running:
+                    if any(ready.values()):
+                        continue
+                    break
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    node_id = running.pop(future)
+                    node = graph.nodes[node_id]
+                    in_flight[node.resource] -= 1
+                    if node.status == GenerationStatus.SUCCESS:
+                        self.checkpoint.mark_completed(node_id, node.result)
+                        self.log('INFO', f"节点 {node_id} 完成，耗时 {node.execution_time:.2f}秒")
+                        release(node_id)
+                    else:
+                        self.log('ERROR', f"节点 {node_id} 失败: {node.error_message}")
+                        block(node_id, f"上游节点 {node_id} 失败")
+        finally:
+            for pool in pools.values():
+                pool.shutdown(wait=True)
+
+        return graph
+
+    def _run_node(self, node: TaskNode, upstream: Dict[str, GenerationResult]) -> None:
+        """在资源线程池中执行节点，失败时按退避时间重试"""
+        node.started_at = time.time()
+        attempt = 0
+        while True:
+            result = None
+            try:
+                result = node.func(upstream)
+                if result is not None and result.is_success:
+                    node.result = result
+                    node.status = GenerationStatus.SUCCESS
+                    break
+                node.error_message = result.error_message if result else "节点未返回结果"
+            except Exception as e:
+                node.error_message = str(e)
+
+            if attempt >= self.retry_count:
+                node.result = result
+                node.status = GenerationStatus.FAILED
+                break
+            attempt += 1
+            self.log('WARNING', f"节点 {node.node_id} 执行失败，准备第{attempt}次重试: {node.error_message}")
+            time.sleep(self.backoff(attempt))
+
+        node.retry_count = attempt
+        node.finished_at = time.time()
@@ -5,12 +5,18 @@
 遵循SRP原则：专注于工作流编排
 遵循DI原则：通过依赖注入获取各个生成器
 遵循OCP原则：通过接口扩展工作流
+
+支持两种执行方式：
+- 按步骤顺序执行（steps）
+- 按章节构建任务DAG（chapters），各阶段按资源分池并发，不同章节的阶段流水线式重叠执行，
+  已完成节点记录在断点文件中，崩溃后重新运行从中断处继续
 """
 
 import os
 import json
+import hashlib
 from typing import Dict, List, Any, Optional, Callable
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum
 
 from .interfaces import (
@@ -19,6 +25,7 @@ from .interfaces import (
     GenerationResult, GenerationStatus
 )
 from .config_manager import ConfigManager
+from .task_dag import DagCheckpoint, DagExecutor, TaskGraph, TaskNode
 
 
 class WorkflowStep(Enum):
@@ -30,6 +37,48 @@ class WorkflowStep(Enum):
     POST_PROCESSING = "post_processing"
 
 
+class ChapterStage(Enum):
+    """章节流水线阶段"""
+    SCRIPT = "script"
+    VALIDATE = "validate"
+    AUDIO = "audio"
+    ASS = "ass"
+    IMAGES = "images"
+    RENDER = "render"
+    FINISH = "finish"
+
+
+# 章节内各阶段的数据依赖：字幕依赖配音时间轴，图片只依赖校验后的脚本，渲染等待字幕和图片
+STAGE_DEPENDENCIES = {
+    ChapterStage.SCRIPT: [],
+    ChapterStage.VALIDATE: [ChapterStage.SCRIPT],
+    ChapterStage.AUDIO: [ChapterStage.VALIDATE],
+    ChapterStage.ASS: [ChapterStage.AUDIO],
+    ChapterStage.IMAGES: [ChapterStage.VALIDATE],
+    ChapterStage.RENDER: [ChapterStage.ASS, ChapterStage.IMAGES],
+    ChapterStage.FINISH: [ChapterStage.RENDER],
+}
+
+# 各阶段占用的资源，同一资源的节点共享一个并发池
+STAGE_RESOURCES = {
+    ChapterStage.SCRIPT: 'llm',
+    ChapterStage.VALIDATE: 'llm',
+    ChapterStage.AUDIO: 'tts',
+    ChapterStage.ASS: 'local',
+    ChapterStage.IMAGES: 'image_api',
+    ChapterStage.RENDER: 'encoder',
+    ChapterStage.FINISH: 'encoder',
+}
+
+DEFAULT_RESOURCE_LIMITS = {
+    'llm': 2,
+    'tts': 2,
+    'local': 2,
+    'image_api': 2,
+    'encoder': 1,
+}
+
+
 @dataclass
 class WorkflowConfig:
     """工作流配置"""
@@ -39,6 +88,8 @@ class WorkflowConfig:
     timeout: int = 3600  # 超时时间（秒）
     output_dir: str = "output"
     cleanup_on_failure: bool = True
+    resource_limits: Dict[str, int] = field(default_factory=lambda: dict(DEFAULT_RESOURCE_LIMITS))
+    checkpoint_path: Optional[str] = None
 
 
 @dataclass
@@ -93,6 +144,11 @@ class WorkflowOrchestrator(IWorkflowOrchestrator):
         self._current_workflow = None
         self._step_results: Dict[WorkflowStep, StepResult] = {}
         self._workflow_data: Dict[str, Any] = {}
+        self._current_graph: Optional[TaskGraph] = None
+        self._cancelled = False
+        
+        # 章节流水线各阶段的处理器：handler(chapter, upstream) -> GenerationResult
+        self._stage_handlers: Dict[ChapterStage, Callable[[Dict[str, Any], Dict[str, GenerationResult]], GenerationResult]] = {}
         
         # 步骤处理器映射
         self._step_handlers = {
@@ -112,6 +168,9 @@ class WorkflowOrchestrator(IWorkflowOrchestrator):
         Returns:
             List[GenerationResult]: 工作流执行结果列表
         """
+        if workflow_config.get('chapters') is not None:
+            return self.execute_chapter_pipeline(workflow_config)
+        
         try:
             # 解析工作流配置
             steps = workflow_config.get('steps', [])
@@ -132,6 +191,8 @@ class WorkflowOrchestrator(IWorkflowOrchestrator):
             )
             
             self._current_workflow = config
+            self._current_graph = None
+            self._cancelled = False
             self._step_results.clear()
             self._workflow_data.clear()
             
@@ -200,6 +261,156 @@ class WorkflowOrchestrator(IWorkflowOrchestrator):
                 error_message=error_msg
             )]
     
+    def execute_chapter_pipeline(self, workflow_config: Dict[str, Any]) -> List[GenerationResult]:
+        """按章节任务DAG执行工作流
+        
+        Args:
+            workflow_config: 工作流配置字典
+                chapters: 章节列表，每项为dict，可包含'id'（缺省为序号）
+                stage_handlers: 阶段名 -> 处理器，覆盖register_stage_handler注册的处理器
+                resource_limits: 资源名 -> 并发数，未配置的使用DEFAULT_RESOURCE_LIMITS
+                checkpoint_path: 断点文件路径，默认 <output_dir>/workflow_checkpoint.json；全部节点成功后删除
+                fingerprint: 本次运行的输入标识，缺省为章节列表和阶段的哈希；与断点记录不一致时从头执行
+                retry_count: 节点失败重试次数
+        
+        Returns:
+            List[GenerationResult]: 各节点结果，最后一项为包含关键路径的总结结果
+        """
+        try:
+            output_dir = workflow_config.get('output_dir', 'output')
+            config = WorkflowConfig(
+                steps=[],
+                parallel_steps=[],
+                retry_count=workflow_config.get('retry_count', 3),
+                output_dir=output_dir,
+                checkpoint_path=workflow_config.get('checkpoint_path') or os.path.join(output_dir, 'workflow_checkpoint.json')
+            )
+            config.resource_limits.update(workflow_config.get('resource_limits', {}))
+            
+            handlers = dict(self._stage_handlers)
+            for stage, handler in workflow_config.get('stage_handlers', {}).items():
+                handlers[ChapterStage(stage) if isinstance(stage, str) else stage] = handler
+            
+            self._current_workflow = config
+            self._cancelled = False
+            self._step_results.clear()
+            os.makedirs(config.output_dir, exist_ok=True)
+            
+            graph = self.build_chapter_graph(workflow_config['chapters'], handlers)
+            self._current_graph = graph
+            self._log_info(f"开始执行章节流水线，{len(workflow_config['chapters'])} 个章节，{len(graph.nodes)} 个任务节点")
+            
+            # 断点只在输入相同的运行之间复用，章节或阶段配置变化后从头执行
+            fingerprint = workflow_config.get('fingerprint') or hashlib.sha256(json.dumps(
+                {'chapters': workflow_config['chapters'], 'nodes': sorted(graph.nodes)},
+                sort_keys=True, ensure_ascii=False, default=str
+            ).encode('utf-8')).hexdigest()
+            checkpoint = DagCheckpoint(config.checkpoint_path, fingerprint)
+            executor = DagExecutor(
+                resource_limits=config.resource_limits,
+                checkpoint=checkpoint,
+                retry_count=config.retry_count,
+                log=self._log,
+                should_stop=lambda: self._cancelled
+            )
+            executor.run(graph)
+            
+            # 断点文件用于续跑，章节流水线失败时不清理输出目录，全部成功后删除
+            results = [node.result for node in graph.nodes.values() if node.result]
+            failed_nodes = [node_id for node_id, node in graph.nodes.items() if node.status != GenerationStatus.SUCCESS]
+            critical_path = graph.critical_path()
+            metadata = {
+                'node_results': self._get_node_results_summary(),
+                'critical_path': critical_path,
+                'total_execution_time': critical_path['total_time'],
+                'resumed_nodes': sum(1 for node in graph.nodes.values() if node.restored),
+                'checkpoint_path': config.checkpoint_path
+            }
+            self._log_info(
+                f"关键路径耗时 {critical_path['total_time']:.2f}秒（执行 {critical_path['busy_time']:.2f}秒，"
+                f"排队 {critical_path['wait_time']:.2f}秒）: "
+                + " -> ".join(item['node_id'] for item in critical_path['nodes'])
+            )
+            
+            if failed_nodes:
+                error_msg = f"{len(failed_nodes)} 个任务节点未完成: {', '.join(failed_nodes)}"
+                self._log_error(error_msg)
+                metadata['failed_nodes'] = failed_nodes
+                results.append(GenerationResult(
+                    status=GenerationStatus.FAILED,
+                    error_message=error_msg,
+                    metadata=metadata
+                ))
+                return results
+            
+            checkpoint.clear()
+            self._log_info("章节流水线执行完成")
+            results.append(GenerationResult(
+                status=GenerationStatus.SUCCESS,
+                output_path=config.output_dir,
+                metadata=metadata
+            ))
+            return results
+            
+        except Exception as e:
+            error_msg = f"章节流水线执行异常: {str(e)}"
+            self._log_error(error_msg)
+            
+            return [GenerationResult(
+                status=GenerationStatus.FAILED,
+                error_message=error_msg
+            )]
+    
+    def build_chapter_graph(
+        self,
+        chapters: List[Dict[str, Any]],
+        handlers: Dict[ChapterStage, Callable[[Dict[str, Any], Dict[str, GenerationResult]], GenerationResult]]
+    ) -> TaskGraph:
+        """
+        为每个章节构建阶段节点，节点ID为 <章节ID>:<阶段名>
+        
+        未配置处理器的阶段被跳过，其下游直接依赖该阶段的上游
+        """
+        if not handlers:
+            raise ValueError("未配置任何章节阶段处理器")
+        
+        def resolve(stage: ChapterStage) -> List[ChapterStage]:
+            resolved = []
+            for dep in STAGE_DEPENDENCIES[stage]:
+                for item in ([dep] if dep in handlers else resolve(dep)):
+                    if item not in resolved:
+                        resolved.append(item)
+            return resolved
+        
+        stage_order = list(ChapterStage)
+        graph = TaskGraph()
+        for index, chapter in enumerate(chapters):
+            chapter_id = str(chapter.get('id', index + 1))
+            for stage in stage_order:
+                if stage not in handlers:
+                    continue
+                graph.add_node(TaskNode(
+                    node_id=f"{chapter_id}:{stage.value}",
+                    resource=STAGE_RESOURCES[stage],
+                    func=self._make_stage_task(handlers[stage], chapter),
+                    deps=[f"{chapter_id}:{dep.value}" for dep in resolve(stage)],
+                    # 优先推进靠前的章节，使后续章节的阶段与之错开重叠
+                    priority=(index, stage_order.index(stage))
+                ))
+        return graph
+    
+    @staticmethod
+    def _make_stage_task(handler, chapter):
+        def run(upstream: Dict[str, GenerationResult]) -> GenerationResult:
+            return handler(chapter, {node_id.split(':', 1)[1]: result for node_id, result in upstream.items()})
+        return run
+    
+    def register_stage_handler(self, stage, handler) -> None:
+        """注册章节流水线阶段处理器，stage可为ChapterStage或阶段名"""
+        stage = ChapterStage(stage) if isinstance(stage, str) else stage
+        self._stage_handlers[stage] = handler
+        self._log_info(f"已注册章节阶段处理器: {stage.value}")
+    
     def _execute_step(self, step: WorkflowStep) -> StepResult:
         """
         执行单个工作流步骤
@@ -428,6 +639,20 @@ class WorkflowOrchestrator(IWorkflowOrchestrator):
             }
         return summary
     
+    def _get_node_results_summary(self) -> Dict[str, Any]:
+        """获取章节流水线节点结果摘要"""
+        summary = {}
+        for node_id, node in self._current_graph.nodes.items():
+            summary[node_id] = {
+                'status': node.status.value,
+                'resource': node.resource,
+                'execution_time': round(node.execution_time, 3),
+                'retry_count': node.retry_count,
+                'restored': node.restored,
+                'error_message': node.error_message
+            }
+        return summary
+    
     def _cleanup_on_failure(self) -> None:
         """失败时清理临时文件"""
         try:
@@ -439,6 +664,15 @@ class WorkflowOrchestrator(IWorkflowOrchestrator):
         except Exception as e:
             self._log_error(f"清理临时文件失败: {e}")
     
+    def _log(self, level: str, message: str) -> None:
+        """按级别记录日志"""
+        if level == 'ERROR':
+            self._log_error(message)
+        elif level == 'WARNING':
+            self._log_warning(message)
+        else:
+            self._log_info(message)
+    
     def _log_info(self, message: str) -> None:
         """记录信息日志"""
         if self.logger:
@@ -465,6 +699,17 @@ class WorkflowOrchestrator(IWorkflowOrchestrator):
         if not self._current_workflow:
             return {'status': 'not_started'}
         
+        if self._current_graph is not None:
+            nodes = self._current_graph.nodes.values()
+            finished = [node for node in nodes if node.status in (GenerationStatus.SUCCESS, GenerationStatus.FAILED, GenerationStatus.CANCELLED)]
+            return {
+                'status': 'running' if len(finished) < len(self._current_graph.nodes) else 'completed',
+                'completed_steps': sum(1 for node in nodes if node.status == GenerationStatus.SUCCESS),
+                'running_steps': [node.node_id for node in nodes if node.status == GenerationStatus.PROCESSING],
+                'total_steps': len(self._current_graph.nodes),
+                'step_results': self._get_node_results_summary()
+            }
+        
         return {
             'status': 'running' if len(self._step_results) < len(self._current_workflow.steps) else 'completed',
             'completed_steps': len(self._step_results),
@@ -489,7 +734,11 @@ class WorkflowOrchestrator(IWorkflowOrchestrator):
     
     def cancel_workflow(self) -> bool:
         """取消当前工作流"""
-        # 实现工作流取消逻辑
-        # 这里可以设置取消标志，在步骤执行中检查
+        # 章节流水线不再提交新的节点，已在执行的节点会正常结束
+        self._cancelled = True
+        # 正在批量生成的生成器停止提交新任务
+        for generator in (self.script_generator, self.image_generator, self.voice_generator, self.video_generator):
+            if generator is not None and hasattr(generator, 'cancel'):
+                generator.cancel()
         self._log_info("工作流已取消")
         return True
\ No newline at end of file
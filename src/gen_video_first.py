@@ -4,6 +4,7 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from volcenginesdkarkruntime import Ark
 from config.config import ARK_CONFIG
+from rate_limiter import rate_limited_call
 
 
 client = Ark(api_key=ARK_CONFIG["api_key"])
@@ -12,7 +13,7 @@ duration = 10
 
 if __name__ == "__main__":
     print("----- create request -----")
-    resp = client.content_generation.tasks.create(
+    resp = rate_limited_call('ark_video_submit', client.content_generation.tasks.create,
         model="doubao-seedance-1-0-lite-i2v-250428",
         content=[
             {
@@ -5,6 +5,8 @@ import os
 
 from volcengine.visual.VisualService import VisualService
 from config.config import IMAGE_TWO_CONFIG
+from rate_limiter import rate_limited_call
+from asset_store import store_bytes
 
 
 def generate_image_with_volcengine(prompt, output_path):
@@ -48,7 +50,7 @@ def generate_image_with_volcengine(prompt, output_path):
         }
         
         print(f"正在生成图片: {os.path.basename(output_path)}")
-        resp = visual_service.cv_process(form)
+        resp = rate_limited_call('visual_sync', visual_service.cv_process, form)
         
         # 检查响应
         if 'data' in resp and 'binary_data_base64' in resp['data']:
@@ -60,8 +62,7 @@ def generate_image_with_volcengine(prompt, output_path):
             
             # 解码并保存图片
             image_data = base64.b64decode(base64_data)
-            with open(output_path, 'wb') as f:
-                f.write(image_data)
+            store_bytes(image_data, output_path)
             
             print(f"图片已保存: {output_path}")
             return True
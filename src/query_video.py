@@ -4,11 +4,12 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from volcenginesdkarkruntime import Ark
 from config.config import ARK_CONFIG
+from rate_limiter import rate_limited_call
 
 client = Ark(api_key=ARK_CONFIG["api_key"])
 
 if __name__ == "__main__":
-    resp = client.content_generation.tasks.get(
+    resp = rate_limited_call('ark_video_query', client.content_generation.tasks.get,
         task_id="cgt-2025****",
     )
     print(resp)
\ No newline at end of file
@@ -21,6 +21,7 @@ sys.path.insert(0, project_root)
 
 from config.prompt_config import prompt_config, SCRIPT_CONFIG
 from config.config import ARK_CONFIG
+from rate_limiter import rate_limited_call
 
 class ScriptGenerator:
     """
@@ -106,7 +107,7 @@ class ScriptGenerator:
             print(f"正在生成第 {chunk_index + 1}/{total_chunks} 个脚本片段...")
             
             # 调用API
-            completion = self.client.chat.completions.create(
+            completion = rate_limited_call('ark_chat', self.client.chat.completions.create,
                 model=self.model,
                 messages=[
                     {"role": "user", "content": prompt}
@@ -433,7 +434,7 @@ class ScriptGenerator:
             print(f"正在为第{chapter_num}章生成解说文案...")
             
             # 调用API生成解说
-            completion = self.client.chat.completions.create(
+            completion = rate_limited_call('ark_chat', self.client.chat.completions.create,
                 model=self.model,
                 messages=[
                     {"role": "user", "content": custom_prompt}
@@ -19,6 +19,7 @@ sys.path.insert(0, project_root)
 
 from config.prompt_config import prompt_config, VOICE_PRESETS, validate_voice_preset
 from config.config import TTS_CONFIG
+from rate_limiter import rate_limited_call
 
 class VoiceGenerator:
     """
@@ -132,7 +133,7 @@ class VoiceGenerator:
             
             print("正在生成语音...")
             print(request_config)
-            response = requests.post(
+            response = rate_limited_call('bytedance_tts', requests.post,
                 self.api_url,
                 headers=headers,
                 json=request_config,
@@ -243,7 +244,7 @@ class VoiceGenerator:
             }
             
             print("正在生成语音...")
-            response = requests.post(
+            response = rate_limited_call('bytedance_tts', requests.post,
                 self.api_url,
                 headers=headers,
                 json=request_config,
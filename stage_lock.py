@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+生成阶段的幂等提交锁
+
+功能:
+    - 按 (小说, 章节, 阶段, 输入哈希) 加锁，同一阶段正在排队或执行时，重复提交（双击、多人同时审查）
+      不再启动新的Celery任务，而是合并到进行中的任务并返回它的任务ID
+    - 优先使用Redis（SET NX + Lua脚本比较后续期/释放），Redis不可用时退回本机SQLite文件（BEGIN IMMEDIATE加文件锁）
+    - 锁由任务心跳续期：排队期间按排队超时保留，worker开始执行后每隔一段时间续期，任务结束时释放；
+      worker崩溃后心跳停止，锁在心跳超时后自动失效，持有锁的任务已结束时也直接接管
+
+使用方法:
+    from stage_lock import get_stage_guard
+
+    task_id, coalesced = get_stage_guard().submit(
+        'audio', novel_id, chapter_id,
+        lambda task_id: generate_audio_async.apply_async((novel_id, chapter_id), task_id=task_id),
+        is_finished=lambda task_id: AsyncResult(task_id).ready(),
+    )
+
+    # worker中（video/tasks.py的task_prerun/task_postrun信号）
+    get_stage_guard().start_heartbeat(task_id)
+    get_stage_guard().finish(task_id)
+
+    # 查看或手动释放锁
+    python stage_lock.py list
+    python stage_lock.py release <锁键>
+
+环境变量:
+    STAGE_LOCK_BACKEND=redis|sqlite   指定后端，默认先尝试Redis
+    STAGE_LOCK_REDIS_URL              Redis地址，默认与限流器相同
+    STAGE_LOCK_DB                     SQLite文件路径，默认 data/.stage_locks.sqlite3
+    STAGE_LOCK_QUEUED_TTL             任务排队期间锁的保留秒数，默认1800
+    STAGE_LOCK_HEARTBEAT_TTL          执行期间心跳超时秒数，默认120（每1/4超时续期一次）
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+
+from rate_limiter import DEFAULT_REDIS_URL, load_rate_limit_config
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB_PATH = os.path.join(PROJECT_ROOT, 'data', '.stage_locks.sqlite3')
+REDIS_KEY_PREFIX = 'stagelock:'
+REDIS_TASK_PREFIX = 'stagelock-task:'
+
+DEFAULT_QUEUED_TTL = 1800.0
+DEFAULT_HEARTBEAT_TTL = 120.0
+
+
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def stage_key(stage, novel_id, chapter=None, inputs=None):
+    """
+    生成锁键：阶段:小说:章节:输入哈希，输入不同（如不同场景、自定义prompt）的请求互不合并
+    """
+    digest = hashlib.sha1(json.dumps(inputs or {}, sort_keys=True, ensure_ascii=False,
+                                     default=str).encode('utf-8')).hexdigest()[:16]
+    return f"{stage}:{novel_id}:{chapter if chapter is not None else '-'}:{digest}"
+
+
+def file_inputs(root, patterns):
+    """
+    输入文件摘要，作为submit的inputs：文件改动后的新请求不会合并到基于旧输入运行的任务
+    文本文件（.txt）按内容SHA-256，音视频和图片按大小和修改时间
+
+    Args:
+        root (str): 目录
+        patterns (list): 相对root的glob模式，如 ['narration.txt', '*_narration_*.mp3']
+
+    Returns:
+        dict: {相对路径: 摘要}
+    """
+    inputs = {}
+    for pattern in patterns:
+        for path in sorted(glob.glob(os.path.join(glob.escape(root), pattern))):
+            try:
+                if path.endswith('.txt'):
+                    with open(path, 'rb') as f:
+                        digest = hashlib.sha256(f.read()).hexdigest()
+                else:
+                    stat = os.stat(path)
+                    digest = [stat.st_size, stat.st_mtime_ns]
+            except OSError:
+                continue
+            inputs[os.path.relpath(path, root)] = digest
+    return inputs
+
+
+class SqliteLockBackend:
+    """
+    本机SQLite锁表，多进程通过BEGIN IMMEDIATE串行化
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.environ.get('STAGE_LOCK_DB') or DEFAULT_DB_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS stage_locks ('
+                'key TEXT PRIMARY KEY, task_id TEXT NOT NULL, created_at REAL, expires_at REAL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS stage_locks_task ON stage_locks (task_id)')
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def claim(self, key, task_id, ttl, now):
+        """
+        锁空闲或已过期时由task_id持有
+
+        Returns:
+            str: 当前持有锁的任务ID（等于task_id表示取得锁）
+        """
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT task_id, expires_at FROM stage_locks WHERE key = ?', (key,)).fetchone()
+            if row and row[1] > now:
+                conn.execute('COMMIT')
+                return row[0]
+            conn.execute('INSERT OR REPLACE INTO stage_locks (key, task_id, created_at, expires_at) VALUES (?, ?, ?, ?)',
+                         (key, task_id, now, now + ttl))
+            conn.execute('COMMIT')
+            return task_id
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def refresh(self, key, task_id, ttl, now):
+        conn = self._connect()
+        try:
+            cursor = conn.execute('UPDATE stage_locks SET expires_at = ? WHERE key = ? AND task_id = ? AND expires_at > ?',
+                                  (now + ttl, key, task_id, now))
+            return cursor.rowcount > 0
+        finally:
+            conn.close()
+
+    def release(self, key, task_id=None):
+        conn = self._connect()
+        try:
+            if task_id is None:
+                cursor = conn.execute('DELETE FROM stage_locks WHERE key = ?', (key,))
+            else:
+                cursor = conn.execute('DELETE FROM stage_locks WHERE key = ? AND task_id = ?', (key, task_id))
+            return cursor.rowcount > 0
+        finally:
+            conn.close()
+
+    def key_for_task(self, task_id, now):
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT key FROM stage_locks WHERE task_id = ? AND expires_at > ?',
+                               (task_id, now)).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
+
+    def snapshot(self, now):
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT key, task_id, created_at, expires_at FROM stage_locks WHERE expires_at > ? '
+                                'ORDER BY created_at', (now,)).fetchall()
+        finally:
+            conn.close()
+        return [{'key': row[0], 'task_id': row[1], 'age': now - row[2], 'expires_in': row[3] - now} for row in rows]
+
+
+class RedisLockBackend:
+    """
+    Redis锁，所有主机共享；续期和释放在Lua脚本中先比较持有者再操作
+    """
+
+    name = 'redis'
+
+    REFRESH_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    redis.call('PEXPIRE', KEYS[1] .. ':created', ARGV[2])
+    redis.call('SET', KEYS[2], ARGV[3], 'PX', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+    RELEASE_SCRIPT = """
+local holder = redis.call('GET', KEYS[1])
+if holder and (ARGV[1] == '' or holder == ARGV[1]) then
+    redis.call('DEL', KEYS[1], KEYS[1] .. ':created', ARGV[2] .. holder)
+    return 1
+end
+return 0
+"""
+
+    def __init__(self, url):
+        import redis
+
+        self.url = url
+        self.client = redis.Redis.from_url(url, socket_connect_timeout=2, socket_timeout=5)
+        self.client.ping()
+        self._refresh = self.client.register_script(self.REFRESH_SCRIPT)
+        self._release = self.client.register_script(self.RELEASE_SCRIPT)
+
+    def claim(self, key, task_id, ttl, now):
+        ttl_ms = int(ttl * 1000)
+        while True:
+            if self.client.set(REDIS_KEY_PREFIX + key, task_id, nx=True, px=ttl_ms):
+                self.client.set(REDIS_TASK_PREFIX + task_id, key, px=ttl_ms)
+                self.client.set(REDIS_KEY_PREFIX + key + ':created', str(now), px=ttl_ms)
+                return task_id
+            holder = self.client.get(REDIS_KEY_PREFIX + key)
+            # 读取前锁恰好过期时重试
+            if holder is not None:
+                return holder.decode('utf-8')
+
+    def refresh(self, key, task_id, ttl, now):
+        return bool(self._refresh(keys=[REDIS_KEY_PREFIX + key, REDIS_TASK_PREFIX + task_id],
+                                  args=[task_id, int(ttl * 1000), key]))
+
+    def release(self, key, task_id=None):
+        return bool(self._release(keys=[REDIS_KEY_PREFIX + key], args=[task_id or '', REDIS_TASK_PREFIX]))
+
+    def key_for_task(self, task_id, now):
+        key = self.client.get(REDIS_TASK_PREFIX + task_id)
+        return key.decode('utf-8') if key else None
+
+    def snapshot(self, now):
+        locks = []
+        for redis_key in self.client.scan_iter(match=REDIS_KEY_PREFIX + '*'):
+            name = redis_key.decode('utf-8')
+            if name.endswith(':created'):
+                continue
+            task_id = self.client.get(redis_key)
+            expires_in = self.client.pttl(redis_key)
+            if task_id is None or expires_in < 0:
+                continue
+            created = self.client.get(redis_key + b':created')
+            locks.append({'key': name[len(REDIS_KEY_PREFIX):], 'task_id': task_id.decode('utf-8'),
+                          'age': now - float(created) if created else 0.0, 'expires_in': expires_in / 1000})
+        return sorted(locks, key=lambda lock: -lock['age'])
+
+
+def create_backend():
+    """
+    按环境变量创建后端：指定sqlite时直接使用SQLite，否则先尝试Redis，失败时退回SQLite
+    """
+    backend = os.environ.get('STAGE_LOCK_BACKEND', '').lower()
+    if backend != 'sqlite':
+        url = (os.environ.get('STAGE_LOCK_REDIS_URL') or os.environ.get('RATE_LIMIT_REDIS_URL')
+               or load_rate_limit_config().get('redis_url') or DEFAULT_REDIS_URL)
+        try:
+            return RedisLockBackend(url)
+        except Exception as e:
+            if backend == 'redis':
+                raise
+            print(f"阶段锁无法连接Redis（{e}），使用本机SQLite锁")
+    return SqliteLockBackend()
+
+
+class StageGuard:
+    """
+    阶段提交守卫：同一锁键同时只有一个排队或执行中的任务
+
+    Args:
+        backend: 锁后端，默认按环境变量创建
+        queued_ttl (float): 提交后到worker开始执行前锁的保留秒数
+        heartbeat_ttl (float): 执行期间的心跳超时秒数
+        clock (callable): 当前时间
+    """
+
+    def __init__(self, backend=None, queued_ttl=None, heartbeat_ttl=None, clock=time.time):
+        self.backend = backend or create_backend()
+        self.queued_ttl = queued_ttl or _env_float('STAGE_LOCK_QUEUED_TTL', DEFAULT_QUEUED_TTL)
+        self.heartbeat_ttl = heartbeat_ttl or _env_float('STAGE_LOCK_HEARTBEAT_TTL', DEFAULT_HEARTBEAT_TTL)
+        self.clock = clock
+        self._fallback_lock = threading.Lock()
+        self._heartbeats_lock = threading.Lock()
+        # task_id -> (锁键, 停止事件)
+        self._heartbeats = {}
+
+    def _call_backend(self, method, *args):
+        """
+        Redis调用失败时切换到SQLite后端
+        """
+        try:
+            return getattr(self.backend, method)(*args)
+        except Exception as e:
+            if isinstance(self.backend, SqliteLockBackend):
+                raise
+            with self._fallback_lock:
+                if not isinstance(self.backend, SqliteLockBackend):
+                    print(f"阶段锁Redis后端出错（{e}），切换到本机SQLite锁")
+                    self.backend = SqliteLockBackend()
+            return getattr(self.backend, method)(*args)
+
+    def submit(self, stage, novel_id, chapter, enqueue, inputs=None, is_finished=None):
+        """
+        提交阶段任务，同一阶段已有进行中的任务时合并到该任务
+
+        Args:
+            stage (str): 阶段名，如 'audio'、'render_all'
+            novel_id: 小说ID
+            chapter: 章节ID或标题，整本小说的阶段传None
+            enqueue (callable): enqueue(task_id)，用预先生成的任务ID投递Celery任务
+            inputs (dict): 影响结果的输入参数，参与锁键计算
+            is_finished (callable): is_finished(task_id) -> bool，持有锁的任务已结束时直接接管
+
+        Returns:
+            tuple: (任务ID, 是否合并到已有任务)
+        """
+        key = stage_key(stage, novel_id, chapter, inputs)
+        task_id = str(uuid.uuid4())
+        try:
+            holder = self._call_backend('claim', key, task_id, self.queued_ttl, self.clock())
+            if holder != task_id and is_finished is not None and is_finished(holder):
+                # 任务已结束但未释放锁（如worker在postrun前被杀），接管
+                self._call_backend('release', key, holder)
+                holder = self._call_backend('claim', key, task_id, self.queued_ttl, self.clock())
+        except Exception as e:
+            # 锁不可用时不阻塞提交，退回不去重
+            print(f"⚠ 阶段锁不可用，直接提交 {key}: {e}")
+            enqueue(task_id)
+            return task_id, False
+
+        if holder != task_id:
+            return holder, True
+        try:
+            enqueue(task_id)
+        except Exception:
+            self._call_backend('release', key, task_id)
+            raise
+        return task_id, False
+
+    def heartbeat(self, task_id):
+        """
+        为任务持有的锁续期一次
+
+        Returns:
+            bool: 任务仍持有锁
+        """
+        key = self._call_backend('key_for_task', task_id, self.clock())
+        if key is None:
+            return False
+        return self._call_backend('refresh', key, task_id, self.heartbeat_ttl, self.clock())
+
+    def start_heartbeat(self, task_id):
+        """
+        任务开始执行时调用：任务持有阶段锁时启动后台心跳线程，不持有时不做任何事
+        """
+        key = self._call_backend('key_for_task', task_id, self.clock())
+        if key is None or not self._call_backend('refresh', key, task_id, self.heartbeat_ttl, self.clock()):
+            return False
+        stop = threading.Event()
+        with self._heartbeats_lock:
+            self._heartbeats[task_id] = (key, stop)
+
+        def run():
+            interval = max(1.0, self.heartbeat_ttl / 4)
+            while not stop.wait(interval):
+                try:
+                    if not self._call_backend('refresh', key, task_id, self.heartbeat_ttl, self.clock()):
+                        return
+                except Exception as e:
+                    print(f"⚠ 阶段锁续期失败 {key}: {e}")
+
+        threading.Thread(target=run, name=f'stage-heartbeat-{task_id[:8]}', daemon=True).start()
+        return True
+
+    def finish(self, task_id):
+        """
+        任务结束时调用：停止心跳并释放锁
+        """
+        with self._heartbeats_lock:
+            entry = self._heartbeats.pop(task_id, None)
+        if entry is None:
+            return False
+        key, stop = entry
+        stop.set()
+        return self._call_backend('release', key, task_id)
+
+    def locks(self):
+        return self._call_backend('snapshot', self.clock())
+
+    def release(self, key):
+        """
+        手动释放锁（不校验持有者）
+        """
+        return self._call_backend('release', key, None)
+
+
+_shared_guard = None
+_shared_guard_lock = threading.Lock()
+
+
+def get_stage_guard():
+    """
+    获取进程内共享的阶段提交守卫
+    """
+    global _shared_guard
+    with _shared_guard_lock:
+        if _shared_guard is None:
+            _shared_guard = StageGuard()
+        return _shared_guard
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成阶段提交锁')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    list_parser = subparsers.add_parser('list', help='查看进行中的阶段锁')
+    list_parser.add_argument('--json', action='store_true', help='以JSON输出')
+    release_parser = subparsers.add_parser('release', help='手动释放阶段锁')
+    release_parser.add_argument('key', help='锁键（list输出的第一列）')
+    args = parser.parse_args()
+
+    guard = get_stage_guard()
+    if args.command == 'release':
+        if guard.release(args.key):
+            print(f"已释放 {args.key}")
+            return 0
+        print(f"锁不存在或已过期: {args.key}")
+        return 1
+
+    locks = guard.locks()
+    if args.json:
+        print(json.dumps(locks, ensure_ascii=False, indent=2))
+        return 0
+    print(f"后端: {guard.backend.name}")
+    if not locks:
+        print("没有进行中的阶段锁")
+        return 0
+    print(f"{'锁键':<56} {'任务ID':<38} {'已持有':>8} {'剩余':>8}")
+    for lock in locks:
+        print(f"{lock['key']:<56} {lock['task_id']:<38} {lock['age']:>7.0f}s {lock['expires_in']:>7.0f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试asset_store.py的内容寻址素材存储
+在临时目录中验证：相同内容只存一份并以硬链接出现在多个章节、重新生成时原子替换不影响其他章节、
+按引用计数回收对象、已有目录收录去重以及对象内容校验
+
+使用方法:
+python test/test_asset_store.py
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from asset_store import AssetStore, hash_bytes
+
+def chapter_image(root, chapter, name):
+    return os.path.join(root, 'data', '001', chapter, 'images', name)
+
+def test_dedup_and_replace():
+    """
+    测试相同内容共用一个对象，重新生成只替换本章节的文件名
+    """
+    print("测试1: 去重与原子替换")
+    with tempfile.TemporaryDirectory() as root:
+        store = AssetStore(os.path.join(root, 'data', '.assets'))
+        first = chapter_image(root, 'chapter_001', 'a.jpeg')
+        second = chapter_image(root, 'chapter_002', 'a.jpeg')
+
+        digest = store.put_bytes(b'portrait', first)
+        assert store.put_file(first, second) == digest
+        obj = store.object_path(digest)
+        assert os.path.samefile(first, second) and os.path.samefile(first, obj)
+        assert os.stat(obj).st_nlink == 3
+
+        # 重新生成第一章的图片：第二章仍是原内容
+        store.put_bytes(b'regenerated', first)
+        with open(first, 'rb') as f:
+            assert f.read() == b'regenerated'
+        with open(second, 'rb') as f:
+            assert f.read() == b'portrait'
+        assert os.stat(obj).st_nlink == 2
+
+        _, rows = store.refs(digest)
+        assert [path for path, kind in rows] == [second], rows
+    print("  ✓ 通过")
+
+def test_gc_reference_counting():
+    """
+    测试删除所有文件名后对象才会被回收，新对象在保留期内不回收
+    """
+    print("测试2: 引用计数回收")
+    with tempfile.TemporaryDirectory() as root:
+        store = AssetStore(os.path.join(root, 'data', '.assets'))
+        image = chapter_image(root, 'chapter_001', 'a.jpeg')
+        backup = image + '.backup'
+        digest = store.put_bytes(b'x' * 1000, image)
+        store.put_file(image, backup)
+
+        os.remove(backup)
+        result = store.gc(grace=0)
+        assert result['removed'] == 0 and result['refs_dropped'] == 1, result
+
+        os.remove(image)
+        result = store.gc()
+        assert result['removed'] == 0 and result['refs_dropped'] == 1, '保留期内的新对象不应回收'
+        dry = store.gc(dry_run=True, grace=0)
+        assert dry['removed'] == 1 and os.path.exists(store.object_path(digest)), dry
+        result = store.gc(grace=0)
+        assert result == {'objects': 1, 'removed': 1, 'freed_bytes': 1000, 'refs_dropped': 0}, result
+        assert not os.path.exists(store.object_path(digest))
+    print("  ✓ 通过")
+
+def test_ingest_stats_verify():
+    """
+    测试收录已有目录时重复文件改为硬链接，统计节省空间，并能发现被就地改写的对象
+    """
+    print("测试3: 收录、统计与校验")
+    with tempfile.TemporaryDirectory() as root:
+        store = AssetStore(os.path.join(root, 'data', '.assets'))
+        paths = [chapter_image(root, f'chapter_00{i}', 'portrait.png') for i in range(1, 4)]
+        for path in paths:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(b'p' * 500)
+        with open(os.path.join(os.path.dirname(paths[0]), 'notes.txt'), 'w') as f:
+            f.write('不收录')
+
+        dry = store.ingest([os.path.join(root, 'data')], dry_run=True)
+        assert dry == {'files': 3, 'new_objects': 1, 'deduplicated': 2, 'saved_bytes': 1000}, dry
+        assert store.ingest([os.path.join(root, 'data')]) == dry
+        assert all(os.path.samefile(paths[0], path) for path in paths[1:])
+        # 再次收录不做任何改动
+        assert store.ingest([os.path.join(root, 'data')])['new_objects'] == 0
+
+        stats = store.stats()
+        assert stats['objects'] == 1 and stats['references'] == 3, stats
+        assert stats['stored_bytes'] == 500 and stats['saved_bytes'] == 1000, stats
+
+        assert store.verify() == []
+        obj = store.object_path(hash_bytes(b'p' * 500))
+        os.chmod(obj, 0o644)
+        with open(paths[0], 'ab') as f:
+            f.write(b'!')
+        assert store.verify() == [obj]
+    print("  ✓ 通过")
+
+if __name__ == '__main__':
+    test_dedup_and_replace()
+    test_gc_reference_counting()
+    test_ingest_stats_verify()
+    print("\n所有测试通过")
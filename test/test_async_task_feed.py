@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试async_task_feed.py的任务目录变更订阅
+在临时目录中搭建 data/<小说>/chapter_xxx/async_tasks 结构，用轮询后端和inotify后端验证：
+启动对账找出已有任务、新建章节和任务文件触发处理、任务移走后目录退出待处理集合、
+项目根目录async_tasks中已结束的任务不再复查
+
+使用方法:
+python test/test_async_task_feed.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from async_task_feed import AsyncTaskFeed, InotifyWatcher, PollingWatcher
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def write_task(path, status='submitted'):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'task_id': 'abc', 'status': status}, f)
+
+def make_feed(root, watcher, clock):
+    return AsyncTaskFeed(os.path.join(root, 'data'), os.path.join(root, 'async_tasks'), watcher=watcher,
+                         recheck_interval=15, debounce=1, clock=clock)
+
+def drain(feed, clock, directory, attempts=5):
+    """
+    读取事件直到目录进入待处理集合（inotify事件可能分多次到达），等过防抖时间后取出到期目录
+    """
+    for _ in range(attempts):
+        feed.poll(0.2)
+        if directory in feed.pending():
+            break
+    assert feed.take_due() == [], '防抖时间内不应分发'
+    clock.now += 2
+    return feed.take_due()
+
+def check_reconcile_and_events(watcher_factory):
+    """
+    测试启动对账、新章节/新任务文件事件以及任务移走后退出待处理集合
+    """
+    with tempfile.TemporaryDirectory() as root:
+        existing = os.path.join(root, 'data', '001', 'chapter_001', 'async_tasks')
+        write_task(os.path.join(existing, 'a.txt'))
+        os.makedirs(os.path.join(root, 'data', '001', 'chapter_002'))
+        os.makedirs(os.path.join(root, 'data', 'backup', 'chapter_001', 'async_tasks'))
+        clock = FakeClock()
+        feed = make_feed(root, watcher_factory(), clock)
+        feed.reconcile()
+
+        # 启动对账：已有任务立即到期，非小说目录不监听
+        assert feed.take_due() == [existing]
+        assert feed.take_due() == []
+        assert feed.snapshot()['watched'] == 5, feed.snapshot()
+
+        # 新章节目录中创建async_tasks和任务文件
+        created = os.path.join(root, 'data', '001', 'chapter_002', 'async_tasks')
+        os.makedirs(created)
+        feed.poll(0.2)
+        write_task(os.path.join(created, 'b.txt'))
+        assert drain(feed, clock, created) == [created]
+
+        # 仍有未完成任务的目录按复查间隔再次到期
+        clock.now += 15
+        assert sorted(feed.take_due()) == sorted([existing, created])
+
+        # 任务文件被移走后目录退出待处理集合
+        os.makedirs(os.path.join(root, 'data', '001', 'chapter_001', 'done'))
+        os.rename(os.path.join(existing, 'a.txt'), os.path.join(root, 'data', '001', 'chapter_001', 'done', 'a.txt'))
+        clock.now += 15
+        for _ in range(5):
+            feed.poll(0.2)
+            if existing not in feed.pending():
+                break
+        assert existing not in feed.pending()
+        assert created in feed.pending()
+        feed.watcher.close()
+
+def test_polling_backend():
+    print("测试1: 轮询后端")
+    check_reconcile_and_events(lambda: PollingWatcher(interval=0, sleep=lambda seconds: None))
+    print("  ✓ 通过")
+
+def test_inotify_backend():
+    print("测试2: inotify后端")
+    if not InotifyWatcher.available():
+        print("  - 跳过（当前系统不支持inotify）")
+        return
+    check_reconcile_and_events(InotifyWatcher)
+    print("  ✓ 通过")
+
+def test_root_tasks_dir_skips_finished():
+    """
+    测试项目根目录async_tasks中已完成/失败的任务文件不会被反复分发
+    """
+    print("测试3: 根目录已结束任务不复查")
+    with tempfile.TemporaryDirectory() as root:
+        tasks_dir = os.path.join(root, 'async_tasks')
+        write_task(os.path.join(tasks_dir, 'done.txt'), status='completed')
+        write_task(os.path.join(tasks_dir, 'failed.txt'), status='failed')
+        clock = FakeClock()
+        feed = make_feed(root, PollingWatcher(interval=0, sleep=lambda seconds: None), clock)
+        feed.reconcile()
+        assert feed.take_due() == []
+        assert feed.pending() == []
+
+        write_task(os.path.join(tasks_dir, 'new.txt'))
+        assert drain(feed, clock, tasks_dir) == [tasks_dir]
+    print("  ✓ 通过")
+
+if __name__ == '__main__':
+    test_polling_backend()
+    test_inotify_backend()
+    test_root_tasks_dir_skips_finished()
+    print("\n所有测试通过")
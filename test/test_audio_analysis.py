@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试audio_analysis.py的响度分析
+用合成信号验证：BS.1770参考信号的积分响度、采样点之间的真峰值、静音区间和结尾裁剪、
+增益计算（含真峰值上限），以及分析结果按文件内容缓存只解码一次
+
+使用方法:
+python test/test_audio_analysis.py
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from audio_analysis import (SAMPLE_RATE, AudioAnalyzer, analyze_pcm, bgm_gain_db, integrated_loudness,
+                            narration_gain_db, trimmed_duration, true_peak)
+
+def sine(freq, seconds, amplitude=1.0, phase=0.0):
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    return amplitude * np.sin(2 * np.pi * freq * t + phase)
+
+def test_loudness_and_true_peak():
+    """
+    测试997Hz满幅正弦单声道为-3.01 LUFS，双声道-20dBFS为-20 LUFS；采样点间的峰值能被测出
+    """
+    print("测试1: 积分响度与真峰值")
+    tone = sine(997, 5)
+    left_only = np.stack([tone, np.zeros_like(tone)], axis=1)
+    assert abs(integrated_loudness(left_only) - (-3.01)) < 0.05, integrated_loudness(left_only)
+    stereo = np.stack([tone, tone], axis=1) * 0.1
+    assert abs(integrated_loudness(stereo) - (-20.0)) < 0.05, integrated_loudness(stereo)
+
+    # fs/4正弦相位45°：采样点只落在峰值的0.707处，真峰值高约3dB
+    quarter = sine(SAMPLE_RATE / 4, 1, amplitude=0.5, phase=np.pi / 4)
+    tp, sp = true_peak(np.stack([quarter, quarter], axis=1))
+    assert abs(sp - 20 * np.log10(0.5 * np.sqrt(0.5))) < 0.01, sp
+    assert abs(tp - 20 * np.log10(0.5)) < 0.1, tp
+
+    # 不足400ms或全为静音时无法测量
+    assert integrated_loudness(stereo[:SAMPLE_RATE // 4]) is None
+    assert integrated_loudness(np.zeros((SAMPLE_RATE, 2))) is None
+    print("  ✓ 通过")
+
+def test_silence_map_and_trim():
+    """
+    测试静音区间、有声区间以及结尾静音裁剪不早于字幕结束
+    """
+    print("测试2: 静音区间与结尾裁剪")
+    speech = sine(440, 2, amplitude=0.3)
+    gap = np.zeros(int(SAMPLE_RATE * 0.5))
+    short_gap = np.zeros(int(SAMPLE_RATE * 0.1))
+    signal = np.concatenate([gap, speech, short_gap, speech, np.zeros(SAMPLE_RATE * 2)])
+    analysis = analyze_pcm((np.stack([signal, signal], axis=1) * 32767).astype(np.int16))
+
+    assert analysis['silences'] == [[0.0, 0.5], [4.6, 6.6]], analysis['silences']
+    assert analysis['speech_start'] == 0.5 and analysis['speech_end'] == 4.6
+    assert abs(trimmed_duration(analysis) - 4.85) < 1e-9
+    assert trimmed_duration(analysis, min_duration=5.5) == 5.5
+    assert trimmed_duration(analysis, min_duration=10) == analysis['duration'] == 6.6
+    print("  ✓ 通过")
+
+def test_gains_and_cache():
+    """
+    测试增益计算受真峰值上限限制，分析结果按内容缓存
+    """
+    print("测试3: 增益与缓存")
+    quiet = {'integrated_lufs': -26.0, 'true_peak_dbtp': -12.0}
+    assert narration_gain_db(quiet) == 10.0
+    assert narration_gain_db({'integrated_lufs': -26.0, 'true_peak_dbtp': -4.0}) == 3.0
+    assert narration_gain_db({'integrated_lufs': -60.0, 'true_peak_dbtp': -40.0}) == 12.0
+    assert narration_gain_db({'integrated_lufs': None, 'true_peak_dbtp': None}) == 0.0
+    # 响度标准化后的BGM（-16 LUFS）与原先固定的0.1倍音量（-20dB）一致
+    assert bgm_gain_db({'integrated_lufs': -16.0, 'true_peak_dbtp': -1.5}) == -20.0
+
+    decoded = []
+
+    def fake_decoder(path):
+        decoded.append(path)
+        tone = sine(997, 2, amplitude=0.1)
+        return np.stack([tone, tone], axis=1).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as root:
+        first = os.path.join(root, 'a.mp3')
+        copy = os.path.join(root, 'b.mp3')
+        for path in (first, copy):
+            with open(path, 'wb') as f:
+                f.write(b'same mp3 bytes')
+        cache_dir = os.path.join(root, 'cache')
+
+        result = AudioAnalyzer(cache_dir, decoder=fake_decoder).analyze(first)
+        assert abs(result['integrated_lufs'] - (-20.0)) < 0.1, result
+        # 相同内容的文件、新的分析器实例（模拟新进程）都读取磁盘缓存
+        assert AudioAnalyzer(cache_dir, decoder=fake_decoder).analyze(copy) == result
+        assert decoded == [first]
+    print("  ✓ 通过")
+
+if __name__ == '__main__':
+    test_loudness_and_true_peak()
+    test_silence_map_and_trim()
+    test_gains_and_cache()
+    print("\n所有测试通过")
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试BatchGenerator的并发流式批量生成
+使用sleep模拟生成耗时，验证并发上限、背压、按完成顺序返回、取消以及并发下的统计信息
+
+使用方法:
+python test/test_batch_generator.py
+"""
+
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.base_generator import BatchGenerator
+from src.core.interfaces import GenerationResult, GenerationStatus
+from src.core.workflow_orchestrator import WorkflowOrchestrator
+
+class QuietLogger:
+    def debug(self, message, **kwargs):
+        pass
+    info = warning = error = debug
+
+class SleepGenerator(BatchGenerator):
+    """
+    输入为耗时秒数，记录最大并发数和执行过的输入
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(logger=QuietLogger(), **kwargs)
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.executed = []
+
+    def _ensure_output_directory(self, output_path):
+        pass
+
+    def _do_generate(self, input_data, output_path, **kwargs):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.executed.append(input_data)
+        time.sleep(input_data)
+        with self.lock:
+            self.active -= 1
+        return GenerationResult(status=GenerationStatus.SUCCESS, output_path=output_path)
+
+def test_concurrent_batch_and_statistics():
+    """
+    测试并发数不超过上限，结果按输入顺序返回，统计信息在并发下准确
+    """
+    print("测试1: 并发批量生成与统计")
+    generator = SleepGenerator(max_workers=4)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        started = time.time()
+        results = generator.generate_batch([0.05] * 20, temp_dir)
+        elapsed = time.time() - started
+
+    assert [r.metadata['batch_index'] for r in results] == list(range(20))
+    assert all(r.output_path.endswith(f"item_{i:03d}") for i, r in enumerate(results))
+    assert generator.max_active == 4
+    assert elapsed < 20 * 0.05 / 2
+
+    stats = generator.get_statistics()
+    assert stats['generation_count'] == 20 and stats['success_count'] == 20
+    assert stats['in_flight'] == 0
+    assert stats['throughput'] > 2 / 0.05
+    assert 0.05 <= stats['latency_p50'] <= stats['latency_p90'] <= stats['latency_p99'] < 0.2
+    print("  ✓ 通过")
+
+def test_streaming_with_backpressure():
+    """
+    测试结果按完成顺序返回，调用方不取结果时不会继续读取输入
+    """
+    print("测试2: 流式返回与背压")
+    generator = SleepGenerator(max_workers=2, max_pending=3)
+    pulled = []
+
+    def inputs():
+        for seconds in [0.2, 0.01, 0.01, 0.01, 0.01, 0.01]:
+            pulled.append(seconds)
+            yield seconds
+
+    stream = generator.iter_generate(inputs(), 'unused')
+    first = next(stream)
+    assert first.metadata['batch_index'] == 1
+    time.sleep(0.1)
+    assert len(pulled) <= 3 + 1
+    rest = list(stream)
+    assert sorted(r.metadata['batch_index'] for r in [first] + rest) == list(range(6))
+    print("  ✓ 通过")
+
+def test_cancel_through_orchestrator():
+    """
+    测试通过编排器取消后未开始的任务不再执行，返回CANCELLED结果
+    """
+    print("测试3: 取消")
+    generator = SleepGenerator(max_workers=2, max_pending=4)
+    orchestrator = WorkflowOrchestrator(config_manager=None, image_generator=generator, logger=QuietLogger())
+
+    statuses = []
+    for result in generator.iter_generate([0.05] * 30, 'unused'):
+        statuses.append(result.status)
+        if len(statuses) == 3:
+            orchestrator.cancel_workflow()
+
+    # 取消后不再提交新任务，只返回已提交任务的结果
+    assert len(statuses) <= 3 + 4
+    assert len(generator.executed) == statuses.count(GenerationStatus.SUCCESS)
+    assert generator.get_statistics()['in_flight'] == 0
+
+    # generate_batch被取消时，未执行的输入同样有CANCELLED结果
+    generator = SleepGenerator(max_workers=2)
+    threading.Timer(0.08, generator.cancel).start()
+    results = generator.generate_batch([0.05] * 30, 'unused')
+    assert len(results) == 30
+    assert results[0].is_success
+    assert results[-1].status == GenerationStatus.CANCELLED
+    assert len(generator.executed) < 30
+
+    results = generator.generate_batch([0.01] * 5, 'unused')
+    assert all(r.is_success for r in results)
+    print("  ✓ 通过")
+
+if __name__ == "__main__":
+    test_concurrent_batch_and_statistics()
+    test_streaming_with_backpressure()
+    test_cancel_through_orchestrator()
+    print("所有测试通过")
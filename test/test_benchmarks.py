@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试benchmarks/下的基准测试框架
+验证合成章节可复现、依赖项失败时后续项跳过、以及基线对比的回归判定
+
+使用方法:
+python test/test_benchmarks.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.run_benchmarks import Benchmark, compare_results, has_regression, run_benchmarks
+from benchmarks.synthetic_chapter import build_workspace
+
+def read_chapter(root):
+    workspace = build_workspace(root, narration_count=4, seconds=2.0, seed=7, media=False)
+    chapter_path = workspace['chapter_path']
+    with open(os.path.join(chapter_path, 'narration.txt'), encoding='utf-8') as f:
+        narration = f.read()
+    with open(os.path.join(chapter_path, 'chapter_001_narration_04_timestamps.json'), encoding='utf-8') as f:
+        timestamps = json.load(f)
+    return workspace, narration, timestamps
+
+def test_synthetic_chapter_reproducible():
+    """
+    测试同一seed生成的文本和时间戳相同，时间戳覆盖整段音频
+    """
+    print("测试1: 合成章节可复现")
+    with tempfile.TemporaryDirectory() as first_dir, tempfile.TemporaryDirectory() as second_dir:
+        workspace, narration, timestamps = read_chapter(first_dir)
+        _, narration_again, timestamps_again = read_chapter(second_dir)
+
+        assert narration == narration_again
+        assert timestamps['character_timestamps'] == timestamps_again['character_timestamps']
+        assert narration.count('<解说内容>') == 4 and narration.count('<分镜') == 2
+        assert len(timestamps['character_timestamps']) == len(timestamps['text'])
+        assert timestamps['character_timestamps'][-1]['end_time'] == 2.0
+        assert os.path.exists(os.path.join(workspace['sound_effects_dir'], 'action', 'footsteps_normal.wav'))
+    print("  ✓ 通过")
+
+def test_run_with_dependencies():
+    """
+    测试只记录选中的项，依赖项失败时后续项跳过，每轮使用新的工作区
+    """
+    print("测试2: 运行与依赖跳过")
+    roots = []
+
+    def parse(workspace):
+        roots.append(workspace['root'])
+        time.sleep(0.01)
+        return True
+
+    benchmarks = [
+        Benchmark('parse', parse),
+        Benchmark('broken', lambda workspace: None),
+        Benchmark('render', lambda workspace: True, requires=('broken',)),
+        Benchmark('after_parse', lambda workspace: True, requires=('parse',)),
+    ]
+    report = run_benchmarks(only=['render', 'after_parse'], repeat=2, benchmarks=benchmarks,
+                            workspace_builder=lambda root, **kwargs: {'root': root})
+
+    assert set(report['results']) == {'render', 'after_parse'}
+    assert report['results']['render']['status'] == 'skipped'
+    assert 'broken' in report['results']['render']['reason']
+    assert report['results']['after_parse']['status'] == 'ok'
+    assert len(roots) == 2 and roots[0] != roots[1]
+    assert os.environ.get('FFMPEG_FORCE_CPU') is None
+    print("  ✓ 通过")
+
+def result(median, status='ok'):
+    return {'status': status, 'median': median} if status == 'ok' else {'status': status, 'reason': 'x'}
+
+def test_compare_flags_regressions():
+    """
+    测试超过阈值且超过最小差值的变慢判定为回归，小幅波动不判定，基线可运行而现在失败判定为回归
+    """
+    print("测试3: 基线对比")
+    baseline = {'results': {'ass': result(1.0), 'render': result(10.0), 'tiny': result(0.01),
+                            'finish': result(5.0), 'gone': result(1.0)}}
+    current = {'results': {'ass': result(1.1), 'render': result(12.0), 'tiny': result(0.03),
+                           'finish': result(3.0), 'new_item': result(1.0)}}
+    rows = {row['name']: row for row in compare_results(baseline, current, threshold=0.15, min_delta=0.05)}
+
+    assert rows['ass']['status'] == 'ok'
+    assert rows['render']['status'] == 'regression' and rows['render']['change'] == 0.2
+    assert rows['tiny']['status'] == 'ok'
+    assert rows['finish']['status'] == 'improved'
+    assert rows['gone']['status'] == 'missing'
+    assert rows['new_item']['status'] == 'new'
+    assert has_regression(rows.values())
+
+    current['results']['render'] = result(None, 'skipped')
+    rows = compare_results(baseline, current)
+    assert next(row for row in rows if row['name'] == 'render')['status'] == 'failed'
+    assert not has_regression(compare_results(baseline, baseline))
+    print("  ✓ 通过")
+
+if __name__ == "__main__":
+    test_synthetic_chapter_reproducible()
+    test_run_with_dependencies()
+    test_compare_flags_regressions()
+    print("所有测试通过")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试bgm_bed.py的BGM音床缓存服务
+使用合成的正弦波代替ffmpeg解码，验证解码缓存、循环接缝交叉淡化、结尾淡出以及章节曲目记录
+
+使用方法:
+python test/test_bgm_bed.py
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from bgm_bed import BgmBedService, SAMPLE_RATE, CHANNELS
+
+TRACK_SECONDS = 2.0
+
+class FakeDecoder:
+    """
+    返回固定时长的440Hz正弦波，并记录解码次数
+    """
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, track_path):
+        self.calls += 1
+        t = np.arange(int(TRACK_SECONDS * SAMPLE_RATE)) / SAMPLE_RATE
+        wave = (np.sin(2 * np.pi * 440 * t) * 10000).astype(np.int16)
+        return np.repeat(wave[:, None], CHANNELS, axis=1)
+
+def create_tracks(bgm_dir, names):
+    os.makedirs(bgm_dir, exist_ok=True)
+    for name in names:
+        Path(bgm_dir, name).write_bytes(b'fake mp3')
+
+def test_bed_is_cached_and_looped():
+    """
+    测试曲目只解码一次，循环生成的音床时长准确且结尾淡出
+    """
+    print("测试1: 解码缓存与循环音床")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        bgm_dir = os.path.join(temp_dir, 'bgm')
+        create_tracks(bgm_dir, ['wn1.mp3'])
+        track = os.path.join(bgm_dir, 'wn1.mp3')
+        decoder = FakeDecoder()
+
+        service = BgmBedService(bgm_dir=bgm_dir, cache_dir=os.path.join(temp_dir, 'cache'), decoder=decoder)
+        bed = service.render_bed(track, 7.5, crossfade_seconds=0.5, fade_out_seconds=1.0)
+        assert bed.shape == (int(7.5 * SAMPLE_RATE), CHANNELS)
+        assert bed.dtype == np.int16
+        assert np.all(bed[-1] == 0)
+
+        # 循环接缝前后不能出现明显跳变
+        seam = int((TRACK_SECONDS - 0.5) * SAMPLE_RATE)
+        assert np.max(np.abs(np.diff(bed[seam - 10:seam + 10, 0].astype(np.int32)))) < 1000
+
+        # 新的服务实例直接从磁盘缓存读取，不再解码
+        other = BgmBedService(bgm_dir=bgm_dir, cache_dir=os.path.join(temp_dir, 'cache'), decoder=decoder)
+        short_bed = other.render_bed(track, 1.0, fade_out_seconds=0)
+        assert decoder.calls == 1
+        assert np.array_equal(short_bed, other.load_track(track)[:SAMPLE_RATE])
+    print("  ✓ 通过")
+
+def test_chapter_track_is_recorded():
+    """
+    测试章节选用的曲目被记录，再次选择时复用
+    """
+    print("测试2: 章节BGM记录")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        bgm_dir = os.path.join(temp_dir, 'bgm')
+        create_tracks(bgm_dir, ['wn1.mp3', 'wn3.mp3', 'wn4.mp3'])
+        chapter_path = os.path.join(temp_dir, 'chapter_001')
+        os.makedirs(chapter_path)
+
+        service = BgmBedService(bgm_dir=bgm_dir, cache_dir=os.path.join(temp_dir, 'cache'), decoder=FakeDecoder())
+        first = service.choose_track(chapter_path, 'chapter_001')
+        assert os.path.exists(service.manifest_path(chapter_path, 'chapter_001'))
+        for _ in range(5):
+            assert service.choose_track(chapter_path, 'chapter_001') == first
+    print("  ✓ 通过")
+
+if __name__ == "__main__":
+    test_bed_is_cached_and_looped()
+    test_chapter_track_is_recorded()
+    print("所有测试通过")
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试chapter_timeline.py的章节时间线
+在临时章节目录上验证：时间线记录各段时长、起止时间、对话、图片和音效增益，
+MP3/ASS变化时失效并重建，图片在读取时解析，合并对话与merge_ass_files一致，渲染视频时长按文件状态复用
+
+使用方法:
+python test/test_chapter_timeline.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from chapter_timeline import (build_timeline, get_timeline, load_timeline, merged_dialogues, narration_entry,
+                              record_video, recorded_video_duration, timeline_path)
+
+CHAPTER = 'chapter_001'
+
+# 音频时长；分析结果中的语音结束时间决定裁剪后的时长
+DURATIONS = {'01': 6.0, '02': 5.0}
+SPEECH_END = {'01': 4.0, '02': 4.9}
+
+def write_ass(path, dialogues):
+    lines = ['[Events]', 'Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text']
+    for start, end, text in dialogues:
+        lines.append(f'Dialogue: 0,{start},{end},Default,,0,0,0,,{text}')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+
+def make_chapter(root):
+    chapter_path = os.path.join(root, CHAPTER)
+    os.makedirs(chapter_path)
+    write_ass(os.path.join(chapter_path, f'{CHAPTER}_narration_01.ass'),
+              [('0:00:00.00', '0:00:02.00', '门开了'), ('0:00:02.00', '0:00:03.50', '砰，一声巨响')])
+    write_ass(os.path.join(chapter_path, f'{CHAPTER}_narration_02.ass'),
+              [('0:00:00.00', '0:00:04.00', '他走了进来')])
+    for num in DURATIONS:
+        with open(os.path.join(chapter_path, f'{CHAPTER}_narration_{num}.mp3'), 'wb') as f:
+            f.write(b'mp3' + num.encode())
+    with open(os.path.join(chapter_path, f'{CHAPTER}_image_02.jpeg'), 'wb') as f:
+        f.write(b'jpeg')
+    return chapter_path
+
+class FakeMedia:
+    """
+    记录调用次数的探测、分析和音效匹配函数
+    """
+
+    def __init__(self):
+        self.probes = []
+        self.analyses = []
+
+    def probe(self, path):
+        self.probes.append(path)
+        return DURATIONS[path[-6:-4]]
+
+    def analyze(self, path):
+        self.analyses.append(path)
+        if path.endswith('boom.wav'):
+            return {'duration': 0.3, 'integrated_lufs': None, 'true_peak_dbtp': None}
+        num = path[-6:-4]
+        return {'duration': DURATIONS[num], 'speech_end': SPEECH_END[num], 'integrated_lufs': -20.0,
+                'true_peak_dbtp': -6.0}
+
+    def sound_effects(self, dialogues, num, work_dir):
+        return [{'path': os.path.join(work_dir, 'boom.wav'), 'start_time': dialogue['start_time'], 'duration': 1.0,
+                 'volume': 0.5} for dialogue in dialogues if '砰' in dialogue['text']]
+
+    def options(self):
+        return {'probe_duration': self.probe, 'analyze': self.analyze, 'sound_effects_for': self.sound_effects}
+
+def test_build_and_load():
+    """
+    测试时间线记录时长、起止时间、对话、图片和音效，输入不变时直接读取
+    """
+    print("测试1: 生成与读取时间线")
+    with tempfile.TemporaryDirectory() as root:
+        chapter_path = make_chapter(root)
+        media = FakeMedia()
+        timeline = build_timeline(chapter_path, root, **media.options())
+
+        first, second = narration_entry(timeline, '01'), narration_entry(timeline, '02')
+        # 结尾静音被裁掉但不早于字幕结束；裁剪不足0.05秒时保持原时长
+        assert first['audio_duration'] == 6.0 and first['ass_duration'] == 3.5
+        assert 3.5 <= first['duration'] < 6.0
+        assert second['duration'] == 5.0
+        assert first['start'] == 0.0 and second['start'] == first['end'] == first['duration']
+        assert timeline['duration'] == second['end']
+        assert first['dialogues'][1] == [2.0, 3.5, '砰，一声巨响']
+        assert first['image'] is None and second['image'] == f'{CHAPTER}_image_02.jpeg'
+        assert first['gain_db'] != 0.0
+
+        # 音效按时间线记录，无法测量响度的短音效增益为None
+        assert len(first['sound_effects']) == 1 and not second['sound_effects']
+        assert first['sound_effects'][0]['start_time'] == 2.0 and first['sound_effects'][0]['gain_db'] is None
+
+        # 输入未变化时读取已保存的时间线，不再探测和分析
+        calls = len(media.probes) + len(media.analyses)
+        assert get_timeline(chapter_path, root, **media.options()) == timeline
+        assert len(media.probes) + len(media.analyses) == calls
+        with open(timeline_path(chapter_path), 'r', encoding='utf-8') as f:
+            assert '\n' not in f.read().strip()
+    print("  ✓ 通过")
+
+def test_invalidation():
+    """
+    测试MP3、ASS或音效库变化时时间线失效并重建，图片变化只更新读取结果
+    """
+    print("测试2: 输入变化时失效")
+    with tempfile.TemporaryDirectory() as root:
+        chapter_path = make_chapter(root)
+        media = FakeMedia()
+        get_timeline(chapter_path, root, **media.options())
+        assert load_timeline(chapter_path, root) is not None
+
+        write_ass(os.path.join(chapter_path, f'{CHAPTER}_narration_02.ass'),
+                  [('0:00:00.00', '0:00:01.00', '他走了'), ('0:00:01.00', '0:00:04.50', '进来')])
+        assert load_timeline(chapter_path, root) is None
+        timeline = get_timeline(chapter_path, root, **media.options())
+        assert len(narration_entry(timeline, '02')['dialogues']) == 2
+
+        mp3_path = os.path.join(chapter_path, f'{CHAPTER}_narration_01.mp3')
+        with open(mp3_path, 'wb') as f:
+            f.write(b'new audio')
+        assert load_timeline(chapter_path, root) is None
+        get_timeline(chapter_path, root, **media.options())
+
+        # 图片在时间线之后生成或重新生成，不使时间线失效
+        calls = len(media.probes) + len(media.analyses)
+        os.remove(os.path.join(chapter_path, f'{CHAPTER}_image_02.jpeg'))
+        assert narration_entry(load_timeline(chapter_path, root), '02')['image'] is None
+
+        # 与审核页面一致识别其他图片扩展名，忽略同名的.json
+        for suffix in ('png', 'json'):
+            with open(os.path.join(chapter_path, f'{CHAPTER}_image_02.{suffix}'), 'wb') as f:
+                f.write(b'image')
+        assert narration_entry(get_timeline(chapter_path, root, **media.options()), '02')['image'] == \
+            f'{CHAPTER}_image_02.png'
+        assert len(media.probes) + len(media.analyses) == calls
+
+        # 音效库状态按目录mtime缓存，子目录中新增音效同样使时间线失效
+        os.makedirs(os.path.join(root, 'sound', 'combat'))
+        assert load_timeline(chapter_path, root) is not None
+        with open(os.path.join(root, 'sound', 'combat', 'boom.wav'), 'wb') as f:
+            f.write(b'wav')
+        assert load_timeline(chapter_path, root) is None
+    print("  ✓ 通过")
+
+def test_merged_dialogues_and_video_records():
+    """
+    测试合并对话的时间偏移，以及渲染视频时长在文件被替换后不再复用
+    """
+    print("测试3: 合并对话与视频时长记录")
+    with tempfile.TemporaryDirectory() as root:
+        chapter_path = make_chapter(root)
+        timeline = get_timeline(chapter_path, root, **FakeMedia().options())
+
+        # 后一段从前一段最后一条字幕结束时开始
+        merged = merged_dialogues(timeline, ['01', '02'])
+        assert [dialogue[:2] for dialogue in merged] == [[0.0, 2.0], [2.0, 3.5], [3.5, 7.5]]
+        assert merged_dialogues(timeline, ['01', '03']) is None
+
+        video_path = os.path.join(chapter_path, f'{CHAPTER}_narration_01_video.mp4')
+        assert recorded_video_duration(video_path) is None
+        with open(video_path, 'wb') as f:
+            f.write(b'video')
+        assert record_video(chapter_path, video_path, 4.123456)
+        assert recorded_video_duration(video_path) == 4.123
+
+        # 视频被重新渲染后记录失效
+        time.sleep(0.01)
+        with open(video_path, 'wb') as f:
+            f.write(b'video rendered again')
+        assert recorded_video_duration(video_path) is None
+    print("  ✓ 通过")
+
+if __name__ == '__main__':
+    test_build_and_load()
+    test_invalidation()
+    test_merged_dialogues_and_video_records()
+    print("\n所有测试通过")
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试ffmpeg_runner.py的进度解析与资源遥测
+用一个输出 -progress 格式的假ffmpeg脚本代替真实ffmpeg，验证百分比计算、stdin输入、
+峰值内存和CPU时间采集、遥测文件落盘以及失败时的错误返回
+
+使用方法:
+python test/test_ffmpeg_runner.py
+"""
+
+import json
+import os
+import stat
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import ffmpeg_runner
+from ffmpeg_runner import (
+    TELEMETRY_FILE, infer_duration, load_telemetry, parse_event_line, run_ffmpeg, run_ffmpeg_stream
+)
+from pipeline_trace import JsonlSpanSink, load_spans, set_sink
+
+# 假ffmpeg：每0.5秒媒体时间输出一组进度，占用约30MB内存，读取stdin后写出输出文件
+FAKE_FFMPEG = '''#!{python}
+import sys, time
+args = sys.argv[1:]
+assert args[:3] == ['-progress', 'pipe:1', '-nostats'], args
+data = b'' if sys.stdin.isatty() else sys.stdin.buffer.read()
+ballast = bytearray(30 * 1024 * 1024)
+sys.stderr.write('Input #0, fake\\n')
+if '--fail' in args:
+    sys.stderr.write('Conversion failed!\\n')
+    sys.exit(1)
+for index in range(1, 9):
+    out_time_us = index * 500000
+    sys.stdout.write(f'frame={{index * 15}}\\nfps=30.0\\nbitrate=1200.5kbits/s\\n'
+                     f'out_time_us={{out_time_us}}\\nout_time=00:00:0{{out_time_us / 1e6:.6f}}\\n'
+                     f'speed=2.5x\\nprogress={{"end" if index == 8 else "continue"}}\\n')
+    sys.stdout.flush()
+with open(args[-1], 'wb') as f:
+    f.write(data or b'video')
+'''
+
+def make_fake_ffmpeg(directory):
+    path = os.path.join(directory, 'fake_ffmpeg')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(FAKE_FFMPEG.format(python=sys.executable))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return path
+
+def test_progress_and_telemetry():
+    """
+    测试按 -t 推断时长计算百分比、stdin输入、峰值内存/CPU时间采集、遥测文件和追踪span
+    """
+    print("测试1: 进度与资源遥测")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        fake_ffmpeg = make_fake_ffmpeg(temp_dir)
+        output_path = os.path.join(temp_dir, 'chapter_001', 'chapter_001_narration_01_video.mp4')
+        os.makedirs(os.path.dirname(output_path))
+        events = []
+        interval = ffmpeg_runner.PROGRESS_INTERVAL
+        ffmpeg_runner.PROGRESS_INTERVAL = 0
+        set_sink(JsonlSpanSink(os.path.join(temp_dir, 'traces')))
+        try:
+            result = run_ffmpeg([fake_ffmpeg, '-y', '-i', 'in.mp4', '-t', '4', output_path],
+                                label='base_video', input=b'pcm-bytes', on_event=events.append)
+        finally:
+            ffmpeg_runner.PROGRESS_INTERVAL = interval
+            set_sink(None)
+
+        assert result.returncode == 0, result.stderr
+        assert b'Input #0' in result.stderr
+        with open(output_path, 'rb') as f:
+            assert f.read() == b'pcm-bytes'
+
+        progress = [event for event in events if event['event'] == 'progress']
+        assert [event['percent'] for event in progress] == [12.5, 25.0, 37.5, 50.0, 62.5, 75.0, 87.5, 100.0]
+        assert progress[0]['frame'] == 15 and progress[0]['speed'] == 2.5
+        assert progress[0]['bitrate_kbps'] == 1200.5 and progress[-1]['time'] == 4.0
+
+        telemetry = result.telemetry
+        assert events[-1] == telemetry and telemetry['event'] == 'finished'
+        assert telemetry['output'] == output_path and telemetry['duration'] == 4.0
+        assert telemetry['frames'] == 120
+        if hasattr(os, 'wait4'):
+            assert telemetry['peak_rss_mb'] >= 30
+            assert telemetry['cpu_time'] is not None
+
+        records = load_telemetry(temp_dir)
+        assert len(records) == 1 and records[0]['label'] == 'base_video'
+        assert os.path.exists(os.path.join(os.path.dirname(output_path), TELEMETRY_FILE))
+
+        ffmpeg_span = load_spans(os.path.join(temp_dir, 'traces'))[0]
+        assert ffmpeg_span['name'] == 'ffmpeg'
+        assert ffmpeg_span['attributes']['step'] == 'base_video'
+        assert ffmpeg_span['attributes']['peak_rss_mb'] == telemetry['peak_rss_mb']
+    print("  ✓ 通过")
+
+def test_failure_and_stream_errors():
+    """
+    测试失败时返回码和stderr、ffmpeg-python流失败抛出RuntimeError、输出到管道时不注入进度参数
+    """
+    print("测试2: 失败与管道输出")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        fake_ffmpeg = make_fake_ffmpeg(temp_dir)
+        output_path = os.path.join(temp_dir, 'out.mp4')
+        set_sink(JsonlSpanSink(os.path.join(temp_dir, 'traces')))
+        try:
+            result = run_ffmpeg([fake_ffmpeg, '--fail', output_path], text=True, persist=False)
+        finally:
+            set_sink(None)
+        assert result.returncode == 1
+        assert 'Conversion failed!' in result.stderr
+        assert result.telemetry['returncode'] == 1
+        assert not os.path.exists(os.path.join(temp_dir, TELEMETRY_FILE))
+
+        class FakeStream:
+            def compile(self):
+                return [fake_ffmpeg, '--fail', output_path]
+
+        set_sink(JsonlSpanSink(os.path.join(temp_dir, 'traces')))
+        try:
+            run_ffmpeg_stream(FakeStream(), persist=False)
+        except RuntimeError as e:
+            assert 'Conversion failed!' in str(e)
+        else:
+            raise AssertionError('失败时应抛出RuntimeError')
+        finally:
+            set_sink(None)
+
+    cmd, has_progress = ffmpeg_runner._with_progress(['ffmpeg', '-i', 'a.mp3', '-f', 's16le', 'pipe:1'])
+    assert not has_progress and '-progress' not in cmd
+    assert infer_duration(['ffmpeg', '-i', 'a.mp4', '-t', '00:01:30.5', 'b.mp4']) == 90.5
+    assert infer_duration(['ffmpeg', '-i', 'a.mp4', 'b.mp4']) is None
+    print("  ✓ 通过")
+
+def test_stdout_events():
+    """
+    测试 FFMPEG_EVENTS=stdout 时输出可解析的事件行
+    """
+    print("测试3: 事件行")
+    event = {'event': 'progress', 'label': 'concat_bgm', 'percent': 50.0}
+    line = ffmpeg_runner.EVENT_PREFIX + json.dumps(event, ensure_ascii=False)
+    assert parse_event_line(line) == event
+    assert parse_event_line('普通输出') is None
+    assert parse_event_line(ffmpeg_runner.EVENT_PREFIX + '{broken') is None
+    print("  ✓ 通过")
+
+if __name__ == "__main__":
+    test_progress_and_telemetry()
+    test_failure_and_stream_errors()
+    test_stdout_events()
+    print("所有测试通过")
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试image_derivatives.py的图片派生图
+在临时目录中用假的派生函数验证：落盘时生成渲染图和缩略图、相同内容共用派生图、原图变化后重新生成、
+渲染时使用派生图并在尺寸不符或无法生成时退回原图，以及按最近使用时间清理
+
+使用方法:
+python test/test_image_derivatives.py
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import image_derivatives
+from image_derivatives import ImageDerivatives, render_image_path, thumbnail_path
+
+class FakeDeriver:
+    """
+    记录调用参数，返回可识别的字节
+    """
+
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    def __call__(self, data, size, fit, quality):
+        self.calls.append((data, size, fit))
+        return None if self.fail else b'%s:%dx%d' % (data, size[0], size[1])
+
+def write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def test_ingest_and_reuse():
+    """
+    测试落盘时生成两种派生图，相同内容复用，原图重新生成后得到新的派生图
+    """
+    print("测试1: 生成与复用派生图")
+    with tempfile.TemporaryDirectory() as root:
+        deriver = FakeDeriver()
+        derivatives = ImageDerivatives(os.path.join(root, 'cache'), deriver=deriver)
+        image = os.path.join(root, 'chapter_001', 'chapter_001_image_01.jpeg')
+        write_file(image, b'full size image')
+
+        result = derivatives.ingest(image)
+        assert read_file(result['render']) == b'full size image:720x1280'
+        assert read_file(result['thumb']) == b'full size image:360x640'
+        assert [call[2] for call in deriver.calls] == ['cover', 'contain']
+
+        # 另一章节的相同图片直接复用
+        copy = os.path.join(root, 'chapter_002', 'chapter_002_image_01.jpeg')
+        write_file(copy, b'full size image')
+        assert derivatives.ingest(copy) == result and len(deriver.calls) == 2
+
+        # 重新生成的图片内容变化
+        write_file(image, b'regenerated image')
+        assert read_file(derivatives.get(image, 'render')) == b'regenerated image:720x1280'
+        assert derivatives.stats == {'hits': 2, 'built': 3, 'failed': 0}
+        assert derivatives.get(os.path.join(root, 'missing.jpeg'), 'render') is None
+    print("  ✓ 通过")
+
+def test_render_fallbacks():
+    """
+    测试渲染和缩略图使用派生图，画布尺寸不符、无法生成或关闭时使用原图
+    """
+    print("测试2: 渲染使用派生图与回退")
+    original = image_derivatives._derivatives
+    try:
+        with tempfile.TemporaryDirectory() as root:
+            image = os.path.join(root, 'chapter_001_image_01.png')
+            write_file(image, b'png bytes')
+
+            image_derivatives._derivatives = ImageDerivatives(os.path.join(root, 'cache'), deriver=FakeDeriver())
+            render = render_image_path(image, 720, 1280)
+            assert render != image and read_file(render) == b'png bytes:720x1280'
+            assert render_image_path(image, 1080, 1920) == image
+            assert read_file(thumbnail_path(image)) == b'png bytes:360x640'
+
+            os.environ['IMAGE_DERIVATIVES_DISABLED'] = '1'
+            try:
+                assert render_image_path(image, 720, 1280) == image
+                assert thumbnail_path(image) is None
+            finally:
+                del os.environ['IMAGE_DERIVATIVES_DISABLED']
+
+            # 未安装PIL等无法生成派生图的情况
+            failing = ImageDerivatives(os.path.join(root, 'other_cache'), deriver=FakeDeriver(fail=True))
+            image_derivatives._derivatives = failing
+            assert render_image_path(image, 720, 1280) == image
+            assert thumbnail_path(image) is None
+            assert failing.stats['failed'] == 2
+    finally:
+        image_derivatives._derivatives = original
+    print("  ✓ 通过")
+
+def test_prune_unused():
+    """
+    测试只清理长期未使用的派生图，使用时刷新最近使用时间
+    """
+    print("测试3: 清理未使用的派生图")
+    with tempfile.TemporaryDirectory() as root:
+        now = [1_000_000.0]
+        derivatives = ImageDerivatives(os.path.join(root, 'cache'), deriver=FakeDeriver(), clock=lambda: now[0])
+        used = os.path.join(root, 'used.jpeg')
+        stale = os.path.join(root, 'stale.jpeg')
+        write_file(used, b'used')
+        write_file(stale, b'stale')
+        for path in (used, stale):
+            for derivative in derivatives.ingest(path).values():
+                os.utime(derivative, (now[0], now[0]))
+
+        now[0] += 40 * 86400
+        derivatives.get(used, 'render')
+        assert derivatives.prune(30, dry_run=True) == 3
+        assert derivatives.disk_stats()['files'] == 4
+        assert derivatives.prune(30) == 3
+        assert derivatives.disk_stats()['files'] == 1
+        assert derivatives.get(used, 'render', build=False)
+    print("  ✓ 通过")
+
+if __name__ == '__main__':
+    test_ingest_and_reuse()
+    test_render_fallbacks()
+    test_prune_unused()
+    print("\n所有测试通过")
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试llm_narration_image.py的并发审查与审查账本
+使用假的Ark客户端和假的共享限流器（不连接Redis、不在仓库中创建限流数据库），
+验证相同内容的图片在第二次运行时复用历史结论而不再调用模型
+
+使用方法:
+python test/test_image_review_ledger.py
+"""
+
+import os
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import rate_limiter
+from llm_narration_image import ReviewLedger, review_images_concurrently
+
+# 最小的JPEG文件头，足以让审查流程识别为JPEG
+FAKE_JPEG = b'\xff\xd8\xff\xe0' + b'\x00' * 64
+
+class FakeArkClient:
+    """
+    模拟Ark客户端，记录调用次数并始终返回"通过"
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages):
+        with self.lock:
+            self.calls += 1
+        message = SimpleNamespace(content='通过')
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+class FakeLimiter:
+    """
+    替代共享限流器，记录经过的接口桶并直接调用
+    """
+
+    def __init__(self):
+        self.apis = []
+
+    def call(self, api, func, *args, **kwargs):
+        self.apis.append(api)
+        return func(*args, **kwargs)
+
+def test_ledger_reuses_verdicts():
+    """
+    测试第二次审查相同图片时全部命中账本
+    """
+    print("测试: 审查账本复用历史结论")
+    limiter = FakeLimiter()
+    original_limiter, rate_limiter._shared_limiter = rate_limiter._shared_limiter, limiter
+    try:
+        run_ledger_reuse(limiter)
+    finally:
+        rate_limiter._shared_limiter = original_limiter
+    print("  ✓ 通过")
+
+def run_ledger_reuse(limiter):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        image_files = []
+        for i in range(1, 5):
+            image_path = os.path.join(temp_dir, f'chapter_001_image_{i:02d}.jpeg')
+            with open(image_path, 'wb') as f:
+                f.write(FAKE_JPEG + bytes([i]))
+            image_files.append(image_path)
+
+        ledger = ReviewLedger(os.path.join(temp_dir, '.image_review'))
+        client = FakeArkClient()
+
+        first = review_images_concurrently(client, image_files, '审查提示词', concurrency=4, ledger=ledger)
+        assert client.calls == len(image_files)
+        assert [r['image_path'] for r in first['records']] == image_files
+        assert all(r['verdict'] == 'pass' for r in first['records'])
+
+        second = review_images_concurrently(client, image_files, '审查提示词', concurrency=4, ledger=ledger)
+        assert client.calls == len(image_files)
+        assert second['cached'] == len(image_files)
+
+        # 提示词变化后历史结论失效
+        review_images_concurrently(client, image_files[:1], '新的审查提示词', ledger=ledger)
+        assert client.calls == len(image_files) + 1
+        assert limiter.apis == ['ark_chat'] * client.calls
+
+if __name__ == "__main__":
+    test_ledger_reuses_verdicts()
+    print("所有测试通过")
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试上传小说的流式解析
+验证编码探测、增量分析（任意切块结果一致）以及流式写入正文存储的结果与整本读取一致
+
+使用方法:
+python test/test_novel_ingest.py
+"""
+
+import os
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加web目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent / 'web'))
+
+from video import novel_ingest
+from video.novel_ingest import NovelTextAnalyzer, detect_text_encoding, ingest_novel_file
+from video.novel_storage import NovelBlobStore
+
+SAMPLE_TEXT = (
+    '第一章 山门\n少年踏入山门，开始修炼。\n\n'
+    '第二章 丹药\r\n长老赐下丹药 ，灵气涌动。\n'
+    '  第三回 下山\n皇帝召见。\n'
+    'Chapter 4 尾声'
+)
+
+def analyze(text, chunk_size):
+    analyzer = NovelTextAnalyzer()
+    for start in range(0, len(text), chunk_size):
+        analyzer.feed(text[start:start + chunk_size])
+    return analyzer.finish()
+
+def test_encoding_detection():
+    """
+    测试UTF-8、带BOM的UTF-8和GBK文件的编码探测
+    """
+    print("测试1: 编码探测")
+    text = SAMPLE_TEXT * 5000
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for encoding, expected in (('utf-8', 'utf-8'), ('utf-8-sig', 'utf-8-sig'), ('gbk', 'gbk')):
+            path = os.path.join(temp_dir, f'{encoding}.txt')
+            with open(path, 'w', encoding=encoding, newline='') as f:
+                f.write(text)
+            assert detect_text_encoding(path) == expected, encoding
+    print("  ✓ 通过")
+
+def test_analyzer_chunk_independent():
+    """
+    测试增量分析结果与切块方式无关
+    """
+    print("测试2: 增量分析")
+    expected = analyze(SAMPLE_TEXT, len(SAMPLE_TEXT))
+    assert expected.genre == '仙侠'
+    assert [item['title'] for item in expected.chapter_offsets] == [
+        '第一章 山门', '第二章 丹药', '第三回 下山', 'Chapter 4 尾声'
+    ]
+    for item in expected.chapter_offsets:
+        assert SAMPLE_TEXT[item['offset']:].startswith(item['title'])
+    assert expected.word_count == len(SAMPLE_TEXT.replace(' ', '').replace('\n', ''))
+
+    for chunk_size in (1, 2, 3, 7, 64):
+        result = analyze(SAMPLE_TEXT, chunk_size)
+        assert result.word_count == expected.word_count
+        assert result.genre == expected.genre
+        assert result.chapter_offsets == expected.chapter_offsets
+
+    assert analyze('平凡的一天', 2).genre == '其他'
+    assert analyze('现代职场故事，后来穿越了', 3).genre == '都市'
+    print("  ✓ 通过")
+
+def test_streaming_txt_ingest():
+    """
+    测试小块读取时流式解析与整本读取结果一致，正文原样写入存储
+    """
+    print("测试3: 流式TXT解析")
+    rng = random.Random(20251120)
+    pieces = SAMPLE_TEXT.split('\n')
+    text = '\n'.join(rng.choice(pieces) for _ in range(3000))
+    original_chunk_size = novel_ingest.TEXT_READ_CHUNK_SIZE
+    novel_ingest.TEXT_READ_CHUNK_SIZE = 101
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'novel.txt')
+            with open(path, 'w', encoding='gbk', newline='') as f:
+                f.write(text)
+            store = NovelBlobStore(os.path.join(temp_dir, 'blobs'))
+            progress = []
+            result = ingest_novel_file(path, store, lambda percent, message: progress.append(percent))
+
+            assert result['content_blob'] == store.put_text(text)
+            assert result['content_length'] == len(text)
+            assert store.read_text(result['content_blob']) == text
+            expected = analyze(text, len(text))
+            assert result['word_count'] == expected.word_count
+            assert result['genre'] == expected.genre
+            assert result['chapter_offsets'] == expected.chapter_offsets
+            assert progress and progress[-1] == 100 and progress == sorted(progress)
+            assert not os.listdir(os.path.join(temp_dir, 'blobs', 'tmp'))
+    finally:
+        novel_ingest.TEXT_READ_CHUNK_SIZE = original_chunk_size
+    print("  ✓ 通过")
+
+if __name__ == "__main__":
+    test_encoding_detection()
+    test_analyzer_chunk_independent()
+    test_streaming_txt_ingest()
+    print("所有测试通过")
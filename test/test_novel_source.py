@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试novel_source.py的小说数据源
+验证：按章节偏移索引切片的分章结果与流式分章一致、GBK小说只解码一次、
+新实例（模拟新进程）直接使用持久化的索引、小说内容变化后重建缓存
+
+使用方法:
+python test/test_novel_source.py
+"""
+
+import io
+import os
+import random
+import sys
+import tempfile
+import zipfile
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import gen_script_v2
+import novel_source
+from gen_script_v2 import ScriptGeneratorV2
+from novel_source import NovelSource
+
+TEXT_PIECES = [
+    '第一章 开始\n', '第2章 继续\r\n', '  \n', '\n\n', '正文' * 30 + '\n', 'Chapter 3 序幕\n',
+    '  缩进行  \n', '\t\n', '没有换行的内容 ', '\n', '章节 4\n', '短\n', '“引号”和emoji😀\n'
+]
+
+class StringSource:
+    def __init__(self, text):
+        self.text = text
+
+    def open(self):
+        return io.StringIO(self.text)
+
+def write_novel(path, text, encoding='utf-8'):
+    with open(path, 'wb') as f:
+        f.write(text.encode(encoding))
+
+def make_novel(chapters):
+    return '书名\n\n' + ''.join(f'第{i}章 标题{i}\n\n' + f'这是标题{i}的正文。' * 30 + '\n\n\n' for i in range(1, chapters + 1))
+
+def test_slices_match_streaming_split():
+    """
+    测试按字节区间切片得到的章节与流式分章完全一致（含合并章节和多字节字符）
+    """
+    print("测试1: 切片分章与流式分章一致")
+    generator = ScriptGeneratorV2.__new__(ScriptGeneratorV2)
+    rng = random.Random(20251201)
+    with tempfile.TemporaryDirectory() as root:
+        for i in range(60):
+            text = ''.join(rng.choice(TEXT_PIECES) for _ in range(rng.randint(1, 60)))
+            path = os.path.join(root, f'novel_{i}.txt')
+            write_novel(path, text)
+            source = NovelSource(path, cache_dir=os.path.join(root, 'cache'))
+            for target_chapters in (1, 3, 50):
+                expected = generator._merge_chapters(generator._split_novel_source(StringSource(text), target_chapters),
+                                                     target_chapters)
+                assert source.chapters(target_chapters) == expected, (text, target_chapters)
+                assert generator.split_novel_into_chapters(text, target_chapters) == expected
+            source.close()
+    print("  ✓ 通过")
+
+def test_decode_once_and_persisted_index():
+    """
+    测试GBK小说只解码一次，新实例按持久化索引读取单章时不再读取原文件
+    """
+    print("测试2: 一次解码与持久化索引")
+    with tempfile.TemporaryDirectory() as root:
+        cache_dir = os.path.join(root, 'cache')
+        path = os.path.join(root, 'novel.txt')
+        text = make_novel(40)
+        write_novel(path, text, encoding='gbk')
+
+        source = NovelSource(path, cache_dir=cache_dir)
+        assert source.chapter_count(50) == 40
+        chapter_37 = source.chapter(37, 50)
+        assert chapter_37.startswith('第37章 标题37') and chapter_37.endswith('这是标题37的正文。')
+        assert source.chapters(50, limit=3) == source.chapters(50)[:3]
+        source.close()
+
+        original_read = novel_source.read_novel_bytes
+
+        def fail_read(file_path):
+            raise AssertionError('不应再次读取原始小说文件')
+
+        novel_source.read_novel_bytes = fail_read
+        try:
+            reopened = NovelSource(path, cache_dir=cache_dir)
+            assert reopened.chapter(37, 50) == chapter_37
+            assert reopened.text() == text.strip().replace('\n\n\n', '\n\n')
+            reopened.close()
+        finally:
+            novel_source.read_novel_bytes = original_read
+
+        try:
+            NovelSource(path, cache_dir=cache_dir).chapter(41, 50)
+            raise AssertionError('应抛出IndexError')
+        except IndexError:
+            pass
+    print("  ✓ 通过")
+
+def test_rebuild_on_change_and_zip():
+    """
+    测试小说内容变化后重建缓存，ZIP中的txt文件同样可以读取
+    """
+    print("测试3: 内容变化与ZIP")
+    with tempfile.TemporaryDirectory() as root:
+        cache_dir = os.path.join(root, 'cache')
+        path = os.path.join(root, 'novel.txt')
+        write_novel(path, make_novel(5))
+        source = NovelSource(path, cache_dir=cache_dir)
+        first_digest = source.digest
+        assert source.chapter_count(50) == 5
+
+        write_novel(path, make_novel(8))
+        os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 10 ** 9))
+        assert source.digest != first_digest
+        assert source.chapter_count(50) == 8 and source.chapter(8, 50).startswith('第8章')
+        source.close()
+
+        archive = os.path.join(root, 'novel.zip')
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('novel.txt', make_novel(8).encode('utf-8'))
+        zipped = NovelSource(archive, cache_dir=cache_dir)
+        assert zipped.chapters(50) == NovelSource(path, cache_dir=cache_dir).chapters(50)
+        zipped.close()
+    print("  ✓ 通过")
+
+def test_crlf_novel():
+    """
+    测试CRLF换行的GBK小说分章后不残留\r，流式分章在\r\n跨块时结果相同
+    """
+    print("测试4: CRLF换行")
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'novel.txt')
+        write_novel(path, make_novel(5).replace('\n', '\r\n'), encoding='gbk')
+        source = NovelSource(path, cache_dir=os.path.join(root, 'cache'))
+        chapters = source.chapters(50)
+        source.close()
+        assert chapters[0].startswith('第1章 标题1\n\n')
+        assert not any('\r' in chapter for chapter in chapters)
+
+        generator = ScriptGeneratorV2.__new__(ScriptGeneratorV2)
+        original_chunk_size = gen_script_v2.STREAM_CHUNK_SIZE
+        gen_script_v2.STREAM_CHUNK_SIZE = 7
+        try:
+            streamed = generator._merge_chapters(
+                generator._split_novel_source(StringSource(make_novel(5).replace('\n', '\r\n')), 50), 50)
+        finally:
+            gen_script_v2.STREAM_CHUNK_SIZE = original_chunk_size
+        assert streamed == chapters
+    print("  ✓ 通过")
+
+if __name__ == '__main__':
+    test_slices_match_streaming_split()
+    test_decode_once_and_persisted_index()
+    test_rebuild_on_change_and_zip()
+    test_crlf_novel()
+    print("\n所有测试通过")
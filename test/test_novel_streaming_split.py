@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试小说正文压缩存储与流式分章
+验证正文存储按内容寻址、原样读回，且流式分章与按字符串分章结果一致
+
+使用方法:
+python test/test_novel_streaming_split.py
+"""
+
+import io
+import os
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加项目根目录和web目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / 'web'))
+
+import gen_script_v2
+from gen_script_v2 import ScriptGeneratorV2
+from video.novel_storage import NovelBlobStore
+
+TEXT_PIECES = [
+    '第一章 开始\n', '第2章 继续\r\n', '  \n', '\n\n', '正文' * 30 + '\n', 'Chapter 3 序幕\n',
+    '  缩进行  \n', '\t\n', '没有换行的内容 ', '\n', '章节 4\n', '短\n'
+]
+
+class StringSource:
+    def __init__(self, text):
+        self.text = text
+
+    def open(self):
+        return io.StringIO(self.text, newline='')
+
+def test_blob_store_roundtrip():
+    """
+    测试相同内容只保存一份，读回内容与原文完全一致（包括换行符）
+    """
+    print("测试1: 正文压缩存储")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store = NovelBlobStore(temp_dir)
+        text = '第一章 开始\r\n' + '正文内容' * 1000 + '\n第二章 结束\n'
+        digest = store.put_text(text)
+        assert store.put_text(text) == digest
+        assert store.read_text(digest) == text
+        assert ''.join(store.iter_chunks(digest, chunk_size=333)) == text
+        assert os.path.getsize(store._path(digest)) < len(text.encode('utf-8'))
+    print("  ✓ 通过")
+
+def test_streaming_split_matches_string_split():
+    """
+    测试流式分章与字符串分章结果一致（使用很小的读取块以覆盖跨块的行）
+    """
+    print("测试2: 流式分章结果一致")
+    generator = ScriptGeneratorV2.__new__(ScriptGeneratorV2)
+    original_chunk_size = gen_script_v2.STREAM_CHUNK_SIZE
+    gen_script_v2.STREAM_CHUNK_SIZE = 7
+    try:
+        rng = random.Random(20251118)
+        for _ in range(200):
+            text = ''.join(rng.choice(TEXT_PIECES) for _ in range(rng.randint(0, 60)))
+            for target_chapters in (1, 3, 50):
+                expected = generator.split_novel_into_chapters(text, target_chapters)
+                assert generator.split_novel_into_chapters(StringSource(text), target_chapters) == expected
+    finally:
+        gen_script_v2.STREAM_CHUNK_SIZE = original_chunk_size
+    print("  ✓ 通过")
+
+if __name__ == "__main__":
+    test_blob_store_roundtrip()
+    test_streaming_split_matches_string_split()
+    print("所有测试通过")
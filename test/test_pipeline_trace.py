@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试pipeline_trace.py的阶段追踪与报告
+使用临时目录保存span文件，验证嵌套span的属性继承、异常状态、装饰器路径解析以及报告中的关键路径和接口分位数
+
+使用方法:
+python test/test_pipeline_trace.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from pipeline_trace import (
+    JsonlSpanSink, build_report, ffmpeg_encoder, load_spans, percentile, set_sink, span, traced
+)
+
+def test_nested_spans_and_errors():
+    """
+    测试子span继承父span的小说和章节属性，异常时记录error状态并继续抛出
+    """
+    print("测试1: 嵌套span与异常")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        set_sink(JsonlSpanSink(temp_dir))
+        try:
+            with span('tts', novel='031', chapter='chapter_001'):
+                with span('llm_call', api='ark_chat', narration=2) as child:
+                    child.set(bytes=100)
+            try:
+                with span('ffmpeg', chapter='chapter_002'):
+                    raise RuntimeError('编码失败')
+            except RuntimeError:
+                pass
+            else:
+                raise AssertionError('异常应继续抛出')
+        finally:
+            set_sink(None)
+
+        spans = {item['name']: item for item in load_spans(temp_dir)}
+        child = spans['llm_call']
+        assert child['parent_id'] == spans['tts']['span_id']
+        assert child['trace_id'] == spans['tts']['trace_id']
+        assert child['attributes'] == {'novel': '031', 'chapter': 'chapter_001', 'narration': 2,
+                                       'api': 'ark_chat', 'bytes': 100}
+        assert spans['ffmpeg']['status'] == 'error'
+        assert spans['ffmpeg']['error'] == 'RuntimeError: 编码失败'
+        assert spans['ffmpeg']['parent_id'] is None
+    print("  ✓ 通过")
+
+def test_traced_path_attributes():
+    """
+    测试装饰器从路径参数中解析小说编号和章节，支持多个参数拼接
+    """
+    print("测试2: 装饰器路径解析")
+
+    @traced('ass', path_arg='chapter_path')
+    def process_chapter(chapter_path, max_length=12):
+        return max_length
+
+    @traced('finish', path_arg=('data_dir', 'chapter_dir'))
+    def process_single_chapter(data_dir, chapter_dir):
+        return chapter_dir
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        set_sink(JsonlSpanSink(temp_dir))
+        try:
+            assert process_chapter(os.path.join('data', '031', 'chapter_004')) == 12
+            process_single_chapter('data/032', 'chapter_007')
+        finally:
+            set_sink(None)
+
+        spans = {item['name']: item for item in load_spans(temp_dir)}
+        assert spans['ass']['attributes'] == {'novel': '031', 'chapter': 'chapter_004'}
+        assert spans['finish']['attributes'] == {'novel': '032', 'chapter': 'chapter_007'}
+
+    assert ffmpeg_encoder(['ffmpeg', '-i', 'a.mp4', '-c:v', 'h264_nvenc', 'b.mp4']) == 'h264_nvenc'
+    assert ffmpeg_encoder(['ffmpeg', '-i', 'a.mp4', 'b.mp4']) == 'ffmpeg'
+    print("  ✓ 通过")
+
+def make_span(name, start, end, chapter='chapter_001', novel='031', span_id=None, parent_id=None, **attributes):
+    return {
+        'name': name, 'span_id': span_id or f'{name}-{chapter}-{start}', 'parent_id': parent_id,
+        'start': start, 'end': end, 'duration': end - start, 'status': 'ok',
+        'attributes': {'novel': novel, 'chapter': chapter, **attributes}
+    }
+
+def test_report_critical_path_and_percentiles():
+    """
+    测试报告的关键路径、空闲时间、嵌套span不重复计时以及接口延迟分位数
+    """
+    print("测试3: 报告")
+    base = time.time()
+    spans = [
+        make_span('script', base, base + 10),
+        make_span('tts', base + 10, base + 14, span_id='tts'),
+        make_span('images', base + 10, base + 30),
+        make_span('render', base + 32, base + 40),
+        make_span('finish', base + 40, base + 45),
+        make_span('ffmpeg', base + 41, base + 44, parent_id=None, span_id='ffmpeg', encoder='h264_nvenc'),
+        make_span('ffmpeg', base + 33, base + 39, span_id='inner', parent_id='render-chapter_001-' + str(base + 32),
+                  encoder='libx264'),
+        make_span('script', base, base + 3, chapter='chapter_002'),
+    ]
+    spans += [make_span('llm_call', base, base + seconds, span_id=f'llm{seconds}', chapter='chapter_003', api='ark_chat')
+              for seconds in range(1, 11)]
+
+    report = build_report(spans, novel='031')
+    chapter = next(entry for entry in report['chapters'] if entry['chapter'] == 'chapter_001')
+    assert chapter['wall_time'] == 45
+    assert chapter['idle_time'] == 2
+    assert [step['name'] for step in chapter['critical_path']] == ['script', 'images', 'render', 'finish']
+    assert chapter['critical_path'][2]['gap'] == 2
+    assert chapter['slowest'][0]['name'] == 'images'
+    assert report['novels'][0]['chapters'] == 3
+
+    api = report['apis'][0]
+    assert (api['api'], api['count'], api['p50'], api['p90'], api['max']) == ('ark_chat', 10, 5, 9, 10)
+    assert {row['encoder'] for row in report['encoders']} == {'h264_nvenc', 'libx264'}
+    assert percentile([], 50) == 0.0
+    assert build_report(spans, novel='999')['chapters'] == []
+    print("  ✓ 通过")
+
+def test_critical_path_zero_duration_spans():
+    """
+    测试同一时刻的零时长span不会在关键路径回溯中互相选取
+    """
+    print("测试4: 零时长span")
+    marks = [make_span('mark', 100.0, 100.0, span_id='a'), make_span('mark', 100.0, 100.0, span_id='b')]
+    assert [step['name'] for step in build_report(marks)['chapters'][0]['critical_path']] == ['mark', 'mark']
+
+    chapter = build_report([make_span('script', 90.0, 100.0)] + marks)['chapters'][0]
+    assert [step['name'] for step in chapter['critical_path']] == ['script', 'mark', 'mark']
+    print("  ✓ 通过")
+
+if __name__ == "__main__":
+    test_nested_spans_and_errors()
+    test_traced_path_attributes()
+    test_report_critical_path_and_percentiles()
+    test_critical_path_zero_duration_spans()
+    print("所有测试通过")
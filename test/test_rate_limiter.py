@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试rate_limiter.py的共享令牌桶
+使用临时SQLite文件和模拟时钟，验证令牌补充与等待、多个限流器实例共享同一个桶、
+限流响应触发的冷却期以及Retry-After解析
+
+使用方法:
+python test/test_rate_limiter.py
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from rate_limiter import RateLimiter, RateLimitTimeout, SqliteBucketBackend, is_rate_limited, retry_after_seconds
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+def make_limiter(db_path, clock, limits=None):
+    return RateLimiter(backend=SqliteBucketBackend(db_path), limits=limits or {'visual_submit': {'rate': 2, 'burst': 2}},
+                       clock=clock.time, sleep=clock.sleep)
+
+def test_bucket_shared_between_limiters():
+    """
+    测试桶容量内不等待，超出后按补充速率等待，两个实例（模拟两个worker）共用同一个桶
+    """
+    print("测试1: 令牌桶共享")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = os.path.join(temp_dir, 'limits.sqlite3')
+        clock = FakeClock()
+        first = make_limiter(db_path, clock)
+        second = make_limiter(db_path, clock)
+
+        assert first.acquire('visual_submit', 'high_aes') == 0
+        assert second.acquire('visual_submit', 'high_aes') == 0
+        waited = first.acquire('visual_submit', 'high_aes')
+        assert 0.5 <= waited <= 0.56, waited
+
+        # 不同模型使用独立的桶
+        assert second.acquire('visual_submit', 'other_key') == 0
+
+        try:
+            second.acquire('visual_submit', 'high_aes', timeout=0.1)
+        except RateLimitTimeout:
+            pass
+        else:
+            raise AssertionError('超时应抛出RateLimitTimeout')
+
+        usage = {row['key']: row for row in first.usage()}
+        assert usage['visual_submit:high_aes']['acquired'] == 3
+        assert usage['visual_submit:high_aes']['wait_total'] == round(waited, 2)
+        assert usage['visual_submit:other_key']['acquired'] == 1
+    print("  ✓ 通过")
+
+def test_rate_limited_response_sets_cooldown():
+    """
+    测试限流响应让所有实例进入冷却期，优先使用Retry-After
+    """
+    print("测试2: 限流冷却")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = os.path.join(temp_dir, 'limits.sqlite3')
+        clock = FakeClock()
+        first = make_limiter(db_path, clock, {'ark_chat': {'rate': 10, 'burst': 10}})
+        second = make_limiter(db_path, clock, {'ark_chat': {'rate': 10, 'burst': 10}})
+
+        class RateLimitError(Exception):
+            status_code = 429
+            headers = {'Retry-After': '12'}
+
+        def create(**kwargs):
+            raise RateLimitError('Too Many Requests')
+
+        try:
+            first.call('ark_chat', create, model='doubao', messages=[])
+        except RateLimitError:
+            pass
+        else:
+            raise AssertionError('限流异常应继续抛出')
+
+        assert first.cooldown_remaining('ark_chat', 'doubao') == 12
+        waited = second.acquire('ark_chat', 'doubao')
+        assert 12 <= waited <= 13.3, waited
+
+        # 火山引擎视觉接口以返回值表示限流，模型取表单中的req_key
+        response = {'ResponseMetadata': {'Error': {'Code': '50429', 'Message': 'Request Has Reached API Limit'}}}
+        assert second.call('visual_submit', lambda form: response, {'req_key': 'high_aes'}) is response
+        usage = {row['key']: row for row in second.usage()}
+        assert usage['visual_submit:high_aes']['limited'] == 1
+        assert usage['visual_submit:high_aes']['cooldown'] == 5.0
+    print("  ✓ 通过")
+
+def test_detection_helpers():
+    """
+    测试限流判定和Retry-After解析，正常响应中的base64内容不误判
+    """
+    print("测试3: 限流判定")
+
+    class Response:
+        def __init__(self, status_code, headers):
+            self.status_code = status_code
+            self.headers = headers
+
+    assert is_rate_limited(Response(429, {}))
+    assert not is_rate_limited(Response(200, {}))
+    assert is_rate_limited(Exception("b'{\"code\":50429,\"message\":\"Request Has Reached API Limit\"}'"))
+    assert not is_rate_limited({'code': 10000, 'data': {'binary_data_base64': ['5042950429']}})
+    assert retry_after_seconds(Response(429, {'Retry-After': '3'})) == 3.0
+    assert retry_after_seconds(Response(429, {'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})) == 0.0
+    assert retry_after_seconds(Response(429, {})) is None
+    print("  ✓ 通过")
+
+if __name__ == "__main__":
+    test_bucket_shared_between_limiters()
+    test_rate_limited_response_sets_cooldown()
+    test_detection_helpers()
+    print("所有测试通过")
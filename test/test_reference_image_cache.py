@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试reference_image_cache.py的参考图片data URL缓存
+使用伪造的缩放函数代替PIL，验证按内容去重、超限图片重新编码、磁盘持久化以及内存LRU上限
+
+使用方法:
+python test/test_reference_image_cache.py
+"""
+
+import base64
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from reference_image_cache import ReferenceImageCache, sniff_image_mime
+
+PNG_HEADER = b'\x89PNG\r\n\x1a\n'
+JPEG_HEADER = b'\xff\xd8\xff\xe0'
+
+class FakeTranscoder:
+    """
+    记录调用次数，返回固定的小JPEG
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, data, max_side, quality):
+        self.calls.append((len(data), max_side, quality))
+        return JPEG_HEADER + b'small', 'image/jpeg'
+
+def fake_dimensions(data):
+    # 文件内容中包含 b'BIG' 时视为超出尺寸
+    return (4000, 3000) if b'BIG' in data else (512, 512)
+
+def make_cache(cache_dir, transcoder, **kwargs):
+    return ReferenceImageCache(cache_dir=cache_dir, max_side=1024, transcoder=transcoder,
+                               dimension_reader=fake_dimensions, **kwargs)
+
+def decode(data_url):
+    header, payload = data_url.split(',', 1)
+    return header, base64.b64decode(payload)
+
+def test_dedup_and_format_detection():
+    """
+    测试相同内容的图片只编码一次，MIME类型按文件内容识别而不是扩展名
+    """
+    print("测试1: 按内容去重与格式识别")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        transcoder = FakeTranscoder()
+        cache = make_cache(os.path.join(temp_dir, 'cache'), transcoder)
+        first = Path(temp_dir, 'a.jpeg')
+        second = Path(temp_dir, 'b.png')
+        first.write_bytes(PNG_HEADER + b'pixels')
+        second.write_bytes(PNG_HEADER + b'pixels')
+
+        url_a = cache.get_data_url(str(first))
+        url_b = cache.get_data_url(str(second))
+        assert url_a == url_b
+        assert decode(url_a) == ('data:image/png;base64', PNG_HEADER + b'pixels')
+        assert cache.stats['encoded'] == 1 and cache.stats['memory_hits'] == 1
+        assert not transcoder.calls
+
+        # 文件内容变化后重新编码
+        time.sleep(0.01)
+        first.write_bytes(JPEG_HEADER + b'other')
+        assert decode(cache.get_data_url(str(first)))[0] == 'data:image/jpeg;base64'
+        assert cache.stats['encoded'] == 2
+        assert sniff_image_mime(b'RIFF\x00\x00\x00\x00WEBPVP8 ') == 'image/webp'
+    print("  ✓ 通过")
+
+def test_oversize_transcoded_and_persisted():
+    """
+    测试超出尺寸、超出大小或接口不支持的图片被重新编码，编码结果在新实例中从磁盘复用
+    """
+    print("测试2: 重新编码与磁盘持久化")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache_dir = os.path.join(temp_dir, 'cache')
+        transcoder = FakeTranscoder()
+        cache = make_cache(cache_dir, transcoder, max_bytes=1000)
+        big = Path(temp_dir, 'big.png')
+        heavy = Path(temp_dir, 'heavy.jpg')
+        bitmap = Path(temp_dir, 'bitmap.bmp')
+        big.write_bytes(PNG_HEADER + b'BIG')
+        heavy.write_bytes(JPEG_HEADER + b'x' * 2000)
+        bitmap.write_bytes(b'BM' + b'\x00' * 10)
+
+        for path in (big, heavy, bitmap):
+            assert decode(cache.get_data_url(str(path))) == ('data:image/jpeg;base64', JPEG_HEADER + b'small')
+        assert len(transcoder.calls) == 3
+        assert all(call[1] == 1024 for call in transcoder.calls)
+
+        fresh_transcoder = FakeTranscoder()
+        fresh = make_cache(cache_dir, fresh_transcoder, max_bytes=1000)
+        assert decode(fresh.get_data_url(str(big)))[1] == JPEG_HEADER + b'small'
+        assert fresh.stats['disk_hits'] == 1 and not fresh_transcoder.calls
+
+        # 缩放参数变化后不复用旧结果
+        other = make_cache(cache_dir, fresh_transcoder, max_bytes=500)
+        other.get_data_url(str(big))
+        assert len(fresh_transcoder.calls) == 1
+    print("  ✓ 通过")
+
+def test_memory_lru_bounded():
+    """
+    测试内存缓存总大小不超过上限，最久未使用的条目先被淘汰
+    """
+    print("测试3: 内存LRU上限")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = make_cache(os.path.join(temp_dir, 'cache'), FakeTranscoder(), memory_limit=300)
+        paths = []
+        for index in range(5):
+            path = Path(temp_dir, f'{index}.png')
+            path.write_bytes(PNG_HEADER + bytes([index]) * 100)
+            paths.append(str(path))
+            cache.get_data_url(str(path))
+
+        assert cache._memory_size <= 300
+        assert cache.stats['evicted'] >= 2
+        assert cache.get_data_url(paths[-1]) and cache.stats['memory_hits'] == 1
+        cache.get_data_url(paths[0])
+        assert cache.stats['disk_hits'] == 1
+    print("  ✓ 通过")
+
+if __name__ == "__main__":
+    test_dedup_and_format_detection()
+    test_oversize_transcoded_and_persisted()
+    test_memory_lru_bounded()
+    print("所有测试通过")
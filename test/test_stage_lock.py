@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试stage_lock.py的阶段提交锁
+在临时SQLite锁表上验证：并发重复提交只投递一次并返回同一任务ID、不同输入互不合并、
+任务结束释放锁、心跳停止后锁过期、持有锁的任务已结束时接管、投递失败时释放锁、
+输入文件改动后的请求不合并到旧任务
+
+使用方法:
+python test/test_stage_lock.py
+"""
+
+import os
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from stage_lock import SqliteLockBackend, StageGuard, file_inputs, stage_key
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+def make_guard(root, clock=None):
+    return StageGuard(SqliteLockBackend(os.path.join(root, 'locks.sqlite3')), queued_ttl=1800, heartbeat_ttl=120,
+                      clock=clock or FakeClock())
+
+def test_concurrent_submissions_coalesce():
+    """
+    测试并发的重复提交只投递一次，所有调用方拿到同一个任务ID
+    """
+    print("测试1: 并发重复提交合并")
+    with tempfile.TemporaryDirectory() as root:
+        guard = make_guard(root)
+        enqueued = []
+        results = []
+        barrier = threading.Barrier(8)
+
+        def submit():
+            barrier.wait()
+            results.append(guard.submit('render_all', 1, 7, enqueued.append))
+
+        threads = [threading.Thread(target=submit) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(enqueued) == 1
+        assert {task_id for task_id, _ in results} == {enqueued[0]}
+        assert sorted(coalesced for _, coalesced in results) == [False] + [True] * 7
+
+        # 不同章节、不同输入互不合并
+        other, coalesced = guard.submit('render_all', 1, 8, enqueued.append)
+        assert not coalesced and other != enqueued[0]
+        first, _ = guard.submit('regenerate_image', 1, '第一章', enqueued.append, inputs={'scene_number': '3'})
+        second, _ = guard.submit('regenerate_image', 1, '第一章', enqueued.append, inputs={'scene_number': '4'})
+        assert first != second and len(enqueued) == 4
+        assert stage_key('a', 1, None, {'x': 1, 'y': 2}) == stage_key('a', 1, None, {'y': 2, 'x': 1})
+    print("  ✓ 通过")
+
+def test_heartbeat_finish_and_expiry():
+    """
+    测试执行期间心跳续期、结束时释放，worker崩溃后锁在心跳超时后过期
+    """
+    print("测试2: 心跳、释放与过期")
+    with tempfile.TemporaryDirectory() as root:
+        clock = FakeClock()
+        guard = make_guard(root, clock)
+        task_id, _ = guard.submit('audio', 1, 7, lambda task_id: None)
+
+        # 未通过阶段锁提交的任务不启动心跳
+        assert not guard.start_heartbeat('other-task')
+        assert guard.start_heartbeat(task_id)
+        clock.now += 100
+        assert guard.heartbeat(task_id)
+        clock.now += 100
+        assert guard.submit('audio', 1, 7, lambda task_id: None) == (task_id, True)
+
+        assert guard.finish(task_id)
+        assert not guard.finish(task_id)
+        new_task, coalesced = guard.submit('audio', 1, 7, lambda task_id: None)
+        assert not coalesced and new_task != task_id
+
+        # worker崩溃：开始执行后不再续期，心跳超时后可以重新提交
+        guard.start_heartbeat(new_task)
+        guard._heartbeats.pop(new_task)[1].set()
+        clock.now += 121
+        assert not guard.heartbeat(new_task)
+        retry, coalesced = guard.submit('audio', 1, 7, lambda task_id: None)
+        assert not coalesced and retry != new_task
+        assert [lock['task_id'] for lock in guard.locks()] == [retry]
+    print("  ✓ 通过")
+
+def test_finished_holder_and_enqueue_failure():
+    """
+    测试持有锁的任务已结束时直接接管，投递失败时释放锁
+    """
+    print("测试3: 接管已结束的任务与投递失败")
+    with tempfile.TemporaryDirectory() as root:
+        guard = make_guard(root)
+        stale, _ = guard.submit('chapter_images', 1, 7, lambda task_id: None)
+        finished = {stale}
+        task_id, coalesced = guard.submit('chapter_images', 1, 7, lambda task_id: None,
+                                          is_finished=lambda task_id: task_id in finished)
+        assert not coalesced and task_id != stale
+        assert guard.submit('chapter_images', 1, 7, lambda task_id: None,
+                            is_finished=lambda task_id: task_id in finished) == (task_id, True)
+
+        def broken_enqueue(task_id):
+            raise ConnectionError('broker down')
+
+        try:
+            guard.submit('novel_images', 1, None, broken_enqueue)
+            raise AssertionError('应抛出ConnectionError')
+        except ConnectionError:
+            pass
+        _, coalesced = guard.submit('novel_images', 1, None, lambda task_id: None)
+        assert not coalesced
+        assert guard.release(stage_key('novel_images', 1))
+    print("  ✓ 通过")
+
+def test_file_inputs_split_locks():
+    """
+    测试narration.txt或音频改动后，新请求启动新任务而不是合并到基于旧输入的任务
+    """
+    print("测试4: 输入文件摘要")
+    with tempfile.TemporaryDirectory() as root:
+        guard = make_guard(root)
+        chapter_dir = os.path.join(root, 'chapter_001')
+        os.makedirs(chapter_dir)
+        narration = os.path.join(chapter_dir, 'narration.txt')
+        Path(narration).write_text('解说', encoding='utf-8')
+        Path(chapter_dir, 'chapter_001_narration_01.mp3').write_bytes(b'mp3')
+        patterns = ['narration.txt', '*_narration_*.mp3']
+
+        inputs = file_inputs(chapter_dir, patterns)
+        assert set(inputs) == {'narration.txt', 'chapter_001_narration_01.mp3'}
+        first, _ = guard.submit('render_all', 1, 1, lambda task_id: None, inputs=inputs)
+        same, coalesced = guard.submit('render_all', 1, 1, lambda task_id: None,
+                                       inputs=file_inputs(chapter_dir, patterns))
+        assert coalesced and same == first
+
+        Path(narration).write_text('改过的解说', encoding='utf-8')
+        edited, coalesced = guard.submit('render_all', 1, 1, lambda task_id: None,
+                                         inputs=file_inputs(chapter_dir, patterns))
+        assert not coalesced and edited != first
+
+        Path(chapter_dir, 'chapter_001_narration_01.mp3').write_bytes(b'new mp3 audio')
+        _, coalesced = guard.submit('render_all', 1, 1, lambda task_id: None, inputs=file_inputs(chapter_dir, patterns))
+        assert not coalesced
+        assert file_inputs(os.path.join(root, 'missing'), patterns) == {}
+    print("  ✓ 通过")
+
+if __name__ == '__main__':
+    test_concurrent_submissions_coalesce()
+    test_heartbeat_finish_and_expiry()
+    test_finished_holder_and_enqueue_failure()
+    test_file_inputs_split_locks()
+    print("\n所有测试通过")
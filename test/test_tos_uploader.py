@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试tos_uploader.py的分片并行上传引擎
+使用本地目录模拟对象存储，验证分片上传、内容一致时跳过、分片失败后的断点续传以及检查点中的上传失效后重新上传
+
+使用方法:
+python test/test_tos_uploader.py
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from tos_uploader import LocalDirectoryStore, ParallelUploader
+
+PART_SIZE = 1024
+
+class FlakyStore(LocalDirectoryStore):
+    """
+    指定分片号第一次上传时抛出异常，模拟网络中断
+    """
+
+    def __init__(self, root, fail_parts):
+        super().__init__(root)
+        self.fail_parts = set(fail_parts)
+        self.uploaded_parts = []
+
+    def upload_part(self, key, upload_id, part_number, data):
+        if part_number in self.fail_parts:
+            self.fail_parts.discard(part_number)
+            raise ConnectionError(f"模拟分片 {part_number} 网络中断")
+        self.uploaded_parts.append(part_number)
+        return super().upload_part(key, upload_id, part_number, data)
+
+def create_file(root, name, size):
+    file_path = os.path.join(root, name)
+    with open(file_path, 'wb') as f:
+        f.write(os.urandom(size))
+    return file_path
+
+def test_upload_and_skip():
+    """
+    测试多文件分片上传后内容一致，第二次运行全部跳过
+    """
+    print("测试1: 分片上传与跳过")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        files = [create_file(temp_dir, f'video_{i}.mp4', PART_SIZE * 3 + i * 100) for i in range(3)]
+        files.append(create_file(temp_dir, 'small.txt', 100))
+        items = [(path, f'data002/{os.path.basename(path)}') for path in files]
+
+        store = LocalDirectoryStore(os.path.join(temp_dir, 'bucket'))
+        uploader = ParallelUploader(store, part_size=PART_SIZE, journal_dir=os.path.join(temp_dir, 'journal'),
+                                    log=lambda msg: None)
+
+        first = uploader.upload_files(items)
+        assert all(r['success'] and not r['skipped'] for r in first['results'])
+        assert first['bytes'] == sum(os.path.getsize(path) for path in files)
+        for path, key in items:
+            assert Path(store.root, key).read_bytes() == Path(path).read_bytes()
+
+        second = uploader.upload_files(items)
+        assert all(r['skipped'] for r in second['results'])
+        assert second['bytes'] == 0
+    print("  ✓ 通过")
+
+def test_resume_after_part_failure():
+    """
+    测试分片失败后重新运行只补传缺失分片
+    """
+    print("测试2: 分片失败后断点续传")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        file_path = create_file(temp_dir, 'video.mp4', PART_SIZE * 5 + 10)
+        store = FlakyStore(os.path.join(temp_dir, 'bucket'), fail_parts=[4])
+        uploader = ParallelUploader(store, part_size=PART_SIZE, part_workers=1, max_retries=0,
+                                    journal_dir=os.path.join(temp_dir, 'journal'), log=lambda msg: None)
+
+        first = uploader.upload_file(file_path, 'video.mp4')
+        assert not first['success']
+        assert store.head('video.mp4') is None
+        completed = set(store.uploaded_parts)
+
+        store.uploaded_parts = []
+        second = uploader.upload_file(file_path, 'video.mp4')
+        assert second['success']
+        assert not completed & set(store.uploaded_parts)
+        assert completed | set(store.uploaded_parts) == set(range(1, 7))
+        assert Path(store.root, 'video.mp4').read_bytes() == Path(file_path).read_bytes()
+    print("  ✓ 通过")
+
+def test_restart_after_upload_expired():
+    """
+    测试检查点中的分片上传在远端失效后丢弃检查点并重新上传
+    """
+    print("测试3: 分片上传失效后重新上传")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        file_path = create_file(temp_dir, 'video.mp4', PART_SIZE * 4 + 10)
+        store = FlakyStore(os.path.join(temp_dir, 'bucket'), fail_parts=[3])
+        uploader = ParallelUploader(store, part_size=PART_SIZE, part_workers=1, max_retries=0,
+                                    journal_dir=os.path.join(temp_dir, 'journal'), log=lambda msg: None)
+
+        assert not uploader.upload_file(file_path, 'video.mp4')['success']
+        expired_id = os.listdir(store.multipart_root)[0]
+        store.abort_multipart('video.mp4', expired_id)
+
+        store.uploaded_parts = []
+        second = uploader.upload_file(file_path, 'video.mp4')
+        assert second['success']
+        # 已完成的分片属于失效的上传，需要全部重新上传
+        assert set(store.uploaded_parts) == set(range(1, 6))
+        assert Path(store.root, 'video.mp4').read_bytes() == Path(file_path).read_bytes()
+        assert not os.listdir(os.path.join(temp_dir, 'journal'))
+    print("  ✓ 通过")
+
+if __name__ == "__main__":
+    test_upload_and_skip()
+    test_resume_after_part_failure()
+    test_restart_after_upload_expired()
+    print("所有测试通过")
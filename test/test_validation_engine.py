@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试validate_narration.py的两阶段校验引擎
+验证本地校验生成结构化问题列表，且只对存在可修复问题的文件执行修复，
+并发修复的输出全部经由log回调，校验后被修改的文件跳过修复
+
+使用方法:
+python test/test_validation_engine.py
+"""
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import validate_narration
+from validate_narration import collect_local_issues, run_validation_engine
+
+VALID_CLOSEUP = "<解说内容>" + "测" * 31 + "</解说内容>"
+
+# 图片prompt标签未闭合，开启auto_fix_tags时无需LLM即可修复
+TAG_ISSUE_CONTENT = f"<分镜1>\n<图片特写1>\n{VALID_CLOSEUP}\n<图片prompt>测试\n</图片特写1>\n</分镜1>\n"
+
+def create_chapter(root, chapter_name, content):
+    """
+    在临时目录下创建章节目录和narration.txt文件
+
+    Args:
+        root (str): 临时根目录
+        chapter_name (str): 章节目录名
+        content (str): narration.txt内容
+
+    Returns:
+        str: narration.txt路径
+    """
+    chapter_dir = os.path.join(root, chapter_name)
+    os.makedirs(chapter_dir, exist_ok=True)
+    narration_file = os.path.join(chapter_dir, 'narration.txt')
+    with open(narration_file, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return narration_file
+
+def test_collect_local_issues():
+    """
+    测试本地校验返回结构化问题列表
+    """
+    print("测试1: 本地校验问题列表")
+    content = f"""<出镜人物>
+<角色1><姓名>张三</姓名></角色1>
+</出镜人物>
+<分镜1>
+<图片特写1>
+<特写人物><角色姓名>李四</角色姓名></特写人物>
+{VALID_CLOSEUP}
+<图片prompt>测试</图片prompt>
+</图片特写1>
+</分镜1>
+"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        narration_file = create_chapter(temp_dir, 'chapter_001', content)
+        scan = collect_local_issues(narration_file)
+
+        issue_types = {issue['type'] for issue in scan['issues']}
+        assert scan['chapter'] == 'chapter_001'
+        assert scan['content_hash']
+        assert 'character' in issue_types
+        assert 'total_length' in issue_types
+        assert scan['results']['first_closeup']['valid']
+        assert all('needs_llm' in issue for issue in scan['issues'])
+    print("  ✓ 通过")
+
+def test_engine_skips_llm_repairs_without_client():
+    """
+    测试没有LLM客户端时不会修改文件，且结果按输入顺序返回
+    """
+    print("测试2: 无客户端时只做本地校验")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        files = [
+            create_chapter(temp_dir, f'chapter_{i:03d}', f"<分镜1>\n<图片特写1>\n{VALID_CLOSEUP}\n</图片特写1>\n</分镜1>\n")
+            for i in range(1, 4)
+        ]
+        before = [Path(f).read_text(encoding='utf-8') for f in files]
+
+        progress = []
+        scans = run_validation_engine(files, client=None, auto_rewrite=True, auto_fix_structure=True,
+                                      local_workers=2, progress_callback=lambda *args: progress.append(args))
+
+        assert [scan['file_path'] for scan in scans] == files
+        assert not any(scan['repaired'] for scan in scans)
+        assert [Path(f).read_text(encoding='utf-8') for f in files] == before
+        assert len([p for p in progress if p[0] == 'local']) == len(files)
+    print("  ✓ 通过")
+
+def test_concurrent_repairs_log_through_callback():
+    """
+    测试并发修复时所有输出都经由log回调，不直接写入stdout
+    """
+    print("测试3: 并发修复输出")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        files = [create_chapter(temp_dir, f'chapter_{i:03d}', TAG_ISSUE_CONTENT) for i in range(1, 5)]
+
+        messages = []
+        progress = []
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            scans = run_validation_engine(files, auto_fix_tags=True, local_workers=1, llm_concurrency=4,
+                                          progress_callback=lambda *args: progress.append(args), log=messages.append)
+
+        assert all(scan['repaired'] for scan in scans)
+        assert len([p for p in progress if p[0] == 'repair']) == len(files)
+        for i in range(1, 5):
+            assert f'\n修复章节: chapter_{i:03d}' in messages
+        assert len(messages) > len(files)
+        assert stdout.getvalue() == ''
+    print("  ✓ 通过")
+
+def test_repair_skips_file_changed_after_scan():
+    """
+    测试本地校验后文件被修改时跳过修复，不覆盖新的内容
+    """
+    print("测试4: 校验后文件被修改时跳过修复")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        changed, unchanged = [create_chapter(temp_dir, f'chapter_{i:03d}', TAG_ISSUE_CONTENT) for i in (1, 2)]
+        edited = TAG_ISSUE_CONTENT + '<!-- 人工修改 -->\n'
+
+        original_scan = validate_narration._scan_chapters_locally
+
+        def scan_then_edit(*args, **kwargs):
+            scans = original_scan(*args, **kwargs)
+            Path(changed).write_text(edited, encoding='utf-8')
+            return scans
+
+        messages = []
+        validate_narration._scan_chapters_locally = scan_then_edit
+        try:
+            scans = run_validation_engine([changed, unchanged], auto_fix_tags=True, local_workers=1,
+                                          log=messages.append)
+        finally:
+            validate_narration._scan_chapters_locally = original_scan
+
+        assert [scan['repaired'] for scan in scans] == [False, True]
+        assert '  chapter_001: 文件在校验期间被修改，跳过修复' in messages
+        assert Path(changed).read_text(encoding='utf-8') == edited
+    print("  ✓ 通过")
+
+if __name__ == "__main__":
+    test_collect_local_issues()
+    test_engine_skips_llm_repairs_without_client()
+    test_concurrent_repairs_log_through_callback()
+    test_repair_skips_file_changed_after_scan()
+    print("所有测试通过")
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试video_clip_cache.py的图生视频片段缓存
+在临时目录中用假的提交函数验证：跨章节相同片段只提交一次、并发数不超过上限、
+任务完成后写入缓存并分发给等待者、再次运行直接命中缓存、任务失败后重新提交
+
+使用方法:
+python test/test_video_clip_cache.py
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from video_clip_cache import ClipCache, ClipJob, run_clip_jobs
+
+MODEL = 'i2v-test'
+
+class FakeSubmitter:
+    """
+    记录提交次数和最大并发数的假提交函数
+    """
+
+    def __init__(self, fail=False):
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self.fail = fail
+        self.lock = threading.Lock()
+
+    def __call__(self, job, clip_key):
+        with self.lock:
+            self.calls.append((job.output_path, clip_key))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.05)
+        with self.lock:
+            self.active -= 1
+        return None if self.fail else f"task-{len(self.calls)}"
+
+def write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def make_jobs(root, chapters, image_data):
+    jobs = []
+    for chapter in chapters:
+        chapter_dir = os.path.join(root, 'data', '001', chapter)
+        image = os.path.join(chapter_dir, 'images', f'{chapter}_image_01.jpeg')
+        write_file(image, image_data)
+        jobs.append(ClipJob(image, 5, os.path.join(chapter_dir, f'{chapter}_video_1.mp4'), '镜头推进', MODEL))
+    return jobs
+
+def test_dedup_and_bounded_concurrency():
+    """
+    测试不同章节的相同片段只提交一次，不同片段并发提交且不超过上限
+    """
+    print("测试1: 跨章节去重与有界并发")
+    with tempfile.TemporaryDirectory() as root:
+        cache = ClipCache(os.path.join(root, 'cache'))
+        shared = make_jobs(root, ['chapter_001', 'chapter_002'], b'same image')
+        unique = [make_jobs(root, [f'chapter_1{i:02d}'], f'image {i}'.encode())[0] for i in range(6)]
+        submitter = FakeSubmitter()
+
+        results = run_clip_jobs(shared + unique, submitter, cache=cache, max_workers=3)
+        assert all(results.values()) and len(results) == 8, results
+        assert len(submitter.calls) == 7, submitter.calls
+        assert submitter.max_active <= 3 and submitter.max_active > 1, submitter.max_active
+
+        # 同一片段的两个输出路径都登记为等待者
+        key = cache.key_for(shared[0])
+        assert key == cache.key_for(shared[1]) and cache.in_flight(key)
+        entry = dict(cache.entries())[key]
+        assert entry['waiters'] == sorted(os.path.abspath(job.output_path) for job in shared)
+    print("  ✓ 通过")
+
+def test_completion_delivers_and_hits():
+    """
+    测试下载完成后写入缓存并分发给等待者，重新生成章节时直接命中缓存不再提交
+    """
+    print("测试2: 完成分发与缓存命中")
+    with tempfile.TemporaryDirectory() as root:
+        cache = ClipCache(os.path.join(root, 'cache'))
+        jobs = make_jobs(root, ['chapter_001', 'chapter_002'], b'same image')
+        submitter = FakeSubmitter()
+        run_clip_jobs(jobs, submitter, cache=cache)
+        key = submitter.calls[0][1]
+
+        # 再次运行时任务仍在生成中：不重复提交
+        run_clip_jobs(jobs, submitter, cache=cache)
+        assert len(submitter.calls) == 1
+
+        # 轮询到任务完成，视频下载到提交时的输出路径
+        downloaded = submitter.calls[0][0]
+        write_file(downloaded, b'clip bytes')
+        delivered = cache.record_completed(key, downloaded)
+        other = [job.output_path for job in jobs if job.output_path != downloaded][0]
+        assert delivered == [os.path.abspath(other)], delivered
+        with open(other, 'rb') as f:
+            assert f.read() == b'clip bytes'
+        assert cache.stats() == {'completed': 1, 'in_flight': 0, 'expired': 0, 'bytes': 10}
+
+        # 删除章节视频后重新生成：命中缓存
+        for job in jobs:
+            os.remove(job.output_path)
+        results = run_clip_jobs(jobs, submitter, cache=cache)
+        assert all(results.values()) and len(submitter.calls) == 1
+        assert all(os.path.exists(job.output_path) for job in jobs)
+
+        # 提示词不同则是不同的片段
+        changed = jobs[0]._replace(prompt='人物转身')
+        os.remove(changed.output_path)
+        run_clip_jobs([changed], submitter, cache=cache)
+        assert len(submitter.calls) == 2
+    print("  ✓ 通过")
+
+def test_failure_and_expiry_resubmit():
+    """
+    测试提交失败不留记录，任务失败或提交记录过期后重新提交
+    """
+    print("测试3: 失败与过期后重新提交")
+    with tempfile.TemporaryDirectory() as root:
+        now = [1000.0]
+        cache = ClipCache(os.path.join(root, 'cache'), clock=lambda: now[0])
+        jobs = make_jobs(root, ['chapter_001'], b'image')
+
+        results = run_clip_jobs(jobs, FakeSubmitter(fail=True), cache=cache)
+        assert results == {jobs[0].output_path: False}
+        assert list(cache.entries()) == []
+
+        submitter = FakeSubmitter()
+        run_clip_jobs(jobs, submitter, cache=cache)
+        cache.record_failed(submitter.calls[0][1])
+        run_clip_jobs(jobs, submitter, cache=cache)
+        assert len(submitter.calls) == 2
+
+        now[0] += 25 * 3600
+        assert cache.prune(dry_run=True) == 1
+        run_clip_jobs(jobs, submitter, cache=cache)
+        assert len(submitter.calls) == 3
+    print("  ✓ 通过")
+
+if __name__ == '__main__':
+    test_dedup_and_bounded_concurrency()
+    test_completion_delivers_and_hits()
+    test_failure_and_expiry_resubmit()
+    print("\n所有测试通过")
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试video_contract.py的视频编码约定
+不调用ffmpeg，用构造的ffprobe结果验证：各编码器的约定参数、单文件约定检查、
+片段能否直接流复制拼接的判断，以及预转码缓存的命中与失效
+
+使用方法:
+python test/test_video_contract.py
+"""
+
+import copy
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import video_contract
+from video_contract import (audio_encode_args, concat_violations, contract_filter, contract_violations,
+                            normalized_asset, video_encode_args)
+
+CONFORMING_PROBE = {
+    'video': [{
+        'codec_name': 'h264', 'profile': 'High', 'level': 40, 'width': 720, 'height': 1280,
+        'sample_aspect_ratio': '1:1', 'pix_fmt': 'yuv420p', 'r_frame_rate': '30/1', 'time_base': '1/15360',
+    }],
+    'audio': [{
+        'codec_name': 'aac', 'profile': 'LC', 'sample_rate': '44100', 'channels': 2, 'channel_layout': 'stereo',
+    }],
+}
+
+def arg_value(args, flag):
+    return args[args.index(flag) + 1]
+
+def test_encode_args():
+    """
+    测试各编码器都输出统一的帧率、GOP、profile、像素格式和时间基，hevc回退为libx264
+    """
+    print("测试1: 约定编码参数")
+    for gpu_params in (
+        {'video_codec': 'libx264', 'preset': 'medium', 'extra_params': ['-crf', '32']},
+        {'hwaccel': 'cuda', 'video_codec': 'h264_nvenc', 'preset': 'p4', 'profile': 'main', 'extra_params': []},
+        {'video_codec': 'h264_videotoolbox', 'extra_params': ['-allow_sw', '1']},
+    ):
+        args = video_encode_args(gpu_params)
+        assert arg_value(args, '-c:v') == gpu_params['video_codec']
+        assert arg_value(args, '-r') == '30' and arg_value(args, '-g') == '60'
+        assert arg_value(args, '-pix_fmt') == 'yuv420p'
+        assert arg_value(args, '-video_track_timescale') == '15360'
+        # 编码器自带的profile被约定覆盖
+        assert args.count('-profile:v') == 1 and arg_value(args, '-profile:v') == 'high'
+        assert ('-preset' in args) == (not gpu_params['video_codec'].endswith('_videotoolbox'))
+
+    assert arg_value(video_encode_args({'video_codec': 'libx264'}), '-sc_threshold') == '0'
+    assert arg_value(video_encode_args({'video_codec': 'hevc_videotoolbox'}), '-c:v') == 'libx264'
+    assert audio_encode_args() == ['-c:a', 'aac', '-b:a', '128k', '-ar', '44100', '-ac', '2']
+    assert contract_filter('crop').endswith('crop=720:1280,setsar=1,format=yuv420p')
+    assert 'pad=720:1280' in contract_filter('pad')
+    print("  ✓ 通过")
+
+def test_contract_and_concat_checks():
+    """
+    测试单文件约定检查和拼接兼容性检查能指出具体不一致的字段
+    """
+    print("测试2: 约定检查与拼接兼容性")
+    assert contract_violations(CONFORMING_PROBE) == []
+
+    legacy = copy.deepcopy(CONFORMING_PROBE)
+    legacy['video'][0].update({'sample_aspect_ratio': '0:1', 'r_frame_rate': '25/1'})
+    legacy['audio'][0]['sample_rate'] = '48000'
+    problems = contract_violations(legacy)
+    assert len(problems) == 3, problems
+
+    silent = copy.deepcopy(CONFORMING_PROBE)
+    silent['audio'] = []
+    assert contract_violations(silent) == ['音频流数量为0']
+    assert contract_violations(silent, video_only=True) == []
+
+    # 都符合约定但level不同（不同编码器产出），不能流复制拼接
+    other_level = copy.deepcopy(CONFORMING_PROBE)
+    other_level['video'][0]['level'] = 31
+    assert concat_violations([('a.mp4', CONFORMING_PROBE), ('b.mp4', CONFORMING_PROBE)]) == []
+    problems = concat_violations([('a.mp4', CONFORMING_PROBE), ('b.mp4', other_level)])
+    assert len(problems) == 1 and problems[0].startswith('b.mp4: video level=31'), problems
+    problems = concat_violations([('a.mp4', CONFORMING_PROBE), ('b.mp4', legacy)])
+    assert all(problem.startswith('b.mp4: ') for problem in problems) and len(problems) == 3, problems
+    print("  ✓ 通过")
+
+def test_normalized_asset_cache():
+    """
+    测试静态素材只转码一次，素材内容或编码器变化时生成新的缓存文件
+    """
+    print("测试3: 静态素材预转码缓存")
+    calls = []
+
+    def fake_conform(src, dst, gpu_params=None, fit='pad', label='conform'):
+        calls.append((src, gpu_params['video_codec']))
+        with open(dst, 'wb') as f:
+            f.write(b'normalized')
+        return dst
+
+    original = video_contract.conform_video
+    video_contract.conform_video = fake_conform
+    try:
+        with tempfile.TemporaryDirectory() as root:
+            source = os.path.join(root, 'finish.mp4')
+            cache_dir = os.path.join(root, 'cache')
+            with open(source, 'wb') as f:
+                f.write(b'finish v1')
+            x264 = {'video_codec': 'libx264'}
+
+            first = normalized_asset(source, gpu_params=x264, cache_dir=cache_dir)
+            assert normalized_asset(source, gpu_params=x264, cache_dir=cache_dir) == first
+            assert len(calls) == 1 and os.path.basename(first).startswith('finish-')
+
+            nvenc = normalized_asset(source, gpu_params={'video_codec': 'h264_nvenc'}, cache_dir=cache_dir)
+            assert nvenc != first and len(calls) == 2
+
+            with open(source, 'wb') as f:
+                f.write(b'finish v2')
+            assert normalized_asset(source, gpu_params=x264, cache_dir=cache_dir) != first
+            assert len(calls) == 3
+            assert not [name for name in os.listdir(cache_dir) if name.endswith('.tmp.mp4')]
+    finally:
+        video_contract.conform_video = original
+    print("  ✓ 通过")
+
+if __name__ == '__main__':
+    test_encode_args()
+    test_contract_and_concat_checks()
+    test_normalized_asset_cache()
+    print("\n所有测试通过")
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试WorkflowOrchestrator的章节任务DAG执行
+使用sleep模拟各阶段耗时，验证资源并发上限、跨章节流水线重叠、断点续跑和关键路径统计
+
+使用方法:
+python test/test_workflow_dag.py
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.interfaces import GenerationResult, GenerationStatus
+from src.core.workflow_orchestrator import ChapterStage, STAGE_RESOURCES, WorkflowOrchestrator
+
+STAGE_SECONDS = 0.05
+
+class QuietLogger:
+    def debug(self, message, **kwargs):
+        pass
+    info = warning = error = debug
+
+class StageRecorder:
+    """
+    记录每个阶段的执行区间和各资源的最大并发数，可指定第一次执行时失败的节点
+    """
+
+    def __init__(self, fail_once=()):
+        self.lock = threading.Lock()
+        self.calls = []
+        self.intervals = {}
+        self.active = {}
+        self.max_active = {}
+        self.fail_once = set(fail_once)
+
+    def handler(self, stage):
+        def run(chapter, upstream):
+            node_id = f"{chapter['id']}:{stage.value}"
+            resource = STAGE_RESOURCES[stage]
+            with self.lock:
+                self.calls.append(node_id)
+                self.active[resource] = self.active.get(resource, 0) + 1
+                self.max_active[resource] = max(self.max_active.get(resource, 0), self.active[resource])
+            started = time.time()
+            time.sleep(STAGE_SECONDS)
+            with self.lock:
+                self.active[resource] -= 1
+                self.intervals[node_id] = (started, time.time())
+                if node_id in self.fail_once:
+                    self.fail_once.discard(node_id)
+                    return GenerationResult(status=GenerationStatus.FAILED, error_message='模拟失败')
+            return GenerationResult(
+                status=GenerationStatus.SUCCESS,
+                output_path=f"{node_id}.out",
+                metadata={'upstream': sorted(upstream)}
+            )
+        return run
+
+    def handlers(self):
+        return {stage.value: self.handler(stage) for stage in ChapterStage}
+
+def run_pipeline(output_dir, recorder, chapter_count=4, source='novel.txt'):
+    orchestrator = WorkflowOrchestrator(config_manager=None, logger=QuietLogger())
+    results = orchestrator.execute_workflow({
+        'chapters': [{'id': f'chapter_{i:03d}', 'source': source} for i in range(1, chapter_count + 1)],
+        'stage_handlers': recorder.handlers(),
+        'resource_limits': {'llm': 2, 'tts': 1, 'local': 1, 'image_api': 1, 'encoder': 1},
+        'output_dir': output_dir,
+        'retry_count': 0,
+    })
+    return orchestrator, results
+
+def overlaps(first, second):
+    return first[0] < second[1] and second[0] < first[1]
+
+def test_pipelined_execution():
+    """
+    测试资源并发不超过上限，不同章节的不同阶段重叠执行，总耗时明显少于串行
+    """
+    print("测试1: 跨章节流水线")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        recorder = StageRecorder()
+        started = time.time()
+        orchestrator, results = run_pipeline(temp_dir, recorder)
+        elapsed = time.time() - started
+
+        summary = results[-1]
+        assert summary.is_success, summary.error_message
+        assert len(recorder.calls) == 4 * len(ChapterStage)
+        assert recorder.max_active['llm'] <= 2 and recorder.max_active['encoder'] == 1
+        assert elapsed < len(recorder.calls) * STAGE_SECONDS * 0.7
+
+        # 某章节渲染时，其他章节的配音或图片正在进行
+        assert any(
+            overlaps(recorder.intervals[f'chapter_{i:03d}:{encode_stage}'], recorder.intervals[f'chapter_{j:03d}:{stage}'])
+            for i in range(1, 5) for j in range(1, 5) if i != j
+            for encode_stage in ('render', 'finish') for stage in ('audio', 'images')
+        )
+
+        # 渲染节点拿到字幕和图片的上游结果
+        render_result = next(r for r in results if r.output_path == 'chapter_002:render.out')
+        assert render_result.metadata['upstream'] == ['ass', 'images']
+        assert orchestrator.get_workflow_status()['status'] == 'completed'
+    print("  ✓ 通过")
+
+def test_resume_from_checkpoint():
+    """
+    测试失败节点只阻断本章节下游，重新运行时已完成节点从断点恢复不再执行；
+    全部成功后删除断点，输入变化时不复用旧断点
+    """
+    print("测试2: 断点续跑")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        recorder = StageRecorder(fail_once={'chapter_002:images'})
+        _, results = run_pipeline(temp_dir, recorder)
+        summary = results[-1]
+        assert summary.is_failed
+        assert summary.metadata['failed_nodes'] == [
+            'chapter_002:images', 'chapter_002:render', 'chapter_002:finish'
+        ]
+        assert 'chapter_003:finish' in recorder.calls
+        assert os.path.exists(os.path.join(temp_dir, 'workflow_checkpoint.json'))
+
+        recorder.calls.clear()
+        _, results = run_pipeline(temp_dir, recorder)
+        assert results[-1].is_success
+        assert sorted(recorder.calls) == ['chapter_002:finish', 'chapter_002:images', 'chapter_002:render']
+        assert results[-1].metadata['resumed_nodes'] == 4 * len(ChapterStage) - 3
+        checkpoint_path = os.path.join(temp_dir, 'workflow_checkpoint.json')
+        assert not os.path.exists(checkpoint_path)
+
+        # 全部成功后再次运行从头执行
+        recorder.calls.clear()
+        _, results = run_pipeline(temp_dir, recorder)
+        assert len(recorder.calls) == 4 * len(ChapterStage)
+        assert results[-1].metadata['resumed_nodes'] == 0
+
+        # 输入变化后忽略旧断点
+        recorder.fail_once.add('chapter_001:finish')
+        run_pipeline(temp_dir, recorder)
+        assert os.path.exists(checkpoint_path)
+        recorder.calls.clear()
+        _, results = run_pipeline(temp_dir, recorder, source='novel_v2.txt')
+        assert results[-1].is_success
+        assert len(recorder.calls) == 4 * len(ChapterStage)
+    print("  ✓ 通过")
+
+def test_critical_path_report():
+    """
+    测试关键路径从第一个节点到最后完成的节点连续，耗时统计自洽
+    """
+    print("测试3: 关键路径")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        _, results = run_pipeline(temp_dir, StageRecorder(), chapter_count=3)
+        critical_path = results[-1].metadata['critical_path']
+        node_ids = [item['node_id'] for item in critical_path['nodes']]
+        assert node_ids[0].endswith(':script')
+        assert node_ids[-1] == 'chapter_003:finish'
+        assert critical_path['busy_time'] >= STAGE_SECONDS * 5
+        assert abs(critical_path['total_time'] - critical_path['busy_time'] - critical_path['wait_time']) < 0.01
+    print("  ✓ 通过")
+
+if __name__ == "__main__":
+    test_pipelined_execution()
+    test_resume_from_checkpoint()
+    test_critical_path_report()
+    print("所有测试通过")
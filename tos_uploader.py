@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+可断点续传的并行分片上传引擎
+
+功能:
+    - 大文件按分片并行上传，多个文件之间也并行上传
+    - 本地检查点日志记录已完成的分片，网络中断后重新运行只补传缺失分片
+    - 远端对象的内容哈希与本地一致时跳过上传
+    - 统计上传字节数、耗时和吞吐量
+    - 对象存储通过ObjectStore接口抽象，TosObjectStore对接TOS，
+      LocalDirectoryStore使用本地目录模拟对象存储，便于离线测试
+
+使用方法:
+    from tos_uploader import ParallelUploader, TosObjectStore
+
+    store = TosObjectStore(client, bucket_name)
+    uploader = ParallelUploader(store)
+    results = uploader.upload_files([(local_path, object_key), ...])
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# 默认分片大小（TOS要求除最后一片外每片不小于5MB）
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+
+# 记录本地文件SHA-256的对象元数据键
+CONTENT_HASH_META_KEY = 'content-sha256'
+
+# 默认检查点日志目录
+DEFAULT_JOURNAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', '.upload_journal')
+
+
+class UploadNotFoundError(Exception):
+    """
+    分片上传在远端已不存在（过期或被取消），对应TOS的NoSuchUpload错误
+    """
+
+
+class ObjectStore:
+    """
+    对象存储接口，上传引擎只依赖以下方法
+    """
+
+    def head(self, key):
+        """
+        查询对象信息
+
+        Returns:
+            dict: {'size': 字节数, 'etag': ETag, 'meta': 元数据字典}，对象不存在时返回None
+        """
+        raise NotImplementedError
+
+    def put_object(self, key, data, meta=None):
+        """
+        单次上传整个对象
+        """
+        raise NotImplementedError
+
+    def create_multipart(self, key, meta=None):
+        """
+        初始化分片上传
+
+        Returns:
+            str: upload_id
+        """
+        raise NotImplementedError
+
+    def upload_part(self, key, upload_id, part_number, data):
+        """
+        上传单个分片，upload_id在远端已不存在时抛出UploadNotFoundError
+
+        Returns:
+            str: 分片ETag
+        """
+        raise NotImplementedError
+
+    def complete_multipart(self, key, upload_id, parts):
+        """
+        合并分片
+
+        Args:
+            parts (list): [(part_number, etag), ...]，按分片号升序
+        """
+        raise NotImplementedError
+
+    def abort_multipart(self, key, upload_id):
+        """
+        取消分片上传
+        """
+        raise NotImplementedError
+
+
+class TosObjectStore(ObjectStore):
+    """
+    基于TOS SDK（tos.TosClientV2）的对象存储实现
+    """
+
+    def __init__(self, client, bucket):
+        self.client = client
+        self.bucket = bucket
+
+    def head(self, key):
+        import tos
+        try:
+            output = self.client.head_object(self.bucket, key)
+        except tos.exceptions.TosServerError as e:
+            if e.status_code == 404:
+                return None
+            raise
+        return {
+            'size': output.content_length,
+            'etag': (output.etag or '').strip('"'),
+            'meta': dict(output.meta or {})
+        }
+
+    def put_object(self, key, data, meta=None):
+        self.client.put_object(self.bucket, key, content=data, meta=meta)
+
+    def create_multipart(self, key, meta=None):
+        output = self.client.create_multipart_upload(self.bucket, key, meta=meta)
+        return output.upload_id
+
+    def upload_part(self, key, upload_id, part_number, data):
+        import tos
+        try:
+            output = self.client.upload_part(self.bucket, key, upload_id, part_number, content=data)
+        except tos.exceptions.TosServerError as e:
+            if e.code == 'NoSuchUpload':
+                raise UploadNotFoundError(f"分片上传不存在: {upload_id}") from e
+            raise
+        return output.etag
+
+    def complete_multipart(self, key, upload_id, parts):
+        from tos.models2 import UploadedPart
+        self.client.complete_multipart_upload(
+            self.bucket, key, upload_id,
+            parts=[UploadedPart(part_number, etag) for part_number, etag in parts]
+        )
+
+    def abort_multipart(self, key, upload_id):
+        self.client.abort_multipart_upload(self.bucket, key, upload_id)
+
+
+class LocalDirectoryStore(ObjectStore):
+    """
+    使用本地目录模拟对象存储，对象键映射为目录下的相对路径
+    元数据保存在 .meta 目录，未合并的分片保存在 .multipart 目录
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.meta_root = os.path.join(root, '.meta')
+        self.multipart_root = os.path.join(root, '.multipart')
+        self.lock = threading.Lock()
+        os.makedirs(self.meta_root, exist_ok=True)
+        os.makedirs(self.multipart_root, exist_ok=True)
+
+    def _object_path(self, key):
+        return os.path.join(self.root, key)
+
+    def _meta_path(self, key):
+        return os.path.join(self.meta_root, key + '.json')
+
+    def _write_object(self, key, chunks, meta):
+        object_path = self._object_path(key)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        md5 = hashlib.md5()
+        temp_path = object_path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            for chunk in chunks:
+                md5.update(chunk)
+                f.write(chunk)
+        os.replace(temp_path, object_path)
+
+        meta_path = self._meta_path(key)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump({'etag': md5.hexdigest(), 'meta': meta or {}}, f)
+
+    def head(self, key):
+        object_path = self._object_path(key)
+        if not os.path.exists(object_path):
+            return None
+        info = {'etag': '', 'meta': {}}
+        if os.path.exists(self._meta_path(key)):
+            with open(self._meta_path(key), 'r', encoding='utf-8') as f:
+                info = json.load(f)
+        return {'size': os.path.getsize(object_path), 'etag': info['etag'], 'meta': info['meta']}
+
+    def put_object(self, key, data, meta=None):
+        if hasattr(data, 'read'):
+            data = data.read()
+        self._write_object(key, [data], meta)
+
+    def create_multipart(self, key, meta=None):
+        upload_id = uuid.uuid4().hex
+        upload_dir = os.path.join(self.multipart_root, upload_id)
+        os.makedirs(upload_dir)
+        with open(os.path.join(upload_dir, 'upload.json'), 'w', encoding='utf-8') as f:
+            json.dump({'key': key, 'meta': meta or {}}, f)
+        return upload_id
+
+    def upload_part(self, key, upload_id, part_number, data):
+        upload_dir = os.path.join(self.multipart_root, upload_id)
+        if not os.path.isdir(upload_dir):
+            raise UploadNotFoundError(f"分片上传不存在: {upload_id}")
+        with open(os.path.join(upload_dir, f'{part_number:05d}.part'), 'wb') as f:
+            f.write(data)
+        return hashlib.md5(data).hexdigest()
+
+    def complete_multipart(self, key, upload_id, parts):
+        upload_dir = os.path.join(self.multipart_root, upload_id)
+        with open(os.path.join(upload_dir, 'upload.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)['meta']
+
+        def read_parts():
+            for part_number, _ in parts:
+                with open(os.path.join(upload_dir, f'{part_number:05d}.part'), 'rb') as f:
+                    yield f.read()
+
+        self._write_object(key, read_parts(), meta)
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+    def abort_multipart(self, key, upload_id):
+        shutil.rmtree(os.path.join(self.multipart_root, upload_id), ignore_errors=True)
+
+
+def compute_file_sha256(file_path, chunk_size=4 * 1024 * 1024):
+    """
+    流式计算文件SHA-256
+    """
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class UploadJournal:
+    """
+    分片上传检查点日志，每个对象一个JSON文件，记录upload_id和已完成分片
+    文件大小、修改时间或分片大小变化后检查点自动作废
+    """
+
+    def __init__(self, journal_dir=DEFAULT_JOURNAL_DIR):
+        self.journal_dir = journal_dir
+        self.lock = threading.Lock()
+        os.makedirs(journal_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.journal_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+    def load(self, key, fingerprint):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('key') != key or entry.get('fingerprint') != fingerprint:
+            return None
+        entry['parts'] = {int(n): etag for n, etag in entry.get('parts', {}).items()}
+        return entry
+
+    def save(self, entry):
+        with self.lock:
+            path = self._path(entry['key'])
+            temp_path = path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(temp_path, path)
+
+    def remove(self, key):
+        path = self._path(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class ParallelUploader:
+    """
+    并行分片上传器
+
+    Args:
+        store (ObjectStore): 对象存储实现
+        part_size (int): 分片大小（字节），小于该大小的文件直接单次上传
+        part_workers (int): 单个文件内并行上传的分片数
+        file_workers (int): 同时上传的文件数
+        journal_dir (str): 检查点日志目录
+        max_retries (int): 单个分片的重试次数
+        log (callable): 日志输出函数，默认print
+    """
+
+    def __init__(self, store, part_size=DEFAULT_PART_SIZE, part_workers=4, file_workers=2,
+                 journal_dir=DEFAULT_JOURNAL_DIR, max_retries=3, log=print):
+        self.store = store
+        self.part_size = part_size
+        self.part_workers = max(1, part_workers)
+        self.file_workers = max(1, file_workers)
+        self.journal = UploadJournal(journal_dir)
+        self.max_retries = max_retries
+        self.log = log
+
+    def _read_part(self, file_path, part_number):
+        with open(file_path, 'rb') as f:
+            f.seek((part_number - 1) * self.part_size)
+            return f.read(self.part_size)
+
+    def _upload_part_with_retry(self, key, upload_id, file_path, part_number):
+        data = self._read_part(file_path, part_number)
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.store.upload_part(key, upload_id, part_number, data), len(data)
+            except UploadNotFoundError:
+                # 上传已失效，重试同一upload_id没有意义
+                raise
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    raise
+                wait_seconds = 2 ** attempt
+                self.log(f"  分片 {part_number} 上传失败({e})，{wait_seconds}秒后重试...")
+                time.sleep(wait_seconds)
+
+    def _upload_multipart(self, file_path, key, file_size, content_hash):
+        stat = os.stat(file_path)
+        fingerprint = {'size': file_size, 'mtime': stat.st_mtime, 'part_size': self.part_size,
+                       'sha256': content_hash}
+        meta = {CONTENT_HASH_META_KEY: content_hash}
+        total_parts = (file_size + self.part_size - 1) // self.part_size
+
+        entry = self.journal.load(key, fingerprint)
+        if entry:
+            self.log(f"  从检查点续传: 已完成 {len(entry['parts'])}/{total_parts} 个分片")
+        else:
+            entry = self._start_multipart(key, fingerprint, meta)
+
+        try:
+            uploaded_bytes = self._upload_parts(file_path, key, entry, total_parts)
+        except UploadNotFoundError:
+            # 检查点中的分片上传已在远端过期或被取消，丢弃检查点后重新发起
+            self.log("  检查点中的分片上传已失效，重新开始上传")
+            self.journal.remove(key)
+            entry = self._start_multipart(key, fingerprint, meta)
+            uploaded_bytes = self._upload_parts(file_path, key, entry, total_parts)
+
+        parts = sorted(entry['parts'].items())
+        self.store.complete_multipart(key, entry['upload_id'], parts)
+        self.journal.remove(key)
+        return uploaded_bytes
+
+    def _start_multipart(self, key, fingerprint, meta):
+        entry = {'key': key, 'fingerprint': fingerprint,
+                 'upload_id': self.store.create_multipart(key, meta=meta), 'parts': {}}
+        self.journal.save(entry)
+        return entry
+
+    def _upload_parts(self, file_path, key, entry, total_parts):
+        uploaded_bytes = 0
+        first_error = None
+        pending = [n for n in range(1, total_parts + 1) if n not in entry['parts']]
+        with ThreadPoolExecutor(max_workers=self.part_workers) as executor:
+            futures = {
+                executor.submit(self._upload_part_with_retry, key, entry['upload_id'], file_path, n): n
+                for n in pending
+            }
+            # 某个分片失败时仍记录其余已完成的分片，续传时只补传失败的部分
+            for future in as_completed(futures):
+                try:
+                    etag, size = future.result()
+                except Exception as e:
+                    # 上传失效优先上报，由调用方重新发起上传
+                    if first_error is None or isinstance(e, UploadNotFoundError):
+                        first_error = e
+                    continue
+                uploaded_bytes += size
+                with self.journal.lock:
+                    entry['parts'][futures[future]] = etag
+                self.journal.save(entry)
+
+        if first_error:
+            raise first_error
+        return uploaded_bytes
+
+    def is_up_to_date(self, key, content_hash, file_size):
+        """
+        判断远端对象是否与本地文件内容一致
+        """
+        remote = self.store.head(key)
+        if not remote or remote['size'] != file_size:
+            return False
+        meta = remote.get('meta') or {}
+        return meta.get(CONTENT_HASH_META_KEY) == content_hash
+
+    def upload_file(self, file_path, key):
+        """
+        上传单个文件
+
+        Returns:
+            dict: {'success', 'key', 'skipped', 'bytes', 'seconds', 'throughput_mb_s', 'error'}
+        """
+        started = time.time()
+        result = {'success': False, 'key': key, 'file_path': file_path, 'skipped': False,
+                  'bytes': 0, 'seconds': 0.0, 'throughput_mb_s': 0.0, 'error': None}
+        try:
+            file_size = os.path.getsize(file_path)
+            content_hash = compute_file_sha256(file_path)
+
+            if self.is_up_to_date(key, content_hash, file_size):
+                self.log(f"⏭ 远端内容一致，跳过: {key}")
+                result.update(success=True, skipped=True)
+                return result
+
+            self.log(f"开始上传: {file_path} -> {key} ({file_size / 1024 / 1024:.2f} MB)")
+            if file_size <= self.part_size:
+                with open(file_path, 'rb') as f:
+                    self.store.put_object(key, f, meta={CONTENT_HASH_META_KEY: content_hash})
+                result['bytes'] = file_size
+            else:
+                result['bytes'] = self._upload_multipart(file_path, key, file_size, content_hash)
+
+            result['success'] = True
+        except Exception as e:
+            result['error'] = str(e)
+            self.log(f"❌ 上传失败: {key}: {e}")
+        finally:
+            result['seconds'] = time.time() - started
+            if result['seconds'] > 0:
+                result['throughput_mb_s'] = result['bytes'] / 1024 / 1024 / result['seconds']
+
+        if result['success']:
+            self.log(f"✓ 上传成功: {key} ({result['throughput_mb_s']:.2f} MB/s)")
+        return result
+
+    def upload_files(self, items):
+        """
+        并行上传多个文件
+
+        Args:
+            items (list): [(本地文件路径, 对象键), ...]
+
+        Returns:
+            dict: {'results': 按输入顺序的结果列表, 'bytes', 'seconds', 'throughput_mb_s'}
+        """
+        started = time.time()
+        results = [None] * len(items)
+        with ThreadPoolExecutor(max_workers=self.file_workers) as executor:
+            futures = {executor.submit(self.upload_file, path, key): i for i, (path, key) in enumerate(items)}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+
+        seconds = time.time() - started
+        total_bytes = sum(r['bytes'] for r in results)
+        return {
+            'results': results,
+            'bytes': total_bytes,
+            'seconds': seconds,
+            'throughput_mb_s': total_bytes / 1024 / 1024 / seconds if seconds > 0 else 0.0
+        }
@@ -9,6 +9,7 @@
 功能:
     遍历指定目录下的chapter文件夹，找到所有的chapter_xxx_complete_video.mp4文件
     并上传到TOS存储服务的指定路径
+    大文件使用分片并行上传，中断后重新运行会从检查点续传，远端内容一致的文件自动跳过
     
 配置说明:
     - TOS访问密钥从config.py的IMAGE_TWO_CONFIG中读取
@@ -23,43 +24,7 @@ import glob
 from pathlib import Path
 import tos
 from config.config import IMAGE_TWO_CONFIG
-
-
-def upload_video_to_tos(local_file_path, bucket_name, object_key, client):
-    """
-    上传单个视频文件到TOS
-    
-    Args:
-        local_file_path (str): 本地文件路径
-        bucket_name (str): TOS bucket名称
-        object_key (str): TOS对象键名
-        client: TOS客户端实例
-    
-    Returns:
-        bool: 上传是否成功
-    """
-    try:
-        print(f"开始上传: {local_file_path} -> tos://{bucket_name}/{object_key}")
-        
-        # 使用文件流方式上传
-        with open(local_file_path, 'rb') as f:
-            client.put_object(bucket_name, object_key, content=f)
-        
-        print(f"✓ 上传成功: {object_key}")
-        return True
-        
-    except tos.exceptions.TosClientError as e:
-        print(f"❌ 客户端错误: {e.message}, 原因: {e.cause}")
-        return False
-    except tos.exceptions.TosServerError as e:
-        print(f"❌ 服务端错误: {e.code}")
-        print(f"请求ID: {e.request_id}")
-        print(f"错误信息: {e.message}")
-        print(f"HTTP状态码: {e.status_code}")
-        return False
-    except Exception as e:
-        print(f"❌ 未知错误: {e}")
-        return False
+from tos_uploader import ParallelUploader, TosObjectStore, DEFAULT_PART_SIZE
 
 
 def find_complete_videos(data_dir):
@@ -103,6 +68,9 @@ def main():
     parser.add_argument('data_dir', help='数据目录路径（如 data/002）')
     parser.add_argument('--bucket', default='rm-tos-001', help='TOS bucket名称')
     parser.add_argument('--prefix', help='TOS路径前缀（如 data002），默认从data_dir推导')
+    parser.add_argument('--part-size', type=int, default=DEFAULT_PART_SIZE // 1024 // 1024, help='分片大小（MB）')
+    parser.add_argument('--part-workers', type=int, default=4, help='单个文件并行上传的分片数')
+    parser.add_argument('--file-workers', type=int, default=2, help='同时上传的文件数')
     
     args = parser.parse_args()
     
@@ -147,18 +115,21 @@ def main():
         
         print(f"\n找到 {len(video_files)} 个视频文件，开始上传...\n")
         
-        # 上传每个视频文件
-        success_count = 0
-        for video_file in video_files:
-            # 构建TOS对象键名
-            file_name = Path(video_file).name
-            object_key = f"{tos_prefix}/{file_name}"
-            
-            if upload_video_to_tos(video_file, args.bucket, object_key, client):
-                success_count += 1
-            print()  # 空行分隔
+        # 并行上传所有视频文件
+        items = [(video_file, f"{tos_prefix}/{Path(video_file).name}") for video_file in video_files]
+        uploader = ParallelUploader(
+            TosObjectStore(client, args.bucket),
+            part_size=args.part_size * 1024 * 1024,
+            part_workers=args.part_workers,
+            file_workers=args.file_workers
+        )
+        summary = uploader.upload_files(items)
         
-        print(f"上传完成: {success_count}/{len(video_files)} 个文件成功")
+        success_count = sum(1 for r in summary['results'] if r['success'])
+        skipped_count = sum(1 for r in summary['results'] if r['skipped'])
+        print(f"\n上传完成: {success_count}/{len(video_files)} 个文件成功（跳过 {skipped_count} 个）")
+        print(f"共上传 {summary['bytes'] / 1024 / 1024:.2f} MB，耗时 {summary['seconds']:.1f} 秒，"
+              f"吞吐量 {summary['throughput_mb_s']:.2f} MB/s")
         
         if success_count == len(video_files):
             print("✓ 所有文件上传成功！")
@@ -8,13 +8,20 @@
 使用方法:
 python validate_narration.py data/xxx
 python validate_narration.py data/xxx --auto-rewrite
+python validate_narration.py data/xxx --auto-fix --workers 8 --llm-concurrency 4
 """
 
 import os
 import sys
 import re
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
 from volcenginesdkarkruntime import Ark
+from pipeline_trace import traced
+from rate_limiter import rate_limited_call
 
 # 导入配置
 try:
@@ -52,7 +59,7 @@ def count_chinese_characters(text):
     chinese_chars = re.findall(r'[\u4e00-\u9fff\u3000-\u303f\uff00-\uffef]', text)
     return len(chinese_chars)
 
-def rewrite_narration_with_llm(client, original_text, max_retries=5):
+def rewrite_narration_with_llm(client, original_text, max_retries=5, log=print):
     """
     使用LLM改写解说内容，将字数精准控制在30-32字，支持重试直到满足标准
     如果所有重试都无法达到30-32字要求，选择字数最少的那次结果保存
@@ -61,12 +68,13 @@ def rewrite_narration_with_llm(client, original_text, max_retries=5):
         client: Ark客户端实例
         original_text (str): 原始解说内容
         max_retries (int): 最大重试次数，默认5次
+        log (callable): 输出消息的函数，默认print
         
     Returns:
         str: 改写后的解说内容，如果所有重试都失败则返回字数最少的结果
     """
     original_char_count = count_chinese_characters(original_text)
-    print(f"  原文字数: {original_char_count}字")
+    log(f"  原文字数: {original_char_count}字")
     
     # 记录所有尝试的结果
     attempts_results = []
@@ -94,7 +102,7 @@ def rewrite_narration_with_llm(client, original_text, max_retries=5):
 改写后："""
         
         try:
-            resp = client.chat.completions.create(
+            resp = rate_limited_call('ark_chat', client.chat.completions.create,
                 model="doubao-seed-1-6-flash-250715",
                 messages=[
                     {
@@ -108,7 +116,7 @@ def rewrite_narration_with_llm(client, original_text, max_retries=5):
             
             # 验证改写后的字数
             char_count = count_chinese_characters(rewritten_text)
-            print(f"  第{attempt+1}次尝试: {char_count}字 - {rewritten_text}")
+            log(f"  第{attempt+1}次尝试: {char_count}字 - {rewritten_text}")
             
             # 记录这次尝试的结果
             attempts_results.append({
@@ -118,13 +126,13 @@ def rewrite_narration_with_llm(client, original_text, max_retries=5):
             })
             
             if 30 <= char_count <= 32:
-                print(f"  改写成功: 满足30-32字要求")
+                log(f"  改写成功: 满足30-32字要求")
                 return rewritten_text
             else:
-                print(f"  字数不符合要求({char_count}字)，继续重试...")
+                log(f"  字数不符合要求({char_count}字)，继续重试...")
                 
         except Exception as e:
-            print(f"  第{attempt+1}次改写失败: {e}")
+            log(f"  第{attempt+1}次改写失败: {e}")
             
     # 如果所有重试都失败，选择最接近30-32字范围的结果
     if attempts_results:
@@ -138,12 +146,12 @@ def rewrite_narration_with_llm(client, original_text, max_retries=5):
                 return 0  # 在范围内，距离为0
         
         best_result = min(attempts_results, key=lambda x: distance_to_target(x['char_count']))
-        print(f"  所有{max_retries}次重试都未达到30-32字要求")
-        print(f"  选择最接近30-32字的第{best_result['attempt']}次结果: {best_result['char_count']}字")
-        print(f"  最终选择: {best_result['text']}")
+        log(f"  所有{max_retries}次重试都未达到30-32字要求")
+        log(f"  选择最接近30-32字的第{best_result['attempt']}次结果: {best_result['char_count']}字")
+        log(f"  最终选择: {best_result['text']}")
         return best_result['text']
     else:
-        print(f"  所有{max_retries}次重试都失败，保持原文")
+        log(f"  所有{max_retries}次重试都失败，保持原文")
         return original_text
 
 def extract_all_narration_content(content):
@@ -163,7 +171,7 @@ def extract_all_narration_content(content):
     # 清理并返回解说内容
     return [match.strip() for match in narration_matches if match.strip()]
 
-def rewrite_entire_narration_with_llm(client, all_narrations, max_retries=3):
+def rewrite_entire_narration_with_llm(client, all_narrations, max_retries=3, log=print):
     """
     使用LLM重写整个narration文件的解说内容，将总字数控制在1100-1300字之间
     
@@ -171,12 +179,13 @@ def rewrite_entire_narration_with_llm(client, all_narrations, max_retries=3):
         client: Ark客户端实例
         all_narrations (list): 所有解说内容的列表
         max_retries (int): 最大重试次数，默认3次
+        log (callable): 输出消息的函数，默认print
         
     Returns:
         list: 重写后的解说内容列表，如果失败则返回原列表
     """
     total_chars = sum(count_chinese_characters(narration) for narration in all_narrations)
-    print(f"  原总字数: {total_chars}字")
+    log(f"  原总字数: {total_chars}字")
     
     # 将所有解说内容合并为一个文本进行重写
     combined_text = "\n\n".join([f"解说{i+1}: {narration}" for i, narration in enumerate(all_narrations)])
@@ -204,7 +213,7 @@ def rewrite_entire_narration_with_llm(client, all_narrations, max_retries=3):
 重写后："""
         
         try:
-            resp = client.chat.completions.create(
+            resp = rate_limited_call('ark_chat', client.chat.completions.create,
                 model="doubao-seed-1-6-flash-250715",
                 messages=[
                     {
@@ -233,20 +242,20 @@ def rewrite_entire_narration_with_llm(client, all_narrations, max_retries=3):
             # 验证重写后的总字数
             if len(rewritten_narrations) == len(all_narrations):
                 total_chars = sum(count_chinese_characters(narration) for narration in rewritten_narrations)
-                print(f"  第{attempt+1}次尝试: {total_chars}字")
+                log(f"  第{attempt+1}次尝试: {total_chars}字")
                 
                 if 1100 <= total_chars <= 1300:
-                    print(f"  重写成功: 满足1100-1300字要求")
+                    log(f"  重写成功: 满足1100-1300字要求")
                     return rewritten_narrations
                 else:
-                    print(f"  字数不符合要求({total_chars}字)，需要在1100-1300字之间，继续重试...")
+                    log(f"  字数不符合要求({total_chars}字)，需要在1100-1300字之间，继续重试...")
             else:
-                print(f"  解说数量不匹配(原{len(all_narrations)}个，重写后{len(rewritten_narrations)}个)，继续重试...")
+                log(f"  解说数量不匹配(原{len(all_narrations)}个，重写后{len(rewritten_narrations)}个)，继续重试...")
                 
         except Exception as e:
-            print(f"  第{attempt+1}次重写失败: {e}")
+            log(f"  第{attempt+1}次重写失败: {e}")
             
-    print(f"  所有{max_retries}次重试都失败，保持原文")
+    log(f"  所有{max_retries}次重试都失败，保持原文")
     return all_narrations
 
 def extract_character_names(content):
@@ -675,7 +684,7 @@ def fix_scene_structure_with_llm(client, scene_content, scene_number, issue_info
 修复后的分镜内容:"""
 
         try:
-            resp = client.chat.completions.create(
+            resp = rate_limited_call('ark_chat', client.chat.completions.create,
                 model="doubao-seed-1-6-flash-250715",
                 messages=[
                     {
@@ -708,7 +717,7 @@ def fix_scene_structure_with_llm(client, scene_content, scene_number, issue_info
     
     return scene_content
 
-def clean_duplicate_tags(content):
+def clean_duplicate_tags(content, log=print):
     """
     清理重复的XML结束标签
     """
@@ -733,12 +742,12 @@ def clean_duplicate_tags(content):
         
         # 调试信息
         if iterations > 1:
-            print(f"  清理重复标签第{iterations}轮")
+            log(f"  清理重复标签第{iterations}轮")
     
     return content
 
 
-def fix_closeup_structure_with_llm(client, closeup_content, scene_number, closeup_number, max_retries=3):
+def fix_closeup_structure_with_llm(client, closeup_content, scene_number, closeup_number, max_retries=3, log=print):
     """
     使用LLM修复单个图片特写的结构问题
     
@@ -748,15 +757,16 @@ def fix_closeup_structure_with_llm(client, closeup_content, scene_number, closeu
         scene_number: 分镜编号
         closeup_number: 图片特写编号
         max_retries: 最大重试次数
+        log (callable): 输出消息的函数，默认print
     
     Returns:
         修复后的图片特写内容
     """
     if not client:
-        print(f"    警告: 未提供LLM客户端，跳过分镜{scene_number}图片特写{closeup_number}的修复")
+        log(f"    警告: 未提供LLM客户端，跳过分镜{scene_number}图片特写{closeup_number}的修复")
         return closeup_content
     
-    print(f"    使用LLM修复分镜{scene_number}图片特写{closeup_number}的结构问题...")
+    log(f"    使用LLM修复分镜{scene_number}图片特写{closeup_number}的结构问题...")
     
     prompt = f"""请修复以下图片特写的XML结构，确保包含所有必要的标签。
 
@@ -784,7 +794,7 @@ def fix_closeup_structure_with_llm(client, closeup_content, scene_number, closeu
 
     for attempt in range(max_retries):
         try:
-            resp = client.chat.completions.create(
+            resp = rate_limited_call('ark_chat', client.chat.completions.create,
                 model="doubao-seed-1-6-flash-250715",
                 messages=[
                     {
@@ -797,7 +807,7 @@ def fix_closeup_structure_with_llm(client, closeup_content, scene_number, closeu
             fixed_content = resp.choices[0].message.content.strip()
             
             # 后处理：清理重复的结束标签
-            fixed_content = clean_duplicate_tags(fixed_content)
+            fixed_content = clean_duplicate_tags(fixed_content, log=log)
             
             # 验证修复后的内容是否包含必要标签
             required_tags = [
@@ -816,39 +826,40 @@ def fix_closeup_structure_with_llm(client, closeup_content, scene_number, closeu
             missing_tags = [tag for tag in required_tags if tag not in fixed_content]
             
             if not missing_tags:
-                print(f"    分镜{scene_number}图片特写{closeup_number}修复成功")
+                log(f"    分镜{scene_number}图片特写{closeup_number}修复成功")
                 return fixed_content
             else:
-                print(f"    第{attempt+1}次尝试失败，缺少标签: {missing_tags}")
+                log(f"    第{attempt+1}次尝试失败，缺少标签: {missing_tags}")
                 
         except Exception as e:
-            print(f"    第{attempt+1}次LLM调用失败: {str(e)}")
+            log(f"    第{attempt+1}次LLM调用失败: {str(e)}")
     
-    print(f"    分镜{scene_number}图片特写{closeup_number}修复失败，返回原内容")
+    log(f"    分镜{scene_number}图片特写{closeup_number}修复失败，返回原内容")
     return closeup_content
 
 
-def fix_all_closeups_with_llm(content, client):
+def fix_all_closeups_with_llm(content, client, log=print):
     """
     逐个修复所有分镜中的图片特写结构问题
     
     Args:
         content: narration.txt的完整内容
         client: LLM客户端
+        log (callable): 输出消息的函数，默认print
     
     Returns:
         修复后的完整内容
     """
     if not client:
-        print("警告: 未提供LLM客户端，跳过图片特写修复")
+        log("警告: 未提供LLM客户端，跳过图片特写修复")
         return content
     
-    print("开始逐个修复所有图片特写的结构问题...")
+    log("开始逐个修复所有图片特写的结构问题...")
     
     # 首先检测所有XML结构问题
     issues = validate_xml_structure_integrity(content)
     if not issues:
-        print("未发现XML结构问题，无需修复")
+        log("未发现XML结构问题，无需修复")
         return content
     
     modified_content = content
@@ -863,14 +874,14 @@ def fix_all_closeups_with_llm(content, client):
     
     # 逐个分镜处理
     for scene_num in sorted(scene_issues.keys()):
-        print(f"\n处理分镜{scene_num}的问题...")
+        log(f"\n处理分镜{scene_num}的问题...")
         
         # 提取分镜内容
         scene_pattern = f'<分镜{scene_num}>(.*?)</分镜{scene_num}>'
         scene_match = re.search(scene_pattern, modified_content, re.DOTALL)
         
         if not scene_match:
-            print(f"  未找到分镜{scene_num}的内容，跳过")
+            log(f"  未找到分镜{scene_num}的内容，跳过")
             continue
         
         scene_content = scene_match.group(1)
@@ -895,11 +906,11 @@ def fix_all_closeups_with_llm(content, client):
             )
             
             if has_issues:
-                print(f"  修复图片特写{closeup_num}...")
+                log(f"  修复图片特写{closeup_num}...")
                 
                 # 使用LLM修复单个图片特写
                 fixed_closeup = fix_closeup_structure_with_llm(
-                    client, original_closeup, scene_num, closeup_num
+                    client, original_closeup, scene_num, closeup_num, log=log
                 )
                 
                 # 替换修复后的内容
@@ -911,15 +922,15 @@ def fix_all_closeups_with_llm(content, client):
                     modified_scene_content = modified_scene_content.replace(
                         original_closeup, fixed_closeup
                     )
-                    print(f"  图片特写{closeup_num}修复完成")
+                    log(f"  图片特写{closeup_num}修复完成")
                 else:
-                    print(f"  图片特写{closeup_num}修复失败")
+                    log(f"  图片特写{closeup_num}修复失败")
         
         # 替换整个分镜的内容
         modified_scene_full = f"<分镜{scene_num}>{modified_scene_content}</分镜{scene_num}>"
         modified_content = modified_content.replace(original_scene_full, modified_scene_full)
     
-    print("\n所有图片特写修复完成")
+    log("\n所有图片特写修复完成")
     return modified_content
 
 
@@ -956,7 +967,79 @@ def find_scene_closeups(content):
     
     return first_closeup, second_closeup
 
-def validate_narration_file(narration_file_path, client=None, auto_rewrite=False, auto_fix_characters=False, auto_fix_tags=False, auto_fix_structure=False):
+def should_ignore_character(char_name):
+    """
+    判断是否应该忽略某个角色名称（如通用角色名"角色x"等）
+    """
+    # 忽略"角色"开头后跟数字或字母的通用角色名
+    if re.match(r'^角色[a-zA-Z0-9]+$', char_name):
+        return True
+    # 忽略单个字母或数字的角色名
+    if re.match(r'^[a-zA-Z0-9]$', char_name):
+        return True
+    return False
+
+def find_invalid_closeup_characters(content):
+    """
+    查找特写人物中未在出镜人物列表定义的角色
+    
+    Args:
+        content (str): narration.txt文件的完整内容
+        
+    Returns:
+        list: 未定义的角色名称列表（可能包含重复项）
+    """
+    character_names = extract_character_names(content)
+    closeup_characters = extract_closeup_characters(content)
+    
+    invalid_characters = []
+    for closeup_char in closeup_characters:
+        if closeup_char not in character_names and not should_ignore_character(closeup_char):
+            invalid_characters.append(closeup_char)
+    return invalid_characters
+
+def find_incomplete_closeup_scenes(content):
+    """
+    查找包含不完整图片特写（缺少特写人物、解说内容或图片prompt）的分镜
+    
+    Args:
+        content (str): narration.txt文件的完整内容
+        
+    Returns:
+        list: 存在不完整图片特写的分镜编号列表
+    """
+    incomplete_scenes = []
+    for scene_match in re.finditer(r'<分镜(\d+)>(.*?)</分镜\1>', content, re.DOTALL):
+        scene_content = scene_match.group(2)
+        for closeup_match in re.finditer(r'<图片特写(\d+)>(.*?)</图片特写\1>', scene_content, re.DOTALL):
+            closeup_content = closeup_match.group(2)
+            has_character = '<特写人物>' in closeup_content and '</特写人物>' in closeup_content
+            has_narration = '<解说内容>' in closeup_content and '</解说内容>' in closeup_content
+            has_prompt = '<图片prompt>' in closeup_content and '</图片prompt>' in closeup_content
+            if not (has_character and has_narration and has_prompt):
+                incomplete_scenes.append(int(scene_match.group(1)))
+                break
+    return incomplete_scenes
+
+def write_text_atomic(file_path, content):
+    """
+    原子写入文本文件：先写入同目录临时文件，再用os.replace替换目标文件
+    
+    Args:
+        file_path (str): 目标文件路径
+        content (str): 要写入的内容
+    """
+    temp_path = f"{file_path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(temp_path, file_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+@traced('validate', path_arg='narration_file_path')
+def validate_narration_file(narration_file_path, client=None, auto_rewrite=False, auto_fix_characters=False, auto_fix_tags=False, auto_fix_structure=False, log=print):
     """
     验证单个narration.txt文件中分镜1的第一个和第二个图片特写的解说内容字数，以及总解说内容字数
     
@@ -966,6 +1049,7 @@ def validate_narration_file(narration_file_path, client=None, auto_rewrite=False
         auto_rewrite (bool): 是否自动改写超长内容
         auto_fix_characters (bool): 是否自动修复缺失的角色定义
         auto_fix_tags (bool): 是否自动修复XML标签闭合问题
+        log (callable): 输出消息的函数，默认print
         
     Returns:
         dict: 验证结果，包含特写序号、内容、字数和是否符合要求，以及总字数信息
@@ -999,36 +1083,18 @@ def validate_narration_file(narration_file_path, client=None, auto_rewrite=False
         
         # 如果启用自动修复标签且有修复
         if auto_fix_tags and has_tag_fixes:
-            print(f"  检测到标签闭合问题，正在自动修复...")
+            log(f"  检测到标签闭合问题，正在自动修复...")
             for error in tag_errors:
-                print(f"    {error}")
+                log(f"    {error}")
             updated_content = fixed_content
             content_updated = True
         elif tag_errors and not auto_fix_tags:
-            print(f"  检测到标签闭合问题（使用--auto-fix可自动修复）:")
+            log(f"  检测到标签闭合问题（使用--auto-fix可自动修复）:")
             for error in tag_errors:
-                print(f"    {error}")
+                log(f"    {error}")
             
         # 验证特写人物是否在出镜人物列表中
-        character_names = extract_character_names(updated_content)
-        closeup_characters = extract_closeup_characters(updated_content)
-        
-        def should_ignore_character(char_name):
-            """
-            判断是否应该忽略某个角色名称（如通用角色名"角色x"等）
-            """
-            # 忽略"角色"开头后跟数字或字母的通用角色名
-            if re.match(r'^角色[a-zA-Z0-9]+$', char_name):
-                return True
-            # 忽略单个字母或数字的角色名
-            if re.match(r'^[a-zA-Z0-9]$', char_name):
-                return True
-            return False
-        
-        invalid_characters = []
-        for closeup_char in closeup_characters:
-            if closeup_char not in character_names and not should_ignore_character(closeup_char):
-                invalid_characters.append(closeup_char)
+        invalid_characters = find_invalid_closeup_characters(updated_content)
         
         character_validation_valid = len(invalid_characters) == 0
         results['character_validation'] = {
@@ -1047,10 +1113,10 @@ def validate_narration_file(narration_file_path, client=None, auto_rewrite=False
         
         # 如果启用自动修复结构且存在结构问题
         if auto_fix_structure and not structure_validation_valid and client:
-            print(f"  检测到{len(structure_issues)}个XML结构问题，正在使用LLM逐个修复图片特写...")
+            log(f"  检测到{len(structure_issues)}个XML结构问题，正在使用LLM逐个修复图片特写...")
             
             # 使用新的修复函数修复所有图片特写
-            fixed_content = fix_all_closeups_with_llm(updated_content, client)
+            fixed_content = fix_all_closeups_with_llm(updated_content, client, log=log)
             
             if fixed_content and fixed_content != updated_content:
                 updated_content = fixed_content
@@ -1063,31 +1129,31 @@ def validate_narration_file(narration_file_path, client=None, auto_rewrite=False
                     'issues': new_structure_issues
                 }
                 if len(new_structure_issues) == 0:
-                    print(f"  XML结构修复完成")
+                    log(f"  XML结构修复完成")
                 else:
-                    print(f"  XML结构修复后仍存在{len(new_structure_issues)}个问题")
+                    log(f"  XML结构修复后仍存在{len(new_structure_issues)}个问题")
             else:
-                print(f"  XML结构修复失败或无需修复")
+                log(f"  XML结构修复失败或无需修复")
         elif len(structure_issues) > 0 and not auto_fix_structure:
-            print(f"  检测到{len(structure_issues)}个XML结构问题（使用--auto-fix-structure可自动修复）:")
+            log(f"  检测到{len(structure_issues)}个XML结构问题（使用--auto-fix-structure可自动修复）:")
             for issue in structure_issues:
-                print(f"    场景{issue['scene_number']}: {issue['issue_type']} - {issue['details']}")
+                log(f"    场景{issue['scene_number']}: {issue['issue_type']} - {issue['details']}")
         
         # 图片特写完整性检查和修复
         if auto_fix_structure and client:
-            print(f"  检查图片特写完整性...")
-            fixed_content, has_closeup_fixes = fix_incomplete_closeups_by_scene(client, updated_content)
+            log(f"  检查图片特写完整性...")
+            fixed_content, has_closeup_fixes = fix_incomplete_closeups_by_scene(client, updated_content, log=log)
             
             if has_closeup_fixes:
                 updated_content = fixed_content
                 content_updated = True
-                print(f"  图片特写完整性修复完成")
+                log(f"  图片特写完整性修复完成")
             else:
-                print(f"  所有图片特写都完整，无需修复")
+                log(f"  所有图片特写都完整，无需修复")
         
         # 如果启用自动修复角色且存在缺失角色
         if auto_fix_characters and invalid_characters:
-            print(f"  检测到缺失角色: {invalid_characters}，正在自动添加...")
+            log(f"  检测到缺失角色: {invalid_characters}，正在自动添加...")
             
             # 找到出镜人物列表的结束位置
             end_pattern = r'</出镜人物>'
@@ -1134,7 +1200,7 @@ def validate_narration_file(narration_file_path, client=None, auto_rewrite=False
                 results['character_validation']['invalid_characters'] = []
                 results['character_validation']['missing_characters'] = []
                 
-                print(f"  已成功添加缺失角色: {list(set(invalid_characters))}")
+                log(f"  已成功添加缺失角色: {list(set(invalid_characters))}")
         
         # 查找分镜1的第一个和第二个图片特写
         first_closeup, second_closeup = find_scene_closeups(content)
@@ -1149,8 +1215,8 @@ def validate_narration_file(narration_file_path, client=None, auto_rewrite=False
             
             # 如果不符合要求且启用自动改写
             if not is_valid and auto_rewrite and client:
-                print(f"  第一个特写字数不符合要求({char_count}字)，正在改写...")
-                rewritten_text = rewrite_narration_with_llm(client, first_closeup)
+                log(f"  第一个特写字数不符合要求({char_count}字)，正在改写...")
+                rewritten_text = rewrite_narration_with_llm(client, first_closeup, log=log)
                 if rewritten_text != first_closeup:
                     rewritten = True
                     # 更新文件内容
@@ -1177,8 +1243,8 @@ def validate_narration_file(narration_file_path, client=None, auto_rewrite=False
             
             # 如果不符合要求且启用自动改写
             if not is_valid and auto_rewrite and client:
-                print(f"  第二个特写字数不符合要求({char_count}字)，正在改写...")
-                rewritten_text = rewrite_narration_with_llm(client, second_closeup)
+                log(f"  第二个特写字数不符合要求({char_count}字)，正在改写...")
+                rewritten_text = rewrite_narration_with_llm(client, second_closeup, log=log)
                 if rewritten_text != second_closeup:
                     rewritten = True
                     # 更新文件内容
@@ -1203,8 +1269,8 @@ def validate_narration_file(narration_file_path, client=None, auto_rewrite=False
         
         # 如果总字数不符合要求且启用自动改写
         if not total_valid and auto_rewrite and client:
-            print(f"  总解说内容字数不符合要求({total_char_count}字)，需要在1100-1300字之间，正在重写...")
-            rewritten_narrations = rewrite_entire_narration_with_llm(client, all_narrations)
+            log(f"  总解说内容字数不符合要求({total_char_count}字)，需要在1100-1300字之间，正在重写...")
+            rewritten_narrations = rewrite_entire_narration_with_llm(client, all_narrations, log=log)
             
             if rewritten_narrations != all_narrations:
                 total_rewritten = True
@@ -1225,16 +1291,15 @@ def validate_narration_file(narration_file_path, client=None, auto_rewrite=False
             'rewritten': total_rewritten
         }
         
-        # 如果内容有更新，写回文件
+        # 如果内容有更新，写回文件（先写临时文件再原子替换，中途失败不会留下半成品）
         if content_updated:
-            with open(narration_file_path, 'w', encoding='utf-8') as f:
-                f.write(updated_content)
-            print(f"  文件已更新: {narration_file_path}")
+            write_text_atomic(narration_file_path, updated_content)
+            log(f"  文件已更新: {narration_file_path}")
                 
     except FileNotFoundError:
-        print(f"警告: 文件不存在 {narration_file_path}")
+        log(f"警告: 文件不存在 {narration_file_path}")
     except Exception as e:
-        print(f"错误: 读取文件 {narration_file_path} 时出错: {e}")
+        log(f"错误: 读取文件 {narration_file_path} 时出错: {e}")
     
     return results
 
@@ -1499,7 +1564,212 @@ def split_narration_by_closeups(narration_file_path, output_dir=None):
     return split_results
 
 
-def validate_data_directory(data_dir, auto_rewrite=False, auto_fix_characters=False, auto_fix_tags=False, auto_fix_structure=False):
+# 本地校验问题类型 -> (是否需要LLM修复, 对应的自动修复开关)
+LOCAL_ISSUE_TYPES = {
+    'tag': (False, 'auto_fix_tags'),
+    'character': (False, 'auto_fix_characters'),
+    'structure': (True, 'auto_fix_structure'),
+    'incomplete_closeup': (True, 'auto_fix_structure'),
+    'first_closeup_length': (True, 'auto_rewrite'),
+    'second_closeup_length': (True, 'auto_rewrite'),
+    'total_length': (True, 'auto_rewrite'),
+}
+
+def _build_closeup_result(text):
+    """
+    根据特写解说内容构建与validate_narration_file一致的结果字典
+    """
+    if not text:
+        return {'content': '', 'char_count': 0, 'valid': False, 'exists': False, 'rewritten': False}
+    char_count = count_chinese_characters(text)
+    return {
+        'content': text,
+        'char_count': char_count,
+        'valid': 30 <= char_count <= 32,
+        'exists': True,
+        'rewritten': False
+    }
+
+def collect_local_issues(narration_file_path):
+    """
+    对单个narration.txt执行纯本地校验（不调用LLM、不写文件），可在进程池中并行执行
+    
+    Args:
+        narration_file_path (str): narration.txt文件路径
+        
+    Returns:
+        dict: 包含chapter、file_path、content_hash、results（与validate_narration_file结构一致）
+              以及issues（结构化问题列表）
+    """
+    chapter_name = Path(narration_file_path).parent.name
+    scan = {
+        'chapter': chapter_name,
+        'file_path': narration_file_path,
+        'content_hash': None,
+        'results': None,
+        'issues': [],
+        'error': None
+    }
+    
+    try:
+        with open(narration_file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except Exception as e:
+        scan['error'] = str(e)
+        return scan
+    
+    scan['content_hash'] = hashlib.sha256(content.encode('utf-8')).hexdigest()
+    issues = scan['issues']
+    
+    _, has_tag_fixes, tag_errors = validate_and_fix_xml_tags(content)
+    if tag_errors:
+        issues.append({'type': 'tag', 'detail': tag_errors})
+    
+    invalid_characters = list(set(find_invalid_closeup_characters(content)))
+    if invalid_characters:
+        issues.append({'type': 'character', 'detail': invalid_characters})
+    
+    structure_issues = validate_xml_structure_integrity(content)
+    if structure_issues:
+        issues.append({'type': 'structure', 'detail': structure_issues})
+    
+    incomplete_scenes = find_incomplete_closeup_scenes(content)
+    if incomplete_scenes:
+        issues.append({'type': 'incomplete_closeup', 'detail': incomplete_scenes})
+    
+    first_closeup, second_closeup = find_scene_closeups(content)
+    first_result = _build_closeup_result(first_closeup)
+    second_result = _build_closeup_result(second_closeup)
+    if first_result['exists'] and not first_result['valid']:
+        issues.append({'type': 'first_closeup_length', 'detail': first_result['char_count']})
+    if second_result['exists'] and not second_result['valid']:
+        issues.append({'type': 'second_closeup_length', 'detail': second_result['char_count']})
+    
+    total_char_count = sum(count_chinese_characters(n) for n in extract_all_narration_content(content))
+    total_valid = 1100 <= total_char_count <= 1300
+    if not total_valid:
+        issues.append({'type': 'total_length', 'detail': total_char_count})
+    
+    for issue in issues:
+        issue['chapter'] = chapter_name
+        issue['needs_llm'] = LOCAL_ISSUE_TYPES[issue['type']][0]
+    
+    scan['results'] = {
+        'file_path': narration_file_path,
+        'first_closeup': first_result,
+        'second_closeup': second_result,
+        'total_narration': {'total_char_count': total_char_count, 'valid': total_valid, 'rewritten': False},
+        'character_validation': {
+            'valid': not invalid_characters,
+            'invalid_characters': invalid_characters,
+            'missing_characters': invalid_characters
+        },
+        'tag_validation': {'valid': not tag_errors, 'errors': tag_errors, 'fixed': False},
+        'structure_validation': {'valid': not structure_issues, 'issues': structure_issues}
+    }
+    return scan
+
+def _scan_chapters_locally(narration_files, max_workers, progress_callback=None):
+    """
+    并行执行本地校验；在守护进程（如Celery prefork worker）中无法创建子进程时退化为顺序执行
+    """
+    scans = {}
+    total = len(narration_files)
+    
+    def report(scan):
+        if progress_callback:
+            progress_callback('local', len(scans), total, scan['chapter'])
+    
+    use_process_pool = max_workers > 1 and total > 1 and not multiprocessing.current_process().daemon
+    if use_process_pool:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(collect_local_issues, f): f for f in narration_files}
+            for future in as_completed(futures):
+                scan = future.result()
+                scans[futures[future]] = scan
+                report(scan)
+    else:
+        for narration_file in narration_files:
+            scan = collect_local_issues(narration_file)
+            scans[narration_file] = scan
+            report(scan)
+    
+    return [scans[f] for f in narration_files]
+
+def run_validation_engine(narration_files, client=None, auto_rewrite=False, auto_fix_characters=False,
+                          auto_fix_tags=False, auto_fix_structure=False, local_workers=None,
+                          llm_concurrency=4, progress_callback=None, log=print):
+    """
+    两阶段校验引擎：
+    1. 在进程池中对所有章节执行本地校验，生成结构化问题列表
+    2. 仅对存在可修复问题的文件，以有限并发调用validate_narration_file执行修复，
+       每个文件的修复在内存中完成后一次性原子写回
+    
+    Args:
+        narration_files (list): narration.txt文件路径列表
+        client: Ark客户端实例，LLM修复时使用
+        auto_rewrite/auto_fix_characters/auto_fix_tags/auto_fix_structure (bool): 各类自动修复开关
+        local_workers (int): 本地校验进程数，默认为CPU核数
+        llm_concurrency (int): LLM修复的最大并发文件数
+        progress_callback (callable): 进度回调 progress_callback(stage, done, total, chapter)，
+                                      stage为'local'或'repair'
+        log (callable): 输出校验消息的函数，默认print
+        
+    Returns:
+        list: 每个章节的结果字典，包含chapter、file_path、issues、repaired和results
+    """
+    if local_workers is None:
+        local_workers = os.cpu_count() or 1
+    
+    flags = {
+        'auto_rewrite': auto_rewrite,
+        'auto_fix_characters': auto_fix_characters,
+        'auto_fix_tags': auto_fix_tags,
+        'auto_fix_structure': auto_fix_structure,
+    }
+    
+    scans = _scan_chapters_locally(narration_files, local_workers, progress_callback)
+    
+    def is_fixable(issue):
+        needs_llm, flag_name = LOCAL_ISSUE_TYPES[issue['type']]
+        return flags[flag_name] and (client is not None or not needs_llm)
+    
+    repair_targets = [scan for scan in scans if scan['results'] and any(is_fixable(i) for i in scan['issues'])]
+    for scan in scans:
+        scan['repaired'] = False
+    
+    def repair(scan):
+        try:
+            # 本地校验后文件被其他进程改动时，放弃基于旧内容的修复，避免覆盖他人的修改
+            with open(scan['file_path'], 'r', encoding='utf-8') as f:
+                current_hash = hashlib.sha256(f.read().encode('utf-8')).hexdigest()
+            if current_hash != scan['content_hash']:
+                log(f"  {scan['chapter']}: 文件在校验期间被修改，跳过修复")
+                return scan
+            
+            log(f"\n修复章节: {scan['chapter']}")
+            scan['results'] = validate_narration_file(scan['file_path'], client, auto_rewrite,
+                                                      auto_fix_characters, auto_fix_tags, auto_fix_structure,
+                                                      log=log)
+            scan['repaired'] = True
+        except Exception as e:
+            log(f"  {scan['chapter']}: 修复失败: {e}")
+        return scan
+    
+    if repair_targets:
+        done = 0
+        with ThreadPoolExecutor(max_workers=max(1, llm_concurrency)) as executor:
+            futures = [executor.submit(repair, scan) for scan in repair_targets]
+            for future in as_completed(futures):
+                scan = future.result()
+                done += 1
+                if progress_callback:
+                    progress_callback('repair', done, len(repair_targets), scan['chapter'])
+    
+    return scans
+
+def validate_data_directory(data_dir, auto_rewrite=False, auto_fix_characters=False, auto_fix_tags=False, auto_fix_structure=False,
+                            local_workers=None, llm_concurrency=4, progress_callback=None, log=print):
     """
     验证数据目录下所有章节的narration.txt文件
     
@@ -1509,15 +1779,22 @@ def validate_data_directory(data_dir, auto_rewrite=False, auto_fix_characters=Fa
         auto_fix_characters (bool): 是否自动修复缺失的角色定义
         auto_fix_tags (bool): 是否自动修复XML标签闭合问题
         auto_fix_structure (bool): 是否自动修复XML结构问题
+        local_workers (int): 本地校验进程数，默认为CPU核数
+        llm_concurrency (int): LLM修复的最大并发文件数
+        progress_callback (callable): 进度回调，参见run_validation_engine
+        log (callable): 输出校验消息，参见run_validation_engine
+        
+    Returns:
+        dict: 校验汇总，包含total_chapters、valid_chapters、issues和chapters（逐章节结果）
     """
     data_path = Path(data_dir)
     
     if not data_path.exists():
-        print(f"错误: 数据目录不存在 {data_dir}")
+        log(f"错误: 数据目录不存在 {data_dir}")
         return
     
     if not data_path.is_dir():
-        print(f"错误: {data_dir} 不是一个目录")
+        log(f"错误: {data_dir} 不是一个目录")
         return
     
     # 查找所有chapter目录
@@ -1525,7 +1802,7 @@ def validate_data_directory(data_dir, auto_rewrite=False, auto_fix_characters=Fa
     chapter_dirs.sort()
     
     if not chapter_dirs:
-        print(f"警告: 在 {data_dir} 中没有找到任何chapter目录")
+        log(f"警告: 在 {data_dir} 中没有找到任何chapter目录")
         return
     
     # 初始化LLM客户端（如果启用自动改写）
@@ -1533,34 +1810,47 @@ def validate_data_directory(data_dir, auto_rewrite=False, auto_fix_characters=Fa
     if auto_rewrite:
         try:
             client = Ark(api_key=ARK_CONFIG['api_key'])
-            print(f"已启用自动改写功能，将调用模型API改写超长内容")
+            log(f"已启用自动改写功能，将调用模型API改写超长内容")
         except Exception as e:
-            print(f"警告: 无法初始化LLM客户端: {e}")
-            print("将继续验证但不进行自动改写")
+            log(f"警告: 无法初始化LLM客户端: {e}")
+            log("将继续验证但不进行自动改写")
             auto_rewrite = False
     
-    print(f"开始验证 {data_dir} 目录下的解说内容字数...")
+    log(f"开始验证 {data_dir} 目录下的解说内容字数...")
     if auto_rewrite:
-        print("自动改写模式: 启用")
-    print("=" * 80)
+        log("自动改写模式: 启用")
+    log("=" * 80)
     
     total_chapters = 0
     valid_chapters = 0
     issues_found = []
     rewritten_count = 0
     
+    narration_files = []
     for chapter_dir in chapter_dirs:
         narration_file = chapter_dir / 'narration.txt'
-        
         if not narration_file.exists():
-            print(f"警告: {chapter_dir.name} 中没有找到 narration.txt 文件")
+            log(f"警告: {chapter_dir.name} 中没有找到 narration.txt 文件")
+            continue
+        narration_files.append(str(narration_file))
+    
+    scans = run_validation_engine(narration_files, client, auto_rewrite, auto_fix_characters, auto_fix_tags,
+                                  auto_fix_structure, local_workers=local_workers,
+                                  llm_concurrency=llm_concurrency, progress_callback=progress_callback, log=log)
+    
+    for scan in scans:
+        narration_file = scan['file_path']
+        chapter_dir = Path(narration_file).parent
+        results = scan['results']
+        
+        if results is None:
+            log(f"错误: 读取文件 {narration_file} 时出错: {scan['error']}")
             continue
         
         total_chapters += 1
-        results = validate_narration_file(str(narration_file), client, auto_rewrite, auto_fix_characters, auto_fix_tags, auto_fix_structure)
         
-        print(f"\n章节: {chapter_dir.name}")
-        print(f"文件: {narration_file}")
+        log(f"\n章节: {chapter_dir.name}")
+        log(f"文件: {narration_file}")
         
         chapter_valid = True
         
@@ -1569,14 +1859,14 @@ def validate_data_directory(data_dir, auto_rewrite=False, auto_fix_characters=Fa
         if first_closeup['exists']:
             status = "✓" if first_closeup['valid'] else "✗"
             rewrite_info = " (已改写)" if first_closeup['rewritten'] else ""
-            print(f"第一个特写: {status} {first_closeup['char_count']}字{rewrite_info} - {first_closeup['content'][:50]}{'...' if len(first_closeup['content']) > 50 else ''}")
+            log(f"第一个特写: {status} {first_closeup['char_count']}字{rewrite_info} - {first_closeup['content'][:50]}{'...' if len(first_closeup['content']) > 50 else ''}")
             if first_closeup['rewritten']:
                 rewritten_count += 1
             if not first_closeup['valid']:
                 chapter_valid = False
                 issues_found.append(f"{chapter_dir.name} 第一个特写: {first_closeup['char_count']}字")
         else:
-            print("第一个特写: ✗ 未找到解说内容")
+            log("第一个特写: ✗ 未找到解说内容")
             chapter_valid = False
             issues_found.append(f"{chapter_dir.name} 第一个特写: 未找到解说内容")
         
@@ -1585,14 +1875,14 @@ def validate_data_directory(data_dir, auto_rewrite=False, auto_fix_characters=Fa
         if second_closeup['exists']:
             status = "✓" if second_closeup['valid'] else "✗"
             rewrite_info = " (已改写)" if second_closeup['rewritten'] else ""
-            print(f"第二个特写: {status} {second_closeup['char_count']}字{rewrite_info} - {second_closeup['content'][:50]}{'...' if len(second_closeup['content']) > 50 else ''}")
+            log(f"第二个特写: {status} {second_closeup['char_count']}字{rewrite_info} - {second_closeup['content'][:50]}{'...' if len(second_closeup['content']) > 50 else ''}")
             if second_closeup['rewritten']:
                 rewritten_count += 1
             if not second_closeup['valid']:
                 chapter_valid = False
                 issues_found.append(f"{chapter_dir.name} 第二个特写: {second_closeup['char_count']}字")
         else:
-            print("第二个特写: ✗ 未找到解说内容")
+            log("第二个特写: ✗ 未找到解说内容")
             chapter_valid = False
             issues_found.append(f"{chapter_dir.name} 第二个特写: 未找到解说内容")
         
@@ -1600,7 +1890,7 @@ def validate_data_directory(data_dir, auto_rewrite=False, auto_fix_characters=Fa
         total_narration = results['total_narration']
         total_status = "✓" if total_narration['valid'] else "✗"
         total_rewrite_info = " (已重写)" if total_narration['rewritten'] else ""
-        print(f"总解说字数: {total_status} {total_narration['total_char_count']}字{total_rewrite_info} (要求: 1100-1300字)")
+        log(f"总解说字数: {total_status} {total_narration['total_char_count']}字{total_rewrite_info} (要求: 1100-1300字)")
         if total_narration['rewritten']:
             rewritten_count += 1
         if not total_narration['valid']:
@@ -1610,74 +1900,72 @@ def validate_data_directory(data_dir, auto_rewrite=False, auto_fix_characters=Fa
         # 检查特写人物验证
         character_validation = results['character_validation']
         char_status = "✓" if character_validation['valid'] else "✗"
-        print(f"特写人物验证: {char_status}", end="")
         if not character_validation['valid']:
             invalid_chars = character_validation['invalid_characters']
-            print(f" (未在出镜人物中定义: {', '.join(invalid_chars)})")
+            log(f"特写人物验证: {char_status} (未在出镜人物中定义: {', '.join(invalid_chars)})")
             chapter_valid = False
             issues_found.append(f"{chapter_dir.name} 特写人物验证: 未定义角色 {', '.join(invalid_chars)}")
         else:
-            print(" (所有特写人物均已在出镜人物中定义)")
+            log(f"特写人物验证: {char_status} (所有特写人物均已在出镜人物中定义)")
         
         # 检查XML标签验证
         tag_validation = results['tag_validation']
         tag_status = "✓" if tag_validation['valid'] else "✗"
-        print(f"XML标签验证: {tag_status}", end="")
         if not tag_validation['valid']:
-            print(f" (发现{len(tag_validation['errors'])}个标签问题)")
+            log(f"XML标签验证: {tag_status} (发现{len(tag_validation['errors'])}个标签问题)")
             if not tag_validation['fixed']:
                 chapter_valid = False
                 issues_found.append(f"{chapter_dir.name} XML标签验证: {len(tag_validation['errors'])}个标签问题")
         elif tag_validation['fixed']:
-            print(" (已自动修复标签问题)")
+            log(f"XML标签验证: {tag_status} (已自动修复标签问题)")
         else:
-            print(" (所有XML标签正确闭合)")
+            log(f"XML标签验证: {tag_status} (所有XML标签正确闭合)")
         
         # 检查XML结构验证
         if 'structure_validation' in results:
             structure_validation = results['structure_validation']
             structure_status = "✓" if structure_validation['valid'] else "✗"
-            print(f"XML结构验证: {structure_status}", end="")
             if not structure_validation['valid']:
                 issue_count = len(structure_validation['issues'])
-                print(f" (发现{issue_count}个结构问题)")
+                log(f"XML结构验证: {structure_status} (发现{issue_count}个结构问题)")
                 if not auto_fix_structure:
                     chapter_valid = False
                     issues_found.append(f"{chapter_dir.name} XML结构验证: {issue_count}个结构问题")
             else:
-                print(" (XML结构完整正确)")
+                log(f"XML结构验证: {structure_status} (XML结构完整正确)")
         
         if chapter_valid:
             valid_chapters += 1
+        scan['valid'] = chapter_valid
     
     # 输出总结
-    print("\n" + "=" * 80)
-    print(f"验证完成!")
-    print(f"总章节数: {total_chapters}")
-    print(f"符合要求的章节: {valid_chapters}")
-    print(f"存在问题的章节: {total_chapters - valid_chapters}")
+    log("\n" + "=" * 80)
+    log(f"验证完成!")
+    log(f"总章节数: {total_chapters}")
+    log(f"符合要求的章节: {valid_chapters}")
+    log(f"存在问题的章节: {total_chapters - valid_chapters}")
     if auto_rewrite:
-        print(f"已改写的特写数量: {rewritten_count}")
+        log(f"已改写的特写数量: {rewritten_count}")
     
     if issues_found:
-        print("\n发现的问题:")
+        log("\n发现的问题:")
         for issue in issues_found:
-            print(f"  - {issue}")
+            log(f"  - {issue}")
         if auto_rewrite:
-            print("\n建议: ")
-            print("  - 分镜1的第一个和第二个特写解说字数应精准控制在30-32字之间")
-            print("  - 总解说内容字数应控制在1100-1300字之间")
+            log("\n建议: ")
+            log("  - 分镜1的第一个和第二个特写解说字数应精准控制在30-32字之间")
+            log("  - 总解说内容字数应控制在1100-1300字之间")
         else:
-            print("\n建议: ")
-            print("  - 分镜1的第一个和第二个特写解说字数应精准控制在30-32字之间")
-            print("  - 总解说内容字数应控制在1100-1300字之间")
-            print("提示: 使用 --auto-rewrite 参数可自动改写不符合要求的内容")
+            log("\n建议: ")
+            log("  - 分镜1的第一个和第二个特写解说字数应精准控制在30-32字之间")
+            log("  - 总解说内容字数应控制在1100-1300字之间")
+            log("提示: 使用 --auto-rewrite 参数可自动改写不符合要求的内容")
     else:
-        print("\n所有章节的解说内容字数都符合要求！")
+        log("\n所有章节的解说内容字数都符合要求！")
     
     # 执行人物特写拆分
-    print("\n" + "=" * 80)
-    print("开始按人物特写拆分narration.txt文件...")
+    log("\n" + "=" * 80)
+    log("开始按人物特写拆分narration.txt文件...")
     
     split_summary = {
         "total_chapters_processed": 0,
@@ -1692,7 +1980,7 @@ def validate_data_directory(data_dir, auto_rewrite=False, auto_fix_characters=Fa
         if not narration_file.exists():
             continue
         
-        print(f"\n处理章节: {chapter_dir.name}")
+        log(f"\n处理章节: {chapter_dir.name}")
         split_results = split_narration_by_closeups(str(narration_file))
         
         if split_results["success"]:
@@ -1700,29 +1988,36 @@ def validate_data_directory(data_dir, auto_rewrite=False, auto_fix_characters=Fa
             split_summary["total_files_created"] += len(split_results["files_created"])
             split_summary["total_closeups"] += split_results["total_closeups"]
             
-            print(f"  ✓ 成功拆分 {split_results['total_closeups']} 个人物特写")
-            print(f"  ✓ 发现 {split_results['character_descriptions_found']} 个人物描述")
-            print(f"  ✓ 创建文件: {', '.join(split_results['files_created'])}")
+            log(f"  ✓ 成功拆分 {split_results['total_closeups']} 个人物特写")
+            log(f"  ✓ 发现 {split_results['character_descriptions_found']} 个人物描述")
+            log(f"  ✓ 创建文件: {', '.join(split_results['files_created'])}")
         else:
             split_summary["chapters_with_errors"].append({
                 "chapter": chapter_dir.name,
                 "error": split_results.get("error", "未知错误")
             })
-            print(f"  ✗ 拆分失败: {split_results.get('error', '未知错误')}")
+            log(f"  ✗ 拆分失败: {split_results.get('error', '未知错误')}")
     
     # 输出拆分总结
-    print("\n" + "=" * 80)
-    print("拆分完成!")
-    print(f"处理章节数: {split_summary['total_chapters_processed']}")
-    print(f"创建文件数: {split_summary['total_files_created']}")
-    print(f"总特写数量: {split_summary['total_closeups']}")
+    log("\n" + "=" * 80)
+    log("拆分完成!")
+    log(f"处理章节数: {split_summary['total_chapters_processed']}")
+    log(f"创建文件数: {split_summary['total_files_created']}")
+    log(f"总特写数量: {split_summary['total_closeups']}")
     
     if split_summary["chapters_with_errors"]:
-        print(f"拆分失败章节: {len(split_summary['chapters_with_errors'])}")
+        log(f"拆分失败章节: {len(split_summary['chapters_with_errors'])}")
         for error_info in split_summary["chapters_with_errors"]:
-            print(f"  - {error_info['chapter']}: {error_info['error']}")
+            log(f"  - {error_info['chapter']}: {error_info['error']}")
     else:
-        print("所有章节都成功完成拆分！")
+        log("所有章节都成功完成拆分！")
+    
+    return {
+        'total_chapters': total_chapters,
+        'valid_chapters': valid_chapters,
+        'issues': issues_found,
+        'chapters': scans
+    }
 
 def main():
     """
@@ -1743,6 +2038,10 @@ def main():
                        help='启用自动修复XML标签功能（已合并到--auto-fix中，保留用于兼容性）')
     parser.add_argument('--auto-fix-structure', action='store_true',
                        help='启用自动修复XML结构功能（已合并到--auto-fix中，保留用于兼容性）')
+    parser.add_argument('--workers', type=int, default=None,
+                       help='本地校验进程数（默认: CPU核数）')
+    parser.add_argument('--llm-concurrency', type=int, default=4,
+                       help='LLM修复的最大并发文件数（默认: 4）')
     
     # 兼容旧的命令行格式
     if len(sys.argv) == 2 and not sys.argv[1].startswith('-'):
@@ -1752,11 +2051,15 @@ def main():
         auto_fix_characters = True  # 默认启用
         auto_fix_tags = True  # 默认启用
         auto_fix_structure = True  # 默认启用
+        local_workers = None
+        llm_concurrency = 4
         print("提示: 已默认启用自动修复功能（包括改写、角色修复、标签修复、结构修复）")
     else:
         # 新格式: python validate_narration.py data/xxx --auto-fix
         args = parser.parse_args()
         data_dir = args.data_dir
+        local_workers = args.workers
+        llm_concurrency = args.llm_concurrency
         
         # 如果使用了新的--auto-fix参数，或者使用了旧的参数，都启用相应功能
         auto_rewrite = args.auto_fix or args.auto_rewrite
@@ -1769,15 +2072,17 @@ def main():
             print("提示: --auto-rewrite、--auto-fix-characters、--auto-fix-tags 和 --auto-fix-structure 参数已合并为 --auto-fix")
             print("建议使用: python validate_narration.py data/xxx --auto-fix")
     
-    validate_data_directory(data_dir, auto_rewrite, auto_fix_characters, auto_fix_tags, auto_fix_structure)
+    validate_data_directory(data_dir, auto_rewrite, auto_fix_characters, auto_fix_tags, auto_fix_structure,
+                            local_workers=local_workers, llm_concurrency=llm_concurrency)
 
-def fix_incomplete_closeups_by_scene(client, content):
+def fix_incomplete_closeups_by_scene(client, content, log=print):
     """
     按分镜修复不完整的图片特写，使用LLM根据模板补全缺失的标签
     
     Args:
         client: Ark客户端实例
         content (str): narration.txt文件的完整内容
+        log (callable): 输出消息的函数，默认print
         
     Returns:
         tuple: (修复后的内容, 是否有修复)
@@ -1804,7 +2109,7 @@ def fix_incomplete_closeups_by_scene(client, content):
         scene_end_tag = scene_match.group(3)
         scene_number = re.search(r'分镜(\d+)', scene_start_tag).group(1)
         
-        print(f"检查{scene_start_tag}...")
+        log(f"检查{scene_start_tag}...")
         
         # 检查这个分镜中的图片特写是否完整
         closeup_pattern = r'<图片特写(\d+)>(.*?)</图片特写\1>'
@@ -1821,13 +2126,13 @@ def fix_incomplete_closeups_by_scene(client, content):
             has_prompt = '<图片prompt>' in closeup_content and '</图片prompt>' in closeup_content
             
             if not (has_character and has_narration and has_prompt):
-                print(f"  发现<图片特写{closeup_number}>不完整: 特写人物={has_character}, 解说内容={has_narration}, 图片prompt={has_prompt}")
+                log(f"  发现<图片特写{closeup_number}>不完整: 特写人物={has_character}, 解说内容={has_narration}, 图片prompt={has_prompt}")
                 scene_needs_fix = True
                 break
         
         # 如果分镜需要修复，使用LLM修复整个分镜
         if scene_needs_fix:
-            print(f"  使用LLM修复{scene_start_tag}...")
+            log(f"  使用LLM修复{scene_start_tag}...")
             
             prompt = f"""请修复以下分镜内容，确保每个<图片特写X>都包含完整的三个标签：<特写人物>、<解说内容>、<图片prompt>
 
@@ -1849,7 +2154,7 @@ def fix_incomplete_closeups_by_scene(client, content):
 修复后："""
             
             try:
-                resp = client.chat.completions.create(
+                resp = rate_limited_call('ark_chat', client.chat.completions.create,
                     model="doubao-seed-1-6-flash-250715",
                     messages=[
                         {
@@ -1865,10 +2170,10 @@ def fix_incomplete_closeups_by_scene(client, content):
                 original_scene = scene_match.group(0)
                 fixed_content = fixed_content.replace(original_scene, fixed_scene)
                 has_fixes = True
-                print(f"  {scene_start_tag}修复完成")
+                log(f"  {scene_start_tag}修复完成")
                 
             except Exception as e:
-                print(f"  {scene_start_tag}修复失败: {e}")
+                log(f"  {scene_start_tag}修复失败: {e}")
     
     return fixed_content, has_fixes
 
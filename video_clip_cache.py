@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图生视频片段缓存与并发提交
+
+功能:
+    - 按 图片内容SHA-256 + 视频提示词 + 时长 + 模型 计算片段key，已生成过的片段直接复制到输出路径，
+      不再调用图生视频接口（最贵的一类调用）
+    - 相同key的任务已提交但未完成时不重复提交，输出路径登记为等待者，任务完成后一并写入
+    - 未命中的片段跨章节去重后由有界线程池并发提交（提交速率仍受rate_limiter令牌桶限制）
+    - check_async_tasks.py 查询到视频任务完成并下载后立即写入缓存，并分发给所有等待的输出路径；
+      任务失败时清除提交记录，下次运行重新提交
+
+使用方法:
+    from video_clip_cache import ClipJob, run_clip_jobs
+
+    jobs = [ClipJob(image_path, duration, output_path, prompt, model), ...]
+    results = run_clip_jobs(jobs, submit)   # submit(job, clip_key) -> task_id 或 None
+    # results: {output_path: bool}
+
+    # 命令行
+    python video_clip_cache.py stats
+    python video_clip_cache.py prune --dry-run
+
+环境变量:
+    I2V_SUBMIT_CONCURRENCY   并发提交线程数，默认4
+    CLIP_CACHE_DISABLED=1    不查缓存，所有片段都重新提交
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from asset_store import format_bytes, hash_file
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.path.join(PROJECT_ROOT, 'data', '.clip_cache')
+
+# 接口侧任务和视频URL的保留时间，超过后未完成的提交记录视为失效
+IN_FLIGHT_TTL = 24 * 3600
+
+DEFAULT_CONCURRENCY = 4
+
+ClipJob = namedtuple('ClipJob', 'image_path duration output_path prompt model')
+
+
+def clip_cache_disabled():
+    return os.environ.get('CLIP_CACHE_DISABLED') == '1'
+
+
+def submit_concurrency():
+    try:
+        return max(1, int(os.environ.get('I2V_SUBMIT_CONCURRENCY', DEFAULT_CONCURRENCY)))
+    except ValueError:
+        return DEFAULT_CONCURRENCY
+
+
+def _copy_atomic(src, dst):
+    """
+    复制到临时文件后原子替换，避免下游读到写了一半的视频
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+    tmp_path = f"{dst}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dst)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class ClipCache:
+    """
+    片段缓存：每个key一个 <key>.json 记录（submitted/completed）和完成后的 <key>.mp4
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, clock=time.time):
+        self.cache_dir = cache_dir
+        self.clock = clock
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key_for(self, job):
+        payload = json.dumps({
+            'image': hash_file(job.image_path),
+            'prompt': job.prompt,
+            'duration': job.duration,
+            'model': job.model,
+        }, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def clip_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.mp4")
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load(self, key):
+        try:
+            with open(self._entry_path(key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, key, entry):
+        path = self._entry_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def materialize(self, key, output_path):
+        """
+        缓存中有完成的片段时复制到output_path，返回是否命中
+        """
+        clip = self.clip_path(key)
+        if not os.path.exists(clip):
+            return False
+        _copy_atomic(clip, output_path)
+        return True
+
+    def in_flight(self, key):
+        """
+        返回仍在接口侧生成中的task_id，没有或已失效时返回None
+        """
+        entry = self._load(key)
+        if not entry or entry.get('status') != 'submitted':
+            return None
+        if self.clock() - entry.get('submit_time', 0) > IN_FLIGHT_TTL:
+            return None
+        return entry.get('task_id')
+
+    def record_submitted(self, key, task_id, job, output_paths):
+        with self._lock:
+            self._save(key, {
+                'status': 'submitted',
+                'task_id': task_id,
+                'image_path': job.image_path,
+                'prompt': job.prompt,
+                'duration': job.duration,
+                'model': job.model,
+                'submit_time': self.clock(),
+                'waiters': sorted({os.path.abspath(path) for path in output_paths}),
+            })
+
+    def add_waiter(self, key, output_path):
+        with self._lock:
+            entry = self._load(key)
+            if not entry:
+                return False
+            waiters = set(entry.get('waiters', []))
+            waiters.add(os.path.abspath(output_path))
+            entry['waiters'] = sorted(waiters)
+            self._save(key, entry)
+            return True
+
+    def record_completed(self, key, video_path):
+        """
+        任务完成、视频已下载到video_path：写入缓存并分发给其他等待的输出路径
+
+        Returns:
+            list: 额外写入的输出路径
+        """
+        with self._lock:
+            entry = self._load(key) or {}
+            _copy_atomic(video_path, self.clip_path(key))
+            delivered = []
+            for waiter in entry.get('waiters', []):
+                if os.path.abspath(waiter) == os.path.abspath(video_path) or os.path.exists(waiter):
+                    continue
+                _copy_atomic(video_path, waiter)
+                delivered.append(waiter)
+            entry.update({
+                'status': 'completed',
+                'completed_time': self.clock(),
+                'size': os.path.getsize(video_path),
+                'waiters': [],
+            })
+            self._save(key, entry)
+            return delivered
+
+    def record_failed(self, key):
+        """
+        任务失败时清除提交记录，下次运行重新提交
+        """
+        with self._lock:
+            entry = self._load(key)
+            if entry and entry.get('status') == 'submitted':
+                os.remove(self._entry_path(key))
+
+    def entries(self):
+        for name in sorted(os.listdir(self.cache_dir)):
+            if name.endswith('.json'):
+                key = name[:-len('.json')]
+                entry = self._load(key)
+                if entry:
+                    yield key, entry
+
+    def stats(self):
+        result = {'completed': 0, 'in_flight': 0, 'expired': 0, 'bytes': 0}
+        for key, entry in self.entries():
+            if entry.get('status') == 'completed' and os.path.exists(self.clip_path(key)):
+                result['completed'] += 1
+                result['bytes'] += os.path.getsize(self.clip_path(key))
+            elif self.in_flight(key):
+                result['in_flight'] += 1
+            else:
+                result['expired'] += 1
+        return result
+
+    def prune(self, dry_run=False):
+        """
+        删除失效的提交记录以及缺少视频文件的完成记录
+        """
+        removed = 0
+        for key, entry in list(self.entries()):
+            if entry.get('status') == 'completed' and os.path.exists(self.clip_path(key)):
+                continue
+            if entry.get('status') == 'submitted' and self.in_flight(key):
+                continue
+            removed += 1
+            if not dry_run:
+                os.remove(self._entry_path(key))
+        return removed
+
+
+def run_clip_jobs(jobs, submit, cache=None, max_workers=None):
+    """
+    处理一批图生视频片段：已存在的跳过，缓存命中的直接复制，已在生成中的登记等待，
+    其余按key去重后并发提交
+
+    Args:
+        jobs: ClipJob列表，可以来自多个章节
+        submit: submit(job, clip_key) -> task_id，失败返回None（负责重试和保存任务文件）
+        cache: ClipCache实例，默认使用全局缓存
+        max_workers: 并发提交线程数，默认取 I2V_SUBMIT_CONCURRENCY
+
+    Returns:
+        dict: {output_path: 是否已有视频或任务已提交}
+    """
+    use_cache = not clip_cache_disabled()
+    cache = cache or (get_clip_cache() if use_cache else None)
+    results = {}
+    misses = {}
+
+    for job in jobs:
+        if os.path.exists(job.output_path):
+            print(f"✓ 视频已存在，跳过生成: {os.path.basename(job.output_path)}")
+            results[job.output_path] = True
+            continue
+        if not use_cache:
+            misses[job.output_path] = [job]
+            continue
+
+        key = cache.key_for(job)
+        if cache.materialize(key, job.output_path):
+            print(f"✓ 片段缓存命中: {os.path.basename(job.output_path)}")
+            results[job.output_path] = True
+        elif cache.in_flight(key) and cache.add_waiter(key, job.output_path):
+            print(f"⏳ 相同片段正在生成，完成后写入: {os.path.basename(job.output_path)}")
+            results[job.output_path] = True
+        else:
+            misses.setdefault(key, []).append(job)
+
+    if not misses:
+        return results
+
+    workers = min(max_workers or submit_concurrency(), len(misses))
+    print(f"提交 {len(misses)} 个图生视频任务（并发 {workers}）")
+
+    def submit_group(key, group):
+        task_id = submit(group[0], key if use_cache else None)
+        if task_id and use_cache:
+            cache.record_submitted(key, task_id, group[0], [job.output_path for job in group])
+        return task_id
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(submit_group, key, group): group for key, group in misses.items()}
+        for future in as_completed(futures):
+            group = futures[future]
+            try:
+                ok = bool(future.result())
+            except Exception as e:
+                print(f"✗ 提交图生视频任务失败 {os.path.basename(group[0].output_path)}: {e}")
+                ok = False
+            for job in group:
+                results[job.output_path] = ok
+    return results
+
+
+def record_task_completed(task_info, output_path):
+    """
+    check_async_tasks.py 下载完成的视频后调用，没有clip_key的旧任务忽略
+    """
+    key = task_info.get('clip_key')
+    if not key or clip_cache_disabled():
+        return []
+    try:
+        delivered = get_clip_cache().record_completed(key, output_path)
+    except OSError as e:
+        print(f"⚠ 写入片段缓存失败: {e}")
+        return []
+    for path in delivered:
+        print(f"✓ 相同片段已写入: {path}")
+    return delivered
+
+
+def record_task_failed(task_info):
+    key = task_info.get('clip_key')
+    if key and not clip_cache_disabled():
+        get_clip_cache().record_failed(key)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_clip_cache():
+    """
+    获取进程内共享的片段缓存
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ClipCache()
+        return _cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description='图生视频片段缓存')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='缓存目录')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('stats', help='查看缓存统计')
+    prune_parser = subparsers.add_parser('prune', help='清理失效的提交记录')
+    prune_parser.add_argument('--dry-run', action='store_true', help='只统计不删除')
+    args = parser.parse_args()
+
+    cache = ClipCache(args.cache_dir)
+    if args.command == 'stats':
+        stats = cache.stats()
+        print(f"已缓存片段: {stats['completed']} 个，共 {format_bytes(stats['bytes'])}")
+        print(f"生成中: {stats['in_flight']} 个，失效记录: {stats['expired']} 个")
+    else:
+        removed = cache.prune(dry_run=args.dry_run)
+        print(f"{'将清理' if args.dry_run else '已清理'} {removed} 条记录")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频编码约定（所有视频生产步骤共用）
+
+功能:
+    - 声明统一的编码约定：分辨率、SAR、帧率、GOP、像素格式、H.264 profile/level、
+      时间基以及音频采样率和声道布局
+    - 为各编码器（libx264 / h264_nvenc / h264_videotoolbox）生成符合约定的编码参数，
+      生产步骤不再各自拼接 -r/-profile/-pix_fmt
+    - 用ffprobe检查文件是否符合约定，以及一组片段能否用concat demuxer直接 -c copy 拼接
+    - 片尾等静态素材按约定预先转码一次，按内容哈希+约定指纹缓存在 data/.contract_cache
+
+使用方法:
+    from video_contract import video_encode_args, audio_encode_args, check_copy_concat
+
+    cmd.extend(video_encode_args(gpu_params))
+    cmd.extend(audio_encode_args())
+    check_copy_concat([main_video, finish_video])   # 不兼容时抛出ContractViolation
+
+    # 命令行
+    python video_contract.py check data/001/chapter_001/*_video.mp4
+    python video_contract.py concat-check a.mp4 b.mp4
+    python video_contract.py normalize src/banner/finish_compatible.mp4
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+
+from asset_store import hash_file
+from ffmpeg_runner import run_ffmpeg
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.path.join(PROJECT_ROOT, 'data', '.contract_cache')
+
+# 编码约定，修改后预转码素材的缓存自动失效
+CONTRACT = {
+    'width': 720,
+    'height': 1280,
+    'sar': '1:1',
+    'fps': 30,
+    'gop': 60,                 # 固定2秒关键帧间隔，关闭场景切换插入关键帧
+    'pix_fmt': 'yuv420p',
+    'video_codec': 'h264',
+    'profile': 'high',
+    'level': '4.0',
+    'timescale': 15360,        # mp4视频轨时间基 1/15360
+    'video_bitrate': '2200k',
+    'audio_codec': 'aac',
+    'audio_rate': 44100,
+    'audio_channels': 2,
+    'channel_layout': 'stereo',
+    'audio_bitrate': '128k',
+}
+
+# 拼接时除约定字段外还必须一致的字段（不同编码器产出的SPS不同，不能混拼）
+CONCAT_VIDEO_FIELDS = ('codec_name', 'profile', 'level', 'width', 'height', 'sample_aspect_ratio',
+                       'pix_fmt', 'r_frame_rate', 'time_base')
+CONCAT_AUDIO_FIELDS = ('codec_name', 'profile', 'sample_rate', 'channels', 'channel_layout')
+
+# hevc编码器不符合约定时使用的CPU编码参数
+FALLBACK_GPU_PARAMS = {
+    'video_codec': 'libx264',
+    'preset': 'medium',
+    'extra_params': ['-crf', '32', '-maxrate', '2200k', '-bufsize', '4400k'],
+}
+
+class ContractViolation(RuntimeError):
+    """文件不符合编码约定或片段之间不能直接流复制拼接"""
+
+    def __init__(self, problems):
+        self.problems = list(problems)
+        super().__init__('; '.join(self.problems))
+
+def contract_fingerprint(encoder=None):
+    """
+    约定指纹：约定内容+编码器名，用于预转码缓存的文件名
+    """
+    payload = json.dumps({'contract': CONTRACT, 'encoder': encoder}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:12]
+
+def contract_gpu_params(gpu_params):
+    """
+    约定只允许H.264，hevc编码器回退为libx264
+    """
+    gpu_params = gpu_params or FALLBACK_GPU_PARAMS
+    if not gpu_params.get('video_codec', '').startswith('h264') and gpu_params.get('video_codec') != 'libx264':
+        print(f"⚠️  编码器 {gpu_params.get('video_codec')} 不符合H.264约定，改用libx264")
+        return FALLBACK_GPU_PARAMS
+    return gpu_params
+
+def contract_filter(fit='pad'):
+    """
+    把任意输入画面变换为约定的分辨率/SAR/像素格式
+
+    fit='pad' 等比缩小后补黑边，fit='crop' 等比放大后居中裁剪
+    """
+    width, height = CONTRACT['width'], CONTRACT['height']
+    if fit == 'crop':
+        geometry = (f"scale={width}:{height}:force_original_aspect_ratio=increase,"
+                    f"crop={width}:{height}")
+    else:
+        geometry = (f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                    f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:black")
+    return f"{geometry},setsar=1,format={CONTRACT['pix_fmt']}"
+
+def hwaccel_args(gpu_params):
+    """
+    输入端硬件解码参数（写在 -i 之前）
+    """
+    args = []
+    if 'hwaccel' in gpu_params:
+        args.extend(['-hwaccel', gpu_params['hwaccel']])
+    if 'hwaccel_output_format' in gpu_params:
+        args.extend(['-hwaccel_output_format', gpu_params['hwaccel_output_format']])
+    return args
+
+def video_encode_args(gpu_params):
+    """
+    生成符合约定的视频编码参数：编码器、preset/tune、码控参数，以及统一的
+    帧率、GOP、profile/level、像素格式和时间基
+    """
+    gpu_params = contract_gpu_params(gpu_params)
+    codec = gpu_params['video_codec']
+    gop = str(CONTRACT['gop'])
+    args = ['-c:v', codec]
+
+    # 只有非VideoToolbox编码器才添加preset参数
+    if 'preset' in gpu_params and not codec.endswith('_videotoolbox'):
+        args.extend(['-preset', gpu_params['preset']])
+    if 'tune' in gpu_params:
+        args.extend(['-tune', gpu_params['tune']])
+    args.extend(gpu_params.get('extra_params', []))
+
+    args.extend(['-profile:v', CONTRACT['profile']])
+    if codec.endswith('_videotoolbox'):
+        args.extend(['-g', gop])
+    elif codec.endswith('_nvenc'):
+        args.extend(['-level:v', CONTRACT['level'], '-g', gop, '-strict_gop', '1',
+                     '-no-scenecut', '1', '-forced-idr', '1'])
+    else:
+        args.extend(['-level:v', CONTRACT['level'], '-g', gop, '-keyint_min', gop, '-sc_threshold', '0'])
+
+    args.extend([
+        '-r', str(CONTRACT['fps']),
+        '-pix_fmt', CONTRACT['pix_fmt'],
+        '-video_track_timescale', str(CONTRACT['timescale']),
+    ])
+    return args
+
+def audio_encode_args():
+    """
+    符合约定的音频编码参数
+    """
+    return [
+        '-c:a', CONTRACT['audio_codec'],
+        '-b:a', CONTRACT['audio_bitrate'],
+        '-ar', str(CONTRACT['audio_rate']),
+        '-ac', str(CONTRACT['audio_channels']),
+    ]
+
+def probe_media(path):
+    """
+    用ffprobe读取所有流信息，返回 {'video': [...], 'audio': [...]}
+    """
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-show_streams', '-of', 'json', path],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise ContractViolation([f"{os.path.basename(path)}: ffprobe失败 {result.stderr.strip()}"])
+    streams = json.loads(result.stdout or '{}').get('streams', [])
+    return {
+        'video': [s for s in streams if s.get('codec_type') == 'video'],
+        'audio': [s for s in streams if s.get('codec_type') == 'audio'],
+    }
+
+def _fps(rate):
+    try:
+        num, den = str(rate).split('/')
+        return float(num) / float(den)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+def contract_violations(probe, video_only=False):
+    """
+    对照约定检查ffprobe结果，返回问题描述列表（空列表表示符合约定）
+    """
+    problems = []
+    if len(probe['video']) != 1:
+        problems.append(f"视频流数量为{len(probe['video'])}")
+        return problems
+
+    video = probe['video'][0]
+    expected = {
+        'codec_name': CONTRACT['video_codec'],
+        'profile': CONTRACT['profile'],
+        'width': CONTRACT['width'],
+        'height': CONTRACT['height'],
+        'sample_aspect_ratio': CONTRACT['sar'],
+        'pix_fmt': CONTRACT['pix_fmt'],
+        'time_base': f"1/{CONTRACT['timescale']}",
+    }
+    for field, value in expected.items():
+        actual = video.get(field)
+        if str(actual).lower() != str(value).lower():
+            problems.append(f"{field}={actual}，约定为{value}")
+    if abs(_fps(video.get('r_frame_rate')) - CONTRACT['fps']) > 0.01:
+        problems.append(f"r_frame_rate={video.get('r_frame_rate')}，约定为{CONTRACT['fps']}")
+
+    if video_only:
+        return problems
+
+    if len(probe['audio']) != 1:
+        problems.append(f"音频流数量为{len(probe['audio'])}")
+        return problems
+    audio = probe['audio'][0]
+    expected = {
+        'codec_name': CONTRACT['audio_codec'],
+        'sample_rate': CONTRACT['audio_rate'],
+        'channels': CONTRACT['audio_channels'],
+    }
+    for field, value in expected.items():
+        actual = audio.get(field)
+        if str(actual) != str(value):
+            problems.append(f"音频{field}={actual}，约定为{value}")
+    return problems
+
+def concat_violations(probes):
+    """
+    检查一组片段能否直接流复制拼接：每段都符合约定，且编码参数（含level等SPS字段）完全一致
+
+    probes: [(名称, probe_media结果), ...]
+    """
+    problems = []
+    for name, probe in probes:
+        problems.extend(f"{name}: {problem}" for problem in contract_violations(probe))
+    if problems or len(probes) < 2:
+        return problems
+
+    first_name, first = probes[0]
+    for name, probe in probes[1:]:
+        for kind, fields in (('video', CONCAT_VIDEO_FIELDS), ('audio', CONCAT_AUDIO_FIELDS)):
+            for field in fields:
+                expected = first[kind][0].get(field)
+                actual = probe[kind][0].get(field)
+                if expected != actual:
+                    problems.append(f"{name}: {kind} {field}={actual}，与{first_name}的{expected}不一致")
+    return problems
+
+def check_contract(path, video_only=False):
+    """
+    检查单个文件，返回问题描述列表
+    """
+    return contract_violations(probe_media(path), video_only=video_only)
+
+def check_copy_concat(paths):
+    """
+    确认片段可以直接 -c copy 拼接，否则抛出ContractViolation
+    """
+    problems = concat_violations([(os.path.basename(path), probe_media(path)) for path in paths])
+    if problems:
+        raise ContractViolation(problems)
+
+def conform_video(src, dst, gpu_params=None, fit='pad', label='conform'):
+    """
+    把视频转码为符合约定的文件（没有音轨时补静音轨，保证能与其他片段流复制拼接）
+    """
+    gpu_params = contract_gpu_params(gpu_params)
+    has_audio = bool(probe_media(src)['audio'])
+    cmd = ['ffmpeg', '-y'] + hwaccel_args(gpu_params) + ['-i', src]
+    if not has_audio:
+        cmd.extend(['-f', 'lavfi', '-i',
+                    f"anullsrc=channel_layout={CONTRACT['channel_layout']}:sample_rate={CONTRACT['audio_rate']}"])
+    cmd.extend(['-map', '0:v:0', '-map', '0:a:0' if has_audio else '1:a:0'])
+    cmd.extend(['-vf', contract_filter(fit)])
+    cmd.extend(video_encode_args(gpu_params))
+    cmd.extend(audio_encode_args())
+    if not has_audio:
+        cmd.append('-shortest')
+    cmd.extend(['-movflags', '+faststart', dst])
+
+    result = run_ffmpeg(cmd, label=label, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"转码失败 {src}: {result.stderr}")
+    return dst
+
+def ensure_conforming(paths, gpu_params=None, label='conform'):
+    """
+    逐个检查片段，不符合约定的（约定之前生成的旧文件）就地转码，返回被转码的文件列表
+    """
+    conformed = []
+    for path in paths:
+        problems = check_contract(path)
+        if not problems:
+            continue
+        print(f"⚠️  {os.path.basename(path)} 不符合编码约定，重新转码: {'; '.join(problems)}")
+        tmp_path = path + '.contract.mp4'
+        conform_video(path, tmp_path, gpu_params=gpu_params, label=label)
+        os.replace(tmp_path, path)
+        conformed.append(path)
+    return conformed
+
+def normalized_asset(path, gpu_params=None, cache_dir=None):
+    """
+    返回静态素材（如片尾）按约定预转码后的缓存路径；素材内容、约定或编码器变化时重新转码
+    """
+    gpu_params = contract_gpu_params(gpu_params)
+    if not os.path.isabs(path):
+        path = os.path.join(PROJECT_ROOT, path)
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+    stem = os.path.splitext(os.path.basename(path))[0]
+    name = f"{stem}-{hash_file(path)[:16]}-{contract_fingerprint(gpu_params['video_codec'])}.mp4"
+    cached = os.path.join(cache_dir, name)
+    if os.path.exists(cached):
+        return cached
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = cached + f'.{os.getpid()}.tmp.mp4'
+    print(f"预转码静态素材: {os.path.basename(path)} -> {name}")
+    try:
+        conform_video(path, tmp_path, gpu_params=gpu_params, label='normalize_asset')
+        os.replace(tmp_path, cached)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return cached
+
+def _load_gpu_params():
+    from concat_finish_video import get_ffmpeg_gpu_params
+    return get_ffmpeg_gpu_params()
+
+def main():
+    parser = argparse.ArgumentParser(description='视频编码约定检查与素材预转码')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    check_parser = subparsers.add_parser('check', help='检查文件是否符合编码约定')
+    check_parser.add_argument('paths', nargs='+')
+
+    concat_parser = subparsers.add_parser('concat-check', help='检查一组片段能否直接流复制拼接')
+    concat_parser.add_argument('paths', nargs='+')
+
+    normalize_parser = subparsers.add_parser('normalize', help='按约定预转码静态素材并缓存')
+    normalize_parser.add_argument('paths', nargs='+')
+
+    args = parser.parse_args()
+
+    if args.command == 'check':
+        failed = 0
+        for path in args.paths:
+            problems = check_contract(path)
+            if problems:
+                failed += 1
+                print(f"❌ {path}")
+                for problem in problems:
+                    print(f"    {problem}")
+            else:
+                print(f"✓ {path}")
+        return 1 if failed else 0
+
+    if args.command == 'concat-check':
+        try:
+            check_copy_concat(args.paths)
+        except ContractViolation as e:
+            print("❌ 不能直接流复制拼接:")
+            for problem in e.problems:
+                print(f"    {problem}")
+            return 1
+        print(f"✓ {len(args.paths)} 个片段可以直接流复制拼接")
+        return 0
+
+    gpu_params = _load_gpu_params()
+    for path in args.paths:
+        print(f"{path} -> {normalized_asset(path, gpu_params=gpu_params)}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -39,6 +39,7 @@ if project_root not in sys.path:
 
 # 导入配置
 from config.config import COMFYUI_CONFIG
+from image_derivatives import ingest_image
 
 # ComfyUI 默认主机常量，可通过环境变量 COMFYUI_HOST 覆盖
 COMFYUI_DEFAULT_HOST = os.getenv("COMFYUI_HOST", COMFYUI_CONFIG["default_host"])
@@ -575,6 +576,8 @@ class ComfyUIClient:
                         if chunk:
                             f.write(chunk)
                 logger.info(f"文件已下载到: {local_path}")
+                # 生成渲染用派生图和缩略图
+                ingest_image(local_path)
                 return local_path
             else:
                 logger.error(f"下载失败，状态码: {resp.status_code}")
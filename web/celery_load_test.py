@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Celery队列拓扑负载测试
+在渲染队列持续满载时测量状态类任务从投递到开始执行的延迟，验证长时间渲染不会拖慢状态扫描
+
+需要运行中的Redis和worker（python run_celery.py worker），测试期间会占满渲染worker。
+
+使用方法:
+    # 按队列拓扑：8个渲染探针占满render队列，同时每0.5秒投递一个control队列的状态探针
+    python celery_load_test.py --renders 8 --render-seconds 20 --probes 40
+
+    # 对照组：全部投递到旧的单一celery队列（先用 celery -A web worker -Q celery -c 2 启动单队列worker）
+    python celery_load_test.py --renders 8 --render-seconds 20 --probes 40 --single-queue celery
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# 设置Django环境
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'web.settings')
+
+# 添加当前目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+import django
+django.setup()
+
+from video.tasks import queue_latency_probe, render_load_probe
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_load_test(renders, render_seconds, probes, interval, timeout, single_queue=None):
+    """
+    投递渲染探针后按固定间隔投递状态探针，统计状态探针的排队延迟
+
+    Args:
+        renders (int): 渲染探针数量
+        render_seconds (float): 每个渲染探针的CPU占用时长
+        probes (int): 状态探针数量
+        interval (float): 状态探针投递间隔（秒）
+        timeout (float): 等待单个状态探针结果的超时（秒）
+        single_queue (str): 指定时所有探针都投递到该队列（对照组）
+
+    Returns:
+        dict: 排队延迟统计（秒）
+    """
+    render_options = {'queue': single_queue} if single_queue else {}
+    probe_options = {'queue': single_queue} if single_queue else {}
+
+    render_results = [render_load_probe.apply_async((render_seconds,), **render_options) for _ in range(renders)]
+    print(f"已投递 {renders} 个渲染探针，每个占用 {render_seconds} 秒")
+
+    latencies = []
+    timeouts = 0
+    for i in range(probes):
+        result = queue_latency_probe.apply_async((time.time(),), **probe_options)
+        try:
+            latencies.append(result.get(timeout=timeout)['queued_seconds'])
+        except Exception as e:
+            timeouts += 1
+            print(f"  状态探针 {i + 1} 超时: {e}")
+        time.sleep(interval)
+
+    finished_renders = sum(1 for result in render_results if result.ready())
+    print(f"渲染探针已完成 {finished_renders}/{renders}（剩余的在后台继续执行）")
+
+    if not latencies:
+        return {'count': 0, 'timeouts': timeouts}
+    return {
+        'count': len(latencies),
+        'timeouts': timeouts,
+        'p50': percentile(latencies, 0.5),
+        'p95': percentile(latencies, 0.95),
+        'max': max(latencies),
+        'mean': statistics.mean(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Celery队列拓扑负载测试：渲染满载时的状态任务延迟')
+    parser.add_argument('--renders', type=int, default=8, help='渲染探针数量，默认8')
+    parser.add_argument('--render-seconds', type=float, default=20.0, help='每个渲染探针占用秒数，默认20')
+    parser.add_argument('--probes', type=int, default=40, help='状态探针数量，默认40')
+    parser.add_argument('--interval', type=float, default=0.5, help='状态探针投递间隔秒数，默认0.5')
+    parser.add_argument('--timeout', type=float, default=300.0, help='单个状态探针等待超时秒数，默认300')
+    parser.add_argument('--single-queue', help='对照组：全部探针投递到该队列（如celery）')
+    parser.add_argument('--max-p95', type=float, help='状态探针p95延迟上限（秒），超过时返回非零退出码')
+    args = parser.parse_args()
+
+    mode = f"单一队列 {args.single_queue}" if args.single_queue else "队列拓扑"
+    print(f"Celery负载测试 - {mode}")
+    print("=" * 50)
+    stats = run_load_test(args.renders, args.render_seconds, args.probes, args.interval, args.timeout,
+                          single_queue=args.single_queue)
+
+    print("-" * 50)
+    if not stats['count']:
+        print(f"❌ 没有收到状态探针结果（超时 {stats['timeouts']} 个），请检查worker是否运行")
+        return 1
+    print(f"状态探针 {stats['count']} 个，超时 {stats['timeouts']} 个")
+    print(f"排队延迟: p50 {stats['p50'] * 1000:.0f}ms  p95 {stats['p95'] * 1000:.0f}ms  "
+          f"max {stats['max'] * 1000:.0f}ms  mean {stats['mean'] * 1000:.0f}ms")
+
+    if args.max_p95 is not None and stats['p95'] > args.max_p95:
+        print(f"❌ p95延迟超过上限 {args.max_p95}s")
+        return 1
+    if stats['timeouts']:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,7 +5,8 @@ Celery运行脚本
 用于启动和管理Celery worker和beat调度器
 
 使用方法:
-    python run_celery.py worker          # 启动worker
+    python run_celery.py worker          # 按队列拓扑启动control、io、render三组worker
+    python run_celery.py worker --profile render --concurrency 1  # 只启动渲染worker
     python run_celery.py beat            # 启动beat调度器
     python run_celery.py both            # 同时启动worker和beat
     python run_celery.py status          # 查看Celery状态
@@ -37,9 +38,10 @@ except Exception as e:
 
 from django.conf import settings
 from celery import Celery
+from video.queue_topology import QUEUE_NAMES, worker_command, worker_profiles
 
 # 全局变量存储进程
-worker_process = None
+worker_processes = []
 beat_process = None
 
 def signal_handler(signum, frame):
@@ -48,12 +50,11 @@ def signal_handler(signum, frame):
     """
     print("\n接收到停止信号，正在关闭Celery进程...")
     
-    global worker_process, beat_process
+    global beat_process
     
-    if worker_process:
+    if worker_processes:
         print("正在停止Celery worker...")
-        worker_process.terminate()
-        worker_process.wait()
+        stop_workers()
         print("Celery worker已停止")
     
     if beat_process:
@@ -64,41 +65,49 @@ def signal_handler(signum, frame):
     
     sys.exit(0)
 
-def run_worker(loglevel='info', concurrency=None):
+def stop_workers():
+    """
+    停止所有worker进程
+    """
+    for process in worker_processes:
+        if process.poll() is None:
+            process.terminate()
+    for process in worker_processes:
+        process.wait()
+
+def run_worker(loglevel='info', concurrency=None, profile='all'):
     """
-    启动Celery worker
+    启动Celery worker，每个队列一组独立的进程池
     
     Args:
         loglevel (str): 日志级别
-        concurrency (int): 并发数
+        concurrency (int): 并发数，不指定时使用队列拓扑中的默认值
+        profile (str): 队列名（control/io/render），all表示三组都启动
     """
-    global worker_process
-    
-    cmd = [
-        sys.executable, '-m', 'celery', 
-        '-A', 'web', 'worker',
-        '--loglevel', loglevel
-    ]
-    
-    if concurrency:
-        cmd.extend(['--concurrency', str(concurrency)])
-    
-    print(f"启动Celery worker: {' '.join(cmd)}")
-    print(f"日志级别: {loglevel}")
-    if concurrency:
-        print(f"并发数: {concurrency}")
-    print("-" * 50)
+    profiles = list(QUEUE_NAMES) if profile == 'all' else [profile]
+    configs = worker_profiles()
     
     try:
-        worker_process = subprocess.Popen(cmd)
-        worker_process.wait()
+        for name in profiles:
+            cmd = worker_command(name, sys.executable, loglevel, concurrency)
+            config = configs[name]
+            print(f"启动Celery worker [{name}]: {' '.join(cmd)}")
+            print(f"队列: {','.join(config['queues'])}  进程池: {config['pool']}  "
+                  f"并发数: {concurrency or config['concurrency']}")
+            worker_processes.append(subprocess.Popen(cmd))
+        print(f"日志级别: {loglevel}")
+        print("-" * 50)
+        
+        # 任一worker退出时停止其余worker，由外部进程管理统一重启
+        while all(process.poll() is None for process in worker_processes):
+            time.sleep(1)
+        stop_workers()
     except KeyboardInterrupt:
         print("\n接收到中断信号，正在停止worker...")
-        if worker_process:
-            worker_process.terminate()
-            worker_process.wait()
+        stop_workers()
     except Exception as e:
         print(f"启动worker失败: {e}")
+        stop_workers()
         return False
     
     return True
@@ -138,13 +147,14 @@ def run_beat(loglevel='info'):
     
     return True
 
-def run_both(loglevel='info', concurrency=None):
+def run_both(loglevel='info', concurrency=None, profile='all'):
     """
     同时启动worker和beat
     
     Args:
         loglevel (str): 日志级别
         concurrency (int): worker并发数
+        profile (str): 要启动的worker队列
     """
     print("同时启动Celery worker和beat调度器")
     print("=" * 50)
@@ -161,7 +171,7 @@ def run_both(loglevel='info', concurrency=None):
     time.sleep(2)
     
     # 在主线程中启动worker
-    run_worker(loglevel, concurrency)
+    run_worker(loglevel, concurrency, profile)
 
 def show_status():
     """
@@ -243,8 +253,9 @@ def main():
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog="""
 示例:
-  python run_celery.py worker                    # 启动worker
-  python run_celery.py worker --concurrency 4   # 启动worker，设置并发数为4
+  python run_celery.py worker                    # 启动control、io、render三组worker
+  python run_celery.py worker --profile io       # 只启动io队列worker
+  python run_celery.py worker --profile render --concurrency 1  # 渲染worker只开1个进程
   python run_celery.py beat                     # 启动beat调度器
   python run_celery.py both                     # 同时启动worker和beat
   python run_celery.py status                   # 查看状态
@@ -269,7 +280,14 @@ def main():
     parser.add_argument(
         '--concurrency',
         type=int,
-        help='Worker并发数 (默认: CPU核心数)'
+        help='Worker并发数，作用于启动的每组worker (默认: 按队列拓扑，render队列按编码能力)'
+    )
+    
+    parser.add_argument(
+        '--profile',
+        default='all',
+        choices=['all'] + list(QUEUE_NAMES),
+        help='启动哪个队列的worker (默认: all)'
     )
     
     args = parser.parse_args()
@@ -284,11 +302,11 @@ def main():
     print("=" * 50)
     
     if args.command == 'worker':
-        run_worker(args.loglevel, args.concurrency)
+        run_worker(args.loglevel, args.concurrency, args.profile)
     elif args.command == 'beat':
         run_beat(args.loglevel)
     elif args.command == 'both':
-        run_both(args.loglevel, args.concurrency)
+        run_both(args.loglevel, args.concurrency, args.profile)
     elif args.command == 'status':
         show_status()
     elif args.command == 'purge':
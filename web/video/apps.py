@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class VideoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'video'
+
+    def ready(self):
+        # 注册Celery信号处理器，任务状态变化时实时同步到数据库
+        from . import task_signals  # noqa: F401
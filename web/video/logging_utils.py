@@ -3,11 +3,21 @@ import logging
 import threading
 import queue
 import time
+import sys
+from pathlib import Path
 from typing import Callable, Optional
 
 logger = logging.getLogger(__name__)
 
-def run_command_with_logging(cmd, cwd=None, progress_callback: Optional[Callable] = None, task_self=None):
+# 项目根目录（ffmpeg_runner.py所在目录）
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from ffmpeg_runner import EVENT_PREFIX as FFMPEG_EVENT_PREFIX, parse_event_line
+
+def run_command_with_logging(cmd, cwd=None, progress_callback: Optional[Callable] = None, task_self=None,
+                             env=None, timeout=None):
     """
     执行命令并实时记录输出到日志
     
@@ -16,9 +26,11 @@ def run_command_with_logging(cmd, cwd=None, progress_callback: Optional[Callable
         cwd: 工作目录
         progress_callback: 进度回调函数
         task_self: Celery任务实例，用于更新状态
+        env: 子进程环境变量，为None时继承当前环境
+        timeout: 超时秒数，超时后终止子进程并抛出subprocess.TimeoutExpired
     
     Returns:
-        subprocess.CompletedProcess: 执行结果
+        subprocess.CompletedProcess: 执行结果（stdout不包含ffmpeg事件行）
     """
     logger.info(f"开始执行命令: {' '.join(cmd)}")
     logger.info(f"工作目录: {cwd}")
@@ -30,6 +42,7 @@ def run_command_with_logging(cmd, cwd=None, progress_callback: Optional[Callable
         stderr=subprocess.PIPE,
         text=True,
         cwd=cwd,
+        env=env,
         bufsize=1,
         universal_newlines=True
     )
@@ -45,7 +58,10 @@ def run_command_with_logging(cmd, cwd=None, progress_callback: Optional[Callable
                 if line:
                     line = line.rstrip('\n')
                     output_queue.put((prefix, line))
-                    logger.info(f"{prefix}: {line}")
+                    if line.startswith(FFMPEG_EVENT_PREFIX):
+                        logger.debug(f"{prefix}: {line}")
+                    else:
+                        logger.info(f"{prefix}: {line}")
         except Exception as e:
             logger.error(f"读取{prefix}输出时出错: {e}")
         finally:
@@ -80,11 +96,13 @@ def run_command_with_logging(cmd, cwd=None, progress_callback: Optional[Callable
             while True:
                 prefix, line = stdout_queue.get_nowait()
                 if prefix == "STDOUT":
-                    all_stdout.append(line)
+                    if not line.startswith(FFMPEG_EVENT_PREFIX):
+                        all_stdout.append(line)
                     
-                    # 更新任务状态（如果提供了task_self）
+                    # 更新任务状态（如果提供了task_self），回调已上报进度时推迟下一次定时更新
                     if task_self and progress_callback:
                         progress_callback(line)
+                        last_update_time = time.time()
         except queue.Empty:
             pass
         
@@ -99,6 +117,11 @@ def run_command_with_logging(cmd, cwd=None, progress_callback: Optional[Callable
         
         # 每5秒更新一次状态
         current_time = time.time()
+        if timeout and current_time - start_time > timeout:
+            process.kill()
+            process.wait()
+            logger.error(f"命令执行超时（{timeout}s）: {' '.join(cmd)}")
+            raise subprocess.TimeoutExpired(cmd, timeout)
         if task_self and current_time - last_update_time > 5:
             elapsed_time = current_time - start_time
             task_self.update_state(
@@ -122,7 +145,7 @@ def run_command_with_logging(cmd, cwd=None, progress_callback: Optional[Callable
     try:
         while True:
             prefix, line = stdout_queue.get_nowait()
-            if prefix == "STDOUT":
+            if prefix == "STDOUT" and not line.startswith(FFMPEG_EVENT_PREFIX):
                 all_stdout.append(line)
     except queue.Empty:
         pass
@@ -261,4 +284,63 @@ def create_progress_callback(task_self, base_progress=40, max_progress=80):
             }
         )
     
-    return progress_callback
\ No newline at end of file
+    return progress_callback
+
+def create_ffmpeg_progress_callback(task_self, base_progress=0, max_progress=100, step='渲染视频'):
+    """
+    创建解析ffmpeg事件行的进度回调（子进程需设置环境变量 FFMPEG_EVENTS=stdout）
+
+    单次编码的百分比由ffmpeg_runner按已知时长精确计算，放在meta['ffmpeg']中；
+    任务总进度停留在base_progress到max_progress之间，每完成一次编码向max_progress逼近一步
+
+    Args:
+        task_self: Celery任务实例
+        base_progress: 基础进度值
+        max_progress: 最大进度值
+        step: 步骤名称
+
+    Returns:
+        Callable: 进度回调函数
+    """
+    progress_state = {
+        'completed': 0,
+        'current_progress': base_progress,
+        'last_finished': None
+    }
+
+    def progress_callback(output_line):
+        event = parse_event_line(output_line.strip())
+        if event is None:
+            return
+
+        if event.get('event') == 'finished':
+            progress_state['completed'] += 1
+            progress_state['last_finished'] = event
+            # 编码总数未知，每完成一次把剩余进度缩小一半
+            remaining = max_progress - progress_state['current_progress']
+            progress_state['current_progress'] += remaining / 2
+
+        label = event.get('label') or 'ffmpeg'
+        percent = event.get('percent')
+        speed = event.get('speed')
+        if event.get('event') == 'finished':
+            status_msg = f"{step}: {label} 完成（第{progress_state['completed']}个编码）"
+        elif percent is not None:
+            status_msg = f"{step}: {label} {percent:.0f}%" + (f"（{speed:.2f}x）" if speed else '')
+        else:
+            status_msg = f"{step}: {label} 已编码 {event.get('time') or 0:.1f}s"
+
+        task_self.update_state(
+            state='PROGRESS',
+            meta={
+                'current': min(int(progress_state['current_progress']), max_progress),
+                'total': 100,
+                'status': status_msg,
+                'step': step,
+                'ffmpeg': event,
+                'encodes_completed': progress_state['completed'],
+                'last_encode': progress_state['last_finished']
+            }
+        )
+
+    return progress_callback
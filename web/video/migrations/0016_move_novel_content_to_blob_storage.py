@@ -0,0 +1,92 @@
+# Generated manually to move Novel.content into compressed blob storage
+
+import gzip
+import hashlib
+import os
+import uuid
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+# 迁移只依赖迁移时的存储格式，不导入video.novel_storage：
+# 正文按内容SHA-256寻址，gzip压缩后保存在 <NOVEL_BLOB_ROOT>/<键前两位>/<键>.txt.gz
+def blob_root():
+    return getattr(settings, 'NOVEL_BLOB_ROOT', None) or os.path.join(settings.BASE_DIR, 'novel_blobs')
+
+
+def blob_path(digest):
+    return os.path.join(blob_root(), digest[:2], f"{digest}.txt.gz")
+
+
+def write_blob(text):
+    data = text.encode('utf-8')
+    digest = hashlib.sha256(data).hexdigest()
+    path = blob_path(digest)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with gzip.open(temp_path, 'wb', compresslevel=6) as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    return digest
+
+
+def read_blob(digest):
+    with gzip.open(blob_path(digest), 'rt', encoding='utf-8', newline='') as f:
+        return f.read()
+
+
+def move_content_to_blobs(apps, schema_editor):
+    """
+    将已有小说的content写入压缩存储，只在数据库中保留存储键
+    逐条读取正文，避免一次性加载所有小说内容
+    """
+    Novel = apps.get_model('video', 'Novel')
+    moved_count = 0
+    for novel_id in Novel.objects.exclude(content__isnull=True).exclude(content='').values_list('id', flat=True):
+        content = Novel.objects.filter(id=novel_id).values_list('content', flat=True).first()
+        Novel.objects.filter(id=novel_id).update(
+            content_blob=write_blob(content),
+            content_length=len(content)
+        )
+        moved_count += 1
+    print(f"已将 {moved_count} 本小说的正文迁移到压缩存储")
+
+
+def restore_content_from_blobs(apps, schema_editor):
+    """
+    回滚操作：从压缩存储读回正文
+    """
+    Novel = apps.get_model('video', 'Novel')
+    restored_count = 0
+    for novel_id, digest in Novel.objects.exclude(content_blob__isnull=True).values_list('id', 'content_blob'):
+        if digest and os.path.exists(blob_path(digest)):
+            Novel.objects.filter(id=novel_id).update(content=read_blob(digest))
+            restored_count += 1
+    print(f"已从压缩存储恢复 {restored_count} 本小说的正文")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video', '0015_update_review_status_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='novel',
+            name='content_blob',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name='小说内容存储键'),
+        ),
+        migrations.AddField(
+            model_name='novel',
+            name='content_length',
+            field=models.IntegerField(default=0, verbose_name='小说内容字符数'),
+        ),
+        migrations.RunPython(move_content_to_blobs, restore_content_from_blobs),
+        migrations.RemoveField(
+            model_name='novel',
+            name='content',
+        ),
+    ]
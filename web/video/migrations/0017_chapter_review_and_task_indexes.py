@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video', '0016_move_novel_content_to_blob_storage'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chapter',
+            index=models.Index(fields=['novel', 'review_status'], name='chapter_novel_review_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chapter',
+            index=models.Index(fields=['review_status', 'novel'], name='chapter_review_novel_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chapter',
+            index=models.Index(fields=['batch_image_task_id'], name='chapter_batch_task_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chapter',
+            index=models.Index(fields=['batch_image_started_at'], name='chapter_batch_started_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='characterimagetask',
+            index=models.Index(fields=['status', 'created_at'], name='charimg_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='narration',
+            index=models.Index(fields=['chapter', 'scene_number'], name='narration_chapter_scene_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='narration',
+            index=models.Index(fields=['celery_task_id'], name='narration_celery_task_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='narration',
+            index=models.Index(fields=['image_task_status', 'image_task_started_at'], name='narration_task_status_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video', '0017_chapter_review_and_task_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='novel',
+            name='chapter_offsets',
+            field=models.JSONField(blank=True, default=list, verbose_name='章节标题位置列表'),
+        ),
+        migrations.AlterField(
+            model_name='novel',
+            name='task_status',
+            field=models.CharField(choices=[('idle', '空闲'), ('ingesting', '解析上传文件中'), ('ingest_failed', '上传文件解析失败'), ('generating_script', '生成解说文案中'), ('script_completed', '解说文案已完成'), ('script_failed', '解说文案生成失败'), ('validating_script', '校验解说文案中'), ('validation_completed', '解说文案校验完成'), ('validation_failed', '解说文案校验失败')], default='idle', max_length=50, verbose_name='任务状态'),
+        ),
+    ]
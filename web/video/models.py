@@ -8,6 +8,8 @@ class Novel(models.Model):
     """
     TASK_STATUS_CHOICES = (
         ('idle', '空闲'),
+        ('ingesting', '解析上传文件中'),
+        ('ingest_failed', '上传文件解析失败'),
         ('generating_script', '生成解说文案中'),
         ('script_completed', '解说文案已完成'),
         ('script_failed', '解说文案生成失败'),
@@ -22,7 +24,10 @@ class Novel(models.Model):
     type = models.CharField(max_length=50, blank=True, null=True, verbose_name='类型')
     # 文件上传相关字段
     original_file = models.FileField(upload_to='novels/', blank=True, null=True, verbose_name='原始文件')
-    content = models.TextField(blank=True, null=True, verbose_name='小说内容')
+    # 正文保存在压缩存储中（见novel_storage.py），这里只保存存储键，通过content属性按需读取
+    content_blob = models.CharField(max_length=64, blank=True, null=True, verbose_name='小说内容存储键')
+    content_length = models.IntegerField(default=0, verbose_name='小说内容字符数')
+    chapter_offsets = models.JSONField(default=list, blank=True, verbose_name='章节标题位置列表')
     upload_date = models.DateTimeField(auto_now_add=True, verbose_name='上传时间')
     last_modified = models.DateTimeField(auto_now=True, verbose_name='最后修改时间')
     
@@ -32,9 +37,62 @@ class Novel(models.Model):
     task_message = models.TextField(blank=True, null=True, verbose_name='任务消息')
     task_updated_at = models.DateTimeField(auto_now=True, verbose_name='任务状态更新时间')
     
+    # 列表页只需要的元数据字段，配合queryset.only()使用
+    LIST_FIELDS = ('id', 'name', 'word_count', 'type', 'upload_date', 'last_modified', 'task_status')
+    
     def __str__(self):
         return self.name
     
+    @property
+    def content(self):
+        """
+        小说正文，首次访问时从压缩存储读取并缓存在实例上
+        """
+        if getattr(self, '_content_dirty', False):
+            return self._content_cache
+        if getattr(self, '_content_cache_key', None) != self.content_blob or not hasattr(self, '_content_cache'):
+            if self.content_blob:
+                from .novel_storage import get_novel_blob_store
+                self._content_cache = get_novel_blob_store().read_text(self.content_blob)
+            else:
+                self._content_cache = None
+            self._content_cache_key = self.content_blob
+        return self._content_cache
+    
+    @content.setter
+    def content(self, value):
+        self._content_cache = value
+        self._content_dirty = True
+    
+    def open_content(self):
+        """
+        返回正文的流式数据源（open()得到文本流），正文为空时返回None
+        """
+        from .novel_storage import get_novel_blob_store, StringTextSource
+        if getattr(self, '_content_dirty', False):
+            return StringTextSource(self._content_cache) if self._content_cache else None
+        if not self.content_blob:
+            return None
+        return get_novel_blob_store().source(self.content_blob)
+    
+    def save(self, *args, **kwargs):
+        """
+        正文被修改时先写入压缩存储，再保存存储键
+        """
+        if getattr(self, '_content_dirty', False):
+            from .novel_storage import get_novel_blob_store
+            content = self._content_cache
+            self.content_blob = get_novel_blob_store().put_text(content) if content else None
+            self.content_length = len(content) if content else 0
+            self._content_cache_key = self.content_blob
+            self._content_dirty = False
+        
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'content' in update_fields:
+            kwargs['update_fields'] = [f for f in update_fields if f != 'content'] + ['content_blob', 'content_length']
+        
+        super().save(*args, **kwargs)
+    
     class Meta:
         verbose_name = '小说'
         verbose_name_plural = '小说'
@@ -94,6 +152,14 @@ class Chapter(models.Model):
     class Meta:
         verbose_name = '章节'
         verbose_name_plural = '章节'
+        indexes = [
+            # 小说详情页按小说筛选审核状态；审核组按审核状态反查小说
+            models.Index(fields=['novel', 'review_status'], name='chapter_novel_review_idx'),
+            models.Index(fields=['review_status', 'novel'], name='chapter_review_novel_idx'),
+            # 任务信号按任务ID更新，扫描器按开始时间筛选最近任务
+            models.Index(fields=['batch_image_task_id'], name='chapter_batch_task_idx'),
+            models.Index(fields=['batch_image_started_at'], name='chapter_batch_started_idx'),
+        ]
 
 
 class Character(models.Model):
@@ -179,6 +245,12 @@ class Narration(models.Model):
     class Meta:
         verbose_name = '解说'
         verbose_name_plural = '解说'
+        indexes = [
+            models.Index(fields=['chapter', 'scene_number'], name='narration_chapter_scene_idx'),
+            # 任务信号按Celery任务ID更新，扫描器按状态和开始时间筛选
+            models.Index(fields=['celery_task_id'], name='narration_celery_task_idx'),
+            models.Index(fields=['image_task_status', 'image_task_started_at'], name='narration_task_status_idx'),
+        ]
 
 
 class AudioGenerationTask(models.Model):
@@ -287,3 +359,6 @@ class CharacterImageTask(models.Model):
         verbose_name = '角色图片生成任务'
         verbose_name_plural = '角色图片生成任务'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='charimg_status_created_idx'),
+        ]
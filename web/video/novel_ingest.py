@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+上传小说的流式解析
+上传请求只负责把文件落盘，解析在Celery任务中进行：
+按块/按段落/按页读取文本，单次遍历同时完成字数统计、类型识别和章节标题定位，
+正文边读边压缩写入正文存储（见novel_storage.py），全程不在内存中拼出整本小说。
+"""
+
+import codecs
+import os
+import re
+
+# TXT文件按块读取的字符数
+TEXT_READ_CHUNK_SIZE = 256 * 1024
+
+# 编码探测：从文件开头、中间、结尾各取一段样本
+ENCODING_SAMPLE_SIZE = 32 * 1024
+CANDIDATE_ENCODINGS = ['utf-8', 'gbk', 'gb2312', 'big5']
+
+# 类型识别关键词，按优先级排列，与原先上传时的判断规则一致
+GENRE_KEYWORDS = [
+    ('仙侠', ['修仙', '仙侠', '灵气', '修炼', '丹药']),
+    ('都市', ['都市', '现代', '都市生活', '职场']),
+    ('玄幻', ['玄幻', '魔法', '异世界', '穿越']),
+    ('历史', ['历史', '古代', '朝廷', '皇帝']),
+]
+DEFAULT_GENRE = '其他'
+
+# 章节标题（行首），记录其在正文中的字符偏移
+CHAPTER_HEADING_PATTERN = re.compile(
+    r'^\s*(第[一二三四五六七八九十百千万零〇两\d]+[章回节卷]|Chapter\s*\d+)[^\n]*',
+    re.IGNORECASE
+)
+MAX_CHAPTER_OFFSETS = 5000
+
+SUPPORTED_EXTENSIONS = ('.txt', '.doc', '.docx', '.pdf')
+
+
+def _sample_decodes(sample, encoding, trim_start):
+    """
+    样本能否用指定编码解码；中间的样本可能从多字节字符中间开始，允许跳过开头几个字节
+    """
+    for skip in range(4 if trim_start else 1):
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(sample[skip:], final=False)
+            return True
+        except UnicodeDecodeError:
+            continue
+    return False
+
+
+def detect_text_encoding(file_path):
+    """
+    根据文件开头、中间、结尾的样本探测文本编码
+
+    Returns:
+        str: 编码名称，都无法解码时返回None
+    """
+    file_size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        head = f.read(ENCODING_SAMPLE_SIZE)
+        samples = [(head, False)]
+        for position in (file_size // 2, max(file_size - ENCODING_SAMPLE_SIZE, 0)):
+            if position > ENCODING_SAMPLE_SIZE:
+                f.seek(position)
+                samples.append((f.read(ENCODING_SAMPLE_SIZE), True))
+
+    if head.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+
+    for encoding in CANDIDATE_ENCODINGS:
+        if all(_sample_decodes(sample, encoding, trim_start) for sample, trim_start in samples):
+            return encoding
+    return None
+
+
+def iter_txt_segments(file_path, progress_callback=None):
+    """
+    按块读取TXT文件，保留原始换行符
+    """
+    encoding = detect_text_encoding(file_path)
+    errors = 'replace' if encoding else 'ignore'
+    file_size = max(os.path.getsize(file_path), 1)
+    with open(file_path, 'rb') as raw:
+        reader = codecs.getreader(encoding or 'utf-8')(raw, errors=errors)
+        for chunk in iter(lambda: reader.read(TEXT_READ_CHUNK_SIZE), ''):
+            yield chunk
+            if progress_callback:
+                progress_callback(raw.tell() * 100 // file_size, '正在解析TXT文件')
+
+
+def iter_docx_segments(file_path, progress_callback=None):
+    """
+    逐段落读取DOCX文件，段落之间以换行分隔，跳过空段落
+    """
+    import docx
+    paragraphs = docx.Document(file_path).paragraphs
+    total = max(len(paragraphs), 1)
+    first = True
+    for index, paragraph in enumerate(paragraphs, 1):
+        text = paragraph.text
+        if text.strip():
+            yield text if first else '\n' + text
+            first = False
+        if progress_callback and index % 200 == 0:
+            progress_callback(index * 100 // total, '正在解析DOCX文件')
+
+
+def iter_pdf_segments(file_path, progress_callback=None):
+    """
+    逐页读取PDF文件，页之间以换行分隔，跳过空白页
+    """
+    import PyPDF2
+    with open(file_path, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        total = max(len(reader.pages), 1)
+        first = True
+        for index, page in enumerate(reader.pages, 1):
+            text = page.extract_text() or ''
+            if text.strip():
+                yield text if first else '\n' + text
+                first = False
+            if progress_callback:
+                progress_callback(index * 100 // total, f'正在解析PDF第{index}/{total}页')
+
+
+def iter_document_segments(file_path, progress_callback=None):
+    """
+    按文件类型选择流式读取方式
+    """
+    file_extension = os.path.splitext(file_path)[1].lower()
+    if file_extension == '.txt':
+        return iter_txt_segments(file_path, progress_callback)
+    if file_extension in ('.doc', '.docx'):
+        return iter_docx_segments(file_path, progress_callback)
+    if file_extension == '.pdf':
+        return iter_pdf_segments(file_path, progress_callback)
+    raise ValueError(f"不支持的文件格式: {file_extension}")
+
+
+class NovelTextAnalyzer:
+    """
+    增量分析正文：字数、类型关键词和章节标题偏移，可接收任意切分的文本块
+    """
+
+    def __init__(self):
+        self.length = 0
+        self.word_count = 0
+        self.chapter_offsets = []
+        self._found_keywords = set()
+        self._all_keywords = {keyword for _, keywords in GENRE_KEYWORDS for keyword in keywords}
+        self._keyword_overlap = max(len(keyword) for keyword in self._all_keywords) - 1
+        self._tail = ''
+        self._line = ''
+        self._line_start = 0
+
+    def feed(self, text):
+        # 字数统计规则与原先一致：去掉空格和换行
+        self.word_count += len(text) - text.count(' ') - text.count('\n')
+
+        # 保留上一块末尾几个字符，避免关键词被块边界截断
+        window = (self._tail + text).lower()
+        for keyword in self._all_keywords - self._found_keywords:
+            if keyword in window:
+                self._found_keywords.add(keyword)
+        self._tail = window[-self._keyword_overlap:] if self._keyword_overlap else ''
+
+        lines = (self._line + text).split('\n')
+        self._line = lines.pop()
+        for line in lines:
+            self._check_heading(line)
+            self._line_start += len(line) + 1
+
+        self.length += len(text)
+
+    def _check_heading(self, line):
+        if len(self.chapter_offsets) >= MAX_CHAPTER_OFFSETS:
+            return
+        match = CHAPTER_HEADING_PATTERN.match(line)
+        if match:
+            self.chapter_offsets.append({
+                'offset': self._line_start + match.start(1),
+                'title': match.group(0).strip()[:50]
+            })
+
+    def finish(self):
+        if self._line:
+            self._check_heading(self._line)
+            self._line = ''
+        return self
+
+    @property
+    def genre(self):
+        for genre, keywords in GENRE_KEYWORDS:
+            if any(keyword in self._found_keywords for keyword in keywords):
+                return genre
+        return DEFAULT_GENRE
+
+
+def ingest_novel_file(file_path, store, progress_callback=None):
+    """
+    流式解析小说文件并写入正文存储
+
+    Args:
+        file_path (str): 已落盘的上传文件路径
+        store (NovelBlobStore): 正文存储
+        progress_callback (callable): progress_callback(百分比, 消息)
+
+    Returns:
+        dict: {'content_blob', 'content_length', 'word_count', 'genre', 'chapter_offsets'}
+    """
+    analyzer = NovelTextAnalyzer()
+
+    def analyzed_segments():
+        for segment in iter_document_segments(file_path, progress_callback):
+            analyzer.feed(segment)
+            yield segment
+
+    digest, length = store.put_chunks(analyzed_segments())
+    analyzer.finish()
+    return {
+        'content_blob': digest if length else None,
+        'content_length': length,
+        'word_count': analyzer.word_count,
+        'genre': analyzer.genre,
+        'chapter_offsets': analyzer.chapter_offsets,
+    }
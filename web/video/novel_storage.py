@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+小说正文压缩存储
+正文按内容SHA-256寻址，gzip压缩后保存在 NOVEL_BLOB_ROOT 下，数据库只保存存储键。
+相同内容只存一份；读取时支持流式打开，分章等流程无需一次性加载整本小说。
+"""
+
+import gzip
+import hashlib
+import io
+import os
+import uuid
+
+# 流式读取时每次读取的字符数
+DEFAULT_READ_CHUNK_SIZE = 256 * 1024
+
+
+class NovelBlobStore:
+    """
+    基于本地目录的正文存储，路径为 <root>/<键前两位>/<键>.txt.gz
+    """
+
+    def __init__(self, root):
+        self.root = str(root)
+
+    def _path(self, digest):
+        return os.path.join(self.root, digest[:2], f"{digest}.txt.gz")
+
+    def exists(self, digest):
+        return bool(digest) and os.path.exists(self._path(digest))
+
+    def put_text(self, text):
+        """
+        保存正文，返回存储键（内容SHA-256）；内容已存在时直接返回
+        """
+        data = text.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if os.path.exists(path):
+            return digest
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with gzip.open(temp_path, 'wb', compresslevel=6) as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        return digest
+
+    def put_chunks(self, chunks):
+        """
+        流式保存正文：边压缩写入临时文件边计算哈希，存储键与put_text(''.join(chunks))相同
+
+        Returns:
+            tuple: (存储键, 正文字符数)
+        """
+        sha256 = hashlib.sha256()
+        length = 0
+        temp_dir = os.path.join(self.root, 'tmp')
+        os.makedirs(temp_dir, exist_ok=True)
+        temp_path = os.path.join(temp_dir, f"{uuid.uuid4().hex}.txt.gz")
+        try:
+            with gzip.open(temp_path, 'wb', compresslevel=6) as f:
+                for chunk in chunks:
+                    data = chunk.encode('utf-8')
+                    sha256.update(data)
+                    f.write(data)
+                    length += len(chunk)
+
+            digest = sha256.hexdigest()
+            path = self._path(digest)
+            if os.path.exists(path):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temp_path, path)
+            return digest, length
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def open_text(self, digest):
+        """
+        以文本流方式打开正文，保留原始换行符
+        """
+        return gzip.open(self._path(digest), 'rt', encoding='utf-8', newline='')
+
+    def read_text(self, digest):
+        with self.open_text(digest) as f:
+            return f.read()
+
+    def iter_chunks(self, digest, chunk_size=DEFAULT_READ_CHUNK_SIZE):
+        """
+        按块迭代正文
+        """
+        with self.open_text(digest) as f:
+            for chunk in iter(lambda: f.read(chunk_size), ''):
+                yield chunk
+
+    def source(self, digest):
+        return BlobTextSource(self, digest)
+
+
+class BlobTextSource:
+    """
+    可重复打开的正文数据源，open()返回文本流
+    ScriptGeneratorV2.split_novel_into_chapters可直接接收此对象做流式分章
+    """
+
+    def __init__(self, store, digest):
+        self.store = store
+        self.digest = digest
+
+    def open(self):
+        return self.store.open_text(self.digest)
+
+
+class StringTextSource:
+    """
+    内存中尚未保存的正文，接口与BlobTextSource一致
+    """
+
+    def __init__(self, text):
+        self.text = text
+
+    def open(self):
+        return io.StringIO(self.text, newline='')
+
+
+def get_novel_blob_store():
+    """
+    按settings.NOVEL_BLOB_ROOT创建正文存储
+    """
+    from django.conf import settings
+    root = getattr(settings, 'NOVEL_BLOB_ROOT', None) or os.path.join(settings.BASE_DIR, 'novel_blobs')
+    return NovelBlobStore(root)
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Celery队列拓扑
+按资源类型把任务分到三个队列，每个队列由独立的worker进程池消费，长时间的渲染不再占满状态扫描的执行槽位:
+
+    control  状态扫描、任务对账等亚秒级任务，threads池，优先级最高
+    io       接口提交与轮询、LLM调用、调用外部脚本等待结果的任务，threads池，并发数高
+    render   ffmpeg合成视频，prefork池，并发数按编码能力设置（默认：有NVIDIA GPU时2，否则CPU核数/4）
+
+settings.py 从这里生成 CELERY_TASK_ROUTES / CELERY_TASK_QUEUES，run_celery.py 按 worker_profiles() 启动worker。
+本模块不依赖Celery和Django，可以单独导入。
+
+环境变量:
+    CELERY_CONTROL_CONCURRENCY   control队列线程数，默认4
+    CELERY_IO_CONCURRENCY        io队列线程数，默认16
+    CELERY_RENDER_CONCURRENCY    render队列进程数，默认按编码能力
+"""
+
+import os
+import shutil
+
+CONTROL_QUEUE = 'control'
+IO_QUEUE = 'io'
+RENDER_QUEUE = 'render'
+
+# 升级前投递到默认队列的消息由io worker继续消费
+LEGACY_QUEUE = 'celery'
+
+QUEUE_NAMES = (CONTROL_QUEUE, IO_QUEUE, RENDER_QUEUE)
+
+# Redis broker的优先级：0最高，9最低
+PRIORITY_STEPS = list(range(10))
+DEFAULT_PRIORITY = 5
+
+# 任务名 -> (队列, 优先级)；同一队列内单个对象的交互操作优先于整本/整章的批量任务
+# control/io为threads池，路由到这两个队列的任务不能修改进程级状态（重定向sys.stdout、os.chdir等），
+# 否则同一worker中并发的任务会互相干扰；需要这样做的任务应改为收集自己的输出，或路由到prefork池
+TASK_QUEUES = {
+    # 状态扫描与对账
+    'scan_and_process_async_tasks': (CONTROL_QUEUE, 0),
+    'scan_specific_async_tasks': (CONTROL_QUEUE, 0),
+    'process_async_task_dirs': (CONTROL_QUEUE, 0),
+    'scan_database_celery_tasks': (CONTROL_QUEUE, 2),
+    'queue_latency_probe': (CONTROL_QUEUE, 0),
+    'test_task': (CONTROL_QUEUE, 5),
+
+    # 接口提交与轮询、LLM调用
+    'get_volcengine_image_result': (IO_QUEUE, 1),
+    'monitor_and_download_narration_images': (IO_QUEUE, 2),
+    'regenerate_single_image_task': (IO_QUEUE, 2),
+    'generate_character_image_async': (IO_QUEUE, 2),
+    'generate_narration_images_async': (IO_QUEUE, 3),
+    'ingest_novel_upload_async': (IO_QUEUE, 3),
+    'generate_character_images_async': (IO_QUEUE, 5),
+    'generate_script_async': (IO_QUEUE, 5),
+    'validate_narration_async': (IO_QUEUE, 5),
+    'gen_image_async_v2_task': (IO_QUEUE, 5),
+    'batch_generate_chapter_images_async': (IO_QUEUE, 5),
+    'generate_first_video_async': (IO_QUEUE, 5),
+    'generate_audio_async': (IO_QUEUE, 5),
+    'validate_narration_images_llm_async': (IO_QUEUE, 5),
+    'gen_image_async_v4_task': (IO_QUEUE, 5),
+    'gen_script_task': (IO_QUEUE, 6),
+    'validate_script_task': (IO_QUEUE, 6),
+    'gen_audio_task': (IO_QUEUE, 6),
+    'gen_ass_task': (IO_QUEUE, 6),
+    'gen_image_task': (IO_QUEUE, 6),
+
+    # ffmpeg渲染
+    'concat_narration_video_async': (RENDER_QUEUE, 3),
+    'generate_chapter_video_task': (RENDER_QUEUE, 4),
+    'generate_video_async': (RENDER_QUEUE, 5),
+    'batch_generate_all_videos_async': (RENDER_QUEUE, 6),
+    'render_load_probe': (RENDER_QUEUE, 5),
+}
+
+TASK_MODULE = 'video.tasks'
+
+
+def default_render_concurrency():
+    """
+    render队列的默认进程数：NVENC同时编码路数有限，有NVIDIA GPU时2路；纯CPU编码时每路占用多个核
+    """
+    if shutil.which('nvidia-smi'):
+        return 2
+    return max(1, (os.cpu_count() or 1) // 4)
+
+
+def _env_int(name, default):
+    try:
+        return max(1, int(os.environ.get(name, default)))
+    except ValueError:
+        return default
+
+
+def worker_profiles():
+    """
+    各队列worker的启动参数
+
+    Returns:
+        dict: {队列名: {'queues', 'pool', 'concurrency', 'prefetch_multiplier'}}
+    """
+    return {
+        CONTROL_QUEUE: {
+            'queues': [CONTROL_QUEUE],
+            'pool': 'threads',
+            'concurrency': _env_int('CELERY_CONTROL_CONCURRENCY', 4),
+            'prefetch_multiplier': 1,
+        },
+        IO_QUEUE: {
+            'queues': [IO_QUEUE, LEGACY_QUEUE],
+            'pool': 'threads',
+            'concurrency': _env_int('CELERY_IO_CONCURRENCY', 16),
+            'prefetch_multiplier': 1,
+        },
+        RENDER_QUEUE: {
+            'queues': [RENDER_QUEUE],
+            'pool': 'prefork',
+            'concurrency': _env_int('CELERY_RENDER_CONCURRENCY', default_render_concurrency()),
+            # 渲染任务长短差异大，每个进程只预取一个，避免短任务排在长任务后面
+            'prefetch_multiplier': 1,
+        },
+    }
+
+
+def task_routes():
+    """
+    生成CELERY_TASK_ROUTES：每个任务显式指定队列和优先级，未列出的任务进入io队列
+    """
+    routes = {
+        f'{TASK_MODULE}.{name}': {'queue': queue, 'routing_key': queue, 'priority': priority}
+        for name, (queue, priority) in TASK_QUEUES.items()
+    }
+    routes[f'{TASK_MODULE}.*'] = {'queue': IO_QUEUE, 'routing_key': IO_QUEUE, 'priority': DEFAULT_PRIORITY}
+    return routes
+
+
+def beat_options(task_name):
+    """
+    定时任务的投递参数，与task_routes一致
+    """
+    queue, priority = TASK_QUEUES[task_name]
+    return {'queue': queue, 'routing_key': queue, 'priority': priority}
+
+
+def worker_command(profile, python, loglevel='info', concurrency=None):
+    """
+    生成启动指定队列worker的命令
+
+    Args:
+        profile (str): 队列名（control/io/render）
+        python (str): Python解释器路径
+        loglevel (str): 日志级别
+        concurrency (int): 覆盖默认并发数
+    """
+    config = worker_profiles()[profile]
+    return [
+        python, '-m', 'celery', '-A', 'web', 'worker',
+        '--loglevel', loglevel,
+        '--hostname', f'{profile}@%h',
+        '--queues', ','.join(config['queues']),
+        '--pool', config['pool'],
+        '--concurrency', str(concurrency or config['concurrency']),
+        '--prefetch-multiplier', str(config['prefetch_multiplier']),
+        '-O', 'fair',
+    ]
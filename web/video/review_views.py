@@ -11,6 +11,7 @@ from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.utils import timezone
 from django.db.models import Q
+import re
 
 from video.models import Chapter
 from video.permissions import reviewer_required, is_reviewer
@@ -324,3 +325,94 @@ def get_chapter_review_status(request, chapter_id):
             'message': f'获取审核状态失败：{str(e)}'
         }, status=500)
 
+
+
+# 章节选择器每页最多返回的条数
+CHAPTER_SEARCH_MAX_LIMIT = 100
+
+CHAPTER_NUMBER_PATTERN = re.compile(r'第(\d+)章')
+
+
+def chapter_number_from_title(title):
+    """
+    从章节标题（如"第12章 xxx"）中解析章节序号，解析不到时返回None
+    """
+    match = CHAPTER_NUMBER_PATTERN.search(title or '')
+    return int(match.group(1)) if match else None
+
+
+@require_http_methods(["GET"])
+@login_required
+def chapter_search_api(request):
+    """
+    章节选择器搜索接口（键集分页）
+    
+    功能：
+    - 按章节名或小说名搜索，可按小说和审核状态筛选
+    - 使用 after=<上一页最后一个章节ID> 翻页，不使用OFFSET，翻页代价与页码无关
+    - 审核组只能看到审核中、已通过、已拒绝的章节
+    
+    查询参数：
+        q: 搜索关键字
+        novel_id: 小说ID
+        status: 审核状态
+        after: 游标（上一页返回的next_cursor）
+        limit: 每页条数，默认20，最多100
+    
+    Args:
+        request: HTTP请求对象
+    
+    Returns:
+        JsonResponse: {'success', 'results', 'next_cursor', 'has_more'}，
+            results每项包含id、title、chapter_number（从标题解析，可能为None）、novel_id、novel_name、review_status
+    """
+    from video.permissions import is_admin
+    
+    try:
+        after = int(request.GET.get('after') or 0)
+        limit = min(max(int(request.GET.get('limit') or 20), 1), CHAPTER_SEARCH_MAX_LIMIT)
+        novel_id = int(request.GET['novel_id']) if request.GET.get('novel_id') else None
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'message': '参数格式错误：after、limit、novel_id必须为整数'
+        }, status=400)
+    
+    search = request.GET.get('q', '').strip()
+    status = request.GET.get('status', '').strip()
+    
+    chapters = Chapter.objects.filter(id__gt=after)
+    if not is_admin(request.user):
+        chapters = chapters.filter(review_status__in=['reviewing', 'approved', 'rejected'])
+    if novel_id:
+        chapters = chapters.filter(novel_id=novel_id)
+    if status:
+        chapters = chapters.filter(review_status=status)
+    if search:
+        chapters = chapters.filter(
+            Q(title__icontains=search) |
+            Q(novel__name__icontains=search)
+        )
+    
+    # 多取一条用于判断是否还有下一页
+    rows = list(chapters.order_by('id').values(
+        'id', 'title', 'novel_id', 'novel__name', 'review_status'
+    )[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    results = [{
+        'id': row['id'],
+        'title': row['title'],
+        'chapter_number': chapter_number_from_title(row['title']),
+        'novel_id': row['novel_id'],
+        'novel_name': row['novel__name'],
+        'review_status': row['review_status'],
+    } for row in rows]
+    
+    return JsonResponse({
+        'success': True,
+        'results': results,
+        'next_cursor': results[-1]['id'] if has_more else None,
+        'has_more': has_more
+    })
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+Celery任务状态事件传播
+通过Celery信号（task_prerun/success/failure/retry）以及进度上报，
+在任务状态变化时立即批量更新数据库，取代定时逐条查询AsyncResult的扫描方式
+同时在task_postrun时为每个任务记录一条追踪span（见项目根目录pipeline_trace.py）
+"""
+
+import logging
+import sys
+import threading
+import time
+from pathlib import Path
+
+from celery import Task
+from celery.signals import task_prerun, task_postrun, task_success, task_failure, task_retry
+from django.db import close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# 同一任务两次进度写库之间的最小间隔（秒），避免高频update_state压垮数据库
+PROGRESS_WRITE_INTERVAL = 0.5
+
+# 角色图片任务以CharacterImageTask.task_id作为Celery任务ID提交；
+# 此前提交的任务只能通过task_id关键字参数关联记录
+CHARACTER_IMAGE_TASK_NAME = 'video.tasks.generate_character_image_async'
+
+# CharacterImageTask的终态
+CHARACTER_TASK_FINAL_STATUSES = ('success', 'failed', 'cancelled')
+
+_last_progress_write = {}
+_progress_lock = threading.Lock()
+
+# 任务开始时间，task_postrun时取出记录追踪span
+_task_started_at = {}
+
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+
+def _result_message(result, default):
+    """
+    从任务返回值中提取消息文本
+    """
+    if isinstance(result, dict):
+        return result.get('message', default)
+    return default
+
+
+def propagate_task_state(task_id, state, info=None, task_kwargs=None, task_name=None):
+    """
+    将Celery任务状态同步到所有引用该任务ID的数据库记录
+
+    每张表只执行一条UPDATE语句（queryset.update），不逐条加载和保存模型。
+
+    Args:
+        task_id (str): Celery任务ID
+        state (str): Celery状态（PENDING/STARTED/PROGRESS/RETRY/SUCCESS/FAILURE）
+        info: 任务结果、进度meta或异常信息
+        task_kwargs (dict): 任务关键字参数，用于定位旧任务自定义ID关联的记录
+        task_name (str): 任务名称
+
+    Returns:
+        int: 更新的记录数
+    """
+    from .models import Chapter, Narration, CharacterImageTask
+
+    if not task_id:
+        return 0
+
+    now = timezone.now()
+    updated = 0
+    chapters = Chapter.objects.filter(batch_image_task_id=task_id)
+    narrations = Narration.objects.filter(celery_task_id=task_id)
+    character_task_ids = [task_id]
+    if task_name == CHARACTER_IMAGE_TASK_NAME and task_kwargs and task_kwargs.get('task_id'):
+        character_task_ids.append(task_kwargs['task_id'])
+    character_tasks = CharacterImageTask.objects.filter(task_id__in=character_task_ids)
+
+    if state == 'SUCCESS':
+        updated += chapters.exclude(batch_image_status='completed').update(
+            batch_image_status='completed',
+            batch_image_progress=100,
+            batch_image_message=_result_message(info, '批量生成完成'),
+            batch_image_completed_at=now
+        )
+        updated += narrations.update(
+            image_task_status='completed',
+            image_task_progress=100,
+            image_task_message=_result_message(info, '图片生成完成'),
+            image_task_completed_at=now
+        )
+        updated += character_tasks.exclude(status__in=CHARACTER_TASK_FINAL_STATUSES).update(
+            status='success',
+            progress=100,
+            completed_at=now
+        )
+    elif state == 'FAILURE':
+        error_info = str(info) if info else '未知错误'
+        updated += chapters.exclude(batch_image_status='failed').update(
+            batch_image_status='failed',
+            batch_image_message=f'任务失败: {error_info}',
+            batch_image_error=error_info,
+            batch_image_completed_at=now
+        )
+        updated += narrations.update(
+            image_task_status='failed',
+            image_task_message=f'任务失败: {error_info}',
+            image_task_error=error_info,
+            image_task_completed_at=now
+        )
+        updated += character_tasks.exclude(status__in=CHARACTER_TASK_FINAL_STATUSES).update(
+            status='failed',
+            error_message=error_info,
+            completed_at=now
+        )
+    elif state == 'PENDING':
+        updated += chapters.exclude(batch_image_status__in=['pending', 'completed', 'failed']).update(
+            batch_image_status='pending'
+        )
+    else:
+        # STARTED/RETRY/PROGRESS等进行中状态
+        chapter_fields = {'batch_image_status': 'processing'}
+        narration_fields = {'image_task_status': 'processing'}
+        character_fields = {'status': 'processing'}
+        if state == 'PROGRESS' and isinstance(info, dict):
+            if 'current' in info:
+                chapter_fields['batch_image_progress'] = info['current']
+                narration_fields['image_task_progress'] = info['current']
+                character_fields['progress'] = info['current']
+            if info.get('status'):
+                chapter_fields['batch_image_message'] = info['status']
+                narration_fields['image_task_message'] = info['status']
+                character_fields['log_message'] = info['status']
+        elif state == 'RETRY' and info:
+            chapter_fields['batch_image_message'] = f'任务重试: {info}'
+            narration_fields['image_task_message'] = f'任务重试: {info}'
+        updated += chapters.exclude(batch_image_status__in=['completed', 'failed']).update(**chapter_fields)
+        updated += narrations.exclude(image_task_status__in=['completed', 'failed']).update(**narration_fields)
+        updated += character_tasks.exclude(status__in=CHARACTER_TASK_FINAL_STATUSES).update(**character_fields)
+
+    if updated:
+        logger.debug(f"任务 {task_id} 状态 {state} 已同步 {updated} 条记录")
+    return updated
+
+
+def _safe_propagate(task_id, state, info=None, task_kwargs=None, task_name=None):
+    """
+    在信号处理器中同步状态，任何异常都不能影响任务本身
+    """
+    try:
+        close_old_connections()
+        propagate_task_state(task_id, state, info, task_kwargs, task_name)
+    except Exception as e:
+        logger.warning(f"同步任务 {task_id} 状态 {state} 失败: {e}")
+
+
+class StatusPropagatingTask(Task):
+    """
+    Celery任务基类：调用update_state上报进度时同步写入数据库（按任务节流）
+    """
+
+    def update_state(self, task_id=None, state=None, meta=None, **kwargs):
+        super().update_state(task_id=task_id, state=state, meta=meta, **kwargs)
+
+        task_id = task_id or self.request.id
+        if not task_id or state is None:
+            return
+
+        now = time.monotonic()
+        finished = isinstance(meta, dict) and meta.get('current', 0) >= meta.get('total', 100)
+        with _progress_lock:
+            last_write = _last_progress_write.get(task_id, 0)
+            if not finished and now - last_write < PROGRESS_WRITE_INTERVAL:
+                return
+            _last_progress_write[task_id] = now
+
+        _safe_propagate(task_id, state, meta, self.request.kwargs, self.name)
+
+
+def _record_task_span(task_id, task_name, state, task_kwargs):
+    """
+    记录Celery任务的追踪span，小说和章节ID取自任务关键字参数
+    """
+    with _progress_lock:
+        started_at = _task_started_at.pop(task_id, None)
+    if started_at is None:
+        return
+    try:
+        from pipeline_trace import record_span
+
+        task_kwargs = task_kwargs or {}
+        record_span(
+            'celery_task', started_at, time.time(),
+            status='ok' if state == 'SUCCESS' else 'error',
+            task=task_name,
+            task_id=task_id,
+            state=state,
+            novel_id=task_kwargs.get('novel_id'),
+            chapter_id=task_kwargs.get('chapter_id'),
+        )
+    except Exception as e:
+        logger.warning(f"记录任务 {task_id} 追踪信息失败: {e}")
+
+
+@task_prerun.connect
+def on_task_prerun(sender=None, task_id=None, task=None, args=None, kwargs=None, **extra):
+    with _progress_lock:
+        _task_started_at[task_id] = time.time()
+    _safe_propagate(task_id, 'STARTED', None, kwargs, getattr(sender, 'name', None))
+
+
+@task_postrun.connect
+def on_task_postrun(sender=None, task_id=None, task=None, args=None, kwargs=None, state=None, **extra):
+    _record_task_span(task_id, getattr(sender, 'name', None), state, kwargs)
+
+
+@task_success.connect
+def on_task_success(sender=None, result=None, **extra):
+    request = sender.request
+    with _progress_lock:
+        _last_progress_write.pop(request.id, None)
+    _safe_propagate(request.id, 'SUCCESS', result, request.kwargs, sender.name)
+
+
+@task_failure.connect
+def on_task_failure(sender=None, task_id=None, exception=None, kwargs=None, **extra):
+    with _progress_lock:
+        _last_progress_write.pop(task_id, None)
+    _safe_propagate(task_id, 'FAILURE', exception, kwargs, getattr(sender, 'name', None))
+
+
+@task_retry.connect
+def on_task_retry(sender=None, request=None, reason=None, **extra):
+    if request is None:
+        return
+    _safe_propagate(request.id, 'RETRY', reason, request.kwargs, getattr(sender, 'name', None))
@@ -5,6 +5,7 @@ Celery异步任务
 """
 
 from celery import shared_task
+from celery.signals import task_postrun, task_prerun, worker_ready, worker_shutdown
 import time
 import logging
 import os
@@ -15,12 +16,19 @@ from pathlib import Path
 from django.conf import settings
 from django.utils import timezone
 from .models import CharacterImageTask, Character, Chapter
+from .queue_topology import CONTROL_QUEUE
 from volcengine.visual.VisualService import VisualService
 
 # 添加项目根目录到Python路径，以便导入check_async_tasks模块
 project_root = Path(__file__).resolve().parent.parent.parent
 sys.path.insert(0, str(project_root))
 
+from rate_limiter import get_rate_limiter, rate_limited_call
+from async_task_feed import get_async_task_feed, process_task_dir
+from asset_store import store_bytes
+from image_derivatives import ingest_image
+from stage_lock import get_stage_guard
+
 try:
     from check_async_tasks import (
         process_all_data_directories,
@@ -63,6 +71,36 @@ def test_task(message):
     return result
 
 
+@shared_task
+def queue_latency_probe(sent_at):
+    """
+    队列延迟探针，走control队列，返回从投递到开始执行的等待时间（celery_load_test.py使用）
+    
+    Args:
+        sent_at (float): 投递时的time.time()
+        
+    Returns:
+        dict: 排队等待秒数
+    """
+    return {'queued_seconds': time.time() - sent_at}
+
+
+@shared_task
+def render_load_probe(seconds):
+    """
+    渲染负载探针，走render队列，占满一个CPU核指定秒数，模拟ffmpeg编码（celery_load_test.py使用）
+    
+    Args:
+        seconds (float): 占用时长
+    """
+    deadline = time.time() + seconds
+    iterations = 0
+    while time.time() < deadline:
+        sum(i * i for i in range(10000))
+        iterations += 1
+    return {'iterations': iterations}
+
+
 @shared_task
 def generate_video_async(novel_id, chapter_id):
     """
@@ -477,21 +515,20 @@ def validate_narration_async(self, novel_id, validation_params=None):
         # 优先采用统一的 --auto-fix 开关，以满足页面映射到命令的需求
         # 如果前端未显式传入，默认启用 --auto-fix（更贴近用户期望的行为）
         auto_fix = validation_params.get('auto_fix', True)
+        fix_flags = {
+            'auto_rewrite': auto_fix or validation_params.get('auto_rewrite', False),
+            'auto_fix_characters': auto_fix or validation_params.get('auto_fix_characters', False),
+            'auto_fix_tags': auto_fix or validation_params.get('auto_fix_tags', False),
+            'auto_fix_structure': auto_fix or validation_params.get('auto_fix_structure', False),
+        }
         if auto_fix:
             cmd.append('--auto-fix')
         else:
             # 兼容旧参数：如果未启用统一开关，则根据旧参数分别添加
-            if validation_params.get('auto_rewrite', False):
-                cmd.append('--auto-rewrite')
-            if validation_params.get('auto_fix_characters', False):
-                cmd.append('--auto-fix-characters')
-            if validation_params.get('auto_fix_tags', False):
-                cmd.append('--auto-fix-tags')
-            if validation_params.get('auto_fix_structure', False):
-                cmd.append('--auto-fix-structure')
+            for flag_name, enabled in fix_flags.items():
+                if enabled:
+                    cmd.append('--' + flag_name.replace('_', '-'))
 
-        logger.info(f"[VALIDATION CMD] 运行命令: {' '.join(cmd)} (cwd={project_root})")
-        
         # 更新任务状态
         self.update_state(
             state='PROGRESS',
@@ -502,13 +539,59 @@ def validate_narration_async(self, novel_id, validation_params=None):
             }
         )
         
-        # 调用 validate_narration.py 脚本
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            cwd=project_root
-        )
+        try:
+            import validate_narration
+        except (ImportError, SystemExit) as import_error:
+            logger.warning(f"无法导入validate_narration模块，改用子进程执行: {import_error}")
+            validate_narration = None
+        
+        if validate_narration is not None:
+            # 进程内调用校验引擎，按章节上报进度：本地校验占20%-50%，LLM修复占50%-80%
+            def report_progress(stage, done, total, chapter):
+                if stage == 'local':
+                    current = 20 + int(30 * done / max(total, 1))
+                    status = f'本地校验 {chapter} ({done}/{total})'
+                else:
+                    current = 50 + int(30 * done / max(total, 1))
+                    status = f'LLM修复 {chapter} ({done}/{total})'
+                self.update_state(
+                    state='PROGRESS',
+                    meta={
+                        'current': current,
+                        'total': 100,
+                        'status': status,
+                        'stage': stage,
+                        'chapter': chapter
+                    }
+                )
+            
+            logger.info(f"[VALIDATION ENGINE] 校验目录: {full_data_dir}, 参数: {fix_flags}")
+            # 校验消息由本任务自己收集（threads池中多个任务并发，不能重定向进程级的sys.stdout）
+            messages = []
+            try:
+                summary = validate_narration.validate_data_directory(
+                    full_data_dir,
+                    progress_callback=report_progress,
+                    llm_concurrency=validation_params.get('llm_concurrency', 4),
+                    log=messages.append,
+                    **fix_flags
+                )
+                succeeded, error_message = True, ''
+            except Exception as engine_error:
+                summary, succeeded, error_message = None, False, str(engine_error)
+            output = '\n'.join(messages)
+        else:
+            logger.info(f"[VALIDATION CMD] 运行命令: {' '.join(cmd)} (cwd={project_root})")
+            
+            # 调用 validate_narration.py 脚本
+            result = subprocess.run(
+                cmd,
+                capture_output=True,
+                text=True,
+                cwd=project_root
+            )
+            summary = None
+            succeeded, output, error_message = result.returncode == 0, result.stdout, result.stderr
         
         # 更新任务状态
         self.update_state(
@@ -520,7 +603,7 @@ def validate_narration_async(self, novel_id, validation_params=None):
             }
         )
         
-        if result.returncode == 0:
+        if succeeded:
             # 更新任务状态
             self.update_state(
                 state='PROGRESS',
@@ -650,7 +733,8 @@ def validate_narration_async(self, novel_id, validation_params=None):
                 'status': 'success',
                 'message': f'小说 {novel_id} 解说文案校验成功',
                 'novel_id': novel_id,
-                'output': result.stdout,
+                'output': output,
+                'summary': {key: summary[key] for key in ('total_chapters', 'valid_chapters', 'issues')} if summary else None,
                 'validation_params': validation_params
             }
         else:
@@ -659,17 +743,17 @@ def validate_narration_async(self, novel_id, validation_params=None):
                 from .models import Novel
                 novel = Novel.objects.get(id=novel_id)
                 novel.task_status = 'validation_failed'
-                novel.task_message = f'解说文案校验失败: {result.stderr}'
+                novel.task_message = f'解说文案校验失败: {error_message}'
                 novel.current_task_id = None
                 novel.save()
                 logger.info(f"小说 {novel_id} 校验失败状态已更新到数据库")
             except Exception as db_error:
                 logger.error(f"更新数据库失败: {str(db_error)}")
             
-            logger.error(f"小说 {novel_id} 解说文案校验失败: {result.stderr}")
+            logger.error(f"小说 {novel_id} 解说文案校验失败: {error_message}")
             return {
                 'status': 'error',
-                'message': f'解说文案校验失败: {result.stderr}',
+                'message': f'解说文案校验失败: {error_message}',
                 'novel_id': novel_id,
                 'validation_params': validation_params
             }
@@ -1607,16 +1691,17 @@ def generate_first_video_async(self, novel_id, chapter_id):
 @shared_task(bind=True)
 def scan_and_process_async_tasks(self, data_dir='data'):
     """
-    定时扫描和处理所有异步任务
+    全量扫描和处理所有异步任务（兜底对账）
     
-    这是一个Celery Beat定时任务，用于：
+    日常处理由worker内的目录变更订阅驱动（见process_async_task_dirs），
+    这个Celery Beat定时任务低频运行，用于：
     1. 扫描所有数据目录下的异步任务文件
     2. 检查任务状态并下载完成的图片/视频
     3. 移动已完成的任务到done_tasks目录
     4. 记录处理统计信息
     
     Args:
-        data_dir (str): 数据根目录路径，默认为'data'
+        data_dir (str): 数据根目录路径，默认为'data'，相对路径按项目根目录解析
         
     Returns:
         dict: 处理结果统计
@@ -1634,27 +1719,18 @@ def scan_and_process_async_tasks(self, data_dir='data'):
                 'stats': {}
             }
         
-        # 切换到项目根目录
-        original_cwd = os.getcwd()
-        os.chdir(project_root)
+        # 按项目根目录解析路径，不切换worker的工作目录
+        stats = process_all_data_directories(str(project_root / data_dir))
         
-        try:
-            # 调用check_async_tasks的主要处理函数
-            stats = process_all_data_directories(data_dir)
-            
-            logger.info(f"异步任务扫描完成: {stats}")
-            
-            return {
-                'success': True,
-                'message': '异步任务扫描处理完成',
-                'stats': stats,
-                'data_dir': data_dir,
-                'processed_at': timezone.now().isoformat()
-            }
-            
-        finally:
-            # 恢复原始工作目录
-            os.chdir(original_cwd)
+        logger.info(f"异步任务扫描完成: {stats}")
+        
+        return {
+            'success': True,
+            'message': '异步任务扫描处理完成',
+            'stats': stats,
+            'data_dir': data_dir,
+            'processed_at': timezone.now().isoformat()
+        }
             
     except Exception as e:
         error_msg = f"定时异步任务扫描失败: {str(e)}"
@@ -1671,15 +1747,15 @@ def scan_and_process_async_tasks(self, data_dir='data'):
 @shared_task(bind=True)
 def scan_specific_async_tasks(self, tasks_dir='async_tasks'):
     """
-    扫描指定目录的异步任务
+    扫描指定目录的异步任务（兜底对账）
     
-    这是一个Celery任务，用于扫描指定的async_tasks目录：
+    这是一个低频Celery Beat任务，用于扫描指定的async_tasks目录：
     1. 检查所有任务文件的状态
     2. 下载完成的图片/视频
     3. 移动已完成的任务
     
     Args:
-        tasks_dir (str): 任务目录路径，默认为'async_tasks'
+        tasks_dir (str): 任务目录路径，默认为'async_tasks'，相对路径按项目根目录解析
         
     Returns:
         dict: 处理结果统计
@@ -1697,42 +1773,34 @@ def scan_specific_async_tasks(self, tasks_dir='async_tasks'):
                 'stats': {}
             }
         
-        # 切换到项目根目录
-        original_cwd = os.getcwd()
-        os.chdir(project_root)
-        
-        try:
-            # 检查任务目录是否存在
-            if not os.path.exists(tasks_dir):
-                logger.warning(f"任务目录不存在: {tasks_dir}")
-                return {
-                    'success': True,
-                    'message': f'任务目录不存在: {tasks_dir}',
-                    'stats': {
-                        'total': 0,
-                        'completed': 0,
-                        'processing': 0,
-                        'pending': 0,
-                        'failed': 0
-                    }
-                }
-            
-            # 调用check_async_tasks的检查函数
-            stats = check_all_tasks(tasks_dir)
-            
-            logger.info(f"异步任务目录扫描完成: {stats}")
-            
+        # 检查任务目录是否存在（按项目根目录解析路径，不切换worker的工作目录）
+        tasks_path = project_root / tasks_dir
+        if not tasks_path.exists():
+            logger.warning(f"任务目录不存在: {tasks_dir}")
             return {
                 'success': True,
-                'message': '异步任务目录扫描完成',
-                'stats': stats,
-                'tasks_dir': tasks_dir,
-                'processed_at': timezone.now().isoformat()
+                'message': f'任务目录不存在: {tasks_dir}',
+                'stats': {
+                    'total': 0,
+                    'completed': 0,
+                    'processing': 0,
+                    'pending': 0,
+                    'failed': 0
+                }
             }
-            
-        finally:
-            # 恢复原始工作目录
-            os.chdir(original_cwd)
+        
+        # 调用check_async_tasks的检查函数
+        stats = check_all_tasks(str(tasks_path))
+        
+        logger.info(f"异步任务目录扫描完成: {stats}")
+        
+        return {
+            'success': True,
+            'message': '异步任务目录扫描完成',
+            'stats': stats,
+            'tasks_dir': tasks_dir,
+            'processed_at': timezone.now().isoformat()
+        }
             
     except Exception as e:
         error_msg = f"异步任务目录扫描失败: {str(e)}"
@@ -1746,6 +1814,86 @@ def scan_specific_async_tasks(self, tasks_dir='async_tasks'):
         }
 
 
+@shared_task(bind=True)
+def process_async_task_dirs(self, task_dirs):
+    """
+    处理目录变更订阅分发过来的任务目录
+    
+    只处理有文件创建/修改、或仍有未完成任务的async_tasks目录，
+    开销与待处理任务数量相关，而不是与历史章节总数相关
+    
+    Args:
+        task_dirs (list): async_tasks目录的绝对路径列表
+        
+    Returns:
+        dict: 每个目录的处理统计
+    """
+    results = {}
+    for task_dir in task_dirs:
+        try:
+            results[task_dir] = process_task_dir(task_dir)
+        except Exception as e:
+            logger.error(f"处理任务目录失败 {task_dir}: {e}", exc_info=True)
+            results[task_dir] = {'error': str(e)}
+    
+    logger.info(f"任务目录处理完成: {results}")
+    return {
+        'success': True,
+        'results': results,
+        'processed_at': timezone.now().isoformat()
+    }
+
+
+def _consumes_control_queue(sender):
+    """
+    worker是否消费control队列；未指定--queues的worker消费全部队列
+    """
+    try:
+        consume_from = sender.app.amqp.queues.consume_from
+    except AttributeError:
+        return True
+    return not consume_from or CONTROL_QUEUE in consume_from
+
+
+@worker_ready.connect
+def start_async_task_feed(sender=None, **kwargs):
+    """
+    worker启动后在主进程中开始监听任务目录，有待处理目录时分发process_async_task_dirs
+    按队列拓扑分组启动时只由control队列的worker监听，避免同一目录被重复分发
+    """
+    if not getattr(settings, 'ASYNC_TASK_FEED_ENABLED', True):
+        return
+    if not _consumes_control_queue(sender):
+        return
+    try:
+        get_async_task_feed().start_thread(lambda task_dirs: process_async_task_dirs.delay(task_dirs))
+    except Exception as e:
+        logger.error(f"启动异步任务目录变更订阅失败，仅依赖定时对账扫描: {e}", exc_info=True)
+
+
+@worker_shutdown.connect
+def stop_async_task_feed(sender=None, **kwargs):
+    get_async_task_feed().stop(timeout=5)
+
+
+@task_prerun.connect
+def start_stage_heartbeat(task_id=None, **kwargs):
+    """
+    通过阶段锁提交的任务开始执行后定期续期，worker崩溃时锁在心跳超时后失效
+    """
+    try:
+        get_stage_guard().start_heartbeat(task_id)
+    except Exception as e:
+        logger.warning(f"阶段锁心跳启动失败 {task_id}: {e}")
+
+
+@task_postrun.connect
+def release_stage_lock(task_id=None, **kwargs):
+    try:
+        get_stage_guard().finish(task_id)
+    except Exception as e:
+        logger.warning(f"释放阶段锁失败 {task_id}: {e}")
+
 
 @shared_task(bind=True)
 def scan_database_celery_tasks(self):
@@ -1839,11 +1987,16 @@ def concat_narration_video_async(self, novel_id, chapter_id):
         # 切换到项目根目录执行
         project_root = settings.BASE_DIR.parent
         
-        result = subprocess.run(
+        # 子进程通过stdout输出ffmpeg进度事件，解析后写入任务meta
+        from .logging_utils import run_command_with_logging, create_ffmpeg_progress_callback
+        ffmpeg_env = {**os.environ, 'FFMPEG_EVENTS': 'stdout'}
+        
+        result = run_command_with_logging(
             cmd,
             cwd=project_root,
-            capture_output=True,
-            text=True,
+            progress_callback=create_ffmpeg_progress_callback(self, base_progress=5, max_progress=70, step='生成主视频'),
+            task_self=self,
+            env=ffmpeg_env,
             timeout=3600  # 1小时超时
         )
         
@@ -1862,11 +2015,12 @@ def concat_narration_video_async(self, novel_id, chapter_id):
                     
                     logger.info(f"执行命令: {' '.join(finish_cmd)}")
                     
-                    finish_result = subprocess.run(
+                    finish_result = run_command_with_logging(
                         finish_cmd,
                         cwd=project_root,
-                        capture_output=True,
-                        text=True,
+                        progress_callback=create_ffmpeg_progress_callback(self, base_progress=70, max_progress=95, step='添加BGM和片尾'),
+                        task_self=self,
+                        env=ffmpeg_env,
                         timeout=1800  # 30分钟超时
                     )
                     
@@ -1950,7 +2104,7 @@ def concat_narration_video_async(self, novel_id, chapter_id):
         }
 
 
-@shared_task(bind=True, rate_limit='2/s')
+@shared_task(bind=True)
 def generate_narration_images_async(self, narration_id):
     """
     异步生成解说分镜图片任务 - 参考generate_character_image_async的实现模式
@@ -2058,7 +2212,7 @@ def generate_narration_images_async(self, narration_id):
         logger.info(f"提交火山引擎图片生成任务，解说内容: {narration.narration[:50]}...")
         
         # 调用同步转异步提交任务接口
-        resp = visual_service.cv_sync2async_submit_task(form)
+        resp = rate_limited_call('visual_submit', visual_service.cv_sync2async_submit_task, form)
         
         # 添加详细的响应日志
         logger.info(f"火山引擎API响应: {resp}")
@@ -2067,10 +2221,10 @@ def generate_narration_images_async(self, narration_id):
             error_msg = f"火山引擎API调用失败: {resp['ResponseMetadata']['Error']}"
             logger.error(error_msg)
             
-            # 检查是否是API限制错误(50429)，如果是则重试
+            # 检查是否是API限制错误(50429)，如果是则在共享限流器的冷却期结束后重试
             if '50429' in str(resp) or 'API Limit' in str(resp):
                 if self.request.retries < 3:  # 最多重试3次
-                    retry_delay = (self.request.retries + 1) * 30  # 递增延迟：30s, 60s, 90s
+                    retry_delay = max(int(get_rate_limiter().cooldown_remaining('visual_submit', form['req_key'])) + 1, 5)
                     logger.info(f"遇到API限制错误，{retry_delay}秒后重试 (第{self.request.retries + 1}/3次)")
                     
                     # 更新重试状态
@@ -2219,7 +2373,7 @@ def get_volcengine_image_result(self, narration_id, volcengine_task_id):
         }
         
         # 调用同步转异步查询结果接口
-        resp = visual_service.cv_sync2async_get_result(form)
+        resp = rate_limited_call('visual_query', visual_service.cv_sync2async_get_result, form)
         
         if resp.get('ResponseMetadata', {}).get('Error'):
             error_msg = f"火山引擎查询API调用失败: {resp['ResponseMetadata']['Error']}"
@@ -2356,16 +2510,16 @@ def monitor_and_download_narration_images(self, narration_id, volcengine_task_id
         }
         
         # 查询任务状态
-        resp = visual_service.cv_sync2async_get_result(form)
+        resp = rate_limited_call('visual_query', visual_service.cv_sync2async_get_result, form)
         
         if resp.get('ResponseMetadata', {}).get('Error'):
             error_msg = f"火山引擎查询API调用失败: {resp['ResponseMetadata']['Error']}"
             logger.error(error_msg)
             
-            # 检查是否是API限制错误(50429)，如果是则使用更短的重试间隔
+            # 检查是否是API限制错误(50429)，如果是则在共享限流器的冷却期结束后重试
             if '50429' in str(resp) or 'API Limit' in str(resp):
                 if self.request.retries < 5:  # API限制错误最多重试5次
-                    api_retry_delay = (self.request.retries + 1) * 30  # 30s, 60s, 90s, 120s, 150s
+                    api_retry_delay = max(int(get_rate_limiter().cooldown_remaining('visual_query', form.get('req_key'))) + 1, 5)
                     logger.info(f"遇到API限制错误，{api_retry_delay}秒后重试 (第{self.request.retries + 1}/5次)")
                     
                     # 更新重试状态
@@ -2427,8 +2581,8 @@ def monitor_and_download_narration_images(self, narration_id, volcengine_task_id
                         output_path = os.path.join(output_dir, filename)
                         
                         # 保存图片
-                        with open(output_path, 'wb') as f:
-                            f.write(image_data)
+                        store_bytes(image_data, output_path)
+                        ingest_image(output_path)
                         
                         downloaded_images.append({
                             'filename': filename,
@@ -2997,20 +3151,58 @@ def validate_narration_images_llm_async(self, novel_id, chapter_id):
         # 执行llm_narration_image.py脚本，针对特定章节
         cmd = ['python', script_path, chapter_dir, '--auto-regenerate']
         
-        logger.info(f"执行命令: {' '.join(cmd)}")
-        
         # 切换到项目根目录执行
         project_root = settings.BASE_DIR.parent
         
-        result = subprocess.run(
-            cmd,
-            cwd=project_root,
-            capture_output=True,
-            text=True,
-            timeout=3600  # 1小时超时
-        )
+        try:
+            import llm_narration_image
+        except ImportError as import_error:
+            logger.warning(f"无法导入llm_narration_image模块，改用子进程执行: {import_error}")
+            llm_narration_image = None
+        
+        if llm_narration_image is not None:
+            # 进程内调用并发审查引擎，逐张图片上报进度
+            def report_progress(record, done, total):
+                self.update_state(
+                    state='PROGRESS',
+                    meta={
+                        'current': int(100 * done / max(total, 1)),
+                        'total': 100,
+                        'status': f'已审查 {done}/{total}: {os.path.basename(record["image_path"])}',
+                        'verdict': record['verdict'],
+                        'cached': record['cached']
+                    }
+                )
+            
+            logger.info(f"审查章节目录: {full_chapter_path}")
+            # 审查消息由本任务自己收集（threads池中多个任务并发，不能重定向进程级的sys.stdout）
+            messages = []
+            try:
+                review_stats = llm_narration_image.process_narration_images(
+                    full_chapter_path,
+                    auto_regenerate=True,
+                    progress_callback=report_progress,
+                    log=messages.append
+                )
+                logger.info(f"审查统计: {review_stats}")
+                succeeded, error_message = True, ''
+            except Exception as engine_error:
+                review_stats, succeeded, error_message = None, False, str(engine_error)
+            output = '\n'.join(messages)
+        else:
+            logger.info(f"执行命令: {' '.join(cmd)}")
+            
+            result = subprocess.run(
+                cmd,
+                cwd=project_root,
+                capture_output=True,
+                text=True,
+                timeout=3600  # 1小时超时
+            )
+            review_stats = None
+            succeeded, output, error_message = result.returncode == 0, result.stdout, result.stderr
         
-        if result.returncode == 0:
+        if succeeded:
             logger.info(f"旁白图片校验(LLM)完成: 小说ID={novel_id}, 章节ID={chapter_id}")
             
             return {
@@ -3018,17 +3210,18 @@ def validate_narration_images_llm_async(self, novel_id, chapter_id):
                 'message': '旁白图片校验(LLM)完成',
                 'novel_id': novel_id,
                 'chapter_id': chapter_id,
-                'output': result.stdout
+                'output': output,
+                'review_stats': review_stats
             }
         else:
-            logger.error(f"旁白图片校验(LLM)失败: {result.stderr}")
+            logger.error(f"旁白图片校验(LLM)失败: {error_message}")
             return {
                 'status': 'error',
-                'message': f'旁白图片校验(LLM)失败: {result.stderr}',
+                'message': f'旁白图片校验(LLM)失败: {error_message}',
                 'novel_id': novel_id,
                 'chapter_id': chapter_id,
-                'output': result.stdout,
-                'error': result.stderr
+                'output': output,
+                'error': error_message
             }
             
     except Exception as e:
@@ -4309,3 +4502,95 @@ def regenerate_single_image_task(self, novel_id, chapter_title, scene_number, cu
             'message': error_msg,
             'error': str(e)
         }
+
+
+@shared_task(bind=True)
+def ingest_novel_upload_async(self, novel_id, original_filename=None):
+    """
+    解析已落盘的小说上传文件
+    
+    流式提取正文写入正文存储，同时统计字数、识别类型、定位章节标题，
+    进度写入Novel的task_status/task_message，解析完成后上传原始文件到TOS。
+    
+    Args:
+        novel_id (int): 小说ID
+        original_filename (str): 上传时的原始文件名，用于TOS对象键
+    """
+    from .models import Novel
+    from .novel_ingest import ingest_novel_file
+    from .novel_storage import get_novel_blob_store
+    from .utils import upload_novel_to_tos
+    
+    logger.info(f"[ingest_novel_upload] 开始解析上传文件，小说ID: {novel_id}")
+    last_percent = [-1]
+    
+    def report_progress(percent, message):
+        # 进度每变化5%才写一次库
+        if percent - last_percent[0] < 5 and percent < 100:
+            return
+        last_percent[0] = percent
+        self.update_state(state='PROGRESS', meta={'current': percent, 'total': 100, 'status': message})
+        Novel.objects.filter(pk=novel_id).update(task_message=f'{message}（{percent}%）')
+    
+    try:
+        novel = Novel.objects.only('id', 'original_file').get(pk=novel_id)
+        if not novel.original_file or not os.path.exists(novel.original_file.path):
+            raise FileNotFoundError(f"上传文件不存在: {novel.original_file}")
+        file_path = novel.original_file.path
+        
+        Novel.objects.filter(pk=novel_id).update(
+            task_status='ingesting',
+            current_task_id=self.request.id,
+            task_message='开始解析上传文件...'
+        )
+        
+        started = time.time()
+        result = ingest_novel_file(file_path, get_novel_blob_store(), progress_callback=report_progress)
+        elapsed = time.time() - started
+        message = (f"文件解析完成：{result['word_count']}字，类型{result['genre']}，"
+                   f"识别到{len(result['chapter_offsets'])}个章节标题，耗时{elapsed:.1f}秒")
+        
+        Novel.objects.filter(pk=novel_id).update(
+            content_blob=result['content_blob'],
+            content_length=result['content_length'],
+            word_count=result['word_count'],
+            type=result['genre'],
+            chapter_offsets=result['chapter_offsets'],
+            task_status='idle',
+            current_task_id=None,
+            task_message=message,
+            task_updated_at=timezone.now()
+        )
+        logger.info(f"[ingest_novel_upload] {message}，小说ID: {novel_id}")
+        
+        # 上传原始文件到TOS，失败不影响解析结果
+        upload_result = upload_novel_to_tos(novel_id, file_path, original_filename or os.path.basename(file_path))
+        if upload_result['success']:
+            logger.info(f"[ingest_novel_upload] TOS上传成功: {upload_result['message']}")
+        else:
+            logger.warning(f"[ingest_novel_upload] TOS上传失败: {upload_result['message']}")
+            Novel.objects.filter(pk=novel_id).update(task_message=f"{message}；TOS上传失败: {upload_result['message']}")
+        
+        return {
+            'status': 'success',
+            'novel_id': novel_id,
+            'message': message,
+            'word_count': result['word_count'],
+            'genre': result['genre'],
+            'chapter_count': len(result['chapter_offsets'])
+        }
+        
+    except Exception as e:
+        error_msg = f"文件解析失败: {str(e)}"
+        logger.error(f"[ingest_novel_upload] {error_msg}，小说ID: {novel_id}", exc_info=True)
+        Novel.objects.filter(pk=novel_id).update(
+            task_status='ingest_failed',
+            current_task_id=None,
+            task_message=error_msg
+        )
+        return {
+            'status': 'error',
+            'novel_id': novel_id,
+            'message': error_msg,
+            'error': str(e)
+        }
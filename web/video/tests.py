@@ -1,3 +1,311 @@
-from django.test import TestCase
+import importlib.util
+import json
+import os
+import re
+import tempfile
+import time
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.exceptions import PermissionDenied
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from . import queue_topology
+from .logging_utils import FFMPEG_EVENT_PREFIX, create_ffmpeg_progress_callback
+from .models import Chapter, Character, CharacterImageTask, Novel
+from .review_views import chapter_search_api
+from .trace_views import rate_limit_usage, trace_report
+
+# 项目根目录模块，视图模块导入时已加入sys.path
+from rate_limiter import RateLimiter, SqliteBucketBackend
+
+
+class ChapterSearchApiTests(TestCase):
+    """
+    章节选择器搜索接口：键集分页的查询次数与耗时回归测试
+    """
+    NOVEL_COUNT = 20
+    CHAPTERS_PER_NOVEL = 150
+    REVIEW_STATUSES = ['not_submitted', 'reviewing', 'approved', 'rejected']
+
+    @classmethod
+    def setUpTestData(cls):
+        novels = Novel.objects.bulk_create([Novel(name=f'小说{i:02d}') for i in range(cls.NOVEL_COUNT)])
+        Chapter.objects.bulk_create([
+            Chapter(
+                title=f'第{j + 1}章',
+                format='默认',
+                novel=novel,
+                review_status=cls.REVIEW_STATUSES[j % len(cls.REVIEW_STATUSES)]
+            )
+            for novel in novels
+            for j in range(cls.CHAPTERS_PER_NOVEL)
+        ], batch_size=1000)
+
+        cls.admin = User.objects.create_user('admin_user', password='x')
+        cls.admin.groups.add(Group.objects.create(name='管理员组'))
+        cls.reviewer = User.objects.create_user('reviewer_user', password='x')
+        cls.reviewer.groups.add(Group.objects.create(name='审核组'))
+
+    def _get(self, user, **params):
+        request = RequestFactory().get('/video/api/chapters/search/', params)
+        request.user = user
+        response = chapter_search_api(request)
+        response.data = json.loads(response.content)
+        return response
+
+    def _walk(self, user, **params):
+        """
+        按游标遍历所有页，每页查询次数固定（权限检查1次 + 章节查询1次）
+        """
+        ids = []
+        after = 0
+        slowest = 0.0
+        while True:
+            started = time.perf_counter()
+            with self.assertNumQueries(2):
+                data = self._get(user, after=after, limit=100, **params).data
+            slowest = max(slowest, time.perf_counter() - started)
+            ids.extend(row['id'] for row in data['results'])
+            if not data['has_more']:
+                break
+            after = data['next_cursor']
+        self.assertLess(slowest, 0.5)
+        return ids
+
+    def test_admin_walks_all_chapters(self):
+        ids = self._walk(self.admin)
+        self.assertEqual(len(ids), self.NOVEL_COUNT * self.CHAPTERS_PER_NOVEL)
+        self.assertEqual(ids, sorted(ids))
+
+    def test_reviewer_only_sees_reviewable_chapters(self):
+        ids = self._walk(self.reviewer)
+        self.assertEqual(len(ids), Chapter.objects.exclude(review_status='not_submitted').count())
+        self.assertFalse(Chapter.objects.filter(id__in=ids, review_status='not_submitted').exists())
+
+    def test_filters_and_invalid_params(self):
+        novel = Novel.objects.order_by('id').first()
+        data = self._get(self.admin, novel_id=novel.id, status='approved', limit=500).data
+        self.assertEqual(len(data['results']), novel.chapters.filter(review_status='approved').count())
+        self.assertTrue(all(row['novel_name'] == novel.name for row in data['results']))
+        self.assertTrue(all(row['title'] == f"第{row['chapter_number']}章" for row in data['results']))
+
+        data = self._get(self.admin, q='小说03', limit=10).data
+        self.assertEqual(len(data['results']), 10)
+        self.assertTrue(data['has_more'])
+
+        self.assertEqual(self._get(self.admin, after='abc').status_code, 400)
+
+    def test_review_indexes_exist(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Chapter._meta.db_table)
+        self.assertIn('chapter_novel_review_idx', constraints)
+        self.assertIn('chapter_review_novel_idx', constraints)
+
+
+class TraceReportViewTests(TestCase):
+    """
+    流水线追踪报告：仅管理员可见，按小说和章节筛选span
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('trace_admin', password='x')
+        cls.admin.groups.add(Group.objects.create(name='管理员组'))
+        cls.reviewer = User.objects.create_user('trace_reviewer', password='x')
+        cls.reviewer.groups.add(Group.objects.create(name='审核组'))
+
+    def setUp(self):
+        self.trace_dir = tempfile.mkdtemp()
+        now = time.time()
+        spans = [
+            {'name': 'tts', 'span_id': 'a', 'parent_id': None, 'start': now, 'end': now + 2, 'duration': 2,
+             'status': 'ok', 'attributes': {'novel': '031', 'chapter': 'chapter_001', 'api': 'bytedance_tts'}},
+            {'name': 'render', 'span_id': 'b', 'parent_id': None, 'start': now + 3, 'end': now + 8, 'duration': 5,
+             'status': 'ok', 'attributes': {'novel': '031', 'chapter': 'chapter_001'}},
+            {'name': 'render', 'span_id': 'c', 'parent_id': None, 'start': now, 'end': now + 1, 'duration': 1,
+             'status': 'error', 'attributes': {'novel': '032', 'chapter': 'chapter_001'}},
+        ]
+        path = os.path.join(self.trace_dir, f"spans-{time.strftime('%Y%m%d')}.jsonl")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(item) + '\n' for item in spans))
+
+    def _get(self, user, **params):
+        request = RequestFactory().get('/video/traces/', {'format': 'json', **params})
+        request.user = user
+        request._messages = CookieStorage(request)
+        with override_settings(PIPELINE_TRACE_DIR=self.trace_dir):
+            response = trace_report(request)
+        return json.loads(response.content)['report']
+
+    def test_admin_report_filtered_by_novel(self):
+        report = self._get(self.admin, novel='031')
+        self.assertEqual(report['span_count'], 2)
+        chapter = report['chapters'][0]
+        self.assertEqual(chapter['wall_time'], 8)
+        self.assertEqual(chapter['idle_time'], 1)
+        self.assertEqual([step['name'] for step in chapter['critical_path']], ['tts', 'render'])
+        self.assertEqual(report['apis'][0]['api'], 'bytedance_tts')
+
+        self.assertEqual(len(self._get(self.admin)['novels']), 2)
+
+    def test_non_admin_denied(self):
+        with self.assertRaises(PermissionDenied):
+            self._get(self.reviewer)
+
+    def test_rate_limit_usage(self):
+        limiter = RateLimiter(backend=SqliteBucketBackend(os.path.join(self.trace_dir, 'limits.sqlite3')), limits={})
+        limiter.acquire('ark_chat', 'doubao-seed-1.6')
+        limiter.penalize('visual_submit', 'high_aes', retry_after=30)
+
+        request = RequestFactory().get('/video/rate-limits/')
+        request.user = self.admin
+        with mock.patch('video.trace_views.get_rate_limiter', return_value=limiter):
+            data = json.loads(rate_limit_usage(request).content)
+
+        self.assertEqual(data['backend'], 'sqlite')
+        buckets = {bucket['key']: bucket for bucket in data['buckets']}
+        self.assertEqual(buckets['ark_chat:doubao-seed-1.6']['acquired'], 1)
+        self.assertEqual(buckets['visual_submit:high_aes']['limited'], 1)
+        self.assertGreater(buckets['visual_submit:high_aes']['cooldown'], 25)
+
+
+class FfmpegProgressCallbackTests(SimpleTestCase):
+    """
+    ffmpeg事件行写入Celery任务meta
+    """
+
+    class FakeTask:
+        def __init__(self):
+            self.states = []
+
+        def update_state(self, state, meta):
+            self.states.append((state, meta))
+
+    def test_events_update_task_meta(self):
+        task = self.FakeTask()
+        callback = create_ffmpeg_progress_callback(task, base_progress=10, max_progress=70, step='生成主视频')
+
+        callback('普通输出')
+        callback(FFMPEG_EVENT_PREFIX + json.dumps({'event': 'progress', 'label': 'base_video',
+                                                   'percent': 42.0, 'speed': 1.5}))
+        callback(FFMPEG_EVENT_PREFIX + json.dumps({'event': 'finished', 'label': 'base_video',
+                                                   'peak_rss_mb': 512.0, 'cpu_time': 8.2}))
+
+        self.assertEqual(len(task.states), 2)
+        progress_meta = task.states[0][1]
+        self.assertEqual(progress_meta['current'], 10)
+        self.assertEqual(progress_meta['ffmpeg']['percent'], 42.0)
+        self.assertIn('42%', progress_meta['status'])
+
+        finished_meta = task.states[1][1]
+        self.assertEqual(finished_meta['current'], 40)
+        self.assertEqual(finished_meta['encodes_completed'], 1)
+        self.assertEqual(finished_meta['last_encode']['peak_rss_mb'], 512.0)
+
+
+class QueueTopologyTests(SimpleTestCase):
+    """
+    每个Celery任务都显式路由到control/io/render之一，渲染任务与状态扫描分开
+    """
+
+    def task_names(self):
+        with open(os.path.join(os.path.dirname(__file__), 'tasks.py'), encoding='utf-8') as f:
+            source = f.read()
+        return set(re.findall(r'^@shared_task(?:\(.*\))?\ndef (\w+)\(', source, re.MULTILINE))
+
+    def test_every_task_has_explicit_route(self):
+        names = self.task_names()
+        self.assertIn('generate_chapter_video_task', names)
+        self.assertEqual(names - set(queue_topology.TASK_QUEUES), set())
+        self.assertEqual(set(queue_topology.TASK_QUEUES) - names, set())
+
+        routes = queue_topology.task_routes()
+        for name in names:
+            route = routes[f'video.tasks.{name}']
+            self.assertIn(route['queue'], queue_topology.QUEUE_NAMES)
+            self.assertIn(route['priority'], queue_topology.PRIORITY_STEPS)
+
+    def test_render_and_control_separation(self):
+        routes = queue_topology.task_routes()
+        for name in ('generate_chapter_video_task', 'concat_narration_video_async', 'generate_video_async',
+                     'batch_generate_all_videos_async'):
+            self.assertEqual(routes[f'video.tasks.{name}']['queue'], queue_topology.RENDER_QUEUE)
+        for name in ('scan_and_process_async_tasks', 'scan_specific_async_tasks', 'process_async_task_dirs',
+                     'scan_database_celery_tasks'):
+            self.assertEqual(routes[f'video.tasks.{name}']['queue'], queue_topology.CONTROL_QUEUE)
+            self.assertEqual(queue_topology.beat_options(name)['queue'], queue_topology.CONTROL_QUEUE)
+        self.assertEqual(routes['video.tasks.regenerate_single_image_task']['queue'], queue_topology.IO_QUEUE)
+        self.assertLess(routes['video.tasks.regenerate_single_image_task']['priority'],
+                        routes['video.tasks.gen_image_task']['priority'])
+
+    def test_threads_pool_tasks_keep_process_state(self):
+        # threads池中的任务共享进程，不能重定向sys.stdout或切换工作目录
+        with open(os.path.join(os.path.dirname(__file__), 'tasks.py'), encoding='utf-8') as f:
+            source = f.read()
+        bodies = re.split(r'^@shared_task(?:\(.*\))?\ndef (\w+)\(', source, flags=re.MULTILINE)[1:]
+        profiles = queue_topology.worker_profiles()
+        for name, body in zip(bodies[::2], bodies[1::2]):
+            queue = queue_topology.TASK_QUEUES[name][0]
+            if profiles[queue]['pool'] != 'threads':
+                continue
+            for pattern in (r'redirect_std(out|err)', r'sys\.std(out|err)\s*=', r'os\.chdir\('):
+                self.assertIsNone(re.search(pattern, body), f'{name} 在threads池中修改进程级状态: {pattern}')
+
+    def test_worker_commands(self):
+        with mock.patch.dict(os.environ, {'CELERY_RENDER_CONCURRENCY': '3'}):
+            render = queue_topology.worker_command('render', 'python')
+        self.assertEqual(render[render.index('--pool') + 1], 'prefork')
+        self.assertEqual(render[render.index('--concurrency') + 1], '3')
+        self.assertEqual(render[render.index('--prefetch-multiplier') + 1], '1')
+        self.assertEqual(render[render.index('--queues') + 1], 'render')
+
+        io = queue_topology.worker_command('io', 'python', concurrency=32)
+        self.assertEqual(io[io.index('--pool') + 1], 'threads')
+        self.assertEqual(io[io.index('--concurrency') + 1], '32')
+        self.assertEqual(io[io.index('--queues') + 1], 'io,celery')
+
+        with mock.patch('video.queue_topology.shutil.which', return_value=None), \
+                mock.patch('video.queue_topology.os.cpu_count', return_value=2):
+            self.assertEqual(queue_topology.default_render_concurrency(), 1)
+        with mock.patch('video.queue_topology.shutil.which', return_value='/usr/bin/nvidia-smi'):
+            self.assertEqual(queue_topology.default_render_concurrency(), 2)
+
+
+@skipUnless(importlib.util.find_spec('celery'), '需要安装celery')
+class CharacterImageTaskPropagationTests(TestCase):
+    """
+    角色图片任务按task_id同步状态，对账扫描不依赖任务名称和关键字参数
+    """
+
+    def setUp(self):
+        chapter = Chapter.objects.create(title='第1章', format='默认', novel=Novel.objects.create(name='小说'))
+        character = Character.objects.create(name='陆川', gender='男', age_group='青年', chapter=chapter)
+        self.task = CharacterImageTask.objects.create(task_id='char_img_1_1_abcd1234', character=character,
+                                                      chapter=chapter)
+
+    def test_propagate_by_task_id(self):
+        from .task_signals import propagate_task_state
+
+        self.assertEqual(propagate_task_state(self.task.task_id, 'PROGRESS', {'current': 40, 'status': '生成中'}), 1)
+        self.task.refresh_from_db()
+        self.assertEqual((self.task.status, self.task.progress), ('processing', 40))
+
+        propagate_task_state(self.task.task_id, 'SUCCESS', {'message': '完成'})
+        self.task.refresh_from_db()
+        self.assertEqual((self.task.status, self.task.progress), ('success', 100))
+        # 终态不再被迟到的进度事件覆盖
+        self.assertEqual(propagate_task_state(self.task.task_id, 'FAILURE', 'late'), 0)
+
+    def test_reconcile_scan(self):
+        from . import celery_task_scanner
+
+        metas = {self.task.task_id: {'status': 'FAILURE', 'result': 'boom'}}
+        with mock.patch.object(celery_task_scanner, 'fetch_task_metas', return_value=metas) as fetch:
+            stats = celery_task_scanner.scan_character_image_tasks()
+        fetch.assert_called_once_with([self.task.task_id])
+        self.assertEqual((stats['failed'], stats['updated']), (1, 1))
+        self.task.refresh_from_db()
+        self.assertEqual((self.task.status, self.task.error_message), ('failed', 'boom'))
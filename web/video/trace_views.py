@@ -0,0 +1,89 @@
+"""
+流水线追踪报告视图
+
+读取pipeline_trace.py写入的span文件，按小说和章节展示各阶段耗时、关键路径和接口延迟；
+同时提供rate_limiter.py共享限流器的当前用量
+"""
+
+import sys
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.shortcuts import render
+from django.views.decorators.http import require_http_methods
+
+from video.permissions import admin_required
+
+# 添加项目根目录到Python路径，以便导入pipeline_trace和rate_limiter模块
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from pipeline_trace import build_report, get_trace_dir, load_spans
+from rate_limiter import get_rate_limiter
+
+# 默认统计最近几天的记录
+DEFAULT_REPORT_DAYS = 7
+
+
+@login_required
+@admin_required
+@require_http_methods(["GET"])
+def trace_report(request):
+    """
+    流水线追踪报告页面
+
+    GET参数：
+    - novel: 小说编号（如 031）
+    - chapter: 章节目录名（如 chapter_001）
+    - days: 统计最近几天，默认7天
+    - format=json: 返回JSON
+
+    Args:
+        request: HTTP请求对象
+
+    Returns:
+        HttpResponse: 渲染的报告页面或JSON
+    """
+    novel = request.GET.get('novel', '').strip() or None
+    chapter = request.GET.get('chapter', '').strip() or None
+    try:
+        days = max(int(request.GET.get('days', DEFAULT_REPORT_DAYS)), 1)
+    except ValueError:
+        days = DEFAULT_REPORT_DAYS
+
+    trace_dir = getattr(settings, 'PIPELINE_TRACE_DIR', None) or get_trace_dir()
+    report = build_report(load_spans(trace_dir, days), novel=novel, chapter=chapter)
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'success': True, 'report': report}, json_dumps_params={'ensure_ascii': False})
+
+    return render(request, 'video/trace_report.html', {
+        'report': report,
+        'novel': novel or '',
+        'chapter': chapter or '',
+        'days': days,
+    })
+
+
+@login_required
+@admin_required
+@require_http_methods(["GET"])
+def rate_limit_usage(request):
+    """
+    接口限流器当前用量（JSON）
+
+    Args:
+        request: HTTP请求对象
+
+    Returns:
+        JsonResponse: 后端类型和每个令牌桶的限额、剩余令牌、冷却时间、调用次数和被限流次数
+    """
+    limiter = get_rate_limiter()
+    return JsonResponse({
+        'success': True,
+        'backend': limiter.backend.name,
+        'buckets': limiter.usage(),
+    }, json_dumps_params={'ensure_ascii': False})
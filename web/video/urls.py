@@ -4,6 +4,7 @@ from django.views.generic.base import RedirectView
 from . import views
 from . import log_views
 from . import review_views
+from . import trace_views
 
 app_name = 'video'
 
@@ -137,4 +138,13 @@ urlpatterns = [
     path('api/chapters/<int:chapter_id>/reset-review/', review_views.chapter_reset_review, name='chapter_reset_review'),
     path('api/chapters/<int:chapter_id>/review-status/', review_views.get_chapter_review_status, name='get_chapter_review_status'),
     path('api/chapters/batch-approve/', review_views.batch_approve_chapters, name='batch_approve_chapters'),
+    
+    # 章节选择器搜索（键集分页）
+    path('api/chapters/search/', review_views.chapter_search_api, name='chapter_search_api'),
+    
+    # 流水线追踪报告（管理员）
+    path('traces/', trace_views.trace_report, name='trace_report'),
+    
+    # 接口限流器用量（管理员）
+    path('rate-limits/', trace_views.rate_limit_usage, name='rate_limit_usage'),
 ]
\ No newline at end of file
@@ -158,6 +158,26 @@ def save_uploaded_file(uploaded_file, novel_name):
         raise ValueError(f"文件保存失败: {str(e)}")
 
 
+def spool_novel_upload(uploaded_file, novel_name):
+    """
+    校验扩展名后将上传的小说文件落盘，不做内容解析
+    解析由ingest_novel_upload_async后台任务完成，请求内只有分块写盘的开销
+    
+    Args:
+        uploaded_file: Django UploadedFile 对象
+        novel_name: 小说名称
+        
+    Returns:
+        str: 保存的文件路径
+    """
+    from .novel_ingest import SUPPORTED_EXTENSIONS
+    
+    file_extension = os.path.splitext(uploaded_file.name)[1].lower()
+    if file_extension not in SUPPORTED_EXTENSIONS:
+        raise ValueError(f"不支持的文件格式: {file_extension}")
+    return save_uploaded_file(uploaded_file, novel_name)
+
+
 def get_file_info(file_path):
     """
     获取文件信息
@@ -250,20 +270,28 @@ def upload_novel_to_tos(novel_id, file_path, original_filename):
         
         logger.info(f"[TOS上传] 开始上传文件: {file_path} -> tos://{bucket_name}/{object_key}")
         
-        # 上传文件
-        with open(file_path, 'rb') as f:
-            logger.info(f"[TOS上传] 文件已打开，开始上传...")
-            result = client.put_object(bucket_name, object_key, content=f)
-            logger.info(f"[TOS上传] 上传响应: {result}")
+        # 使用分片并行上传引擎：大文件断点续传，远端内容一致时跳过
+        import sys
+        project_root = str(settings.BASE_DIR.parent)
+        if project_root not in sys.path:
+            sys.path.insert(0, project_root)
+        from tos_uploader import ParallelUploader, TosObjectStore
+
+        uploader = ParallelUploader(TosObjectStore(client, bucket_name), log=lambda msg: logger.info(f"[TOS上传] {msg}"))
+        upload_result = uploader.upload_file(file_path, object_key)
+        if not upload_result['success']:
+            raise RuntimeError(upload_result['error'])
         
-        logger.info(f"[TOS上传] ✓ 小说文件上传成功: {object_key}")
+        logger.info(f"[TOS上传] ✓ 小说文件上传成功: {object_key}，"
+                    f"吞吐量: {upload_result['throughput_mb_s']:.2f} MB/s")
         
         return {
             'success': True,
             'bucket': bucket_name,
             'object_key': object_key,
             'url': f"tos://{bucket_name}/{object_key}",
-            'message': '文件上传成功'
+            'skipped': upload_result['skipped'],
+            'message': '文件已存在且内容一致，跳过上传' if upload_result['skipped'] else '文件上传成功'
         }
         
     except ImportError as e:
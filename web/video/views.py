@@ -12,8 +12,8 @@ from django.views.decorators.http import require_http_methods
 from django.core.paginator import Paginator
 from .forms import TaskForm, NovelForm, ChapterForm, CharacterForm, NarrationForm, SearchForm, CustomLoginForm
 from .models import Novel, Chapter, Character, Narration, CharacterImageTask
-from .utils import handle_uploaded_file, save_uploaded_file, upload_novel_to_tos, get_chapter_number_from_filesystem, get_chapter_directory_path
-from .tasks import generate_script_async, validate_narration_async, generate_audio_async
+from .utils import spool_novel_upload, get_chapter_number_from_filesystem, get_chapter_directory_path
+from .tasks import generate_script_async, validate_narration_async, generate_audio_async, ingest_novel_upload_async
 from .permissions import AdminRequiredMixin, admin_required
 from celery import current_app
 from datetime import datetime
@@ -24,10 +24,56 @@ import os
 import subprocess
 from django.conf import settings
 from datetime import datetime
+# 项目根目录模块，导入.tasks时已加入sys.path
+from stage_lock import file_inputs, get_stage_guard
+from chapter_timeline import load_timeline, narration_entry
 
 logger = logging.getLogger(__name__)
 
 
+def submit_stage_task(stage, novel_id, chapter, task, args, inputs=None, before_enqueue=None):
+    """
+    通过阶段锁提交Celery任务，同一阶段已有排队或执行中的任务时不重复提交
+    
+    Args:
+        stage (str): 阶段名
+        novel_id: 小说ID
+        chapter: 章节ID或标题，整本小说的阶段传None
+        task: Celery任务
+        args (tuple): 任务参数
+        inputs (dict): 影响结果的其他输入，不同输入不合并
+        before_enqueue (callable): before_enqueue(task_id)，投递前调用（如先记录任务ID和状态）
+        
+    Returns:
+        tuple: (任务ID, 是否合并到进行中的任务)
+    """
+    def enqueue(task_id):
+        if before_enqueue:
+            before_enqueue(task_id)
+        task.apply_async(args, task_id=task_id)
+
+    return get_stage_guard().submit(stage, novel_id, chapter, enqueue, inputs=inputs,
+                                    is_finished=lambda task_id: current_app.AsyncResult(task_id).ready())
+
+
+# 各章节阶段结果依赖的文件（相对章节目录的glob模式），文件改动后的请求不合并到旧任务
+STAGE_INPUT_PATTERNS = {
+    'audio': ['narration.txt'],
+    'chapter_images': ['narration.txt'],
+    'render_all': ['narration.txt', '*_narration_*.mp3', '*_narration_*.ass', '*_image_*.*'],
+}
+
+
+def chapter_stage_inputs(stage, novel_id, chapter):
+    """
+    章节阶段的输入文件摘要，找不到章节目录时返回空字典
+    """
+    chapter_number = get_chapter_number_from_filesystem(novel_id, chapter)
+    if not chapter_number:
+        return {}
+    return file_inputs(get_chapter_directory_path(novel_id, chapter_number), STAGE_INPUT_PATTERNS[stage])
+
+
 def get_default_character_image(character):
     """
     根据角色性别和年龄段获取默认图片路径
@@ -317,7 +363,8 @@ class NovelListView(LoginRequiredMixin, ListView):
         """
         from video.permissions import is_admin
         
-        queryset = Novel.objects.all()
+        # 列表页只加载元数据字段
+        queryset = Novel.objects.only(*Novel.LIST_FIELDS)
         
         # 审核组权限过滤：显示有审核相关章节的小说（审核中、已通过、已拒绝）
         if not is_admin(self.request.user):
@@ -335,21 +382,11 @@ class NovelListView(LoginRequiredMixin, ListView):
     
     def get_context_data(self, **kwargs):
         """
-        添加搜索表单和章节数据到上下文
-        审核组可以看到审核相关的章节
+        添加搜索表单到上下文
         """
-        from video.permissions import is_admin
-        
         context = super().get_context_data(**kwargs)
         context['search_form'] = SearchForm(self.request.GET)
-        # 添加章节数据，用于批量生成功能中的章节选择
-        # 审核组可以看到审核中、已通过、已拒绝的章节
-        if is_admin(self.request.user):
-            context['chapters'] = Chapter.objects.all().order_by('id')
-        else:
-            context['chapters'] = Chapter.objects.filter(
-                review_status__in=['reviewing', 'approved', 'rejected']
-            ).order_by('id')
+        # 批量生成功能的章节选择器通过 video:chapter_search_api 分页加载，不再把全部章节放入上下文
         return context
 
 
@@ -367,7 +404,8 @@ class NovelDetailView(LoginRequiredMixin, DetailView):
         """
         from video.permissions import is_admin
         
-        queryset = Novel.objects.all()
+        # 详情页只展示名称和章节，不需要加载其余字段
+        queryset = Novel.objects.only(*Novel.LIST_FIELDS)
         
         # 审核组权限过滤：可以访问有审核相关章节的小说
         if not is_admin(self.request.user):
@@ -421,32 +459,12 @@ class NovelCreateView(AdminRequiredMixin, CreateView):
             novel_name = os.path.splitext(file_name)[0]  # 去掉文件扩展名
             form.instance.name = novel_name
             
-            # 提取文件内容
+            # 只把上传文件落盘，文本提取、字数统计、类型识别和TOS上传在后台任务中完成
             try:
-                extracted_content = handle_uploaded_file(uploaded_file)
-                
-                # 自动填充内容
-                form.instance.content = extracted_content
-                
-                # 保存文件
-                file_path = save_uploaded_file(uploaded_file, novel_name)
+                file_path = spool_novel_upload(uploaded_file, novel_name)
                 form.instance.original_file = file_path
-                
-                # 自动计算字数
-                form.instance.word_count = len(extracted_content.replace(' ', '').replace('\n', ''))
-                
-                # 根据内容自动判断类型（简单的关键词匹配）
-                content_lower = extracted_content.lower()
-                if any(keyword in content_lower for keyword in ['修仙', '仙侠', '灵气', '修炼', '丹药']):
-                    form.instance.type = '仙侠'
-                elif any(keyword in content_lower for keyword in ['都市', '现代', '都市生活', '职场']):
-                    form.instance.type = '都市'
-                elif any(keyword in content_lower for keyword in ['玄幻', '魔法', '异世界', '穿越']):
-                    form.instance.type = '玄幻'
-                elif any(keyword in content_lower for keyword in ['历史', '古代', '朝廷', '皇帝']):
-                    form.instance.type = '历史'
-                else:
-                    form.instance.type = '其他'
+                form.instance.task_status = 'ingesting'
+                form.instance.task_message = '文件已上传，等待后台解析...'
                         
             except ValueError as e:
                 # 检查是否为AJAX请求
@@ -462,27 +480,21 @@ class NovelCreateView(AdminRequiredMixin, CreateView):
             # 先保存实例到数据库
             response = super().form_valid(form)
             
-            # 上传文件到TOS
-            try:
-                if form.instance.original_file:
-                    upload_result = upload_novel_to_tos(form.instance.id, form.instance.original_file.path, uploaded_file.name)
-                    if upload_result['success']:
-                        print(f"TOS上传成功: {upload_result['message']}")
-                    else:
-                        print(f"TOS上传失败: {upload_result['message']}")
-            except Exception as e:
-                print(f"TOS上传异常: {str(e)}")
+            # 提交后台解析任务
+            task = ingest_novel_upload_async.delay(form.instance.id, uploaded_file.name)
+            Novel.objects.filter(pk=form.instance.id).update(current_task_id=task.id)
             
             # 检查是否为AJAX请求
             if self.request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return JsonResponse({
                     'success': True,
-                    'message': '小说创建成功！',
+                    'message': '小说创建成功，文件正在后台解析',
                     'novel_id': form.instance.id,
-                    'novel_name': form.instance.name
+                    'novel_name': form.instance.name,
+                    'task_id': task.id
                 })
             else:
-                messages.success(self.request, '小说创建成功！')
+                messages.success(self.request, '小说创建成功，文件正在后台解析')
                 return response
             
         except Exception as e:
@@ -538,32 +550,12 @@ class NovelUpdateView(AdminRequiredMixin, UpdateView):
                 novel_name = os.path.splitext(file_name)[0]  # 去掉文件扩展名
                 form.instance.name = novel_name
                 
-                # 提取文件内容
+                # 只把上传文件落盘，解析和TOS上传在后台任务中完成
                 try:
-                    extracted_content = handle_uploaded_file(uploaded_file)
-                    
-                    # 自动填充内容
-                    form.instance.content = extracted_content
-                    
-                    # 保存文件
-                    file_path = save_uploaded_file(uploaded_file, novel_name)
+                    file_path = spool_novel_upload(uploaded_file, novel_name)
                     form.instance.original_file = file_path
-                    
-                    # 自动计算字数
-                    form.instance.word_count = len(extracted_content.replace(' ', '').replace('\n', ''))
-                    
-                    # 根据内容自动判断类型（简单的关键词匹配）
-                    content_lower = extracted_content.lower()
-                    if any(keyword in content_lower for keyword in ['修仙', '仙侠', '灵气', '修炼', '丹药']):
-                        form.instance.type = '仙侠'
-                    elif any(keyword in content_lower for keyword in ['都市', '现代', '都市生活', '职场']):
-                        form.instance.type = '都市'
-                    elif any(keyword in content_lower for keyword in ['玄幻', '魔法', '异世界', '穿越']):
-                        form.instance.type = '玄幻'
-                    elif any(keyword in content_lower for keyword in ['历史', '古代', '朝廷', '皇帝']):
-                        form.instance.type = '历史'
-                    else:
-                        form.instance.type = '其他'
+                    form.instance.task_status = 'ingesting'
+                    form.instance.task_message = '文件已上传，等待后台解析...'
                         
                 except ValueError as e:
                     messages.error(self.request, f'文件处理失败: {str(e)}')
@@ -572,56 +564,11 @@ class NovelUpdateView(AdminRequiredMixin, UpdateView):
             # 保存小说到数据库
             response = super().form_valid(form)
             
-            # 如果有上传文件，则上传到TOS
-            if uploaded_file and hasattr(form.instance, 'id'):
-                import logging
-                logger = logging.getLogger(__name__)
-                
-                try:
-                    logger.info(f"[Django视图] 准备上传文件到TOS，小说ID: {form.instance.id}")
-                    logger.info(f"[Django视图] 上传文件名: {uploaded_file.name}")
-                    
-                    # 获取保存的文件路径
-                    import os
-                    from django.conf import settings
-                    local_file_path = os.path.join(settings.MEDIA_ROOT, form.instance.original_file)
-                    logger.info(f"[Django视图] 本地文件路径: {local_file_path}")
-                    logger.info(f"[Django视图] MEDIA_ROOT: {settings.MEDIA_ROOT}")
-                    logger.info(f"[Django视图] original_file字段值: {form.instance.original_file}")
-                    
-                    # 检查文件是否存在
-                    if os.path.exists(local_file_path):
-                        logger.info(f"[Django视图] 本地文件存在，开始调用TOS上传函数")
-                    else:
-                        logger.error(f"[Django视图] 本地文件不存在: {local_file_path}")
-                    
-                    # 上传到TOS
-                    upload_result = upload_novel_to_tos(
-                        novel_id=form.instance.id,
-                        file_path=local_file_path,
-                        original_filename=uploaded_file.name
-                    )
-                    
-                    logger.info(f"[Django视图] TOS上传结果: {upload_result}")
-                    
-                    if upload_result['success']:
-                        logger.info(f"[Django视图] TOS上传成功: {upload_result['object_key']}")
-                        messages.success(self.request, f'小说更新成功！文件已上传到TOS: {upload_result["object_key"]}')
-                    else:
-                        logger.error(f"[Django视图] TOS上传失败: {upload_result['message']}")
-                        messages.warning(self.request, f'小说更新成功，但TOS上传失败: {upload_result["message"]}')
-                        
-                except Exception as e:
-                    logger.error(f"[Django视图] TOS上传异常: {str(e)}")
-                    logger.error(f"[Django视图] 异常类型: {type(e).__name__}")
-                    messages.warning(self.request, f'小说更新成功，但TOS上传失败: {str(e)}')
+            if uploaded_file:
+                task = ingest_novel_upload_async.delay(form.instance.id, uploaded_file.name)
+                Novel.objects.filter(pk=form.instance.id).update(current_task_id=task.id)
+                messages.success(self.request, '小说更新成功，新文件正在后台解析')
             else:
-                import logging
-                logger = logging.getLogger(__name__)
-                if not uploaded_file:
-                    logger.info(f"[Django视图] 没有上传文件，跳过TOS上传")
-                elif not hasattr(form.instance, 'id'):
-                    logger.info(f"[Django视图] 小说实例没有ID，跳过TOS上传")
                 messages.success(self.request, '小说更新成功！')
             
             return response
@@ -727,8 +674,9 @@ class ChapterDetailView(LoginRequiredMixin, DetailView):
         # 构建章节目录路径
         chapter_dir = project_root / 'data' / f'{novel_id:03d}' / chapter_title
         
-        # 读取文件系统中的narration信息
+        # 读取文件系统中的narration信息（时间信息来自章节时间线，页面只读取不重建）
         file_narrations = []
+        timeline = load_timeline(str(chapter_dir), str(project_root)) if chapter_dir.exists() else None
         if chapter_dir.exists():
             # 查找所有音频文件
             audio_files = sorted(glob.glob(str(chapter_dir / '*.mp3')))
@@ -758,6 +706,7 @@ class ChapterDetailView(LoginRequiredMixin, DetailView):
                     audio_rel_path = os.path.relpath(audio_file, data_dir)
                     subtitle_rel_path = os.path.relpath(subtitle_file, data_dir) if subtitle_file and subtitle_file.exists() else None
                     image_rel_path = os.path.relpath(image_files[0], data_dir) if image_files else None
+                    entry = narration_entry(timeline, f'{number:02d}')
                     
                     file_narrations.append({
                         'number': number,
@@ -767,10 +716,14 @@ class ChapterDetailView(LoginRequiredMixin, DetailView):
                         'subtitle_exists': subtitle_file is not None and subtitle_file.exists(),
                         'image_path': image_rel_path,
                         'image_exists': len(image_files) > 0,
-                        'image_count': len(image_files)
+                        'image_count': len(image_files),
+                        'start': entry['start'] if entry else None,
+                        'end': entry['end'] if entry else None,
+                        'duration': entry['duration'] if entry else None
                     })
         
         context['file_narrations'] = file_narrations
+        context['timeline_duration'] = timeline['duration'] if timeline else None
         
         # 提取视频文件名用于显示
         if self.object.video_path:
@@ -2580,13 +2533,18 @@ def batch_generate_chapter_images(request, chapter_id):
         # 导入批量生成任务
         from .tasks import batch_generate_chapter_images_async
         
-        # 启动异步任务
-        task = batch_generate_chapter_images_async.delay(chapter.novel.id, chapter.id)
+        # 启动异步任务，同一章节已在生成时返回进行中的任务
+        task_id, coalesced = submit_stage_task(
+            'chapter_images', chapter.novel.id, chapter.id, batch_generate_chapter_images_async,
+            (chapter.novel.id, chapter.id), inputs=chapter_stage_inputs('chapter_images', chapter.novel.id, chapter)
+        )
         
         return JsonResponse({
             'success': True,
-            'message': f'已启动章节 {chapter.title} 的分镜图片批量生成任务',
-            'task_id': task.id,
+            'message': (f'章节 {chapter.title} 的分镜图片批量生成任务正在进行中，已返回进行中的任务' if coalesced
+                        else f'已启动章节 {chapter.title} 的分镜图片批量生成任务'),
+            'task_id': task_id,
+            'coalesced': coalesced,
             'chapter_id': chapter.id,
             'chapter_title': chapter.title,
             'novel_id': chapter.novel.id,
@@ -2671,15 +2629,21 @@ def batch_generate_all_videos(request, chapter_id):
         # 导入Celery任务
         from .tasks import batch_generate_all_videos_async
         
-        # 启动异步任务
-        task = batch_generate_all_videos_async.delay(novel_id, chapter_id)
+        # 启动异步任务，同一章节已在生成时返回进行中的任务
+        task_id, coalesced = submit_stage_task('render_all', novel_id, chapter_id,
+                                               batch_generate_all_videos_async, (novel_id, chapter_id),
+                                               inputs=chapter_stage_inputs('render_all', novel_id, chapter))
         
-        logger.info(f"批量生成全部视频任务已启动: task_id={task.id}")
+        if coalesced:
+            logger.info(f"批量生成全部视频任务已在进行中，合并到: task_id={task_id}")
+        else:
+            logger.info(f"批量生成全部视频任务已启动: task_id={task_id}")
         
         return JsonResponse({
             'success': True,
-            'message': '批量生成全部视频任务已启动',
-            'task_id': task.id,
+            'message': '批量生成全部视频任务正在进行中' if coalesced else '批量生成全部视频任务已启动',
+            'task_id': task_id,
+            'coalesced': coalesced,
             'novel_id': novel_id,
             'chapter_id': chapter_id,
             'count': narrations.count()
@@ -2865,15 +2829,16 @@ def generate_character_image(request):
         
         # 导入并启动异步任务
         from .tasks import generate_character_image_async
-        celery_task = generate_character_image_async.delay(
-            task_id=task_id,
-            character_id=character_id,
-            chapter_id=chapter_id,
-            image_style=image_style,
-            image_quality=image_quality,
-            image_count=image_count,
-            custom_prompt=custom_prompt
-        )
+        # Celery任务ID与CharacterImageTask.task_id一致，状态同步和对账可直接按task_id定位记录
+        celery_task = generate_character_image_async.apply_async(kwargs={
+            'task_id': task_id,
+            'character_id': character_id,
+            'chapter_id': chapter_id,
+            'image_style': image_style,
+            'image_quality': image_quality,
+            'image_count': image_count,
+            'custom_prompt': custom_prompt
+        }, task_id=task_id)
         
         logger.info(f"角色图片生成任务已启动: {task_id}, Celery任务ID: {celery_task.id}")
         
@@ -2958,15 +2923,15 @@ def batch_generate_character_images(request):
             
             # 启动异步任务
             from .tasks import generate_character_image_async
-            celery_task = generate_character_image_async.delay(
-                task_id=task_id,
-                character_id=character.id,
-                chapter_id=chapter_id,
-                image_style=image_style,
-                image_quality=image_quality,
-                image_count=image_count,
-                custom_prompt=custom_prompt
-            )
+            celery_task = generate_character_image_async.apply_async(kwargs={
+                'task_id': task_id,
+                'character_id': character.id,
+                'chapter_id': chapter_id,
+                'image_style': image_style,
+                'image_quality': image_quality,
+                'image_count': image_count,
+                'custom_prompt': custom_prompt
+            }, task_id=task_id)
             celery_tasks.append(celery_task.id)
         
         logger.info(f"批量角色图片生成任务已启动: {len(tasks)}个任务")
@@ -3209,15 +3174,18 @@ def generate_audio(request, novel_id, chapter_id):
                 'error': '解说文件不存在，请先生成解说内容'
             }, status=400)
         
-        # 启动音频生成任务
-        task = generate_audio_async.delay(novel_id, chapter_id)
+        # 启动音频生成任务，同一章节已在生成时返回进行中的任务
+        task_id, coalesced = submit_stage_task('audio', novel_id, chapter_id, generate_audio_async,
+                                               (novel_id, chapter_id),
+                                               inputs=file_inputs(data_dir, STAGE_INPUT_PATTERNS['audio']))
         
-        logger.info(f"音频生成任务已启动: 小说ID={novel_id}, 章节ID={chapter_id}, 任务ID={task.id}")
+        logger.info(f"音频生成任务{'已在进行中' if coalesced else '已启动'}: 小说ID={novel_id}, 章节ID={chapter_id}, 任务ID={task_id}")
         
         return JsonResponse({
             'success': True,
-            'task_id': task.id,
-            'message': '音频生成任务已启动',
+            'task_id': task_id,
+            'coalesced': coalesced,
+            'message': '音频生成任务正在进行中' if coalesced else '音频生成任务已启动',
             'novel_id': novel_id,
             'chapter_id': chapter_id
         })
@@ -3335,6 +3303,7 @@ def get_chapter_audio_files(request, novel_id, chapter_id):
         
         # 使用新的工具函数获取章节目录路径
         from .utils import get_chapter_directory_path
+        import re
         
         data_dir = get_chapter_directory_path(novel_id, chapter_number)
         
@@ -3346,9 +3315,10 @@ def get_chapter_audio_files(request, novel_id, chapter_id):
                 'message': '章节数据目录不存在'
             })
         
-        # 查找音频文件和ASS字幕文件
+        # 查找音频文件和ASS字幕文件（时长来自章节时间线，失效时不返回时长）
         audio_files = []
         ass_files = []
+        timeline = load_timeline(data_dir, str(settings.BASE_DIR.parent))
         
         try:
             for filename in os.listdir(data_dir):
@@ -3366,13 +3336,19 @@ def get_chapter_audio_files(request, novel_id, chapter_id):
                     timestamp_path = os.path.join(data_dir, timestamp_file)
                     has_timestamps = os.path.exists(timestamp_path)
                     
+                    match = re.search(r'narration_(\d+)\.mp3$', filename)
+                    entry = narration_entry(timeline, match.group(1)) if match else None
+                    
                     audio_files.append({
                         'filename': filename,
                         'file_path': file_path,
                         'file_size': file_size,
                         'modified_time': modified_time,
                         'has_timestamps': has_timestamps,
-                        'timestamp_file': timestamp_file if has_timestamps else None
+                        'timestamp_file': timestamp_file if has_timestamps else None,
+                        'duration': entry['audio_duration'] if entry else None,
+                        'start': entry['start'] if entry else None,
+                        'end': entry['end'] if entry else None
                     })
                 
                 # 检查是否为ASS字幕文件
@@ -3402,7 +3378,8 @@ def get_chapter_audio_files(request, novel_id, chapter_id):
             'audio_files': audio_files,
             'ass_files': ass_files,
             'total_audio_files': len(audio_files),
-            'total_ass_files': len(ass_files)
+            'total_ass_files': len(ass_files),
+            'total_duration': timeline['duration'] if timeline else None
         })
         
     except Exception as e:
@@ -3962,6 +3939,13 @@ def serve_narration_image(request, novel_id, chapter_id, narration_id, filename)
         if content_type is None:
             content_type = 'application/octet-stream'
         
+        # 缩略图请求（?thumb=1）优先返回下载时生成的小图
+        if request.GET.get('thumb'):
+            from image_derivatives import thumbnail_path
+            thumb = thumbnail_path(image_path)
+            if thumb:
+                image_path, content_type = thumb, 'image/jpeg'
+        
         # 返回图片文件
         with open(image_path, 'rb') as f:
             response = HttpResponse(f.read(), content_type=content_type)
@@ -4132,23 +4116,25 @@ def novel_gen_image(request, novel_id):
     try:
         novel = get_object_or_404(Novel, pk=novel_id)
         
-        # 先更新状态为"处理中"
-        novel.task_status = 'generating_image'
-        novel.task_message = '正在生成分镜图片...'
-        novel.save()
+        def mark_processing(task_id):
+            # 投递前更新状态为"处理中"并保存任务ID
+            novel.task_status = 'generating_image'
+            novel.task_message = '正在生成分镜图片...'
+            novel.current_task_id = task_id
+            novel.save()
         
-        # 调用Celery异步任务
+        # 调用Celery异步任务，已在生成时返回进行中的任务
         from .tasks import gen_image_task
-        task = gen_image_task.delay(novel_id)
-        
-        # 保存任务ID
-        novel.current_task_id = task.id
-        novel.save()
+        novel_dir = os.path.join(settings.BASE_DIR, '..', 'data', f'{novel_id:03d}')
+        task_id, coalesced = submit_stage_task('novel_images', novel_id, None, gen_image_task, (novel_id,),
+                                               inputs=file_inputs(novel_dir, ['chapter_*/narration.txt']),
+                                               before_enqueue=mark_processing)
         
         return JsonResponse({
             'success': True,
-            'message': f'开始生成图片，任务ID: {task.id}',
-            'task_id': task.id
+            'message': f'图片正在生成中，任务ID: {task_id}' if coalesced else f'开始生成图片，任务ID: {task_id}',
+            'task_id': task_id,
+            'coalesced': coalesced
         })
     except Exception as e:
         logger.error(f"生成图片失败: {str(e)}")
@@ -4192,19 +4178,27 @@ def regenerate_single_image(request):
                 'message': '缺少必要参数'
             }, status=400)
         
-        # 调用Celery任务
+        # 调用Celery任务，同一场景相同prompt的重复请求返回进行中的任务
         from .tasks import regenerate_single_image_task
-        task = regenerate_single_image_task.delay(novel_id, chapter_title, scene_number, custom_prompt)
+        task_id, coalesced = submit_stage_task(
+            'regenerate_image', novel_id, chapter_title, regenerate_single_image_task,
+            (novel_id, chapter_title, scene_number, custom_prompt),
+            inputs={'scene_number': str(scene_number), 'custom_prompt': custom_prompt or ''}
+        )
         
-        if custom_prompt:
-            logger.info(f"重新生成图片任务已提交（使用自定义Prompt）: novel_id={novel_id}, chapter={chapter_title}, scene={scene_number}, task_id={task.id}")
+        if coalesced:
+            logger.info(f"重新生成图片任务已在进行中: novel_id={novel_id}, chapter={chapter_title}, scene={scene_number}, task_id={task_id}")
+        elif custom_prompt:
+            logger.info(f"重新生成图片任务已提交（使用自定义Prompt）: novel_id={novel_id}, chapter={chapter_title}, scene={scene_number}, task_id={task_id}")
         else:
-            logger.info(f"重新生成图片任务已提交: novel_id={novel_id}, chapter={chapter_title}, scene={scene_number}, task_id={task.id}")
+            logger.info(f"重新生成图片任务已提交: novel_id={novel_id}, chapter={chapter_title}, scene={scene_number}, task_id={task_id}")
         
         return JsonResponse({
             'success': True,
-            'task_id': task.id,
-            'message': f'场景 {scene_number} 图片重新生成任务已提交'
+            'task_id': task_id,
+            'coalesced': coalesced,
+            'message': (f'场景 {scene_number} 图片正在重新生成中' if coalesced
+                        else f'场景 {scene_number} 图片重新生成任务已提交')
         })
         
     except Exception as e:
@@ -4407,6 +4401,15 @@ def serve_data_file(request, file_path):
     
     logger.info(f"文件类型: {content_type}")
     
+    # 列表中的缩略图请求（?thumb=1）返回下载时生成的小图，没有可用缩略图时返回原图
+    if request.GET.get('thumb') and content_type.startswith('image/'):
+        from image_derivatives import thumbnail_path
+        thumb = thumbnail_path(str(full_path))
+        if thumb:
+            response = FileResponse(open(thumb, 'rb'), content_type='image/jpeg')
+            response['Content-Disposition'] = f'inline; filename="{full_path.stem}_thumb.jpg"'
+            return response
+    
     # 返回文件
     response = FileResponse(open(full_path, 'rb'), content_type=content_type)
     response['Content-Disposition'] = f'inline; filename="{os.path.basename(full_path)}"'
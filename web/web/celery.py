@@ -11,7 +11,8 @@ from celery import Celery
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'web.settings')
 
 # 创建Celery应用实例
-app = Celery('web')
+# 使用StatusPropagatingTask作为默认任务基类，update_state上报的进度会实时同步到数据库
+app = Celery('web', task_cls='video.task_signals:StatusPropagatingTask')
 
 # 从Django设置中加载配置
 app.config_from_object('django.conf:settings', namespace='CELERY')
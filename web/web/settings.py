@@ -166,6 +166,9 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# 小说正文压缩存储目录（不在MEDIA_ROOT下，避免通过MEDIA_URL直接访问）
+NOVEL_BLOB_ROOT = BASE_DIR / 'novel_blobs'
+
 # File upload settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024   # 10MB
@@ -203,19 +206,33 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 CELERY_ENABLE_UTC = True
 
-# Celery任务路由
-CELERY_TASK_ROUTES = {
-    'video.tasks.*': {'queue': 'celery'},
+# Celery队列拓扑：control（状态扫描）、io（接口提交与轮询）、render（ffmpeg渲染）分别由独立的worker池消费，
+# 每个任务的队列和优先级在 video/queue_topology.py 中声明，worker按 run_celery.py --profile 启动
+from kombu import Queue
+from video import queue_topology
+
+CELERY_TASK_QUEUES = [
+    Queue(name, routing_key=name, queue_arguments={'x-max-priority': 10})
+    for name in queue_topology.QUEUE_NAMES + (queue_topology.LEGACY_QUEUE,)
+]
+CELERY_TASK_DEFAULT_QUEUE = queue_topology.IO_QUEUE
+CELERY_TASK_DEFAULT_PRIORITY = queue_topology.DEFAULT_PRIORITY
+CELERY_TASK_ROUTES = queue_topology.task_routes()
+# Redis按优先级拆分子队列，0最高
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'queue_order_strategy': 'priority',
+    'priority_steps': queue_topology.PRIORITY_STEPS,
+    'sep': ':',
 }
+# 长任务不预取，避免排队消息被占着的worker扣住
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
 
-# Celery任务注解配置 - 启用rate_limit功能
+# Celery任务注解配置
+# 接口调用频率由项目根目录rate_limiter.py的共享令牌桶控制（所有worker和命令行脚本共用），任务本身不再限速
 CELERY_TASK_ANNOTATIONS = {
     '*': {
         'rate_limit': None,  # 默认无限制
     },
-    'video.tasks.generate_narration_images_async': {
-        'rate_limit': '2/s',  # 每秒最多2个任务
-    },
 }
 
 # Celery日志配置
@@ -227,35 +244,31 @@ CELERY_WORKER_LOGLEVEL = 'INFO'
 # Celery Beat定时任务配置
 from celery.schedules import crontab
 
+# 异步任务目录由worker内的变更订阅（项目根目录async_task_feed.py）按文件事件驱动处理，
+# 下面两个全量扫描只作为兜底对账；关闭订阅时退回每15秒扫描
+ASYNC_TASK_FEED_ENABLED = os.environ.get('ASYNC_TASK_FEED_ENABLED', '1') != '0'
+ASYNC_TASK_SCAN_INTERVAL = 3600.0 if ASYNC_TASK_FEED_ENABLED else 15.0
+
 CELERY_BEAT_SCHEDULE = {
-    # 每15秒扫描一次data目录
+    # 全量扫描data目录（兜底）
     'scan-all-async-tasks': {
         'task': 'video.tasks.scan_and_process_async_tasks',
-        'schedule': 15.0,  # 每15秒执行一次
+        'schedule': ASYNC_TASK_SCAN_INTERVAL,
         'args': ('data',),  # 数据目录参数
-        'options': {
-            'queue': 'celery',
-            'routing_key': 'celery',
-        }
+        'options': queue_topology.beat_options('scan_and_process_async_tasks'),
     },
-    # 每15秒扫描一次async_tasks目录
+    # 全量扫描async_tasks目录（兜底）
     'scan-specific-async-tasks': {
         'task': 'video.tasks.scan_specific_async_tasks',
-        'schedule': 15.0,  # 每15秒执行一次
+        'schedule': ASYNC_TASK_SCAN_INTERVAL,
         'args': ('async_tasks',),  # 任务目录参数
-        'options': {
-            'queue': 'celery',
-            'routing_key': 'celery',
-        }
+        'options': queue_topology.beat_options('scan_specific_async_tasks'),
     },
-    # 每30秒扫描一次数据库中的Celery任务状态
+    # 数据库中的Celery任务状态由信号实时同步，这里每10分钟批量对账一次作为兜底
     'scan-database-celery-tasks': {
         'task': 'video.tasks.scan_database_celery_tasks',
-        'schedule': 30.0,  # 每30秒执行一次
-        'options': {
-            'queue': 'celery',
-            'routing_key': 'celery',
-        }
+        'schedule': 600.0,  # 每10分钟执行一次
+        'options': queue_topology.beat_options('scan_database_celery_tasks'),
     },
 }
 